@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'polls.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -155,15 +156,128 @@ SENTENCE_TRANSFORMER_MODEL = os.getenv(
     'SENTENCE_TRANSFORMER_MODEL',
     'paraphrase-MiniLM-L6-v2'
 )
+# 啟動伺服器時是否在背景預先載入模型（或執行 python manage.py warmup_models）
+SENTENCE_TRANSFORMER_WARMUP = (
+    os.getenv('SENTENCE_TRANSFORMER_WARMUP', 'False') == 'True'
+)
+# 批次編碼設定（每批句子數、合併同時請求的等待毫秒數）
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv('EMBEDDING_MAX_WAIT_MS', '5'))
+# 向量快取：以 (模型, 正規化文字) 為鍵，預設為記憶體 LRU + SQLite 兩層
+# 更換 SENTENCE_TRANSFORMER_MODEL 後自動清空
+EMBEDDING_CACHE_ENABLED = (
+    os.getenv('EMBEDDING_CACHE_ENABLED', 'True') == 'True'
+)
+EMBEDDING_CACHE_BACKEND = os.getenv('EMBEDDING_CACHE_BACKEND', 'tiered')
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '10000')
+)
+EMBEDDING_CACHE_SQLITE_PATH = os.getenv(
+    'EMBEDDING_CACHE_SQLITE_PATH',
+    str(BASE_DIR / 'cache' / 'embeddings.sqlite3')
+)
+# 向量儲存精度（float32 / float16）
+EMBEDDING_STORAGE_DTYPE = os.getenv('EMBEDDING_STORAGE_DTYPE', 'float32')
+# 批次相似度 API 單次請求最多比對組數（查詢數 × 候選數）
+SIMILARITY_MAX_PAIRS = int(os.getenv('SIMILARITY_MAX_PAIRS', '25000000'))
+# MinHash / LSH 近似重複偵測（修改簽章長度或 bands 後需執行
+# python manage.py sentence_duplicates --rebuild）
+MINHASH_NUM_PERM = int(os.getenv('MINHASH_NUM_PERM', '128'))
+MINHASH_BANDS = int(os.getenv('MINHASH_BANDS', '32'))
+MINHASH_SHINGLE_SIZE = int(os.getenv('MINHASH_SHINGLE_SIZE', '3'))
+# 估計 Jaccard 相似度達此值才視為近似重複
+MINHASH_THRESHOLD = float(os.getenv('MINHASH_THRESHOLD', '0.5'))
 
 # Ollama Cloud API 設定
 OLLAMA_API_KEY = os.getenv('OLLAMA_API_KEY', '')
 OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'https://ollama.com')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'gpt-oss:120b')
 
+# Ollama 連線池設定（每個 host + API Key 的連線上限、閒置回收秒數）
+OLLAMA_POOL_MAX_CONNECTIONS = int(os.getenv('OLLAMA_POOL_MAX_CONNECTIONS', '8'))
+OLLAMA_POOL_IDLE_TIMEOUT = float(os.getenv('OLLAMA_POOL_IDLE_TIMEOUT', '300'))
+OLLAMA_POOL_ACQUIRE_TIMEOUT = float(
+    os.getenv('OLLAMA_POOL_ACQUIRE_TIMEOUT', '30')
+)
+
+# LLM 並行呼叫設定（行程共用的同時呼叫上限、每個區段的逾時秒數）
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_SECTION_TIMEOUT = float(os.getenv('LLM_SECTION_TIMEOUT', '180'))
+# 超過並行上限時最多排隊的呼叫數；佇列已滿的請求立即回傳 503
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '32'))
+# 各供應商同時呼叫上限，以及等待額度的最長秒數（逾時回傳 503）
+LLM_PROVIDER_LIMITS = {
+    'ollama': int(os.getenv('LLM_OLLAMA_CONCURRENCY', '8')),
+    'openai': int(os.getenv('LLM_OPENAI_CONCURRENCY', '4')),
+}
+LLM_PROVIDER_ACQUIRE_TIMEOUT = float(
+    os.getenv('LLM_PROVIDER_ACQUIRE_TIMEOUT', '30')
+)
+# 非同步 view（ASGI）同時進行的 LLM 呼叫上限；等待回應時不佔用執行緒
+LLM_ASYNC_MAX_CONCURRENCY = int(os.getenv('LLM_ASYNC_MAX_CONCURRENCY', '1000'))
+
+# 背景生成工作（GenerationJob 資料庫佇列）
+# JOB_WORKER_AUTOSTART=True 時 web 行程在第一次送出工作時啟動 worker 執行緒；
+# 設為 False 則改由 python manage.py run_job_worker 獨立執行
+JOB_WORKER_AUTOSTART = os.getenv('JOB_WORKER_AUTOSTART', 'True') == 'True'
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+# 執行中超過此秒數的工作視為 worker 已中止，重新排入佇列
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '1800'))
+
+# LLM 回應快取設定
+# LLM_CACHE_ENABLED=True 時快取所有呼叫；否則只快取 temperature=0 的呼叫
+# LLM_CACHE_BACKEND 可為 memory / sqlite / tiered 或自訂 dotted path
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'False') == 'True'
+LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'tiered')
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024'))
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '86400'))
+LLM_CACHE_SQLITE_PATH = os.getenv(
+    'LLM_CACHE_SQLITE_PATH',
+    str(BASE_DIR / 'cache' / 'llm_responses.sqlite3')
+)
+
+# 列表 API 分頁（?limit= 預設值與上限）
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '500'))
+
+# 批次 CRUD API（/polls/<資源>/bulk/）：單次請求筆數上限與每批寫入筆數
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '50000'))
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '1000'))
+
+# SQL 查詢數預算（QueryBudgetMiddleware）
+# 回應加上 X-Query-Count 標頭；超過預算時記錄警告，STRICT 時拋出例外
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED', str(DEBUG)) == 'True'
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', '50'))
+# 依 URL 名稱設定的預算：列表頁不論筆數都應只有一個查詢
+QUERY_BUDGETS = {
+    'user-list': 1,
+    'order-list': 1,
+    'order-detail': 1,
+    'sync-path-list': 1,
+    'chat-session-list': 1,
+    'category-memory-list': 1,
+    'uploaded-file-list': 1,
+    'weight_config_list': 1,
+    'field_priority_list': 1,
+    'gpt_prompt_list': 1,
+}
+
 # FAISS 索引設定
-FAISS_INDEX_PATH = os.getenv('FAISS_INDEX_PATH', './faiss_index')
+FAISS_INDEX_PATH = os.getenv('FAISS_INDEX_PATH', 'faiss_data')
 FAISS_DIMENSION = int(os.getenv('FAISS_DIMENSION', '384'))
+# 索引類型：flat（精確）、ivf_flat、ivf_pq、hnsw、sq8
+FAISS_INDEX_TYPE = os.getenv('FAISS_INDEX_TYPE', 'flat')
+# IVF 群數（0 表示依資料量自動決定，約 4√n）
+FAISS_NLIST = int(os.getenv('FAISS_NLIST', '0'))
+FAISS_PQ_M = int(os.getenv('FAISS_PQ_M', '16'))
+FAISS_HNSW_M = int(os.getenv('FAISS_HNSW_M', '32'))
+# 訓練 IVF / PQ / SQ8 時抽樣的向量數
+FAISS_TRAIN_SAMPLE = int(os.getenv('FAISS_TRAIN_SAMPLE', '50000'))
+# 查詢預設值（可由 search API 的 nprobe / ef_search 覆寫）
+FAISS_NPROBE = int(os.getenv('FAISS_NPROBE', '8'))
+FAISS_EF_SEARCH = int(os.getenv('FAISS_EF_SEARCH', '64'))
 
 # 檔案上傳設定
 MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', '10485760'))  # 10MB
@@ -2,9 +2,19 @@
 API 工具函數
 提供 OpenAI、Ollama 和 Sentence Transformers 的整合函數
 """
+import asyncio
 import os
+from collections import deque
+import threading
+import time
+import weakref
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from functools import partial
+
 from django.conf import settings
 
+from .caching import acached_llm_call, cached_llm_call
+
 
 def get_openai_client():
     """
@@ -29,7 +39,8 @@ def get_openai_client():
         )
 
 
-def call_openai_api(prompt, user_input, model=None, temperature=None, max_tokens=None):
+def call_openai_api(prompt, user_input, model=None, temperature=None,
+                    max_tokens=None, bypass_cache=False):
     """
     呼叫 OpenAI API
     
@@ -39,6 +50,7 @@ def call_openai_api(prompt, user_input, model=None, temperature=None, max_tokens
         model: 模型名稱（預設從 settings 讀取）
         temperature: 溫度參數（預設從 settings 讀取）
         max_tokens: 最大 token 數（預設從 settings 讀取）
+        bypass_cache: 略過回應快取，強制重新呼叫 API
     
     回傳：
         str: AI 生成的文本
@@ -57,22 +69,302 @@ def call_openai_api(prompt, user_input, model=None, temperature=None, max_tokens
             "請在 .env 檔案中設定：OPENAI_API_KEY=your-api-key"
         )
     
-    openai = get_openai_client()
+    model_name = model or settings.OPENAI_MODEL
+    if temperature is None:
+        temperature = settings.OPENAI_TEMPERATURE
+    max_tokens = max_tokens or settings.OPENAI_MAX_TOKENS
     
-    response = openai.ChatCompletion.create(
-        model=model or settings.OPENAI_MODEL,
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": user_input}
-        ],
-        temperature=temperature or settings.OPENAI_TEMPERATURE,
-        max_tokens=max_tokens or settings.OPENAI_MAX_TOKENS
-    )
+    def compute():
+        openai = get_openai_client()
+        
+        with get_llm_executor().provider_slot('openai'):
+            response = openai.ChatCompletion.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": user_input}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        
+        return response.choices[0].message.content
     
-    return response.choices[0].message.content
+    return cached_llm_call(
+        'openai', model_name, prompt, user_input, temperature, max_tokens,
+        bypass_cache, compute
+    )
+
+
+_async_openai_clients = weakref.WeakKeyDictionary()
+_async_openai_clients_lock = threading.Lock()
+
+
+def _get_async_openai_client(api_key):
+    # AsyncOpenAI 內部的 httpx.AsyncClient 綁定建立時的事件迴圈，每個迴圈各自一個
+    loop = asyncio.get_running_loop()
+    with _async_openai_clients_lock:
+        clients = _async_openai_clients.setdefault(loop, {})
+        client = clients.get(api_key)
+        if client is None:
+            try:
+                from openai import AsyncOpenAI
+            except ImportError:
+                raise ImportError(
+                    "請先安裝 openai>=1.0: pip install openai\n"
+                    "並在 .env 中設定 OPENAI_API_KEY"
+                )
+            client = AsyncOpenAI(api_key=api_key)
+            clients[api_key] = client
+    return client
+
+
+async def acall_openai_api(prompt, user_input, model=None, temperature=None,
+                           max_tokens=None, bypass_cache=False):
+    """
+    call_openai_api 的非同步版本（openai.AsyncOpenAI），
+    等待回應期間不佔用執行緒；參數與回傳值相同
+
+    範例：
+        result = await acall_openai_api(
+            prompt="You are a helpful assistant",
+            user_input="What is Django?"
+        )
+    """
+    if not settings.OPENAI_API_KEY:
+        raise ValueError(
+            "未設定 OPENAI_API_KEY\n"
+            "請在 .env 檔案中設定：OPENAI_API_KEY=your-api-key"
+        )
+
+    model_name = model or settings.OPENAI_MODEL
+    if temperature is None:
+        temperature = settings.OPENAI_TEMPERATURE
+    max_tokens = max_tokens or settings.OPENAI_MAX_TOKENS
+
+    async def compute():
+        client = _get_async_openai_client(settings.OPENAI_API_KEY)
+
+        async with get_llm_executor().async_provider_slot('openai'):
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": user_input}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+
+        return response.choices[0].message.content
+
+    return await acached_llm_call(
+        'openai', model_name, prompt, user_input, temperature, max_tokens,
+        bypass_cache, compute
+    )
+
+
+class OllamaClientPool:
+    """
+    Ollama 客戶端連線池（行程共用、執行緒安全）
+
+    以 (host, api_key) 為鍵保存已建立的 ollama.Client，
+    重複使用底層 HTTP keep-alive 連線，避免每次呼叫都重新握手。
+
+    參數：
+        max_per_host: 每個 (host, api_key) 同時可借出的客戶端上限
+        idle_timeout: 閒置超過此秒數的客戶端會被關閉並移出池
+        acquire_timeout: 等待可用客戶端的最長秒數（None 表示無限等待）
+        factory: 建立客戶端的函數 factory(host, api_key)，預設建立 ollama.Client
+
+    使用方式：
+        with get_ollama_client_pool().client(host, api_key) as client:
+            client.chat(model, messages=messages, stream=True)
+    """
+
+    def __init__(self, max_per_host=4, idle_timeout=300.0,
+                 acquire_timeout=None, factory=None):
+        self.max_per_host = max(1, int(max_per_host))
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._factory = factory or _create_ollama_client
+        self._cond = threading.Condition()
+        # key -> [(client, last_used_at), ...]
+        self._idle = {}
+        # key -> 已借出的客戶端數量
+        self._in_use = {}
+        self._created = 0
+        self._reused = 0
+        self._discarded = 0
+
+    def acquire(self, host, api_key):
+        """借出一個客戶端，若已達上限則等待其他呼叫歸還"""
+        key = (host, api_key)
+        deadline = (None if self.acquire_timeout is None
+                    else time.monotonic() + self.acquire_timeout)
+        with self._cond:
+            self._evict_idle_locked()
+            while True:
+                idle = self._idle.get(key)
+                while idle:
+                    client, _ = idle.pop()
+                    if self._is_healthy(client):
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                        self._reused += 1
+                        return client
+                    self._close(client)
+                    self._discarded += 1
+                if self._in_use.get(key, 0) < self.max_per_host:
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+                remaining = (None if deadline is None
+                             else deadline - time.monotonic())
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(
+                        f"等待 Ollama 連線逾時 ({host})，"
+                        f"已達上限 {self.max_per_host}"
+                    )
+                self._cond.wait(remaining)
+
+        # 在鎖外建立客戶端，避免阻塞其他 host
+        try:
+            client = self._factory(host, api_key)
+        except Exception:
+            with self._cond:
+                self._in_use[key] -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+        return client
+
+    def release(self, host, api_key, client, healthy=True):
+        """歸還客戶端；healthy=False 時直接關閉不放回池中"""
+        key = (host, api_key)
+        with self._cond:
+            self._in_use[key] = max(0, self._in_use.get(key, 0) - 1)
+            if healthy and self._is_healthy(client):
+                self._idle.setdefault(key, []).append(
+                    (client, time.monotonic())
+                )
+                client = None
+            else:
+                self._discarded += 1
+            self._cond.notify()
+        if client is not None:
+            self._close(client)
+
+    @contextmanager
+    def client(self, host, api_key):
+        """以 context manager 借出客戶端，發生例外時丟棄該連線"""
+        client = self.acquire(host, api_key)
+        healthy = True
+        try:
+            yield client
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            self.release(host, api_key, client, healthy=healthy)
+
+    def evict_idle(self):
+        """關閉所有閒置逾時的客戶端，回傳關閉數量"""
+        with self._cond:
+            return self._evict_idle_locked()
+
+    def close_all(self):
+        """關閉池中所有閒置客戶端"""
+        with self._cond:
+            idle, self._idle = self._idle, {}
+        for entries in idle.values():
+            for client, _ in entries:
+                self._close(client)
+
+    def stats(self):
+        """回傳連線池統計資訊"""
+        with self._cond:
+            return {
+                'hosts': len(set(self._idle) | set(self._in_use)),
+                'idle': sum(len(v) for v in self._idle.values()),
+                'in_use': sum(self._in_use.values()),
+                'created': self._created,
+                'reused': self._reused,
+                'discarded': self._discarded,
+                'max_per_host': self.max_per_host,
+            }
+
+    def _evict_idle_locked(self):
+        if not self.idle_timeout:
+            return 0
+        now = time.monotonic()
+        evicted = 0
+        for key in list(self._idle):
+            alive = []
+            for client, last_used in self._idle[key]:
+                if now - last_used > self.idle_timeout:
+                    self._close(client)
+                    evicted += 1
+                else:
+                    alive.append((client, last_used))
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+        self._discarded += evicted
+        return evicted
+
+    @staticmethod
+    def _is_healthy(client):
+        # ollama.Client 底層為 httpx.Client，已關閉的連線不可再使用
+        http_client = getattr(client, '_client', None)
+        return not getattr(http_client, 'is_closed', False)
+
+    @staticmethod
+    def _close(client):
+        http_client = getattr(client, '_client', None)
+        close = getattr(http_client, 'close', None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception:
+            pass
+
+
+def _create_ollama_client(host, api_key):
+    try:
+        from ollama import Client
+    except ImportError:
+        raise ImportError(
+            "請先安裝 ollama: pip install ollama\n"
+            "並在 .env 中設定 OLLAMA_API_KEY 和 OLLAMA_HOST"
+        )
+    return Client(
+        host=host,
+        headers={'Authorization': 'Bearer ' + api_key}
+    )
+
 
+_ollama_client_pool = None
+_ollama_client_pool_lock = threading.Lock()
 
-def call_ollama_api(prompt, user_input, model=None):
+
+def get_ollama_client_pool():
+    """取得行程共用的 Ollama 客戶端連線池（延遲建立）"""
+    global _ollama_client_pool
+    if _ollama_client_pool is None:
+        with _ollama_client_pool_lock:
+            if _ollama_client_pool is None:
+                _ollama_client_pool = OllamaClientPool(
+                    max_per_host=settings.OLLAMA_POOL_MAX_CONNECTIONS,
+                    idle_timeout=settings.OLLAMA_POOL_IDLE_TIMEOUT,
+                    acquire_timeout=settings.OLLAMA_POOL_ACQUIRE_TIMEOUT,
+                )
+    return _ollama_client_pool
+
+
+def call_ollama_api(prompt, user_input, model=None, temperature=None,
+                    max_tokens=None, bypass_cache=False):
     """
     呼叫 Ollama Cloud API
     
@@ -80,6 +372,9 @@ def call_ollama_api(prompt, user_input, model=None):
         prompt: 系統提示詞
         user_input: 使用者輸入
         model: 模型名稱（預設從 settings 讀取）
+        temperature: 溫度參數（預設使用模型設定）
+        max_tokens: 最大 token 數（預設使用模型設定）
+        bypass_cache: 略過回應快取，強制重新呼叫 API
     
     回傳：
         str: AI 生成的文本
@@ -91,27 +386,28 @@ def call_ollama_api(prompt, user_input, model=None):
             model="gpt-oss:120b"
         )
     """
-    try:
-        from ollama import Client
-    except ImportError:
-        raise ImportError(
-            "請先安裝 ollama: pip install ollama\n"
-            "並在 .env 中設定 OLLAMA_API_KEY 和 OLLAMA_HOST"
-        )
-    
     if not settings.OLLAMA_API_KEY:
         raise ValueError(
             "未設定 OLLAMA_API_KEY\n"
             "請在 .env 檔案中設定：OLLAMA_API_KEY=your-api-key"
         )
     
-    client = Client(
-        host=settings.OLLAMA_HOST,
-        headers={'Authorization': 'Bearer ' + settings.OLLAMA_API_KEY}
-    )
-    
     model_name = model or settings.OLLAMA_MODEL
     
+    def compute():
+        return ''.join(stream_ollama_api(
+            prompt, user_input, model=model_name,
+            temperature=temperature, max_tokens=max_tokens
+        ))
+    
+    return cached_llm_call(
+        'ollama', model_name, prompt, user_input, temperature, max_tokens,
+        bypass_cache, compute
+    )
+
+
+def _ollama_chat_args(prompt, user_input, temperature, max_tokens):
+    """組出 Ollama chat 的 messages 與 options"""
     messages = [
         {
             'role': 'system',
@@ -122,14 +418,56 @@ def call_ollama_api(prompt, user_input, model=None):
             'content': user_input,
         },
     ]
+
+    options = {}
+    if temperature is not None:
+        options['temperature'] = temperature
+    if max_tokens is not None:
+        options['num_predict'] = max_tokens
+    return messages, options
+
+
+def stream_ollama_api(prompt, user_input, model=None, temperature=None,
+                      max_tokens=None):
+    """
+    以串流方式呼叫 Ollama Cloud API，逐段產出生成的文字
+    
+    參數與 call_ollama_api 相同（串流模式不使用回應快取）
+    
+    產出：
+        str: 模型回傳的每一段文字（token chunk）
+    
+    範例：
+        for chunk in stream_ollama_api(
+            prompt="You are a helpful assistant",
+            user_input="What is Django?"
+        ):
+            print(chunk, end='', flush=True)
+    """
+    if not settings.OLLAMA_API_KEY:
+        raise ValueError(
+            "未設定 OLLAMA_API_KEY\n"
+            "請在 .env 檔案中設定：OLLAMA_API_KEY=your-api-key"
+        )
     
+    model_name = model or settings.OLLAMA_MODEL
+    messages, options = _ollama_chat_args(
+        prompt, user_input, temperature, max_tokens
+    )
+    
+    pool = get_ollama_client_pool()
     try:
-        # 使用串流方式接收回應
-        full_response = ""
-        for part in client.chat(model_name, messages=messages, stream=True):
-            full_response += part['message']['content']
-        
-        return full_response
+        # 佔用 Ollama 呼叫額度並從連線池借用客戶端；
+        # 呼叫端中途停止讀取時連線會被丟棄
+        with get_llm_executor().provider_slot('ollama'), \
+                pool.client(settings.OLLAMA_HOST, settings.OLLAMA_API_KEY) as client:
+            for part in client.chat(model_name, messages=messages,
+                                    stream=True, options=options or None):
+                content = part['message']['content']
+                if content:
+                    yield content
+    except (ImportError, LLMBusyError):
+        raise
     except Exception as e:
         raise ConnectionError(
             f"無法連接到 Ollama API ({settings.OLLAMA_HOST})\n"
@@ -137,27 +475,685 @@ def call_ollama_api(prompt, user_input, model=None):
         )
 
 
-def get_sentence_transformer_model():
+# 事件迴圈 -> {(host, api_key): ollama.AsyncClient}
+# AsyncClient 的 HTTP 連線綁定建立時的事件迴圈，因此依迴圈分別保存；迴圈結束後自動釋放
+_async_ollama_clients = weakref.WeakKeyDictionary()
+_async_ollama_clients_lock = threading.Lock()
+
+
+def _get_async_ollama_client(host, api_key):
+    loop = asyncio.get_running_loop()
+    with _async_ollama_clients_lock:
+        clients = _async_ollama_clients.setdefault(loop, {})
+        client = clients.get((host, api_key))
+        if client is None:
+            try:
+                from ollama import AsyncClient
+            except ImportError:
+                raise ImportError(
+                    "請先安裝 ollama: pip install ollama\n"
+                    "並在 .env 中設定 OLLAMA_API_KEY 和 OLLAMA_HOST"
+                )
+            client = AsyncClient(
+                host=host,
+                headers={'Authorization': 'Bearer ' + api_key}
+            )
+            clients[(host, api_key)] = client
+    return client
+
+
+async def acall_ollama_api(prompt, user_input, model=None, temperature=None,
+                           max_tokens=None, bypass_cache=False):
     """
-    取得 Sentence Transformer 模型
-    
+    call_ollama_api 的非同步版本（ollama.AsyncClient），
+    等待回應期間不佔用執行緒；參數與回傳值相同
+
+    範例：
+        result = await acall_ollama_api(
+            prompt="You are a helpful assistant",
+            user_input="What is Django?"
+        )
+    """
+    if not settings.OLLAMA_API_KEY:
+        raise ValueError(
+            "未設定 OLLAMA_API_KEY\n"
+            "請在 .env 檔案中設定：OLLAMA_API_KEY=your-api-key"
+        )
+
+    model_name = model or settings.OLLAMA_MODEL
+
+    async def compute():
+        return ''.join([
+            chunk async for chunk in astream_ollama_api(
+                prompt, user_input, model=model_name,
+                temperature=temperature, max_tokens=max_tokens
+            )
+        ])
+
+    return await acached_llm_call(
+        'ollama', model_name, prompt, user_input, temperature, max_tokens,
+        bypass_cache, compute
+    )
+
+
+async def astream_ollama_api(prompt, user_input, model=None, temperature=None,
+                             max_tokens=None):
+    """
+    stream_ollama_api 的非同步版本，以 async for 逐段產出生成的文字
+    """
+    if not settings.OLLAMA_API_KEY:
+        raise ValueError(
+            "未設定 OLLAMA_API_KEY\n"
+            "請在 .env 檔案中設定：OLLAMA_API_KEY=your-api-key"
+        )
+
+    model_name = model or settings.OLLAMA_MODEL
+    messages, options = _ollama_chat_args(
+        prompt, user_input, temperature, max_tokens
+    )
+
+    try:
+        async with get_llm_executor().async_provider_slot('ollama'):
+            client = _get_async_ollama_client(
+                settings.OLLAMA_HOST, settings.OLLAMA_API_KEY
+            )
+            stream = await client.chat(
+                model_name, messages=messages,
+                stream=True, options=options or None
+            )
+            async for part in stream:
+                content = part['message']['content']
+                if content:
+                    yield content
+    except (ImportError, LLMBusyError):
+        raise
+    except Exception as e:
+        raise ConnectionError(
+            f"無法連接到 Ollama API ({settings.OLLAMA_HOST})\n"
+            f"錯誤訊息：{str(e)}"
+        )
+
+
+class LLMBusyError(RuntimeError):
+    """
+    LLM 呼叫已達並行上限且等待佇列已滿，或等待供應商額度逾時
+
+    呼叫端應立即回傳 503（附 Retry-After），而不是讓請求繼續堆積
+    """
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _ProviderLimit:
+    def __init__(self, limit):
+        self.limit = limit
+        self.semaphore = threading.BoundedSemaphore(limit)
+        # 等待中的非同步呼叫 (事件迴圈, future)，依先後順序取得額度
+        self.async_waiters = deque()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+
+class BoundedLLMExecutor:
+    """
+    行程共用的 LLM 執行器（執行緒安全）
+
+    - 全域並行上限：max_workers 個執行緒同時呼叫 LLM
+    - 有上限的等待佇列：進行中 + 排隊的任務超過 max_workers + max_queue 時
+      submit_all 直接拋出 LLMBusyError（背壓），不接受任何一個任務
+    - 非同步呼叫：admit(n) 登記事件迴圈上進行中的呼叫（不佔執行緒），
+      超過 max_async 時拋出 LLMBusyError
+    - 供應商額度：provider_slot / async_provider_slot 限制同一供應商
+      同時進行的呼叫數（同步與非同步共用），
+      等待超過 acquire_timeout 秒拋出 LLMBusyError
+
+    參數：
+        max_workers: 全域並行上限
+        max_queue: 等待佇列長度上限
+        provider_limits: {供應商: 同時呼叫上限}；未列出的供應商不限制
+        acquire_timeout: 等待供應商額度的最長秒數（None 表示無限等待）
+        max_async: 非同步呼叫的並行上限
+
     使用方式：
-        from polls.api_utils import calculate_sentence_similarity
-        
-        similarity = calculate_sentence_similarity(
-            "用戶可以登入系統",
-            "使用者能夠登入平台"
+        futures = get_llm_executor().submit_all([task1, task2])
+    """
+
+    def __init__(self, max_workers, max_queue, provider_limits=None,
+                 acquire_timeout=None, max_async=1000):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.acquire_timeout = acquire_timeout
+        self.max_async = max_async
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='llm'
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._async_active = 0
+        self._providers = {
+            name: _ProviderLimit(limit)
+            for name, limit in (provider_limits or {}).items()
+        }
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_all([partial(fn, *args, **kwargs)])[0]
+
+    def submit_all(self, funcs):
+        """
+        一次提交多個任務（全部接受或全部拒絕）
+
+        回傳：
+            list: 與 funcs 順序相同的 Future；容量不足時拋出 LLMBusyError
+        """
+        funcs = list(funcs)
+        with self._lock:
+            if self._pending + len(funcs) > self.max_workers + self.max_queue:
+                self._rejected += len(funcs)
+                raise LLMBusyError(
+                    f'LLM 服務忙碌中（進行中與排隊的呼叫已達 '
+                    f'{self.max_workers + self.max_queue} 個），請稍後重試'
+                )
+            self._pending += len(funcs)
+            self._submitted += len(funcs)
+        futures = []
+        for func in funcs:
+            future = self._executor.submit(self._run, func)
+            future.add_done_callback(self._done)
+            futures.append(future)
+        return futures
+
+    @contextmanager
+    def admit(self, count):
+        """
+        登記 count 個非同步呼叫直到 with 區塊結束（全部接受或全部拒絕）
+
+        非同步呼叫在事件迴圈上等待回應、不佔用執行緒，
+        因此另以 max_async 限制，而不受 max_workers 限制
+        """
+        with self._lock:
+            if self._async_active + count > self.max_async:
+                self._rejected += count
+                raise LLMBusyError(
+                    f'LLM 服務忙碌中（非同步呼叫已達 {self.max_async} 個），'
+                    '請稍後重試'
+                )
+            self._async_active += count
+            self._submitted += count
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._async_active -= count
+                self._completed += count
+
+    @contextmanager
+    def provider_slot(self, provider):
+        """佔用一個供應商呼叫額度，直到 with 區塊結束"""
+        limit = self._providers.get(provider)
+        if limit is None:
+            yield
+            return
+        acquired = False
+        with self._lock:
+            limit.waiting += 1
+        try:
+            acquired = limit.semaphore.acquire(
+                timeout=self.acquire_timeout
+            ) if self.acquire_timeout is not None else limit.semaphore.acquire()
+        finally:
+            self._slot_acquired(limit, acquired)
+        if not acquired:
+            raise self._slot_busy(provider, limit)
+        try:
+            yield
+        finally:
+            self._release_slot(limit)
+
+    @asynccontextmanager
+    async def async_provider_slot(self, provider):
+        """
+        provider_slot 的非同步版本
+
+        與同步呼叫共用同一個額度；額度不足時在所屬事件迴圈上以 future 排隊，
+        釋放額度時直接交給最早等待的非同步呼叫（依序喚醒，不輪詢、不佔執行緒）
+        """
+        limit = self._providers.get(provider)
+        if limit is None:
+            yield
+            return
+        loop = asyncio.get_running_loop()
+        future = None
+        with self._lock:
+            limit.waiting += 1
+            acquired = limit.semaphore.acquire(blocking=False)
+            if not acquired:
+                future = loop.create_future()
+                limit.async_waiters.append((loop, future))
+        try:
+            if not acquired:
+                try:
+                    await asyncio.wait_for(future, self.acquire_timeout)
+                    acquired = True
+                except asyncio.TimeoutError:
+                    # 逾時與交付同時發生時，額度已經屬於此呼叫
+                    acquired = future.done() and not future.cancelled()
+        except BaseException:
+            # 被取消時若額度已交給此呼叫，轉交給下一位
+            if future is not None and future.done() and not future.cancelled():
+                self._pass_slot(limit)
+            raise
+        finally:
+            self._slot_acquired(limit, acquired)
+        if not acquired:
+            raise self._slot_busy(provider, limit)
+        try:
+            yield
+        finally:
+            self._release_slot(limit)
+
+    def _release_slot(self, limit):
+        with self._lock:
+            limit.active -= 1
+        self._pass_slot(limit)
+
+    def _pass_slot(self, limit):
+        """將一個額度交給最早等待的非同步呼叫；沒有等待者時歸還號誌"""
+        with self._lock:
+            while limit.async_waiters:
+                loop, future = limit.async_waiters.popleft()
+                if future.done():
+                    continue
+                try:
+                    loop.call_soon_threadsafe(
+                        self._hand_over, limit, future
+                    )
+                    return
+                except RuntimeError:
+                    # 事件迴圈已關閉
+                    continue
+            limit.semaphore.release()
+
+    def _hand_over(self, limit, future):
+        # 在等待者的事件迴圈上執行；等待者已逾時或取消時轉交給下一位
+        if future.done():
+            self._pass_slot(limit)
+        else:
+            future.set_result(None)
+
+    def _slot_acquired(self, limit, acquired):
+        with self._lock:
+            limit.waiting -= 1
+            if acquired:
+                limit.active += 1
+            else:
+                limit.rejected += 1
+
+    def _slot_busy(self, provider, limit):
+        return LLMBusyError(
+            f'{provider} 同時呼叫數已達上限 {limit.limit}，'
+            f'等待超過 {self.acquire_timeout:g} 秒'
         )
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'queued': self._pending - self._active,
+                'max_async': self.max_async,
+                'async_active': self._async_active,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'providers': {
+                    name: {
+                        'limit': limit.limit,
+                        'active': limit.active,
+                        'waiting': limit.waiting,
+                        'rejected': limit.rejected,
+                    }
+                    for name, limit in self._providers.items()
+                },
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, func):
+        with self._lock:
+            self._active += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+
+_llm_executor = None
+_llm_executor_lock = threading.Lock()
+
+
+def get_llm_executor():
+    """
+    取得行程共用的 LLM 執行器
+
+    所有需要並行呼叫 LLM 的 view 共用同一個執行器，
+    同時進行中的呼叫數量上限為 settings.LLM_MAX_CONCURRENCY，
+    排隊上限為 settings.LLM_MAX_QUEUE，各供應商上限見 settings.LLM_PROVIDER_LIMITS
+    """
+    global _llm_executor
+    if _llm_executor is None:
+        with _llm_executor_lock:
+            if _llm_executor is None:
+                _llm_executor = BoundedLLMExecutor(
+                    max_workers=settings.LLM_MAX_CONCURRENCY,
+                    max_queue=settings.LLM_MAX_QUEUE,
+                    provider_limits=settings.LLM_PROVIDER_LIMITS,
+                    acquire_timeout=settings.LLM_PROVIDER_ACQUIRE_TIMEOUT,
+                    max_async=settings.LLM_ASYNC_MAX_CONCURRENCY,
+                )
+    return _llm_executor
+
+
+def run_llm_tasks(tasks, timeout=None):
+    """
+    並行執行多個互不相依的 LLM 呼叫
+
+    參數：
+        tasks: dict，名稱 -> 無參數的可呼叫物件
+        timeout: 每個任務的逾時秒數；可為數字或 {名稱: 秒數} 的 dict
+
+    回傳：
+        tuple: (results, errors)
+            results: {名稱: 回傳值}，只包含成功的任務
+            errors: {名稱: 錯誤訊息}，只包含失敗或逾時的任務
+        執行器佇列已滿時拋出 LLMBusyError（任何任務都不會執行）
+
+    範例：
+        results, errors = run_llm_tasks({
+            'dbml': lambda: call_ollama_api(prompt=dbml_prompt, user_input=""),
+            'gherkin': lambda: call_ollama_api(prompt=gherkin_prompt, user_input=""),
+        }, timeout=120)
+    """
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+
+    started_at = time.monotonic()
+    futures = dict(zip(tasks, get_llm_executor().submit_all(tasks.values())))
+
+    results = {}
+    errors = {}
+    for name, future in futures.items():
+        limit = timeout.get(name) if isinstance(timeout, dict) else timeout
+        remaining = (None if limit is None
+                     else max(0.0, started_at + limit - time.monotonic()))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # 尚未開始的任務直接取消；執行中的任務完成後結果會被捨棄
+            future.cancel()
+            errors[name] = f'逾時（超過 {limit} 秒）'
+        except Exception as e:
+            errors[name] = str(e)
+    return results, errors
+
+
+async def arun_llm_tasks(tasks, timeout=None):
     """
+    run_llm_tasks 的非同步版本：以 asyncio.gather 並行執行，等待期間不佔用執行緒
+
+    參數：
+        tasks: dict，名稱 -> 無參數、回傳 awaitable 的可呼叫物件
+        timeout: 每個任務的逾時秒數；可為數字或 {名稱: 秒數} 的 dict
+
+    回傳：
+        tuple: (results, errors)，格式與 run_llm_tasks 相同；
+        非同步呼叫已達 LLM_ASYNC_MAX_CONCURRENCY 時拋出 LLMBusyError
+
+    範例：
+        results, errors = await arun_llm_tasks({
+            'dbml': lambda: acall_ollama_api(prompt=dbml_prompt, user_input=""),
+            'gherkin': lambda: acall_ollama_api(prompt=gherkin_prompt, user_input=""),
+        }, timeout=120)
+    """
+    async def run(name, factory):
+        limit = timeout.get(name) if isinstance(timeout, dict) else timeout
+        try:
+            return name, await asyncio.wait_for(factory(), limit), None
+        except asyncio.TimeoutError:
+            return name, None, f'逾時（超過 {limit} 秒）'
+        except Exception as e:
+            return name, None, str(e)
+
+    with get_llm_executor().admit(len(tasks)):
+        outcomes = await asyncio.gather(*(
+            run(name, factory) for name, factory in tasks.items()
+        ))
+
+    results = {name: value for name, value, error in outcomes if error is None}
+    errors = {name: error for name, _, error in outcomes if error is not None}
+    return results, errors
+
+
+def astream_llm_tasks(tasks, timeout=None):
+    """
+    並行執行多個非同步串流 LLM 呼叫，並依抵達順序合併產出事件
+    （須在事件迴圈中呼叫，例如 async view）
+
+    參數：
+        tasks: dict，名稱 -> 無參數、回傳文字 chunk 非同步迭代器的可呼叫物件
+        timeout: 每個任務的逾時秒數；可為數字或 {名稱: 秒數} 的 dict
+
+    回傳：
+        非同步事件迭代器，產出 tuple: (名稱, 事件類型, 值)
+            ('token', chunk)：收到一段文字
+            ('done', 完整文字)：該任務完成
+            ('error', 錯誤訊息)：該任務失敗或逾時
+
+    呼叫時立即登記非同步呼叫額度並啟動所有任務，已達 LLM_ASYNC_MAX_CONCURRENCY
+    時直接拋出 LLMBusyError，讓 view 能在開始串流前回傳 503。
+    呼叫端停止讀取（例如用戶端斷線）時，所有進行中的串流會被取消。
+    """
+    events = asyncio.Queue()
+    admission = ExitStack()
+    admission.enter_context(get_llm_executor().admit(len(tasks)))
+
+    async def run(name, factory):
+        limit = timeout.get(name) if isinstance(timeout, dict) else timeout
+        parts = []
+
+        async def consume():
+            chunks = factory()
+            try:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    events.put_nowait((name, 'token', chunk))
+            finally:
+                # 立即結束串流並釋放供應商額度，不等垃圾回收
+                aclose = getattr(chunks, 'aclose', None)
+                if aclose is not None:
+                    await aclose()
+
+        try:
+            await asyncio.wait_for(consume(), limit)
+            events.put_nowait((name, 'done', ''.join(parts)))
+        except asyncio.TimeoutError:
+            events.put_nowait((name, 'error', f'逾時（超過 {limit:g} 秒）'))
+        except Exception as e:
+            events.put_nowait((name, 'error', str(e)))
+
+    runners = [
+        asyncio.ensure_future(run(name, factory))
+        for name, factory in tasks.items()
+    ]
+    # 全部任務結束（或被取消）後才釋放額度
+    asyncio.gather(*runners, return_exceptions=True).add_done_callback(
+        lambda _: admission.close()
+    )
+
+    async def merge():
+        pending = set(tasks)
+        try:
+            while pending:
+                name, kind, value = await events.get()
+                if kind != 'token':
+                    pending.discard(name)
+                yield name, kind, value
+        finally:
+            for runner in runners:
+                runner.cancel()
+
+    return merge()
+
+
+class SentenceTransformerRegistry:
+    """
+    Sentence Transformer 模型登錄表（行程共用、執行緒安全）
+
+    每個模型名稱只載入一次，之後的呼叫直接取用已載入的模型，
+    並記錄載入時間與記憶體用量供 metrics 使用。
+
+    參數：
+        loader: 載入模型的函數 loader(model_name)，預設建立 SentenceTransformer
+    """
+
+    def __init__(self, loader=None):
+        self._loader = loader or _load_sentence_transformer
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._model_locks = {}
+
+    def get(self, model_name=None):
+        """取得模型，第一次使用時才載入"""
+        model_name = model_name or settings.SENTENCE_TRANSFORMER_MODEL
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            model_lock = self._model_locks.setdefault(
+                model_name, threading.Lock()
+            )
+        # 每個模型各自加鎖，同時請求同一模型時只會載入一次
+        with model_lock:
+            model = self._models.get(model_name)
+            if model is None:
+                started_at = time.monotonic()
+                model = self._loader(model_name)
+                self._stats[model_name] = {
+                    'load_seconds': round(time.monotonic() - started_at, 4),
+                    'memory_bytes': _model_memory_bytes(model),
+                    'dimension': _model_dimension(model),
+                    'loaded_at': time.time(),
+                }
+                self._models[model_name] = model
+        return model
+
+    def warmup(self, model_names=None):
+        """
+        預先載入模型並執行一次 encode，避免第一個請求承擔初始化成本
+
+        回傳：
+            dict: 各模型的 metrics
+        """
+        model_names = model_names or [settings.SENTENCE_TRANSFORMER_MODEL]
+        for model_name in model_names:
+            model = self.get(model_name)
+            started_at = time.monotonic()
+            model.encode(['warmup'])
+            self._stats[model_name]['warmup_seconds'] = round(
+                time.monotonic() - started_at, 4
+            )
+        return {name: self._stats[name] for name in model_names}
+
+    def is_loaded(self, model_name=None):
+        model_name = model_name or settings.SENTENCE_TRANSFORMER_MODEL
+        return model_name in self._models
+
+    def unload(self, model_name=None):
+        """移除已載入的模型（例如切換模型設定後釋放記憶體）"""
+        model_name = model_name or settings.SENTENCE_TRANSFORMER_MODEL
+        with self._lock:
+            self._models.pop(model_name, None)
+            self._stats.pop(model_name, None)
+
+    def metrics(self):
+        """回傳已載入模型的載入時間與記憶體用量"""
+        return {
+            name: dict(stats) for name, stats in list(self._stats.items())
+        }
+
+
+def _load_sentence_transformer(model_name):
     try:
         from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer(settings.SENTENCE_TRANSFORMER_MODEL)
-        return model
     except ImportError:
         raise ImportError(
             "請先安裝 sentence-transformers:\n"
             "pip install sentence-transformers"
         )
+    return SentenceTransformer(model_name)
+
+
+def _model_memory_bytes(model):
+    # 以模型參數與 buffer 的大小估算記憶體用量（torch 模型）
+    total = 0
+    for attr in ('parameters', 'buffers'):
+        tensors = getattr(model, attr, None)
+        if tensors is None:
+            continue
+        try:
+            total += sum(t.numel() * t.element_size() for t in tensors())
+        except Exception:
+            return None
+    return total or None
+
+
+def _model_dimension(model):
+    get_dimension = getattr(
+        model, 'get_sentence_embedding_dimension', None
+    )
+    if get_dimension is None:
+        return None
+    try:
+        return get_dimension()
+    except Exception:
+        return None
+
+
+sentence_transformer_registry = SentenceTransformerRegistry()
+
+
+def get_sentence_transformer_model(model_name=None):
+    """
+    取得 Sentence Transformer 模型（同一行程內只載入一次）
+    
+    參數：
+        model_name: 模型名稱（預設從 settings 讀取）
+    
+    使用方式：
+        from polls.api_utils import calculate_sentence_similarity
+        
+        similarity = calculate_sentence_similarity(
+            "用戶可以登入系統",
+            "使用者能夠登入平台"
+        )
+    """
+    return sentence_transformer_registry.get(model_name)
 
 
 def calculate_sentence_similarity(sentence1, sentence2):
@@ -178,13 +1174,18 @@ def calculate_sentence_similarity(sentence1, sentence2):
         )
         print(f"相似度: {similarity:.2f}")
     """
-    from sklearn.metrics.pairwise import cosine_similarity
-    
-    model = get_sentence_transformer_model()
-    embeddings = model.encode([sentence1, sentence2])
-    similarity = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
-    
-    return float(similarity)
+    import numpy as np
+    from polls.embeddings import encode_sentences
+
+    # 經由向量快取編碼，重複出現的句子不會再送進模型
+    first, second = (
+        np.asarray(v, dtype=np.float32)
+        for v in encode_sentences([sentence1, sentence2])
+    )
+    norms = float(np.linalg.norm(first) * np.linalg.norm(second))
+    if not norms:
+        return 0.0
+    return float(first @ second / norms)
 
 
 def check_api_keys():
@@ -1,6 +1,57 @@
+import logging
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class PollsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        # SentenceDatabase / Ticket 變更寫入向量索引 outbox
+        from . import signals  # noqa: F401
+
+        # 啟動伺服器時在背景預熱語意模型，不阻塞啟動也不影響 migrate / test 等指令
+        if settings.SENTENCE_TRANSFORMER_WARMUP and _is_server_process():
+            threading.Thread(
+                target=_warmup_sentence_transformer,
+                name='sentence-transformer-warmup',
+                daemon=True,
+            ).start()
+
+
+# 會長時間服務請求、值得預熱模型的 WSGI / ASGI 伺服器
+SERVER_PROGRAMS = ('gunicorn', 'uvicorn', 'daphne', 'hypercorn')
+
+
+def _program_name(path):
+    # python -m uvicorn 的 argv[0] 是 .../uvicorn/__main__.py
+    name = os.path.basename(path)
+    if name == '__main__.py':
+        name = os.path.basename(os.path.dirname(path))
+    return os.path.splitext(name)[0]
+
+
+def _is_server_process():
+    """只有 runserver 或已知的 WSGI / ASGI 伺服器才預熱；測試、celery 與一次性指令不預熱"""
+    argv = sys.argv or ['']
+    if 'runserver' in argv[1:]:
+        # runserver 的自動重新載入會啟動兩個行程，只在實際服務的行程預熱
+        return (os.environ.get('RUN_MAIN') == 'true'
+                or '--noreload' in argv)
+    return _program_name(argv[0]) in SERVER_PROGRAMS
+
+
+def _warmup_sentence_transformer():
+    from .api_utils import sentence_transformer_registry
+    try:
+        metrics = sentence_transformer_registry.warmup()
+        logger.info('Sentence Transformer 預熱完成：%s', metrics)
+    except Exception as e:
+        logger.warning('Sentence Transformer 預熱失敗：%s', e)
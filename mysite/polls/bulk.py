@@ -0,0 +1,443 @@
+"""
+CRUD 資源的批次新增 / 修改 / 刪除
+先驗證所有資料（欄位型別、model.clean()、唯一性與外鍵以批次查詢檢查），
+再於單一交易內以 bulk_create / bulk_update / 分批刪除寫入；
+單筆 API 每筆各自 save() 與觸發訊號，批次 API 的查詢數只隨分段數增加
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .minhash import band_buckets, pack_signature, signature, unpack_signature
+from .models import (
+    CategoryMemory, ChatSession, FieldPriorityConfiguration,
+    GPTPromptConfiguration, Order, SentenceDatabase, SentenceLSHBucket,
+    SyncPathConfiguration, UploadedFile, User, VectorIndexOutbox,
+    WeightConfiguration,
+)
+from .signals import batched_index_changes
+from .vector_index import record_index_changes
+
+# __in 查詢每次最多帶入的值（SQLite 參數數量有上限）
+LOOKUP_CHUNK = 500
+
+
+class BulkError(ValueError):
+    """請求格式錯誤（回傳 400）"""
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _message(error):
+    if isinstance(error, ValidationError):
+        return '; '.join(error.messages)
+    return str(error)
+
+
+def _hash_passwords(instances, fields):
+    """
+    密碼雜湊刻意很慢（PBKDF2）；hashlib 計算時會釋放 GIL，
+    以執行緒池平行處理
+    """
+    if fields is not None and 'password' not in fields:
+        return fields
+    pending = [
+        user for user in instances
+        if user.password and not user.password.startswith('pbkdf2_')
+    ]
+    if pending:
+        workers = min(len(pending), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            hashed = executor.map(make_password, [u.password for u in pending])
+            for user, password in zip(pending, hashed):
+                user.password = password
+    return fields
+
+
+def _sentence_signatures(instances, fields):
+    # bulk_create / bulk_update 不會呼叫 save()，簽章在此計算
+    if fields is not None and 'sentence' not in fields:
+        return fields
+    for item in instances:
+        item.minhash = pack_signature(signature(item.sentence))
+    return fields if fields is None else fields + ['minhash']
+
+
+def _sentence_written(instances, fields):
+    # bulk 操作不觸發訊號：自行寫入 LSH buckets 與向量索引變更紀錄
+    ids = [item.pk for item in instances]
+    if fields is None or 'sentence' in fields:
+        if fields is not None:
+            for chunk in _chunks(ids):
+                SentenceLSHBucket.objects.filter(sentence_id__in=chunk).delete()
+        buckets = []
+        for item in instances:
+            values = unpack_signature(item.minhash)
+            if values is not None:
+                buckets.extend(
+                    SentenceLSHBucket(sentence_id=item.pk, bucket=key)
+                    for key in band_buckets(values)
+                )
+        SentenceLSHBucket.objects.bulk_create(
+            buckets, batch_size=settings.BULK_BATCH_SIZE
+        )
+    record_index_changes('kb', ids, VectorIndexOutbox.ACTION_UPSERT)
+
+
+class BulkResource:
+    """
+    可批次寫入的資源
+
+    參數：
+        model: Django model
+        fields: {可寫入欄位（attname）: 新增時的預設值}
+        required: 去除空白後不可為空的欄位（對應單筆 API 的檢查）
+        strip: 寫入前去除前後空白的欄位
+        prepare: 寫入前呼叫 prepare(instances, fields)，回傳實際寫入的欄位；
+            新增時 fields 為 None
+        written: 寫入後（同一交易內）呼叫 written(instances, fields)
+    """
+
+    def __init__(self, model, fields, required=(), strip=(), prepare=None,
+                 written=None):
+        self.model = model
+        self.fields = fields
+        self.required = required
+        self.strip = strip
+        self.prepare = prepare
+        self.written = written
+        self.pk = model._meta.pk.attname
+        self.model_fields = {
+            field.attname: field for field in model._meta.concrete_fields
+        }
+
+    def _assign(self, instance, values):
+        """轉換欄位型別並套用到 instance；錯誤時拋出 ValidationError"""
+        unknown = [name for name in values if name not in self.fields]
+        if unknown:
+            raise ValidationError(f"未知的欄位: {', '.join(unknown)}")
+        for name, value in values.items():
+            if name in self.strip and isinstance(value, str):
+                value = value.strip()
+            if name in self.required and not value:
+                raise ValidationError(f'{name} 必須為非空字串')
+            field = self.model_fields[name]
+            try:
+                value = field.to_python(value)
+                # 向量等陣列值不能以 in 比較，沒有 validators 時直接略過
+                if field.validators and value not in field.empty_values:
+                    field.run_validators(value)
+            except ValidationError as e:
+                raise ValidationError(f'{name}: {_message(e)}')
+            setattr(instance, name, value)
+        instance.clean()
+
+    def _unique_groups(self):
+        meta = self.model._meta
+        groups = [
+            (field.attname,) for field in meta.concrete_fields
+            if field.unique and not (field.primary_key and field.auto_created)
+        ]
+        for names in meta.unique_together:
+            groups.append(tuple(meta.get_field(name).attname for name in names))
+        return groups
+
+    def _check_unique(self, rows, errors):
+        """唯一鍵：批次內重複與資料庫既有資料各以一次（分段）查詢檢查"""
+        for group in self._unique_groups():
+            owners = {}
+            for index, instance in list(rows.items()):
+                key = tuple(getattr(instance, name) for name in group)
+                if key in owners:
+                    errors[index] = f"{', '.join(group)} 與第 {owners[key]} 筆重複"
+                    del rows[index]
+                else:
+                    owners[key] = index
+            lead = group[0]
+            for chunk in _chunks({key[0] for key in owners}):
+                existing = self.model.objects.filter(
+                    **{f'{lead}__in': chunk}
+                ).values_list(self.pk, *group)
+                for pk, *key in existing:
+                    index = owners.get(tuple(key))
+                    if index in rows and rows[index].pk != pk:
+                        errors[index] = f"{', '.join(group)} 已存在"
+                        del rows[index]
+
+    def _check_foreign_keys(self, rows, errors, fields):
+        for name in fields:
+            field = self.model_fields[name]
+            if not field.is_relation:
+                continue
+            wanted = {
+                getattr(instance, name) for instance in rows.values()
+            } - {None}
+            found = set()
+            target = field.related_model
+            for chunk in _chunks(wanted):
+                found.update(
+                    target.objects.filter(pk__in=chunk)
+                    .values_list('pk', flat=True)
+                )
+            for index, instance in list(rows.items()):
+                value = getattr(instance, name)
+                if value is not None and value not in found:
+                    errors[index] = f'{target.__name__} not found: {value}'
+                    del rows[index]
+
+    def create(self, items, partial=False):
+        """
+        批次新增
+
+        回傳：
+            tuple: (新增的 instance 列表, {索引: 錯誤訊息})；
+            partial=False 且有錯誤時不寫入任何資料
+        """
+        rows, errors = {}, {}
+        for index, values in enumerate(items):
+            if not isinstance(values, dict):
+                errors[index] = '每筆資料必須是 JSON 物件'
+                continue
+            instance = self.model()
+            try:
+                self._assign(instance, {**self.fields, **values})
+            except (ValidationError, TypeError, ValueError) as e:
+                errors[index] = _message(e)
+                continue
+            rows[index] = instance
+        self._check_unique(rows, errors)
+        self._check_foreign_keys(rows, errors, self.fields)
+        if errors and not partial:
+            return [], errors
+
+        instances = [rows[index] for index in sorted(rows)]
+        with transaction.atomic():
+            if self.prepare:
+                self.prepare(instances, None)
+            instances = self.model.objects.bulk_create(
+                instances, batch_size=settings.BULK_BATCH_SIZE
+            )
+            if self.written:
+                self.written(instances, None)
+        return instances, errors
+
+    def update(self, items, partial=False):
+        """
+        批次修改：每筆以主鍵指定資料，只修改提供的欄位
+
+        回傳：
+            tuple: (修改的 instance 列表, {索引: 錯誤訊息})
+        """
+        keys, seen, errors = {}, set(), {}
+        for index, values in enumerate(items):
+            if not isinstance(values, dict) or values.get(self.pk) is None:
+                errors[index] = f'每筆資料必須是包含 {self.pk} 的 JSON 物件'
+            elif values[self.pk] in seen:
+                errors[index] = f'{self.pk} 重複: {values[self.pk]}'
+            else:
+                keys[index] = values[self.pk]
+                seen.add(values[self.pk])
+
+        existing = {}
+        for chunk in _chunks(seen):
+            existing.update(self.model.objects.in_bulk(chunk))
+
+        rows, changed = {}, set()
+        for index, key in keys.items():
+            instance = existing.get(key)
+            if instance is None:
+                errors[index] = f'Not found: {key}'
+                continue
+            values = {
+                name: value for name, value in items[index].items()
+                if name != self.pk
+            }
+            try:
+                self._assign(instance, values)
+            except (ValidationError, TypeError, ValueError) as e:
+                errors[index] = _message(e)
+                continue
+            changed.update(values)
+            rows[index] = instance
+        self._check_unique(rows, errors)
+        self._check_foreign_keys(rows, errors, changed)
+        if errors and not partial:
+            return [], errors
+
+        instances = [rows[index] for index in sorted(rows)]
+        # bulk_update 不會更新 auto_now 欄位
+        now = timezone.now()
+        fields = sorted(changed)
+        for field in self.model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):
+                fields.append(field.attname)
+                for instance in instances:
+                    setattr(instance, field.attname, now)
+        if not instances or not changed:
+            return instances, errors
+        with transaction.atomic():
+            if self.prepare:
+                fields = self.prepare(instances, fields)
+            self.model.objects.bulk_update(
+                instances, fields, batch_size=settings.BULK_BATCH_SIZE
+            )
+            if self.written:
+                self.written(instances, fields)
+        return instances, errors
+
+    def delete(self, ids):
+        """
+        分批刪除（連同 CASCADE 關聯資料）
+
+        回傳：
+            tuple: (已刪除的主鍵列表, 不存在的主鍵列表)
+        """
+        ids = list(dict.fromkeys(ids))
+        deleted = []
+        with transaction.atomic(), batched_index_changes():
+            for chunk in _chunks(ids, settings.BULK_BATCH_SIZE):
+                queryset = self.model.objects.filter(pk__in=chunk)
+                deleted.extend(queryset.values_list('pk', flat=True))
+                queryset.delete()
+        found = set(deleted)
+        return deleted, [pk for pk in ids if pk not in found]
+
+
+RESOURCES = {
+    'user': BulkResource(
+        User, {'username': '', 'email': '', 'password': ''},
+        prepare=_hash_passwords,
+    ),
+    'order': BulkResource(
+        Order,
+        {'user_id': None, 'product_name': '', 'amount': 0, 'status': 'pending'},
+    ),
+    'weight-config': BulkResource(
+        WeightConfiguration,
+        {
+            'name': '', 'score_a': 0.25, 'score_b': 0.25,
+            'score_c': 0.25, 'score_d': 0.25,
+        },
+    ),
+    'field-priority': BulkResource(
+        FieldPriorityConfiguration, {'name': '', 'field_order': []},
+    ),
+    'sentence-db': BulkResource(
+        SentenceDatabase,
+        {'user': '', 'sentence': '', 'category': '', 'embedding': None},
+        prepare=_sentence_signatures, written=_sentence_written,
+    ),
+    'gpt-prompt': BulkResource(
+        GPTPromptConfiguration,
+        {'task_type': 'custom', 'prompt': '', 'model': 'gpt-3.5-turbo'},
+    ),
+    'sync-path': BulkResource(
+        SyncPathConfiguration, {'name': '', 'path': ''},
+        required=('name',), strip=('name', 'path'),
+    ),
+    'chat-session': BulkResource(
+        ChatSession, {'session_id': '', 'title': '', 'messages': []},
+        required=('session_id',), strip=('session_id', 'title'),
+    ),
+    'category-memory': BulkResource(
+        CategoryMemory, {'configuration_item': '', 'category': ''},
+        required=('configuration_item', 'category'),
+        strip=('configuration_item', 'category'),
+    ),
+    'uploaded-file': BulkResource(
+        UploadedFile,
+        {
+            'filename': '', 'stored_filename': '', 'file_size': 0,
+            'file_path': 'uploads/',
+        },
+    ),
+}
+
+
+def _error_list(errors, items=None, pk=None):
+    result = []
+    for index in sorted(errors):
+        entry = {'index': index, 'error': errors[index]}
+        if pk and isinstance(items[index], dict) and pk in items[index]:
+            entry[pk] = items[index][pk]
+        result.append(entry)
+    return result
+
+
+def _parse_list(payload, key):
+    if not isinstance(payload, dict):
+        raise BulkError('請求內容必須是 JSON 物件')
+    values = payload.get(key)
+    if not isinstance(values, list) or not values:
+        raise BulkError(f'{key} 必須為非空陣列')
+    if len(values) > settings.BULK_MAX_ITEMS:
+        raise BulkError(f'{key} 一次最多 {settings.BULK_MAX_ITEMS} 筆')
+    return values
+
+
+def run_bulk(name, method, payload):
+    """
+    依 HTTP 方法執行批次操作
+
+        POST   {"items": [{...}, ...], "partial": false}：新增
+        PUT    {"items": [{"id": 1, ...}, ...], "partial": false}：修改
+        DELETE {"ids": [1, 2, ...]}：刪除
+
+    partial=false（預設）時任何一筆驗證失敗就不寫入任何資料；
+    partial=true 時寫入通過驗證的資料並回報失敗的筆數
+
+    回傳：
+        tuple: (回應內容, HTTP 狀態碼)；請求格式錯誤時拋出 BulkError
+    """
+    resource = RESOURCES[name]
+    started = time.perf_counter()
+    if method == 'DELETE':
+        ids = _parse_list(payload, 'ids')
+        if not all(isinstance(pk, (int, str)) for pk in ids):
+            raise BulkError('ids 必須為主鍵陣列')
+        deleted, missing = resource.delete(ids)
+        body = {'result': 'deleted', 'deleted': len(deleted), 'not_found': missing}
+        status = 200
+    else:
+        items = _parse_list(payload, 'items')
+        partial = bool(payload.get('partial', False))
+        if method == 'POST':
+            instances, errors = resource.create(items, partial)
+            body = {
+                'result': 'created',
+                'created': len(instances),
+                'ids': [instance.pk for instance in instances],
+            }
+            status = 201
+            error_list = _error_list(errors)
+        else:
+            instances, errors = resource.update(items, partial)
+            body = {
+                'result': 'updated',
+                'updated': len(instances),
+                'ids': [instance.pk for instance in instances],
+            }
+            status = 200
+            error_list = _error_list(errors, items, resource.pk)
+        if errors and not partial:
+            return {
+                'error': f'{len(errors)} 筆資料驗證失敗，未寫入任何資料',
+                'errors': error_list,
+            }, 400
+        body['errors'] = error_list
+
+    elapsed = time.perf_counter() - started
+    processed = body.get('created', body.get('updated', body.get('deleted')))
+    body['elapsed_ms'] = round(elapsed * 1000, 3)
+    body['rows_per_second'] = round(processed / elapsed, 1) if elapsed else None
+    return body, status
@@ -0,0 +1,341 @@
+"""
+快取工具
+提供可替換的快取後端（記憶體 LRU、SQLite 持久化、兩層組合）
+以及 LLM 回應快取
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class MemoryLRUCache:
+    """
+    行程內 LRU 快取，具容量上限與 TTL
+
+    參數：
+        max_entries: 最多保存的項目數，超過時淘汰最久未使用的項目
+        ttl: 預設存活秒數（None 表示永不過期）
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    以 SQLite 檔案保存的持久化快取，重新啟動後仍然有效
+
+    參數：
+        path: SQLite 檔案路徑（目錄不存在時自動建立）
+        ttl: 預設存活秒數（None 表示永不過期）
+        table: 資料表名稱
+    """
+
+    def __init__(self, path, ttl=None, table='cache_entries'):
+        self.path = str(path)
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, timeout=30
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL)'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                conn.execute(
+                    f'DELETE FROM {self.table} WHERE key = ?', (key,)
+                )
+                conn.commit()
+                return None
+            return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} '
+                '(key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f'DELETE FROM {self.table}')
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TieredCache:
+    """
+    兩層快取：先查記憶體，再查持久層；持久層命中時回填記憶體
+    """
+
+    def __init__(self, *tiers):
+        self.tiers = list(tiers)
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for upper in self.tiers[:i]:
+                    upper.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value, ttl=None):
+        for tier in self.tiers:
+            tier.set(key, value, ttl=ttl)
+
+    def delete(self, key):
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+
+class LLMResponseCache:
+    """
+    LLM 回應快取（內容定址）
+
+    以 (provider, model, system prompt, user input, temperature, max_tokens)
+    的雜湊值為鍵，並記錄命中／未命中次數。
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def make_key(provider, model, prompt, user_input,
+                 temperature=None, max_tokens=None):
+        raw = json.dumps(
+            [provider, model, prompt, user_input, temperature, max_tokens],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+        with self._lock:
+            self.stores += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def build_cache_backend(name, max_entries, ttl, sqlite_path, table):
+    """
+    依名稱建立快取後端
+
+    name 可為 'memory'、'sqlite'、'tiered'，
+    或一個可呼叫物件的 dotted path（以關鍵字參數接收上述設定）
+    """
+    if name == 'memory':
+        return MemoryLRUCache(max_entries=max_entries, ttl=ttl)
+    if name == 'sqlite':
+        return SQLiteCache(sqlite_path, ttl=ttl, table=table)
+    if name == 'tiered':
+        return TieredCache(
+            MemoryLRUCache(max_entries=max_entries, ttl=ttl),
+            SQLiteCache(sqlite_path, ttl=ttl, table=table),
+        )
+    from django.utils.module_loading import import_string
+    factory = import_string(name)
+    return factory(
+        max_entries=max_entries, ttl=ttl,
+        sqlite_path=sqlite_path, table=table
+    )
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """取得行程共用的 LLM 回應快取（延遲建立）"""
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(build_cache_backend(
+                    settings.LLM_CACHE_BACKEND,
+                    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                    ttl=settings.LLM_CACHE_TTL,
+                    sqlite_path=settings.LLM_CACHE_SQLITE_PATH,
+                    table='llm_responses',
+                ))
+    return _llm_cache
+
+
+def should_cache_llm_call(temperature):
+    """
+    判斷此次 LLM 呼叫是否使用快取
+
+    全域開啟 LLM_CACHE_ENABLED 時一律快取；
+    否則只快取 temperature 為 0 的確定性呼叫
+    """
+    return settings.LLM_CACHE_ENABLED or temperature == 0
+
+
+def cached_llm_call(provider, model, prompt, user_input, temperature,
+                    max_tokens, bypass_cache, compute):
+    """
+    以快取包裝一次 LLM 呼叫
+
+    bypass_cache=True 時略過讀取快取，但仍以新結果更新快取
+    """
+    if not should_cache_llm_call(temperature):
+        return compute()
+
+    cache = get_llm_cache()
+    key = LLMResponseCache.make_key(
+        provider, model, prompt, user_input, temperature, max_tokens
+    )
+    if not bypass_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    result = compute()
+    cache.set(key, result)
+    return result
+
+
+async def acached_llm_call(provider, model, prompt, user_input, temperature,
+                           max_tokens, bypass_cache, compute):
+    """
+    cached_llm_call 的非同步版本（compute 為回傳 awaitable 的函數）
+
+    記憶體快取直接在事件迴圈中讀寫；SQLite 等持久層會取鎖、commit，
+    可能等待 busy timeout，改在執行緒中進行以免阻塞事件迴圈
+    """
+    if not should_cache_llm_call(temperature):
+        return await compute()
+
+    cache = get_llm_cache()
+    key = LLMResponseCache.make_key(
+        provider, model, prompt, user_input, temperature, max_tokens
+    )
+    offload = not isinstance(cache.backend, MemoryLRUCache)
+
+    async def run(method, *args):
+        if offload:
+            from asgiref.sync import sync_to_async
+
+            return await sync_to_async(method, thread_sensitive=False)(*args)
+        return method(*args)
+
+    if not bypass_cache:
+        cached = await run(cache.get, key)
+        if cached is not None:
+            return cached
+
+    result = await compute()
+    await run(cache.set, key, result)
+    return result
@@ -0,0 +1,335 @@
+"""
+語意向量批次編碼
+提供去重複的批次編碼、以 (模型, 正規化文字) 為鍵的向量快取、
+合併同時請求的 micro-batching 佇列，以及將向量批次寫回 SentenceDatabase 的工具
+"""
+import base64
+import hashlib
+import queue
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import api_utils
+from .caching import build_cache_backend
+from .vectors import as_vector, pack_vector, unpack_vector
+
+
+def normalize_text(text):
+    """快取用的正規化：NFKC（全形轉半形等）並合併空白；不改變大小寫"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+class EmbeddingCache:
+    """
+    語意向量快取
+
+    以 (模型名稱, 正規化文字) 的雜湊值為鍵，值為 float32 二進位向量的 base64，
+    可使用 caching.py 的任一後端（記憶體 LRU、SQLite、兩層組合）。
+    預設模型（settings.SENTENCE_TRANSFORMER_MODEL）改變時清空快取。
+    """
+
+    MODEL_MARKER = '__model__'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.model_name = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(model_name, text):
+        raw = f'{model_name}\0{normalize_text(text)}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def check_model(self):
+        """預設模型與快取記錄的不同時清空（含持久層中舊模型的向量）"""
+        model_name = settings.SENTENCE_TRANSFORMER_MODEL
+        if model_name == self.model_name:
+            return
+        with self._lock:
+            if model_name == self.model_name:
+                return
+            stored = self.backend.get(self.MODEL_MARKER)
+            if stored is not None and stored != model_name:
+                self.backend.clear()
+                self.invalidations += 1
+            if stored != model_name:
+                self.backend.set(self.MODEL_MARKER, model_name)
+            self.model_name = model_name
+
+    def get_many(self, keys):
+        """回傳 {鍵: 向量}，只包含命中的鍵"""
+        self.check_model()
+        found = {}
+        for key in keys:
+            value = self.backend.get(key)
+            if value is not None:
+                found[key] = unpack_vector(base64.b64decode(value))
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, vectors):
+        stored = 0
+        for key, vector in vectors.items():
+            if vector is None:
+                continue
+            value = base64.b64encode(pack_vector(vector, 'float32'))
+            self.backend.set(key, value.decode('ascii'))
+            stored += 1
+        with self._lock:
+            self.stores += stored
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.model_name = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': settings.EMBEDDING_CACHE_ENABLED,
+                'backend': type(self.backend).__name__,
+                'model': self.model_name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """取得行程共用的向量快取（延遲建立）"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(build_cache_backend(
+                    settings.EMBEDDING_CACHE_BACKEND,
+                    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                    ttl=None,
+                    sqlite_path=settings.EMBEDDING_CACHE_SQLITE_PATH,
+                    table='embeddings',
+                ))
+    return _embedding_cache
+
+
+def encode_sentences(sentences, model_name=None, batch_size=None):
+    """
+    批次編碼多個句子
+
+    正規化後相同的句子只編碼一次；已快取的向量直接取用，
+    其餘依 batch_size 分批交給模型後寫入快取。
+
+    參數：
+        sentences: 句子列表
+        model_name: 模型名稱（預設從 settings 讀取）
+        batch_size: 每批送進模型的句子數（預設 settings.EMBEDDING_BATCH_SIZE）
+
+    回傳：
+        list: 與輸入順序對應的向量（一維 ndarray；API 輸出時再以 vector_to_list 轉換）
+    """
+    sentences = list(sentences)
+    if not sentences:
+        return []
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    model_name = model_name or settings.SENTENCE_TRANSFORMER_MODEL
+
+    # 保留第一次出現的順序去除重複
+    keys = [EmbeddingCache.make_key(model_name, s) for s in sentences]
+    unique = dict(zip(reversed(keys), reversed(sentences)))
+
+    cache = get_embedding_cache() if settings.EMBEDDING_CACHE_ENABLED else None
+    vectors = cache.get_many(list(unique)) if cache is not None else {}
+    missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+    if missing:
+        model = api_utils.get_sentence_transformer_model(model_name)
+        encoded_vectors = {}
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            encoded = model.encode(
+                [unique[key] for key in batch], batch_size=batch_size
+            )
+            for key, vector in zip(batch, encoded):
+                encoded_vectors[key] = as_vector(vector)
+        if cache is not None:
+            cache.set_many(encoded_vectors)
+        vectors.update(encoded_vectors)
+
+    return [vectors[key] for key in keys]
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching 編碼佇列
+
+    多個執行緒同時呼叫 encode() 時，在 max_wait 秒內抵達的請求
+    會合併為同一批交給模型，減少逐筆呼叫模型的開銷。
+
+    參數：
+        encode_fn: 實際編碼函數 encode_fn(sentences) -> vectors，預設為 encode_sentences
+        batch_size: 單批最多合併的句子數
+        max_wait: 等待更多請求加入同一批的秒數
+    """
+
+    def __init__(self, encode_fn=None, batch_size=64, max_wait=0.005):
+        self._encode_fn = encode_fn or encode_sentences
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    def encode(self, sentences, timeout=None):
+        """編碼句子；會等待所屬批次完成後回傳向量列表"""
+        sentences = list(sentences)
+        if not sentences:
+            return []
+        future = Future()
+        self._queue.put((sentences, future))
+        self._ensure_worker()
+        return future.result(timeout=timeout)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='embedding-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        count = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            sentences = [s for batch, _ in pending for s in batch]
+            self.batches += 1
+            self.requests += len(pending)
+            try:
+                vectors = self._encode_fn(sentences)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for batch, future in pending:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'queued': self._queue.qsize(),
+            'batch_size': self.batch_size,
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+        }
+
+
+_embedding_batcher = None
+_embedding_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher():
+    """取得行程共用的 micro-batching 編碼佇列"""
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        with _embedding_batcher_lock:
+            if _embedding_batcher is None:
+                _embedding_batcher = EmbeddingBatcher(
+                    batch_size=settings.EMBEDDING_BATCH_SIZE,
+                    max_wait=settings.EMBEDDING_MAX_WAIT_MS / 1000,
+                )
+    return _embedding_batcher
+
+
+def backfill_sentence_embeddings(queryset=None, only_missing=True,
+                                 batch_size=None, progress=None):
+    """
+    為 SentenceDatabase 批次計算並寫回語意向量
+
+    以主鍵順序分段讀取（只載入 id 與 sentence），每段批次編碼後
+    以 bulk_update 一次寫回，避免逐筆 save() 的開銷。
+
+    參數：
+        queryset: 要處理的資料（預設為全部 SentenceDatabase）
+        only_missing: 只處理尚未有向量的資料
+        batch_size: 每段處理的筆數（預設 settings.EMBEDDING_BATCH_SIZE）
+        progress: 每段完成後呼叫 progress(已處理筆數)
+
+    回傳：
+        int: 更新的筆數
+    """
+    from .models import SentenceDatabase, VectorIndexOutbox
+    from .vector_index import record_index_changes
+
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    if queryset is None:
+        queryset = SentenceDatabase.objects.all()
+    if only_missing:
+        queryset = queryset.filter(embedding__isnull=True)
+
+    updated = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'sentence')[:batch_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        vectors = encode_sentences(
+            [item.sentence for item in chunk], batch_size=batch_size
+        )
+        now = timezone.now()
+        for item, vector in zip(chunk, vectors):
+            item.embedding = vector
+            item.updated_at = now
+        SentenceDatabase.objects.bulk_update(
+            chunk, ['embedding', 'updated_at'], batch_size=batch_size
+        )
+        # bulk_update 不會觸發 post_save，需自行寫入索引變更紀錄
+        record_index_changes(
+            'kb', [item.id for item in chunk], VectorIndexOutbox.ACTION_UPSERT
+        )
+        updated += len(chunk)
+        if progress:
+            progress(updated)
+    return updated
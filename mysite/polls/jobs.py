@@ -0,0 +1,253 @@
+"""
+背景生成工作
+LLM 流程（Formulation / Discovery / 完整結果）以 GenerationJob 存放在資料庫佇列，
+API 只負責寫入工作並立即回傳 job id；worker 執行緒從資料庫領取工作執行，
+不需要 Redis 等額外服務。多個行程（web 內建 worker 或
+python manage.py run_job_worker）可同時領取，以條件式 UPDATE 確保每個工作只執行一次
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .pipeline_runs import run_pipeline_job
+from .pipelines import PIPELINES
+
+logger = logging.getLogger(__name__)
+
+# 工作類型 -> 處理函數（接收 payload，回傳 (回應內容, HTTP 狀態碼)）
+JOB_HANDLERS = {**PIPELINES, 'pipeline': run_pipeline_job}
+
+
+def submit_job(kind, payload):
+    """
+    新增工作並喚醒 worker
+
+    回傳：
+        GenerationJob；kind 不存在時拋出 ValueError
+    """
+    from .models import GenerationJob
+
+    if kind not in JOB_HANDLERS:
+        raise ValueError(
+            f"未知的工作類型: {kind}（可用：{', '.join(JOB_HANDLERS)}）"
+        )
+    job = GenerationJob.objects.create(kind=kind, payload=payload)
+    transaction.on_commit(_notify_workers)
+    return job
+
+
+def retry_job(job):
+    """
+    失敗的工作重新排入佇列（保留原本的輸入）
+
+    回傳：
+        bool: 是否重新排隊（只有 failed 狀態的工作可以重試）
+    """
+    from .models import GenerationJob
+
+    updated = GenerationJob.objects.filter(
+        id=job.id, status=GenerationJob.STATUS_FAILED
+    ).update(
+        status=GenerationJob.STATUS_QUEUED, error='', result=None,
+        worker='', started_at=None, finished_at=None,
+    )
+    if updated:
+        transaction.on_commit(_notify_workers)
+    job.refresh_from_db()
+    return bool(updated)
+
+
+def claim_job(worker):
+    """
+    領取最早排隊的工作
+
+    以「status 仍為 queued 才更新」的條件式 UPDATE 搶工作，
+    多個 worker 同時領取時只有一個會成功；沒有工作時回傳 None
+    """
+    from .models import GenerationJob
+
+    while True:
+        job_id = (
+            GenerationJob.objects.filter(status=GenerationJob.STATUS_QUEUED)
+            .order_by('id').values_list('id', flat=True).first()
+        )
+        if job_id is None:
+            return None
+        claimed = GenerationJob.objects.filter(
+            id=job_id, status=GenerationJob.STATUS_QUEUED
+        ).update(
+            status=GenerationJob.STATUS_RUNNING, worker=worker,
+            started_at=timezone.now(),
+        )
+        if claimed:
+            return GenerationJob.objects.get(id=job_id)
+
+
+def execute_job(job):
+    """執行已領取的工作並寫回結果"""
+    from .models import GenerationJob
+
+    job.attempts += 1
+    try:
+        body, status = JOB_HANDLERS[job.kind](job.payload)
+    except Exception as e:
+        logger.exception('工作 #%s 執行失敗', job.id)
+        body, status = {'error': str(e)}, 500
+
+    job.result = body
+    job.status = (
+        GenerationJob.STATUS_SUCCEEDED if status < 400
+        else GenerationJob.STATUS_FAILED
+    )
+    job.error = '' if status < 400 else str(body.get('error', ''))
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'attempts', 'result', 'status', 'error', 'finished_at'
+    ])
+    return job
+
+
+def requeue_stale_jobs():
+    """
+    執行中超過 JOB_STALE_SECONDS 的工作視為 worker 已中止，重新排入佇列
+
+    回傳：
+        int: 重新排隊的工作數
+    """
+    from .models import GenerationJob
+
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    return GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING, started_at__lt=cutoff
+    ).update(status=GenerationJob.STATUS_QUEUED, worker='', started_at=None)
+
+
+def run_pending_jobs(worker=None, limit=None):
+    """
+    在目前執行緒依序執行排隊中的工作，直到佇列清空
+
+    回傳：
+        int: 執行的工作數
+    """
+    worker = worker or _worker_name('inline')
+    done = 0
+    while limit is None or done < limit:
+        job = claim_job(worker)
+        if job is None:
+            break
+        execute_job(job)
+        done += 1
+    return done
+
+
+def _worker_name(suffix):
+    return f'{socket.gethostname()}:{os.getpid()}:{suffix}'[:64]
+
+
+class JobWorkerPool:
+    """
+    worker 執行緒池
+
+    每個執行緒反覆領取並執行工作；佇列為空時等待喚醒
+    （同一行程新增工作時）或每 poll_interval 秒重新檢查資料庫
+    （其他行程新增的工作）
+    """
+
+    def __init__(self, workers, poll_interval):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stopped.clear()
+            self._threads = [
+                threading.Thread(
+                    target=self._run, args=(_worker_name(f'w{i}'),),
+                    name=f'job-worker-{i}', daemon=True
+                )
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self, worker):
+        while not self._stopped.is_set():
+            try:
+                requeue_stale_jobs()
+                job = claim_job(worker)
+                if job is not None:
+                    execute_job(job)
+                    continue
+            except Exception:
+                logger.exception('worker %s 領取工作失敗', worker)
+            finally:
+                # 長時間執行的執行緒需自行關閉逾時或失效的資料庫連線
+                close_old_connections()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+_job_worker_pool = None
+_job_worker_pool_lock = threading.Lock()
+
+
+def get_job_worker_pool():
+    """取得行程共用的 worker 執行緒池（settings.JOB_WORKERS 個執行緒）"""
+    global _job_worker_pool
+    if _job_worker_pool is None:
+        with _job_worker_pool_lock:
+            if _job_worker_pool is None:
+                _job_worker_pool = JobWorkerPool(
+                    settings.JOB_WORKERS, settings.JOB_POLL_INTERVAL
+                )
+    return _job_worker_pool
+
+
+def _notify_workers():
+    # JOB_WORKER_AUTOSTART=False 時由獨立的 run_job_worker 行程輪詢執行
+    if not settings.JOB_WORKER_AUTOSTART:
+        return
+    pool = get_job_worker_pool()
+    pool.start()
+    pool.notify()
+
+
+def job_to_dict(job, include_result=True):
+    data = {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'error': job.error or None,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+    if include_result:
+        data['result'] = job.result
+    return data
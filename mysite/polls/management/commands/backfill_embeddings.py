@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.embeddings import backfill_sentence_embeddings
+
+
+class Command(BaseCommand):
+    help = '批次計算 SentenceDatabase 的語意向量並寫回資料庫'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='每批處理筆數（預設為 settings.EMBEDDING_BATCH_SIZE）'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='重新計算所有句子（預設只處理尚未有向量的句子）'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        def progress(count):
+            self.stdout.write(f"已處理 {count} 筆")
+
+        try:
+            updated = backfill_sentence_embeddings(
+                only_missing=not options['all'],
+                batch_size=options['batch_size'],
+                progress=progress,
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"完成：更新 {updated} 筆，耗時 {elapsed:.2f}s"
+        ))
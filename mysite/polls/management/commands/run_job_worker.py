@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls.jobs import get_job_worker_pool, requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = '執行背景生成工作（GenerationJob 資料庫佇列）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='執行目前排隊中的工作後結束（可由排程定期執行）'
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'重新排隊 {requeued} 個中止的工作')
+
+        if options['once']:
+            done = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f'完成 {done} 個工作'))
+            return
+
+        pool = get_job_worker_pool()
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(
+            f'{pool.workers} 個 worker 執行中，Ctrl+C 結束'
+        ))
+        try:
+            while pool.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write('等待執行中的工作完成...')
+            pool.stop()
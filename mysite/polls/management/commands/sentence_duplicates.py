@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from polls.minhash import backfill_signatures, find_duplicate_clusters
+from polls.models import SentenceDatabase
+
+
+class Command(BaseCommand):
+    help = '以 MinHash / LSH 找出 SentenceDatabase 中的近似重複群組'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float, default=None,
+            help='估計 Jaccard 相似度門檻（預設 settings.MINHASH_THRESHOLD）'
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='重新計算所有簽章（修改 MINHASH_* 設定後使用）'
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='以 JSON 輸出群組'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            SentenceDatabase.objects.update(minhash=None)
+        updated = backfill_signatures()
+        if updated and not options['json']:
+            self.stdout.write(f'已補上 {updated} 筆簽章')
+
+        clusters = find_duplicate_clusters(options['threshold'])
+        if options['json']:
+            self.stdout.write(json.dumps(clusters))
+            return
+
+        sentences = dict(
+            SentenceDatabase.objects.filter(
+                id__in=[pk for cluster in clusters for pk in cluster]
+            ).values_list('id', 'sentence')
+        )
+        for number, cluster in enumerate(clusters, 1):
+            self.stdout.write(f'群組 {number}（{len(cluster)} 筆）')
+            for pk in cluster:
+                self.stdout.write(f'  [{pk}] {sentences.get(pk, "")[:80]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'共 {len(clusters)} 組近似重複'
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.vector_index import SOURCES, rebuild_vector_index, sync_vector_index
+
+
+class Command(BaseCommand):
+    help = '依變更紀錄增量同步向量索引（可由排程定期執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'indexes', nargs='*',
+            help='索引名稱（預設為全部：kb、ticket）'
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true', help='忽略變更紀錄，完整重建'
+        )
+
+    def handle(self, *args, **options):
+        names = options['indexes'] or list(SOURCES)
+        unknown = [name for name in names if name not in SOURCES]
+        if unknown:
+            raise CommandError(f"未知的索引: {', '.join(unknown)}")
+
+        for name in names:
+            try:
+                if options['rebuild']:
+                    vector_index = rebuild_vector_index(name)
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{name}: 重建完成，共 {vector_index.count} 筆"
+                    ))
+                    continue
+                result = sync_vector_index(name)
+            except ImportError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: {result['mode']}，更新 {result['upserted']} 筆、"
+                f"移除 {result['removed']} 筆，共 {result['record_count']} 筆"
+                f"（watermark {result['watermark']}）"
+            ))
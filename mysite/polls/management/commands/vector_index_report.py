@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.vector_index import INDEX_KINDS, SOURCES, evaluate_index_kinds
+
+
+class Command(BaseCommand):
+    help = '比較各向量索引類型的召回率與查詢延遲（recall@k vs latency）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index', default='kb', help='索引名稱（kb 或 ticket，預設 kb）'
+        )
+        parser.add_argument(
+            '--kinds', default=','.join(INDEX_KINDS),
+            help='要比較的索引類型，以逗號分隔'
+        )
+        parser.add_argument('-k', type=int, default=10, help='recall@k 的 k')
+        parser.add_argument(
+            '--queries', type=int, default=100, help='抽樣查詢筆數'
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='以 JSON 輸出'
+        )
+
+    def handle(self, *args, **options):
+        if options['index'] not in SOURCES:
+            raise CommandError(f"未知的索引: {options['index']}")
+        kinds = [kind.strip() for kind in options['kinds'].split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in INDEX_KINDS]
+        if unknown:
+            raise CommandError(f"未知的索引類型: {', '.join(unknown)}")
+
+        report = evaluate_index_kinds(
+            options['index'], kinds, k=options['k'],
+            num_queries=options['queries']
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        if not report:
+            self.stdout.write('索引沒有資料可供比較')
+            return
+
+        self.stdout.write(
+            f"{'kind':<9}{'param':<16}{'recall@' + str(options['k']):>10}"
+            f"{'mean ms':>10}{'p95 ms':>10}{'build s':>10}"
+        )
+        for row in report:
+            if 'error' in row:
+                self.stdout.write(f"{row['kind']:<9}{row['error']}")
+                continue
+            param = f"{row['param']}={row['value']}" if row['param'] else '-'
+            self.stdout.write(
+                f"{row['kind']:<9}{param:<16}{row['recall']:>10.4f}"
+                f"{row['latency_ms_mean']:>10.3f}{row['latency_ms_p95']:>10.3f}"
+                f"{row['build_seconds']:>10.3f}"
+            )
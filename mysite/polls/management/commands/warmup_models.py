@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.api_utils import sentence_transformer_registry
+
+
+class Command(BaseCommand):
+    help = '預先載入 Sentence Transformer 模型並回報載入時間與記憶體用量'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help='模型名稱（預設為 settings.SENTENCE_TRANSFORMER_MODEL）'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            metrics = sentence_transformer_registry.warmup(
+                options['models'] or None
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        for name, stats in metrics.items():
+            memory = stats.get('memory_bytes')
+            memory_text = (
+                f"{memory / 1024 / 1024:.1f} MiB" if memory else '未知'
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: 載入 {stats['load_seconds']:.2f}s，"
+                f"預熱 {stats['warmup_seconds']:.2f}s，記憶體 {memory_text}"
+            ))
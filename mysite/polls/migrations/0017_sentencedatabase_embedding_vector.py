@@ -0,0 +1,18 @@
+from django.db import migrations
+
+import polls.vectors
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0016_user_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentencedatabase',
+            name='embedding_vector',
+            field=polls.vectors.VectorField(blank=True, help_text='語意向量（二進位 float32/float16）', null=True),
+        ),
+    ]
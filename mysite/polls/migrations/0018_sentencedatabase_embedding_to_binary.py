@@ -0,0 +1,40 @@
+from django.db import migrations
+
+import polls.vectors
+
+
+def json_to_binary(apps, schema_editor):
+    SentenceDatabase = apps.get_model('polls', 'SentenceDatabase')
+    batch = []
+    for item in SentenceDatabase.objects.only('id', 'embedding').iterator():
+        item.embedding_vector = polls.vectors.pack_vector(item.embedding or None)
+        batch.append(item)
+        if len(batch) >= 1000:
+            SentenceDatabase.objects.bulk_update(batch, ['embedding_vector'])
+            batch = []
+    if batch:
+        SentenceDatabase.objects.bulk_update(batch, ['embedding_vector'])
+
+
+def binary_to_json(apps, schema_editor):
+    SentenceDatabase = apps.get_model('polls', 'SentenceDatabase')
+    batch = []
+    for item in SentenceDatabase.objects.only('id', 'embedding_vector').iterator():
+        item.embedding = polls.vectors.vector_to_list(item.embedding_vector)
+        batch.append(item)
+        if len(batch) >= 1000:
+            SentenceDatabase.objects.bulk_update(batch, ['embedding'])
+            batch = []
+    if batch:
+        SentenceDatabase.objects.bulk_update(batch, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0017_sentencedatabase_embedding_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(json_to_binary, binary_to_json),
+    ]
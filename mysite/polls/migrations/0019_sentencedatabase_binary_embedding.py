@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0018_sentencedatabase_embedding_to_binary'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='sentencedatabase',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='sentencedatabase',
+            old_name='embedding_vector',
+            new_name='embedding',
+        ),
+    ]
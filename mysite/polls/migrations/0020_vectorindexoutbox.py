@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0019_sentencedatabase_binary_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VectorIndexOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index_name', models.CharField(help_text='索引名稱（kb / ticket）', max_length=32)),
+                ('object_id', models.BigIntegerField(help_text='資料主鍵')),
+                ('action', models.CharField(choices=[('upsert', '新增或更新'), ('delete', '刪除')], max_length=8)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': '向量索引變更紀錄',
+                'indexes': [models.Index(fields=['index_name', 'id'], name='polls_vecto_index_n_efe2b3_idx')],
+            },
+        ),
+    ]
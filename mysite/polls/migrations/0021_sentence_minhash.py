@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0020_vectorindexoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentencedatabase',
+            name='minhash',
+            field=models.BinaryField(help_text='MinHash 簽章（近似重複偵測）', null=True),
+        ),
+        migrations.CreateModel(
+            name='SentenceLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True, help_text='band 編號與簽章片段的雜湊')),
+                ('sentence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='polls.sentencedatabase')),
+            ],
+            options={
+                'verbose_name_plural': '語句 LSH 索引',
+            },
+        ),
+    ]
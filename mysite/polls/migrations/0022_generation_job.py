@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0021_sentence_minhash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('formulation', 'Formulation'), ('discovery', 'Discovery'), ('complete_result', '完整結果')], max_length=32)),
+                ('status', models.CharField(choices=[('queued', '排隊中'), ('running', '執行中'), ('succeeded', '成功'), ('failed', '失敗')], default='queued', max_length=16)),
+                ('payload', models.JSONField(default=dict, help_text='流程輸入')),
+                ('result', models.JSONField(blank=True, help_text='流程輸出', null=True)),
+                ('error', models.TextField(blank=True, help_text='失敗原因')),
+                ('attempts', models.IntegerField(default=0, help_text='已執行次數')),
+                ('worker', models.CharField(blank=True, help_text='執行中的 worker', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': '背景生成工作',
+                'indexes': [models.Index(fields=['status', 'id'], name='polls_gener_status_d8b0e7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:31
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0022_generation_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spec_text', models.TextField(help_text='原始規格文本')),
+                ('dbml', models.TextField(blank=True, help_text='目前的 DBML（Formulation 輸出或用戶修改）')),
+                ('gherkin', models.TextField(blank=True, help_text='目前的 Gherkin')),
+                ('stages', models.JSONField(default=dict, help_text='各階段 checkpoint：{階段: {status, input_hash, output, ...}}')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': '規格流程執行紀錄',
+            },
+        ),
+        migrations.AlterField(
+            model_name='generationjob',
+            name='kind',
+            field=models.CharField(choices=[('formulation', 'Formulation'), ('discovery', 'Discovery'), ('complete_result', '完整結果'), ('pipeline', '流程續跑')], max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='generationjob',
+            name='result',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='流程輸出', null=True),
+        ),
+    ]
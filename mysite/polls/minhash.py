@@ -0,0 +1,248 @@
+"""
+MinHash / LSH 近似重複偵測
+每筆 SentenceDatabase 保存 MinHash 簽章，並將簽章切成 bands 寫入
+SentenceLSHBucket；新增句子時只需查詢同 bucket 的資料即可找出近似重複，
+不必與整張表逐一比對。find_duplicate_clusters() 以單次掃描分群整張表
+"""
+import hashlib
+import re
+
+import numpy as np
+from django.conf import settings
+
+# Mersenne 質數 2^31 - 1：a * x 不會超出 uint64
+_PRIME = (1 << 31) - 1
+_permutations = {}
+
+# 同一 bucket 超過此筆數時只與代表句比對，避免熱門 bucket 退化為兩兩比對
+MAX_BUCKET_PAIRS = 50
+
+
+def shingles(text, size=None):
+    """正規化（小寫、合併空白）後的字元 n-gram 集合；中英文皆適用"""
+    size = size or settings.MINHASH_SHINGLE_SIZE
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _stable_hash(value):
+    """跨行程固定的 31-bit 雜湊（內建 hash() 每個行程的種子不同）"""
+    digest = hashlib.blake2b(value.encode(), digest_size=4).digest()
+    return int.from_bytes(digest, 'little') % _PRIME
+
+
+def _permutation_params(num_perm):
+    params = _permutations.get(num_perm)
+    if params is None:
+        rng = np.random.default_rng(1)
+        params = (
+            rng.integers(1, _PRIME, num_perm, dtype=np.uint64),
+            rng.integers(0, _PRIME, num_perm, dtype=np.uint64),
+        )
+        _permutations[num_perm] = params
+    return params
+
+
+def signature(text, num_perm=None):
+    """
+    MinHash 簽章
+
+    回傳：
+        ndarray: uint32[num_perm]；沒有內容的句子回傳 None
+    """
+    num_perm = num_perm or settings.MINHASH_NUM_PERM
+    tokens = shingles(text)
+    if not tokens:
+        return None
+    hashes = np.fromiter(
+        (_stable_hash(token) for token in tokens),
+        dtype=np.uint64, count=len(tokens)
+    )
+    a, b = _permutation_params(num_perm)
+    # (a * x + b) mod p，每個排列取最小值
+    values = (hashes[:, None] * a + b) % _PRIME
+    return values.min(axis=0).astype(np.uint32)
+
+
+def pack_signature(values):
+    return None if values is None else values.astype('<u4').tobytes()
+
+
+def unpack_signature(data):
+    if not data:
+        return None
+    return np.frombuffer(bytes(data), dtype='<u4')
+
+
+def estimate_similarity(sig_a, sig_b):
+    """兩個簽章相同位置的比例即為 Jaccard 相似度的估計值"""
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+def band_buckets(values, bands=None):
+    """
+    將簽章切成 bands 段，每段雜湊為一個 bucket 鍵
+
+    段落編號一併納入雜湊，所有 band 可存在同一個欄位並以 IN 查詢
+    """
+    bands = bands or settings.MINHASH_BANDS
+    rows = len(values) // bands
+    keys = []
+    for band in range(bands):
+        chunk = values[band * rows:(band + 1) * rows].astype('<u4').tobytes()
+        digest = hashlib.blake2b(
+            band.to_bytes(2, 'little') + chunk, digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def index_sentence(item):
+    """重新寫入單筆 SentenceDatabase 的 LSH buckets"""
+    from .models import SentenceLSHBucket
+
+    SentenceLSHBucket.objects.filter(sentence_id=item.pk).delete()
+    values = unpack_signature(item.minhash)
+    if values is None:
+        return
+    SentenceLSHBucket.objects.bulk_create([
+        SentenceLSHBucket(sentence_id=item.pk, bucket=key)
+        for key in band_buckets(values)
+    ])
+
+
+def find_near_duplicates(text, threshold=None, exclude_id=None, limit=20):
+    """
+    查詢與 text 近似重複的句子（只比對同 bucket 的候選）
+
+    回傳：
+        list: [{'id', 'sentence', 'similarity'}]，依估計相似度由高到低
+    """
+    from .models import SentenceDatabase
+
+    threshold = settings.MINHASH_THRESHOLD if threshold is None else threshold
+    values = signature(text)
+    if values is None:
+        return []
+    candidates = SentenceDatabase.objects.filter(
+        lsh_buckets__bucket__in=band_buckets(values)
+    ).distinct().only('id', 'sentence', 'minhash')
+    if exclude_id is not None:
+        candidates = candidates.exclude(id=exclude_id)
+
+    matches = []
+    for item in candidates:
+        other = unpack_signature(item.minhash)
+        if other is None or len(other) != len(values):
+            continue
+        similarity = estimate_similarity(values, other)
+        if similarity >= threshold:
+            matches.append({
+                'id': item.id,
+                'sentence': item.sentence,
+                'similarity': round(similarity, 4),
+            })
+    matches.sort(key=lambda match: (-match['similarity'], match['id']))
+    return matches[:limit]
+
+
+def backfill_signatures(batch_size=1000):
+    """替尚未有簽章的資料（bulk_create、遷移前的資料）補上簽章與 buckets"""
+    from .models import SentenceDatabase, SentenceLSHBucket
+
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(
+            SentenceDatabase.objects.filter(minhash__isnull=True, id__gt=last_id)
+            .only('id', 'sentence').order_by('id')[:batch_size]
+        )
+        if not batch:
+            return updated
+        last_id = batch[-1].id
+        buckets = []
+        for item in batch:
+            item.minhash = pack_signature(signature(item.sentence))
+            if item.minhash is not None:
+                buckets.extend(
+                    SentenceLSHBucket(sentence_id=item.id, bucket=key)
+                    for key in band_buckets(unpack_signature(item.minhash))
+                )
+        SentenceDatabase.objects.bulk_update(batch, ['minhash'])
+        SentenceLSHBucket.objects.filter(
+            sentence_id__in=[item.id for item in batch]
+        ).delete()
+        SentenceLSHBucket.objects.bulk_create(buckets, batch_size=batch_size)
+        updated += len(batch)
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def find_duplicate_clusters(threshold=None, bands=None):
+    """
+    找出整張表的近似重複群組
+
+    單次掃描所有簽章並在記憶體中分 bucket，只比對同 bucket 的資料，
+    再以 union-find 合併為群組；時間約與資料筆數成正比。
+
+    回傳：
+        list: [[主鍵, ...], ...]，每組至少兩筆，依最小主鍵排序
+    """
+    from .models import SentenceDatabase
+
+    threshold = settings.MINHASH_THRESHOLD if threshold is None else threshold
+    signatures = {}
+    buckets = {}
+    rows = (
+        SentenceDatabase.objects.filter(minhash__isnull=False)
+        .values_list('id', 'minhash').order_by('id').iterator(chunk_size=2000)
+    )
+    for pk, data in rows:
+        values = unpack_signature(data)
+        signatures[pk] = values
+        for key in band_buckets(values, bands):
+            buckets.setdefault(key, []).append(pk)
+
+    groups = _DisjointSet()
+    compared = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        if len(members) <= MAX_BUCKET_PAIRS:
+            pairs = (
+                (a, b) for i, a in enumerate(members) for b in members[i + 1:]
+            )
+        else:
+            pairs = ((members[0], b) for b in members[1:])
+        for a, b in pairs:
+            if (a, b) in compared or groups.find(a) == groups.find(b):
+                continue
+            compared.add((a, b))
+            if estimate_similarity(signatures[a], signatures[b]) >= threshold:
+                groups.union(a, b)
+
+    clusters = {}
+    for pk in groups.parent:
+        clusters.setdefault(groups.find(pk), []).append(pk)
+    return sorted(
+        (sorted(members) for members in clusters.values() if len(members) > 1),
+        key=lambda members: members[0]
+    )
@@ -1,7 +1,11 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.hashers import make_password
 
+from .minhash import pack_signature, signature
+from .vectors import VectorField, as_vector
+
 
 # User 核心實體
 class User(models.Model):
@@ -172,16 +176,28 @@ class SentenceDatabase(models.Model):
     user = models.CharField(max_length=64, help_text="用戶標識")
     sentence = models.TextField(help_text="語句內容")
     category = models.CharField(max_length=64, blank=True, help_text="分類")
-    embedding = models.JSONField(default=list, blank=True, help_text="語意向量")
+    embedding = VectorField(help_text="語意向量（二進位 float32/float16）")
+    minhash = models.BinaryField(
+        null=True, editable=False, help_text="MinHash 簽章（近似重複偵測）"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def clean(self):
-        if not isinstance(self.embedding, list):
-            raise ValidationError('embedding 必須是 JSON 陣列格式')
-        if not all(isinstance(x, (float, int)) for x in self.embedding):
+        try:
+            self.embedding = as_vector(self.embedding)
+        except (TypeError, ValueError):
             raise ValidationError('embedding 必須為數值陣列')
 
+    def save(self, *args, **kwargs):
+        # 句子變更時重新計算簽章；LSH buckets 由 post_save 訊號寫入
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'sentence' in update_fields:
+            self.minhash = pack_signature(signature(self.sentence))
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'minhash'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user}: {self.sentence[:20]}... ({self.category})"
 
@@ -331,3 +347,107 @@ class UploadedFile(models.Model):
 
     class Meta:
         verbose_name_plural = "上傳檔案記錄"
+
+
+# 向量索引變更紀錄（outbox）
+class VectorIndexOutbox(models.Model):
+    ACTION_UPSERT = 'upsert'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = [
+        (ACTION_UPSERT, '新增或更新'),
+        (ACTION_DELETE, '刪除'),
+    ]
+
+    index_name = models.CharField(
+        max_length=32, help_text="索引名稱（kb / ticket）"
+    )
+    object_id = models.BigIntegerField(help_text="資料主鍵")
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.index_name}:{self.object_id} {self.action}"
+
+    class Meta:
+        verbose_name_plural = "向量索引變更紀錄"
+        indexes = [models.Index(fields=['index_name', 'id'])]
+
+
+# SentenceDatabase 的 LSH bucket（MinHash 簽章每個 band 一筆）
+class SentenceLSHBucket(models.Model):
+    sentence = models.ForeignKey(
+        SentenceDatabase, on_delete=models.CASCADE,
+        related_name='lsh_buckets'
+    )
+    bucket = models.BigIntegerField(
+        db_index=True, help_text="band 編號與簽章片段的雜湊"
+    )
+
+    def __str__(self):
+        return f"{self.sentence_id}:{self.bucket}"
+
+    class Meta:
+        verbose_name_plural = "語句 LSH 索引"
+
+
+# 背景生成工作（資料庫佇列，由 polls.jobs 的 worker 執行）
+class GenerationJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, '排隊中'),
+        (STATUS_RUNNING, '執行中'),
+        (STATUS_SUCCEEDED, '成功'),
+        (STATUS_FAILED, '失敗'),
+    ]
+    KIND_CHOICES = [
+        ('formulation', 'Formulation'),
+        ('discovery', 'Discovery'),
+        ('complete_result', '完整結果'),
+        ('pipeline', '流程續跑'),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+    payload = models.JSONField(default=dict, help_text="流程輸入")
+    result = models.JSONField(
+        null=True, blank=True, encoder=DjangoJSONEncoder, help_text="流程輸出"
+    )
+    error = models.TextField(blank=True, help_text="失敗原因")
+    attempts = models.IntegerField(default=0, help_text="已執行次數")
+    worker = models.CharField(
+        max_length=64, blank=True, help_text="執行中的 worker"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job #{self.id} {self.kind} ({self.status})"
+
+    class Meta:
+        verbose_name_plural = "背景生成工作"
+        indexes = [models.Index(fields=['status', 'id'])]
+
+
+# Formulation → Discovery → 完整結果流程的執行紀錄（各階段輸出的 checkpoint）
+class PipelineRun(models.Model):
+    spec_text = models.TextField(help_text="原始規格文本")
+    dbml = models.TextField(blank=True, help_text="目前的 DBML（Formulation 輸出或用戶修改）")
+    gherkin = models.TextField(blank=True, help_text="目前的 Gherkin")
+    stages = models.JSONField(
+        default=dict,
+        help_text="各階段 checkpoint：{階段: {status, input_hash, output, ...}}"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"PipelineRun #{self.id}: {self.spec_text[:20]}"
+
+    class Meta:
+        verbose_name_plural = "規格流程執行紀錄"
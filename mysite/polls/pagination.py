@@ -0,0 +1,155 @@
+"""
+列表 API 的游標分頁與欄位投影
+
+    ?limit=50：每頁筆數（上限 settings.API_MAX_PAGE_SIZE）
+    ?cursor=...：上一頁回傳的 next_cursor
+    ?order=desc：依主鍵遞減（預設遞增）
+    ?fields=id,title：只回傳（也只從資料庫讀取）指定欄位
+    ?expand=user：額外輸出關聯資料（以 JOIN 在同一個查詢讀取，不會逐筆查詢）
+
+以主鍵做 keyset 分頁（WHERE pk > 游標 ORDER BY pk LIMIT n），
+不論資料表多大，每頁的查詢成本與回應大小都固定
+"""
+import base64
+import binascii
+import json
+from operator import attrgetter
+
+from django.conf import settings
+
+
+class PaginationError(ValueError):
+    """分頁或欄位參數錯誤（回傳 400）"""
+
+
+class ListField:
+    """
+    列表輸出欄位
+
+    參數：
+        columns: 輸出此欄位需要從資料庫讀取的欄位（傳給 .only()）
+        getter: 由 model instance 取得輸出值的函數（預設讀取同名屬性）
+        related: 需要 JOIN 讀取的外鍵（傳給 .select_related()）；
+            有設定的欄位才能用 expand= 展開
+    """
+
+    def __init__(self, *columns, getter=None, related=()):
+        self.columns = columns
+        self.getter = getter or attrgetter(columns[0])
+        self.related = related
+
+
+def columns(*names):
+    """對應同名資料庫欄位的輸出欄位"""
+    return {name: ListField(name) for name in names}
+
+
+def _parse_limit(value):
+    if value is None:
+        return settings.API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError('limit 必須為正整數')
+    if limit <= 0:
+        raise PaginationError('limit 必須為正整數')
+    return min(limit, settings.API_MAX_PAGE_SIZE)
+
+
+def _parse_fields(value, fields, default_fields):
+    if not value:
+        return list(default_fields or fields)
+    selected = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in fields]
+    if unknown:
+        raise PaginationError(
+            f"未知的欄位: {', '.join(unknown)}（可用：{', '.join(fields)}）"
+        )
+    return list(dict.fromkeys(selected))
+
+
+def _parse_expand(value, fields):
+    if not value:
+        return []
+    selected = [name.strip() for name in value.split(',') if name.strip()]
+    expandable = [name for name, field in fields.items() if field.related]
+    unknown = [name for name in selected if name not in expandable]
+    if unknown:
+        raise PaginationError(
+            f"無法展開: {', '.join(unknown)}（可用：{', '.join(expandable) or '無'}）"
+        )
+    return selected
+
+
+def encode_cursor(value, descending):
+    raw = json.dumps([value, 'desc' if descending else 'asc'])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, descending):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, order = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        raise PaginationError('cursor 格式錯誤')
+    if order != ('desc' if descending else 'asc'):
+        raise PaginationError('cursor 與 order 不一致')
+    return value
+
+
+def paginate(request, queryset, fields, default_fields=None):
+    """
+    依查詢參數回傳一頁資料
+
+    參數：
+        queryset: 尚未排序與切片的 QuerySet
+        fields: {輸出名稱: ListField}，可由 fields= 選擇的欄位
+        default_fields: 未指定 fields= 時輸出的欄位（預設全部）；
+            expand= 指定的欄位一律附加在後
+
+    回傳：
+        tuple: (資料列表, {'limit', 'next_cursor', 'fields'})
+
+    參數錯誤時拋出 PaginationError
+    """
+    limit = _parse_limit(request.GET.get('limit'))
+    selected = _parse_fields(request.GET.get('fields'), fields, default_fields)
+    expand = _parse_expand(request.GET.get('expand'), fields)
+    selected = list(dict.fromkeys(selected + expand))
+    order = request.GET.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise PaginationError('order 必須為 asc 或 desc')
+    descending = order == 'desc'
+
+    pk = queryset.model._meta.pk.name
+    needed = {pk}
+    related = set()
+    for name in selected:
+        needed.update(fields[name].columns)
+        related.update(fields[name].related)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    queryset = queryset.only(*needed)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        value = decode_cursor(cursor, descending)
+        lookup = f'{pk}__lt' if descending else f'{pk}__gt'
+        queryset = queryset.filter(**{lookup: value})
+    queryset = queryset.order_by(f'-{pk}' if descending else pk)
+
+    # 多取一筆判斷是否還有下一頁
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], pk), descending)
+
+    data = [
+        {name: fields[name].getter(row) for name in selected} for row in rows
+    ]
+    return data, {
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'fields': selected,
+    }
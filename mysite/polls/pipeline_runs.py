@@ -0,0 +1,187 @@
+"""
+規格流程的階段 checkpoint
+PipelineRun 在伺服器端保存 Formulation → Discovery → 完整結果各階段的輸出，
+以輸入內容的雜湊判斷 checkpoint 是否仍有效：輸入未變時直接回傳保存的輸出，
+重新整理頁面或重試時從最後完成的階段續跑，已完成的 LLM 工作不會重做；
+完整結果階段在輸入修改後只重新生成相依內容有變更的區段（見 polls.spec_diff）
+"""
+import hashlib
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .pipelines import PIPELINES
+
+# 階段順序與各階段使用的輸入欄位
+STAGES = ('formulation', 'discovery', 'complete_result')
+STAGE_INPUTS = {
+    'formulation': ('spec_text',),
+    'discovery': ('dbml', 'gherkin'),
+    'complete_result': ('dbml', 'gherkin'),
+}
+
+# 可依輸入差異只重做部分內容的階段
+INCREMENTAL_STAGES = ('complete_result',)
+
+STATE_COMPLETED = 'completed'
+STATE_STALE = 'stale'
+STATE_FAILED = 'failed'
+STATE_PENDING = 'pending'
+
+
+def stage_inputs(run, stage):
+    return {name: getattr(run, name) for name in STAGE_INPUTS[stage]}
+
+
+def input_hash(stage, inputs):
+    raw = json.dumps([stage, inputs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def stage_state(run, stage):
+    """
+    階段狀態
+
+        completed：已完成且輸入未變（可直接重用輸出）
+        stale：曾完成但輸入已變更
+        failed：最近一次執行失敗或只有部分成功
+        pending：尚未執行
+    """
+    checkpoint = run.stages.get(stage)
+    if not checkpoint:
+        return STATE_PENDING
+    if checkpoint['status'] != STATE_COMPLETED:
+        return STATE_FAILED
+    if checkpoint['input_hash'] != input_hash(stage, stage_inputs(run, stage)):
+        return STATE_STALE
+    return STATE_COMPLETED
+
+
+def next_stage(run):
+    """第一個尚未完成（或輸入已變更）的階段；全部完成時回傳 None"""
+    for stage in STAGES:
+        if stage_state(run, stage) != STATE_COMPLETED:
+            return stage
+    return None
+
+
+def _save_checkpoint(run, stage, inputs, body, status):
+    # 以資料列鎖合併寫入，避免不同階段同時完成時互相覆蓋
+    completed = status < 400 and not body.get('partial')
+    with transaction.atomic():
+        locked = type(run).objects.select_for_update().get(pk=run.pk)
+        locked.stages[stage] = {
+            'status': STATE_COMPLETED if completed else STATE_FAILED,
+            'input_hash': input_hash(stage, inputs),
+            'inputs': inputs,
+            'output': body,
+            'http_status': status,
+            'finished_at': timezone.now().isoformat(),
+        }
+        update_fields = ['stages', 'updated_at']
+        # Formulation 的產物成為下游階段的輸入
+        if stage == 'formulation' and status < 400:
+            for name in ('dbml', 'gherkin'):
+                if body.get(name):
+                    setattr(locked, name, body[name])
+                    update_fields.append(name)
+        locked.save(update_fields=update_fields)
+    run.refresh_from_db()
+
+
+def update_inputs(run, **values):
+    """修改流程輸入（例如依澄清結果編輯後的 DBML）；未提供的欄位不變"""
+    changed = [
+        name for name, value in values.items()
+        if value is not None and getattr(run, name) != value
+    ]
+    for name in changed:
+        setattr(run, name, values[name])
+    if changed:
+        run.save(update_fields=changed + ['updated_at'])
+    return changed
+
+
+def run_stage(run, stage, bypass_cache=False):
+    """
+    執行單一階段；checkpoint 仍有效時直接回傳保存的輸出
+
+    回傳：
+        tuple: (回應內容, HTTP 狀態碼, 是否重用 checkpoint)
+    """
+    if not bypass_cache and stage_state(run, stage) == STATE_COMPLETED:
+        checkpoint = run.stages[stage]
+        return checkpoint['output'], checkpoint['http_status'], True
+
+    inputs = stage_inputs(run, stage)
+    payload = {**inputs, 'bypass_cache': bypass_cache}
+    # 完整結果：以上一次的輸入與輸出為基準，只重新生成受修改影響的區段
+    checkpoint = run.stages.get(stage)
+    if stage in INCREMENTAL_STAGES and checkpoint and 'inputs' in checkpoint:
+        payload['previous'] = {
+            **checkpoint['inputs'], 'result': checkpoint['output']
+        }
+    try:
+        body, status = PIPELINES[stage](payload)
+    except Exception as e:
+        body, status = {'success': False, 'error': str(e)}, 500
+    _save_checkpoint(run, stage, inputs, body, status)
+    return body, status, False
+
+
+def resume_run(run, bypass_cache=False):
+    """
+    從第一個未完成的階段依序執行到最後；任一階段失敗即停止
+
+    回傳：
+        dict: {階段: {'status': HTTP 狀態碼, 'reused': bool}}，只包含本次經過的階段
+    """
+    summary = {}
+    for stage in STAGES:
+        body, status, reused = run_stage(run, stage, bypass_cache)
+        summary[stage] = {'status': status, 'reused': reused}
+        if status >= 400 or body.get('partial'):
+            break
+    return summary
+
+
+def run_pipeline_job(payload):
+    """背景工作（kind='pipeline'）：續跑指定的 PipelineRun"""
+    from .models import PipelineRun
+
+    try:
+        run = PipelineRun.objects.get(id=payload.get('run_id'))
+    except PipelineRun.DoesNotExist:
+        return {'error': f"PipelineRun {payload.get('run_id')} not found"}, 404
+    summary = resume_run(run, bool(payload.get('bypass_cache', False)))
+    body = run_to_dict(run)
+    body['executed'] = summary
+    failed = [stage for stage, item in summary.items() if item['status'] >= 400]
+    if failed:
+        body['error'] = f'階段 {failed[0]} 失敗'
+        return body, 500
+    return body, 200
+
+
+def run_to_dict(run, include_output=True):
+    stages = {}
+    for stage in STAGES:
+        checkpoint = run.stages.get(stage, {})
+        data = {
+            'state': stage_state(run, stage),
+            'finished_at': checkpoint.get('finished_at'),
+        }
+        if include_output:
+            data['output'] = checkpoint.get('output')
+        stages[stage] = data
+    return {
+        'run_id': run.id,
+        'spec_text': run.spec_text,
+        'dbml': run.dbml,
+        'gherkin': run.gherkin,
+        'stages': stages,
+        'next_stage': next_stage(run),
+        'created_at': run.created_at,
+        'updated_at': run.updated_at,
+    }
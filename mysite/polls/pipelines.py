@@ -0,0 +1,386 @@
+"""
+進階規格產出流程（Formulation → Discovery → 完整結果）
+每個階段接收請求內容、回傳 (回應內容, HTTP 狀態碼)；
+同步 API 與背景工作（polls.jobs）共用同一份實作，
+非同步 view 使用 arun_*（以 asyncio 並行呼叫 LLM，等待期間不佔用執行緒）
+
+每個階段拆成 prepare（驗證輸入、建立提示詞）與 finish（組合回應），
+同步與非同步版本只差在中間呼叫 LLM 的方式
+"""
+import json
+from functools import partial
+
+from django.conf import settings
+
+from .api_utils import LLMBusyError
+from .prompts import (
+    build_complete_result_prompts, build_discovery_prompt,
+    build_formulation_prompts, strip_code_block,
+)
+
+
+class PipelineInputError(Exception):
+    """輸入驗證失敗，攜帶要直接回傳的 (回應內容, HTTP 狀態碼)"""
+
+    def __init__(self, body, status=400):
+        super().__init__(body.get('error'))
+        self.body = body
+        self.status = status
+
+
+def _text(payload, name):
+    return str(payload.get(name, '') or '').strip()
+
+
+def _busy(error):
+    # LLM 執行器已滿載：回傳 503，由 view 轉為 Retry-After 標頭
+    return {
+        'success': False, 'error': str(error),
+        'retry_after': error.retry_after,
+    }, 503
+
+
+def _failure(label, errors):
+    return {
+        'success': False,
+        'error': f'{label}：' + '；'.join(
+            f'{name}: {message}' for name, message in errors.items()
+        ),
+        'errors': errors
+    }, 500
+
+
+# ---- Formulation ----
+
+def _prepare_formulation(payload):
+    spec_text = _text(payload, 'spec_text')
+    if not spec_text:
+        raise PipelineInputError({'error': '缺少規格文本'})
+
+    # 依照 formulation-rules.md 規則建立資料模型與功能模型提示詞
+    prompts = build_formulation_prompts(spec_text)
+    return {
+        'prompts': prompts,
+        'timeout': {name: settings.LLM_SECTION_TIMEOUT for name in prompts},
+    }
+
+
+def _finish_formulation(plan, results, errors):
+    if not results:
+        return _failure('Formulation 執行失敗', errors)
+
+    # 移除可能的 markdown code block 標記
+    artifacts = {
+        name: strip_code_block(results.get(name, ''))
+        for name in plan['prompts']
+    }
+
+    # 單一產物失敗時仍回傳另一個產物，並標示各自的錯誤
+    response = {
+        'success': True,
+        'dbml': artifacts['dbml'],
+        'gherkin': artifacts['gherkin']
+    }
+    if errors:
+        response['partial'] = True
+        response['errors'] = errors
+    return response, 200
+
+
+# ---- Discovery ----
+
+def _prepare_discovery(payload):
+    dbml_content = _text(payload, 'dbml')
+    gherkin_content = _text(payload, 'gherkin')
+    if not dbml_content or not gherkin_content:
+        raise PipelineInputError({'error': '缺少 DBML 或 Gherkin 內容'})
+
+    return {
+        'prompts': {
+            'discovery': build_discovery_prompt(dbml_content, gherkin_content)
+        },
+        'timeout': settings.LLM_SECTION_TIMEOUT,
+    }
+
+
+def _finish_discovery(plan, results, errors):
+    if errors:
+        return {
+            'success': False,
+            'error': f"Discovery 執行失敗：{errors['discovery']}"
+        }, 500
+
+    # 移除可能的 markdown code block 標記
+    result = results['discovery'].strip()
+    if result.startswith('```'):
+        lines = result.split('\n')
+        if lines[-1].strip() == '```':
+            result = '\n'.join(lines[1:-1])
+        else:
+            result = '\n'.join(lines[1:])
+
+    # 解析 JSON
+    try:
+        clarification_items = json.loads(result)
+    except json.JSONDecodeError as je:
+        return {
+            'success': False,
+            'error': f'AI 返回的內容無法解析為 JSON: {str(je)}\n原始內容: {result[:200]}'
+        }, 500
+
+    # 計算統計
+    total = len(clarification_items)
+    high = len([item for item in clarification_items if item.get('priority') == 'High'])
+    medium = len([item for item in clarification_items if item.get('priority') == 'Medium'])
+    low = len([item for item in clarification_items if item.get('priority') == 'Low'])
+
+    return {
+        'success': True,
+        'items': clarification_items,
+        'statistics': {
+            'total': total,
+            'high': high,
+            'medium': medium,
+            'low': low
+        }
+    }, 200
+
+
+# ---- 完整結果 ----
+
+def _reusable_sections(previous, dbml_content, gherkin_content, section_names):
+    """
+    比對上一版規格，找出可直接沿用的區段
+
+    回傳：
+        tuple: ({區段: 沿用的內容}, 差異摘要)
+    """
+    from polls.spec_diff import diff_spec
+
+    changes = diff_spec(
+        _text(previous, 'dbml'), _text(previous, 'gherkin'),
+        dbml_content, gherkin_content
+    )
+    result = previous.get('result') or {}
+    failed = result.get('errors') or {}
+    reused = {
+        name: result[name] for name in section_names
+        if name not in changes['sections'] and name not in failed
+        and isinstance(result.get(name), str) and result[name]
+    }
+    return reused, changes
+
+
+def _valid_previous(previous):
+    if not isinstance(previous, dict):
+        return False
+    result = previous.get('result')
+    return (
+        isinstance(previous.get('dbml'), str)
+        and isinstance(previous.get('gherkin'), str)
+        and isinstance(result, dict)
+        and isinstance(result.get('errors', {}), (dict, type(None)))
+    )
+
+
+def _prepare_complete_result(payload):
+    dbml_content = _text(payload, 'dbml')
+    gherkin_content = _text(payload, 'gherkin')
+    previous = payload.get('previous')
+
+    # 參數驗證
+    if not dbml_content or not gherkin_content:
+        raise PipelineInputError({
+            'success': False,
+            'error': '缺少必要參數：dbml 和 gherkin 都是必填項'
+        })
+    if previous is not None and not _valid_previous(previous):
+        raise PipelineInputError({
+            'success': False,
+            'error': 'previous 必須是包含 dbml、gherkin（字串）與 result（物件）的物件'
+        })
+
+    section_prompts = build_complete_result_prompts(
+        dbml_content, gherkin_content
+    )
+    reused, changes = {}, None
+    if previous is not None and not payload.get('bypass_cache'):
+        reused, changes = _reusable_sections(
+            previous, dbml_content, gherkin_content, section_prompts
+        )
+
+    # 背景說明、專案目標、流程圖、API 規格四個區段互不相依，
+    # 並行呼叫 LLM（受共用並行上限限制）；沿用的區段不呼叫
+    return {
+        'prompts': {
+            name: prompt for name, prompt in section_prompts.items()
+            if name not in reused
+        },
+        'timeout': settings.LLM_SECTION_TIMEOUT,
+        'sections': list(section_prompts),
+        'incremental': previous is not None,
+        'reused': reused,
+        'changes': changes,
+    }
+
+
+def _finish_complete_result(plan, results, errors):
+    reused = plan['reused']
+    if errors and not results and not reused:
+        return _failure('生成完整結果失敗', errors)
+
+    sections = {
+        name: reused.get(name, results.get(name, '')).strip()
+        for name in plan['sections']
+    }
+
+    # 移除可能的 code block 標記
+    sections['flowchart'] = strip_code_block(
+        sections['flowchart']
+    ).strip()
+
+    # 返回完整結果（部分區段失敗時仍回傳成功的區段）
+    response = {'success': True}
+    response.update(sections)
+    if plan['incremental']:
+        response['regenerated'] = list(plan['prompts'])
+        response['reused_sections'] = list(reused)
+        if plan['changes'] is not None:
+            response['changes'] = {
+                'dbml': plan['changes']['dbml'],
+                'gherkin': plan['changes']['gherkin'],
+            }
+    if errors:
+        response['partial'] = True
+        response['errors'] = errors
+    return response, 200
+
+
+# 階段 -> (prepare, finish, 失敗訊息前綴)
+STAGE_STEPS = {
+    'formulation': (
+        _prepare_formulation, _finish_formulation, 'Formulation 執行失敗'
+    ),
+    'discovery': (_prepare_discovery, _finish_discovery, 'Discovery 執行失敗'),
+    'complete_result': (
+        _prepare_complete_result, _finish_complete_result, '生成完整結果失敗'
+    ),
+}
+
+
+def _execute(stage, payload):
+    prepare, finish, label = STAGE_STEPS[stage]
+    try:
+        plan = prepare(payload)
+    except PipelineInputError as e:
+        return e.body, e.status
+
+    from polls.api_utils import call_ollama_api, run_llm_tasks
+
+    bypass_cache = bool(payload.get('bypass_cache', False))
+    try:
+        results, errors = run_llm_tasks(
+            {
+                name: partial(
+                    call_ollama_api,
+                    prompt=prompt,
+                    user_input="",
+                    bypass_cache=bypass_cache
+                )
+                for name, prompt in plan['prompts'].items()
+            },
+            timeout=plan['timeout']
+        )
+        return finish(plan, results, errors)
+    except LLMBusyError as e:
+        return _busy(e)
+    except Exception as e:
+        return {'success': False, 'error': f'{label}：{str(e)}'}, 500
+
+
+async def _aexecute(stage, payload):
+    prepare, finish, label = STAGE_STEPS[stage]
+    try:
+        plan = prepare(payload)
+    except PipelineInputError as e:
+        return e.body, e.status
+
+    from polls.api_utils import acall_ollama_api, arun_llm_tasks
+
+    bypass_cache = bool(payload.get('bypass_cache', False))
+    try:
+        results, errors = await arun_llm_tasks(
+            {
+                name: partial(
+                    acall_ollama_api,
+                    prompt=prompt,
+                    user_input="",
+                    bypass_cache=bypass_cache
+                )
+                for name, prompt in plan['prompts'].items()
+            },
+            timeout=plan['timeout']
+        )
+        return finish(plan, results, errors)
+    except LLMBusyError as e:
+        return _busy(e)
+    except Exception as e:
+        return {'success': False, 'error': f'{label}：{str(e)}'}, 500
+
+
+def run_formulation(payload):
+    """
+    Formulation 階段: 從原始規格文本萃取資料模型 (DBML) 和功能模型 (Gherkin)
+    依照 formulation-rules.md 規則執行；DBML 與 Gherkin 兩者互不相依，並行生成
+    """
+    return _execute('formulation', payload)
+
+
+def run_discovery(payload):
+    """
+    Discovery 階段: 掃描 DBML 和 Gherkin 規格,識別歧義與遺漏
+    執行 A1-A6 (資料模型), B1-B5 (功能模型) 檢查清單
+    """
+    return _execute('discovery', payload)
+
+
+def run_complete_result(payload):
+    """
+    生成完整規格結果
+    輸入: DBML 和 Gherkin 內容
+    輸出: 背景說明、專案目標、流程圖、API 規格
+
+    可選 previous={"dbml", "gherkin", "result"}（上一版輸入與完整結果）：
+    只重新生成相依內容有變更的區段，其餘沿用 previous.result
+    """
+    return _execute('complete_result', payload)
+
+
+async def arun_formulation(payload):
+    """run_formulation 的非同步版本"""
+    return await _aexecute('formulation', payload)
+
+
+async def arun_discovery(payload):
+    """run_discovery 的非同步版本"""
+    return await _aexecute('discovery', payload)
+
+
+async def arun_complete_result(payload):
+    """run_complete_result 的非同步版本"""
+    return await _aexecute('complete_result', payload)
+
+
+# 背景工作可執行的流程
+PIPELINES = {
+    'formulation': run_formulation,
+    'discovery': run_discovery,
+    'complete_result': run_complete_result,
+}
+
+# 非同步 view 使用的版本
+ASYNC_PIPELINES = {
+    'formulation': arun_formulation,
+    'discovery': arun_discovery,
+    'complete_result': arun_complete_result,
+}
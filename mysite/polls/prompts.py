@@ -0,0 +1,446 @@
+"""
+規格產出提示詞
+集中管理 spec_generator、Formulation、Discovery 與完整結果生成所使用的提示詞，
+供同步 API、串流 API 與背景任務共用
+"""
+from .spec_diff import dbml_outline, gherkin_outline, parse_dbml, parse_gherkin
+
+# 規格文件生成（spec_generator）系統提示詞
+SPEC_SYSTEM_PROMPT = """你是一個專業的軟體規格文件生成助手。請根據用戶提供的資訊，生成一份完整的軟體規格文件。
+
+**重要規則：**
+1. 嚴格按照指定格式輸出，不要添加任何額外的說明、備註或問候語
+2. 每個章節必須以 "==== 章節名稱 ====" 開頭
+3. 直接輸出內容，不要用括號說明、不要用「以下是...」這類開場白
+4. Mermaid 流程圖必須用完整的 ```mermaid 代碼塊包裹
+5. 不要在內容中添加任何 emoji
+6. 資料模型、功能規格、API 規格請使用適當的換行，每個項目或區塊之間空一行
+
+**輸出格式：**
+
+==== 背景說明 ====
+[直接寫背景內容，分段描述，段落之間空一行]
+
+==== 目標 ====
+[直接列出目標項目，使用 "1. " "2. " 編號，每個目標換行]
+
+==== 資料模型 ====
+[直接寫 DBML 代碼，用 ```dbml 代碼塊包裹，表格之間空一行]
+
+範例：
+```dbml
+Table users {
+  id integer [primary key]
+  username varchar
+  email varchar
+}
+
+Table posts {
+  id integer [primary key]
+  user_id integer [ref: > users.id]
+  content text
+}
+```
+
+==== 功能規格 ====
+[直接寫 Gherkin 格式的功能描述，每個 Feature 之間空一行，每個 Scenario 之間也要空一行]
+
+範例：
+```gherkin
+Feature: 使用者登入
+
+Scenario: 成功登入
+  Given 使用者在登入頁面
+  When 輸入正確的帳號密碼
+  Then 應該導向首頁
+
+Scenario: 密碼錯誤
+  Given 使用者在登入頁面
+  When 輸入錯誤的密碼
+  Then 應該顯示錯誤訊息
+
+Feature: 發布文章
+
+Scenario: 成功發布
+  Given 使用者已登入
+  When 填寫文章內容並發布
+  Then 應該顯示成功訊息
+```
+
+==== 流程圖 ====
+```mermaid
+graph TD
+    [直接寫 Mermaid 流程圖代碼]
+```
+
+==== API 規格 ====
+[直接列出 API 端點和規格，每個 API 之間空一行]
+
+範例：
+POST /api/login
+- 請求：{"username": "string", "password": "string"}
+- 回應：{"token": "string", "user": {...}}
+
+GET /api/posts
+- 請求：無
+- 回應：[{"id": 1, "title": "string", ...}]
+"""
+
+# formulation-rules.md 規則
+FORMULATION_RULES = """
+# 核心原則：無腦補或任意假設原則
+嚴格遵守原始規格文本內容，如果需求中沒有明確寫出的欄位、規則、條件或行為，就不要加入。不要擅自假設、推測或補充任何需求中不存在的內容。
+
+# 資料模型萃取規則 (DBML 格式)
+
+## A. 識別「實體 (Entity)」
+- 只萃取規格中明確提到的實體
+- 實體名稱使用規格中的術語，不要自行創造
+- 不要添加規格中未提及的實體
+
+## B. 萃取實體的「屬性 (Attribute)」
+- 只萃取規格中明確提到或可直接推導的屬性
+- 每個屬性必須指定資料型別：int, long, float, bool, string
+- 每個屬性必須有 note 說明其定義與用途
+- 如果規格中有提到屬性的限制條件（如 > 0, >= 0, 必須唯一等），在 note 中明確標註
+- 不要添加規格中沒有提到的「預留欄位」或「可能需要的欄位」
+
+## C. 標註「跨屬性不變條件」
+- 在實體的 Note 中條列跨屬性不變條件
+- 例如：總額 = 單價 × 數量
+- 只記錄規格中明確提到的約束，不要臆測
+
+## D. 識別實體之間的「關係 (Relationship)」
+- 只標註規格中明確提到的關聯關係
+- 使用 DBML 的 ref 語法描述關聯
+- 明確標示關聯類型（一對一、一對多、多對多）
+
+## E. 記錄實體的整體說明
+- 在 Table 的 Note 中簡述此實體的用途
+
+# 功能模型萃取規則 (Gherkin 格式)
+
+## A. 萃取「功能 (Feature)」
+- 每個功能都是使用者與系統的請求交互點，若沒有明確交互時機則不被視為功能
+- 只萃取規格中明確提到的功能，不要推測「可能需要的功能」
+- 功能命名應清晰且反映使用者意圖
+
+## B. 萃取功能的「規則 (Rule)」
+- 每個前置條件 or 後置條件都必須為一條獨立的 Rule
+- Rule 必須原子化，分割到不可分割為止，每一個 Rule 只驗證一件事
+- 只萃取規格中明確提到的規則，不要添加「合理的驗證」
+- 規則描述必須可驗證，避免使用模糊的形容詞
+
+## C. 萃取規則的「例子 (Example)」
+- 使用 Gherkin 語法 (Given-When-Then) 描述此 Example
+- 如果無法從文本中找到任何例子，則在 Rule 下標記 #TODO
+- 不要編造例子或假設測試情境
+- 每個 Example 至少都有 "When step"，When 與該 Feature 的系統交互相關
+"""
+
+
+def build_spec_user_input(project_goal, core_features,
+                          technical_constraints, target_audience):
+    """組合 spec_generator 的使用者輸入"""
+    return f"""
+專案目標: {project_goal}
+核心功能: {core_features}
+技術限制: {technical_constraints}
+目標使用者: {target_audience}
+"""
+
+
+def build_formulation_prompts(spec_text):
+    """
+    建立 Formulation 提示詞
+
+    回傳：
+        dict: {'dbml': 資料模型提示詞, 'gherkin': 功能模型提示詞}
+    """
+    # 資料模型
+    dbml_prompt = f"""你是一個專業的需求分析師。請依照以下規則從規格文本中萃取資料模型 (Data Model)，並輸出為 DBML 格式。
+
+{FORMULATION_RULES}
+
+## 原始規格文本
+{spec_text}
+
+## 輸出要求
+請嚴格依照上述規則萃取資料模型，輸出為標準 DBML 格式。
+
+**重要**: 
+- 只輸出 DBML 代碼本身，不要包含任何說明文字或前綴
+- 不要使用 markdown code block 標記 (```dbml)
+- 直接從 Table 開始輸出
+- 每個 Table 必須有 Note 說明用途
+- 每個 Column 必須有 note 說明定義
+- 使用 ref 語法描述實體關係
+
+範例格式:
+Table User {{
+  id int [pk]
+  username string [note: "使用者名稱，必須唯一"]
+  email string [note: "電子郵件"]
+  
+  Note: "系統使用者實體"
+}}
+
+Table Order {{
+  id int [pk]
+  user_id int [ref: > User.id, note: "訂單所屬使用者"]
+  total float [note: "訂單總額，必須 >= 0"]
+  
+  Note: "訂單實體。不變條件: total = sum(OrderItem.price * OrderItem.quantity)"
+}}
+"""
+
+    # 功能模型
+    gherkin_prompt = f"""你是一個專業的需求分析師。請依照以下規則從規格文本中萃取功能模型 (Functional Model)，並輸出為 Gherkin 格式。
+
+{FORMULATION_RULES}
+
+## 原始規格文本
+{spec_text}
+
+## 輸出要求
+請嚴格依照上述規則萃取功能模型，輸出為標準 Gherkin Language 格式。
+
+**重要**: 
+- 只輸出 Gherkin 代碼本身，不要包含任何說明文字或前綴
+- 不要使用 markdown code block 標記 (```gherkin)
+- 使用英文 keyword (Feature, Rule, Example, Given, When, Then, And)
+- 主要內容使用繁體中文
+- 階層結構: Feature > Rule > Example
+- 每個 Example 必須有 When step
+- 如果規則沒有例子，標記 #TODO
+
+範例格式:
+Feature: 使用者註冊
+
+  Rule: 註冊時必須提供使用者名稱
+    Example: 成功註冊
+      Given 系統已啟動
+      When 使用者提供使用者名稱「張三」和密碼「pass123」進行註冊
+      Then 系統建立新使用者帳號
+      And 使用者名稱為「張三」
+
+  Rule: 使用者名稱必須唯一
+    Example: 拒絕重複的使用者名稱
+      Given 系統中已存在使用者名稱「張三」
+      When 使用者嘗試以使用者名稱「張三」註冊
+      Then 操作失敗
+      And 系統顯示錯誤訊息「使用者名稱已存在」
+"""
+
+    return {'dbml': dbml_prompt, 'gherkin': gherkin_prompt}
+
+
+def build_discovery_prompt(dbml_content, gherkin_content):
+    """建立 Discovery 提示詞（A1-A6 資料模型、B1-B5 功能模型檢查清單）"""
+    return f"""你是一個專業的規格品質檢查專家。請依照以下檢查清單掃描規格,識別需要釐清的項目。
+
+## 檢查清單
+
+### A. 資料模型檢查 (DBML)
+
+A1. 實體完整性
+- 所有核心業務概念是否都已建模為實體？
+- 實體命名是否清晰且無歧義？
+
+A2. 屬性定義
+- 每個屬性是否都有明確的資料型別？
+- 每個屬性是否都有充足的定義說明？
+
+A3. 屬性值邊界條件
+- 數值屬性的範圍限制是否明確（>=、<=）？
+- 特殊值處理是否已定義（空值、零、負值）？
+
+A4. 跨屬性不變條件
+- 屬性間的計算關係是否明確？
+
+A5. 關係與唯一性
+- 實體間的關聯關係是否完整？
+- 主鍵與唯一性規則是否明確？
+
+A6. 生命週期與狀態
+- 具有狀態的實體是否定義了所有可能狀態？
+- 狀態轉換規則是否完整？
+
+### B. 功能模型檢查 (Gherkin)
+
+B1. 功能識別
+- 所有使用者與系統的交互點是否都已識別為功能？
+- 功能命名是否清晰？
+
+B2. 規則完整性
+- 每個功能是否至少有一條規則？
+- 規則是否已原子化？
+- 前置條件和後置條件是否完整？
+
+B3. 例子覆蓋度
+- 每條規則是否至少有一個 Example？
+- 缺少 Example 的規則是否已標記 #TODO？
+
+B4. 邊界條件覆蓋
+- 是否涵蓋臨界值案例（剛好達標、差一點、超過）？
+- 不同值域的資料分類是否都有對應 Example？
+
+B5. 錯誤與異常處理
+- 前置條件失敗時的行為是否明確？
+- 異常情況是否都有對應的規則與 Example？
+
+## 當前規格
+
+### DBML 資料模型
+```dbml
+{dbml_content}
+```
+
+### Gherkin 功能模型
+```gherkin
+{gherkin_content}
+```
+
+## 輸出要求
+
+請以 JSON 格式輸出釐清項目清單。每個釐清項目包含:
+- id: 編號
+- priority: 優先級 (High/Medium/Low)
+- location: 定位 (ERM: 實體.屬性 或 Feature: 功能名 → Rule: 規則)
+- question: 釐清問題
+- options: 選項陣列,每個選項包含 key (A/B/C/Short) 和 text
+
+**重要**: 
+- 只輸出 JSON 陣列,不要包含任何說明文字
+- 不要使用 markdown code block 標記
+- 直接從 [ 開始輸出
+- 如果沒有發現需要釐清的項目,返回空陣列 []
+- 優先識別 High 優先級的問題(影響核心功能或資料建模)
+
+範例格式:
+[
+  {{
+    "id": 1,
+    "priority": "High",
+    "location": "ERM: User 實體 → email 屬性",
+    "question": "email 是否必須唯一？",
+    "options": [
+      {{"key": "A", "text": "是，email 必須唯一"}},
+      {{"key": "B", "text": "否，允許重複 email"}}
+    ]
+  }}
+]
+"""
+
+
+def _bullets(items):
+    return '\n'.join(f'- {item}' for item in items) or '- （無）'
+
+
+def _spec_outline(dbml_content, gherkin_content):
+    """規格大綱：資料實體名稱與 Feature / Rule / Scenario 標題"""
+    return (
+        '### 資料實體\n'
+        + _bullets(dbml_outline(parse_dbml(dbml_content)))
+        + '\n\n### 功能清單（Feature / Rule / Scenario）\n'
+        + _bullets(gherkin_outline(parse_gherkin(gherkin_content)))
+    )
+
+
+def build_complete_result_prompts(dbml_content, gherkin_content):
+    """
+    建立完整結果生成的四個區段提示詞
+
+    回傳：
+        dict: {'background', 'goals', 'flowchart', 'api_spec'} -> 提示詞
+    """
+    # 各區段只帶入實際需要的規格內容（對應 spec_diff.SECTION_DEPENDENCIES），
+    # 規格修改後只有相依內容改變的區段需要重新生成
+    outline = _spec_outline(dbml_content, gherkin_content)
+
+    # 1. 背景說明
+    background_prompt = f"""你是一個專業的技術文件撰寫專家。請根據以下規格生成簡潔的背景說明（2-3 句話）。
+
+當前規格:
+{outline}
+
+請直接輸出背景說明內容，不要包含任何標題或 markdown 標記。"""
+
+    # 2. 專案目標
+    goals_prompt = f"""你是一個專業的產品經理。請根據以下規格列出 3-5 個核心專案目標。
+
+當前規格:
+{outline}
+
+請以有編號的清單格式輸出（例如：1. ... 2. ...），不要包含任何標題。"""
+
+    # 3. 流程圖 (Mermaid)
+    flowchart_prompt = f"""你是一個流程圖設計專家。請根據以下規格生成 Mermaid 流程圖代碼。
+
+當前規格:
+### Gherkin 功能模型
+```gherkin
+{gherkin_content}
+```
+
+**重要規則**：
+1. 只輸出 Mermaid 語法，不要包含 ```mermaid 標記
+2. 直接從 graph 或 flowchart 開始
+3. 節點標籤使用英文或簡短中文（不超過 10 個字）
+4. 箭頭標籤（條件分支）請使用英文，例如：
+   - 使用 -->|Yes| 而不是 -->|是|
+   - 使用 -->|No| 而不是 -->|否|
+   - 使用 -->|Success| 而不是 -->|成功|
+5. 避免使用特殊符號：/ \\ : " ' 等
+6. 節點 ID 使用簡單的字母數字組合（A, B, C 或 step1, step2）
+7. 使用基本圖形：方括號表示方形、圓括號表示圓角、大括號表示菱形
+
+**範例格式**：
+graph TD
+    A[Start] --> B{{Check Auth}}
+    B -->|Yes| C[Load Data]
+    B -->|No| D[Show Login]
+    C --> E[Display]
+
+請只輸出符合以上規則的 Mermaid 代碼。"""
+
+    # 4. API 規格
+    features = _bullets(gherkin_outline(parse_gherkin(gherkin_content)))
+    api_spec_prompt = f"""你是一個 API 設計專家。請根據以下規格生成 RESTful API 規格文件。
+
+當前規格:
+### DBML 資料模型
+```dbml
+{dbml_content}
+```
+
+### 功能清單（Feature / Rule / Scenario）
+{features}
+
+請以 Markdown 格式輸出，包含：
+- 端點路徑和方法
+- 描述
+- 請求參數
+- 回應格式
+- 狀態碼
+
+不要包含 # API 規格 這樣的大標題。"""
+
+    return {
+        'background': background_prompt,
+        'goals': goals_prompt,
+        'flowchart': flowchart_prompt,
+        'api_spec': api_spec_prompt,
+    }
+
+
+def strip_code_block(content):
+    """移除 AI 回應外層可能的 markdown code block 標記"""
+    content = content.strip()
+    if content.startswith('```'):
+        lines = content.split('\n')
+        if lines[-1].strip() == '```':
+            content = '\n'.join(lines[1:-1])
+        else:
+            content = '\n'.join(lines[1:])
+    return content
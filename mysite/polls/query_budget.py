@@ -0,0 +1,102 @@
+"""
+SQL 查詢數預算
+QueryBudgetMiddleware 在每個回應加上 X-Query-Count 標頭，超過預算時記錄警告
+（QUERY_BUDGET_STRICT=True 時直接拋出例外）；QueryBudgetTestMixin 提供
+assertMaxQueries()，讓逐筆查詢（N+1）之類的退化在測試中失敗
+"""
+import logging
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """查詢數超過預算"""
+
+
+class QueryCounter:
+    """以 connection.execute_wrapper 計算執行的 SQL（含 SQL 文字供除錯）"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+
+def _budget_message(label, counter, budget):
+    listing = '\n'.join(
+        f'  {i}. {sql}' for i, sql in enumerate(counter.queries, 1)
+    )
+    return f'{label} 執行了 {counter.count} 次查詢，預算為 {budget}：\n{listing}'
+
+
+def query_budget_for(request):
+    """依 URL 名稱取得預算（settings.QUERY_BUDGETS），沒有設定時用預設值"""
+    match = getattr(request, 'resolver_match', None)
+    name = match.url_name if match is not None else None
+    return settings.QUERY_BUDGETS.get(name, settings.QUERY_BUDGET_DEFAULT)
+
+
+class QueryBudgetMiddleware:
+    # 同時支援同步與非同步請求，避免非同步 view 因中介層被迫切換到執行緒執行
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.QUERY_BUDGET_ENABLED:
+            return self.get_response(request)
+
+        with count_queries() as counter:
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(counter.count)
+
+        budget = query_budget_for(request)
+        if budget is not None and counter.count > budget:
+            message = _budget_message(
+                f'{request.method} {request.path}', counter, budget
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    async def __acall__(self, request):
+        # 非同步請求的 ORM 查詢在 sync_to_async 的執行緒以該執行緒的連線執行，
+        # 無法從事件迴圈以 execute_wrapper 計算，因此直接放行
+        return await self.get_response(request)
+
+
+class QueryBudgetTestMixin:
+    """TestCase 混入：assertMaxQueries(n) 斷言區塊內最多執行 n 次查詢"""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, label='區塊'):
+        with count_queries() as counter:
+            yield counter
+        if counter.count > budget:
+            self.fail(_budget_message(label, counter, budget))
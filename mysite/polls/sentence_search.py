@@ -0,0 +1,139 @@
+"""
+SentenceDatabase 語意搜尋
+查詢句子只編碼一次，再依 user / category 分區在 kb 向量索引中搜尋：
+分區的主鍵集合直接限制索引比對範圍（NumPy 只計算分區內的列，
+faiss 以 IDSelector 篩選），不會先取全域 top-k 再過濾而漏掉結果
+"""
+import threading
+import time
+
+import numpy as np
+
+from .vector_index import _cache_key, get_vector_index
+
+INDEX_NAME = 'kb'
+
+# (索引路徑, 名稱) -> (索引 generation, {'user': {值: 主鍵}, 'category': {...}})
+_partitions = {}
+_partitions_lock = threading.Lock()
+
+
+def _load_partitions():
+    from .models import SentenceDatabase
+
+    partitions = {'user': {}, 'category': {}}
+    rows = (
+        SentenceDatabase.objects.filter(embedding__isnull=False)
+        .values_list('id', 'user', 'category')
+        .order_by('id')
+        .iterator(chunk_size=5000)
+    )
+    for pk, user, category in rows:
+        partitions['user'].setdefault(user, []).append(pk)
+        partitions['category'].setdefault(category, []).append(pk)
+    for groups in partitions.values():
+        for value, ids in groups.items():
+            groups[value] = np.asarray(ids, dtype=np.int64)
+    return partitions
+
+
+def get_partitions(vector_index):
+    """
+    取得 user / category 分區的主鍵陣列
+
+    隨索引 generation 快取：同步索引（資料或分類變更）後重新讀取
+    """
+    key = _cache_key(INDEX_NAME, vector_index.base_path)
+    generation = vector_index.metadata.get('generation', 0)
+    cached = _partitions.get(key)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    with _partitions_lock:
+        cached = _partitions.get(key)
+        if cached is None or cached[0] != generation:
+            cached = (generation, _load_partitions())
+            _partitions[key] = cached
+    return cached[1]
+
+
+def partition_ids(vector_index, user=None, category=None):
+    """符合條件的主鍵（已排序）；沒有條件時回傳 None 表示整個索引"""
+    if user is None and category is None:
+        return None
+    partitions = get_partitions(vector_index)
+    empty = np.empty(0, dtype=np.int64)
+    ids = None
+    for field, value in (('user', user), ('category', category)):
+        if value is None:
+            continue
+        values = partitions[field].get(value, empty)
+        ids = values if ids is None else np.intersect1d(
+            ids, values, assume_unique=True
+        )
+    return ids
+
+
+def search_sentences(query=None, vector=None, k=10, user=None, category=None,
+                     min_score=None, nprobe=None, ef_search=None):
+    """
+    語意搜尋 SentenceDatabase
+
+    回傳：
+        dict: {'results', 'candidates'（分區筆數，None 表示全部）,
+               'generation', 'timings_ms': {'embed', 'search', 'hydrate', 'total'}}；
+        索引尚未建立時回傳 None
+    """
+    from .models import SentenceDatabase
+
+    started = time.perf_counter()
+    vector_index = get_vector_index(INDEX_NAME)
+    if vector_index is None:
+        return None
+    loaded = time.perf_counter()
+
+    if vector is None:
+        from .embeddings import get_embedding_batcher
+
+        vector = get_embedding_batcher().encode([query])[0]
+    embedded = time.perf_counter()
+
+    ids = partition_ids(vector_index, user, category)
+    hits = vector_index.search(
+        vector, k, nprobe=nprobe, ef_search=ef_search, ids=ids
+    )
+    if min_score is not None:
+        hits = [hit for hit in hits if hit['score'] >= min_score]
+    searched = time.perf_counter()
+
+    # 回傳目前資料庫中的內容；索引同步前已刪除的資料略過
+    items = SentenceDatabase.objects.only(
+        'id', 'user', 'sentence', 'category'
+    ).in_bulk([hit['id'] for hit in hits])
+    results = []
+    for hit in hits:
+        item = items.get(hit['id'])
+        if item is None:
+            continue
+        results.append({
+            'id': item.id,
+            'user': item.user,
+            'sentence': item.sentence,
+            'category': item.category,
+            'score': hit['score'],
+        })
+    finished = time.perf_counter()
+
+    def elapsed(start, end):
+        return round((end - start) * 1000, 3)
+
+    return {
+        'results': results,
+        'candidates': None if ids is None else len(ids),
+        'generation': vector_index.metadata.get('generation', 0),
+        'timings_ms': {
+            'embed': elapsed(loaded, embedded),
+            'search': elapsed(embedded, searched),
+            'hydrate': elapsed(searched, finished),
+            'total': elapsed(started, finished),
+        },
+    }
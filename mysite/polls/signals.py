@@ -0,0 +1,72 @@
+"""
+資料變更訊號
+SentenceDatabase / Ticket 新增、修改、刪除時寫入 VectorIndexOutbox，
+由 sync_vector_index() 只套用變更的部分；
+SentenceDatabase 句子變更時同步更新 MinHash LSH buckets
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .minhash import index_sentence
+from .models import SentenceDatabase, Ticket, VectorIndexOutbox
+from .vector_index import record_index_changes
+
+INDEX_NAMES = {
+    SentenceDatabase: 'kb',
+    Ticket: 'ticket',
+}
+
+_pending = threading.local()
+
+
+@contextmanager
+def batched_index_changes():
+    """
+    區塊內由訊號產生的變更紀錄先暫存，結束時每個（索引, 動作）只寫入一次
+
+    批次刪除等大量觸發訊號的操作使用，避免每筆資料各寫一次 outbox
+    """
+    if getattr(_pending, 'changes', None) is not None:
+        yield
+        return
+    _pending.changes = {}
+    try:
+        yield
+        changes = _pending.changes
+    finally:
+        _pending.changes = None
+    for (index_name, action), object_ids in changes.items():
+        record_index_changes(index_name, object_ids, action)
+
+
+def _record(index_name, pk, action):
+    changes = getattr(_pending, 'changes', None)
+    if changes is None:
+        record_index_changes(index_name, [pk], action)
+    else:
+        changes.setdefault((index_name, action), []).append(pk)
+
+
+@receiver(post_save, sender=SentenceDatabase)
+@receiver(post_save, sender=Ticket)
+def record_upsert(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _record(INDEX_NAMES[sender], instance.pk, VectorIndexOutbox.ACTION_UPSERT)
+
+
+@receiver(post_save, sender=SentenceDatabase)
+def update_lsh_buckets(sender, instance, raw=False, update_fields=None,
+                       **kwargs):
+    if raw or (update_fields is not None and 'sentence' not in update_fields):
+        return
+    index_sentence(instance)
+
+
+@receiver(post_delete, sender=SentenceDatabase)
+@receiver(post_delete, sender=Ticket)
+def record_delete(sender, instance, **kwargs):
+    _record(INDEX_NAMES[sender], instance.pk, VectorIndexOutbox.ACTION_DELETE)
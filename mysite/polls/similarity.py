@@ -0,0 +1,188 @@
+"""
+批次語意相似度
+一次計算 1×N 或 N×M 句子的相似度並取出每列的 top-k：
+有語意向量模型時以正規化向量的矩陣乘法計算 cosine 相似度，
+否則以稀疏詞彙集合矩陣計算 Jaccard 相似度（與 sentence_similarity_api 相同的詞彙重疊）
+"""
+import numpy as np
+
+# 每次計算的相似度矩陣最多元素數（依列分段以限制暫存記憶體）
+CHUNK_ELEMENTS = 1_000_000
+
+METHOD_EMBEDDING = 'embedding'
+METHOD_LEXICAL = 'lexical'
+
+
+def tokenize(text):
+    return set(text.lower().split())
+
+
+class TokenSetMatrix:
+    """
+    詞彙集合的稀疏矩陣（CSR：indptr / indices，每列為一個句子的詞彙 ID）
+
+    vocabulary 共用時，兩個矩陣的詞彙 ID 一致，可直接計算交集大小。
+    """
+
+    def __init__(self, texts, vocabulary):
+        indptr = [0]
+        indices = []
+        for text in texts:
+            tokens = tokenize(text)
+            indices.extend(
+                vocabulary.setdefault(token, len(vocabulary))
+                for token in tokens
+            )
+            indptr.append(len(indices))
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.sizes = np.diff(self.indptr)
+        # 每個非零元素所在的列
+        self.row_ids = np.repeat(
+            np.arange(len(self.sizes), dtype=np.int64), self.sizes
+        )
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def postings(self, vocabulary_size):
+        """倒排索引：依詞彙 ID 排序的列號與各詞彙的起點"""
+        order = np.argsort(self.indices, kind='stable')
+        starts = np.searchsorted(
+            self.indices[order], np.arange(vocabulary_size + 1)
+        )
+        return self.row_ids[order], starts
+
+
+def _intersections(left, left_start, left_stop, posting_rows, starts, width):
+    """left[left_start:left_stop] 與右側所有列的交集大小（稀疏矩陣乘法 A·Bᵀ）"""
+    begin, end = left.indptr[left_start], left.indptr[left_stop]
+    tokens = left.indices[begin:end]
+    rows = left.row_ids[begin:end] - left_start
+    lo, hi = starts[tokens], starts[tokens + 1]
+    repeats = hi - lo
+    total = int(repeats.sum())
+    counts = np.zeros((left_stop - left_start) * width, dtype=np.int64)
+    if total:
+        # 展開每個詞彙對應的右側列：lo[i], lo[i]+1, ..., hi[i]-1
+        offsets = np.arange(total) - np.repeat(
+            np.cumsum(repeats) - repeats, repeats
+        )
+        right_rows = posting_rows[np.repeat(lo, repeats) + offsets]
+        flat = np.repeat(rows, repeats) * width + right_rows
+        counts += np.bincount(flat, minlength=len(counts))
+    return counts.reshape(left_stop - left_start, width)
+
+
+def lexical_similarity_chunks(queries, candidates):
+    """
+    依列分段產生 Jaccard 相似度矩陣
+
+    產生：
+        (起始列, 相似度矩陣 float32)
+    """
+    vocabulary = {}
+    left = TokenSetMatrix(queries, vocabulary)
+    right = TokenSetMatrix(candidates, vocabulary)
+    posting_rows, starts = right.postings(len(vocabulary))
+    width = len(right)
+    step = max(1, CHUNK_ELEMENTS // max(width, 1))
+
+    for start in range(0, len(left), step):
+        stop = min(start + step, len(left))
+        inter = _intersections(left, start, stop, posting_rows, starts, width)
+        union = left.sizes[start:stop, None] + right.sizes[None, :] - inter
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(union > 0, inter / union, 0.0)
+        yield start, scores.astype(np.float32)
+
+
+def _normalized(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embedding_similarity_chunks(query_vectors, candidate_vectors):
+    """依列分段產生 cosine 相似度矩陣（正規化後矩陣相乘）"""
+    left = _normalized(query_vectors)
+    right = _normalized(candidate_vectors)
+    if left.shape[1] != right.shape[1]:
+        raise ValueError('查詢與候選向量維度不符')
+    step = max(1, CHUNK_ELEMENTS // max(len(right), 1))
+    for start in range(0, len(left), step):
+        yield start, left[start:start + step] @ right.T
+
+
+def top_k(scores, k, threshold, exclude=None):
+    """
+    每列取出分數最高的 k 個（且不低於 threshold）
+
+    參數：
+        exclude: 每列要排除的欄（如自身比對時的對角線），None 表示不排除
+
+    回傳：
+        list: 每列一個 [(欄, 分數), ...]，分數由高到低
+    """
+    scores = np.array(scores, dtype=np.float32)
+    if exclude is not None:
+        scores[np.arange(len(scores)), exclude] = -np.inf
+    k = min(k, scores.shape[1])
+    if not k:
+        return [[] for _ in range(len(scores))]
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    rows = []
+    for columns, values in zip(top, top_scores):
+        keep = values >= threshold
+        rows.append(list(zip(columns[keep].tolist(), values[keep].tolist())))
+    return rows
+
+
+def batch_similarity(queries, candidates=None, k=5, threshold=0.0,
+                     method='auto'):
+    """
+    批次計算相似度並取每列 top-k
+
+    參數：
+        queries: 查詢句子列表
+        candidates: 候選句子列表；None 表示查詢彼此比對（排除自身）
+        k: 每列回傳筆數
+        threshold: 最低相似度
+        method: 'embedding'、'lexical' 或 'auto'（可載入模型時用向量，否則用詞彙）
+
+    回傳：
+        tuple: (實際使用的方法, 每列 [(候選索引, 相似度), ...])
+    """
+    self_match = candidates is None
+    if self_match:
+        candidates = queries
+
+    if method in ('auto', METHOD_EMBEDDING):
+        try:
+            from .embeddings import encode_sentences
+
+            vectors = encode_sentences(list(queries) + list(candidates))
+            chunks = embedding_similarity_chunks(
+                vectors[:len(queries)], vectors[len(queries):]
+            )
+            method = METHOD_EMBEDDING
+        except ImportError:
+            if method == METHOD_EMBEDDING:
+                raise
+            method = METHOD_LEXICAL
+    if method == METHOD_LEXICAL:
+        chunks = lexical_similarity_chunks(queries, candidates)
+
+    results = []
+    for start, scores in chunks:
+        exclude = None
+        if self_match:
+            exclude = np.arange(start, start + len(scores))
+        results.extend(top_k(scores, k, threshold, exclude))
+    return method, results
@@ -0,0 +1,210 @@
+"""
+DBML / Gherkin 內容差異
+將規格拆成 Table / Feature 層級的區塊並正規化（忽略註解、空白與縮排），
+比對前後兩版找出新增、刪除與修改的區塊；完整結果的四個區段
+各自只依賴部分規格內容（SECTION_DEPENDENCIES），只有相依內容改變的區段需要重新生成
+"""
+import hashlib
+import re
+
+# 區段 -> 提示詞實際使用的規格面向（與 prompts.build_complete_result_prompts 一致）
+#   dbml / gherkin：完整內容（正規化後）
+#   dbml_outline：資料實體名稱；gherkin_outline：Feature / Rule / Scenario 標題
+SECTION_DEPENDENCIES = {
+    'background': ('dbml_outline', 'gherkin_outline'),
+    'goals': ('dbml_outline', 'gherkin_outline'),
+    'flowchart': ('gherkin',),
+    'api_spec': ('dbml', 'gherkin_outline'),
+}
+
+_QUOTES = '\'"`'
+# 大綱只保留資料實體（Ref 等關聯定義屬於細節）
+_OUTLINE_KINDS = {'table', 'enum', 'tablegroup', 'project'}
+_GHERKIN_TITLE = re.compile(
+    r'^(Feature|Rule|Background|Scenario Outline|Scenario Template|Scenario|'
+    r'Example|功能|規則|背景|場景大綱|場景|例子)\s*:', re.I
+)
+
+
+def _normalize(text):
+    return ' '.join(text.split())
+
+
+def _unique_key(blocks, key):
+    # 同名區塊（例如重複定義）依出現順序加上編號
+    candidate, n = key, 2
+    while candidate in blocks:
+        candidate = f'{key} #{n}'
+        n += 1
+    return candidate
+
+
+def parse_dbml(text):
+    """
+    將 DBML 拆成頂層區塊
+
+    回傳：
+        dict: {'Table User': 正規化後的區塊內容, 'Ref: ...': ..., ...}（保留原順序）
+    """
+    text = text or ''
+    blocks = {}
+    chunk, depth, quote = [], 0, None
+
+    def flush():
+        body = _normalize(''.join(chunk))
+        chunk.clear()
+        if not body:
+            return
+        words = body.split('{', 1)[0].replace(':', ' ').split()
+        if words[0].lower() == 'ref' or len(words) < 2:
+            key = body
+        else:
+            key = f'{words[0]} {words[1].strip(_QUOTES)}'
+        blocks[_unique_key(blocks, key)] = body
+
+    # 註解在同一個掃描迴圈中略過，字串內的 // 與 /* */ 屬於內容
+    i, length = 0, len(text)
+    while i < length:
+        char = text[i]
+        if not quote and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = length if end < 0 else end + 2
+            continue
+        if (not quote and text.startswith('//', i)
+                and (i == 0 or text[i - 1].isspace())):
+            end = text.find('\n', i)
+            i = length if end < 0 else end
+            continue
+        i += 1
+        chunk.append(char)
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in _QUOTES:
+            quote = char
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth = max(depth - 1, 0)
+            if depth == 0:
+                flush()
+        elif char == '\n' and depth == 0:
+            flush()
+    flush()
+    return blocks
+
+
+def parse_gherkin(text):
+    """
+    將 Gherkin 依 Feature 拆成區塊（Feature 前的 @tag 歸入該 Feature）
+
+    回傳：
+        dict: {'Feature: 登入': 正規化後的內容, ...}
+    """
+    blocks = {}
+    key, lines, pending = '', [], []
+
+    def flush():
+        if lines:
+            blocks[_unique_key(blocks, key)] = '\n'.join(lines)
+
+    for raw in (text or '').splitlines():
+        line = _normalize(raw)
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('@'):
+            pending.append(line)
+            continue
+        if re.match(r'^(Feature|功能)\s*:', line, re.I):
+            flush()
+            key, lines = _normalize(line), []
+        lines.extend(pending)
+        pending.clear()
+        lines.append(line)
+    lines.extend(pending)
+    flush()
+    return blocks
+
+
+def dbml_outline(blocks):
+    """資料實體清單（Table / Enum / TableGroup / Project 名稱）"""
+    return [
+        key for key in blocks
+        if key.split(' ', 1)[0].lower() in _OUTLINE_KINDS
+    ]
+
+
+def gherkin_outline(blocks):
+    """Feature / Rule / Scenario 標題清單"""
+    return [
+        line for body in blocks.values() for line in body.split('\n')
+        if _GHERKIN_TITLE.match(line)
+    ]
+
+
+def spec_facets(dbml, gherkin):
+    """
+    計算提示詞使用的四個規格面向
+
+    回傳：
+        dict: {'dbml', 'dbml_outline', 'gherkin', 'gherkin_outline'} -> 正規化文字
+    """
+    dbml_blocks = parse_dbml(dbml)
+    gherkin_blocks = parse_gherkin(gherkin)
+    return {
+        'dbml': '\n'.join(dbml_blocks.values()),
+        'dbml_outline': '\n'.join(dbml_outline(dbml_blocks)),
+        'gherkin': '\n'.join(gherkin_blocks.values()),
+        'gherkin_outline': '\n'.join(gherkin_outline(gherkin_blocks)),
+    }
+
+
+def section_fingerprints(dbml, gherkin):
+    """各區段相依內容的雜湊；雜湊相同代表該區段的提示詞輸入未變"""
+    facets = spec_facets(dbml, gherkin)
+    fingerprints = {}
+    for section, names in SECTION_DEPENDENCIES.items():
+        digest = hashlib.sha256()
+        for name in names:
+            digest.update(name.encode())
+            digest.update(b'\0')
+            digest.update(facets[name].encode())
+            digest.update(b'\0')
+        fingerprints[section] = digest.hexdigest()
+    return fingerprints
+
+
+def diff_blocks(old, new):
+    """
+    比對兩組區塊
+
+    回傳：
+        dict: {'added': [...], 'removed': [...], 'changed': [...]}（區塊名稱）
+    """
+    return {
+        'added': [key for key in new if key not in old],
+        'removed': [key for key in old if key not in new],
+        'changed': [key for key in new if key in old and old[key] != new[key]],
+    }
+
+
+def diff_spec(old_dbml, old_gherkin, new_dbml, new_gherkin):
+    """
+    比對前後兩版規格
+
+    回傳：
+        dict: {
+            'dbml': Table 層級差異,
+            'gherkin': Feature 層級差異,
+            'sections': 需要重新生成的區段,
+        }
+    """
+    old = section_fingerprints(old_dbml, old_gherkin)
+    new = section_fingerprints(new_dbml, new_gherkin)
+    return {
+        'dbml': diff_blocks(parse_dbml(old_dbml), parse_dbml(new_dbml)),
+        'gherkin': diff_blocks(
+            parse_gherkin(old_gherkin), parse_gherkin(new_gherkin)
+        ),
+        'sections': [section for section in new if old[section] != new[section]],
+    }
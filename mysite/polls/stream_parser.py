@@ -0,0 +1,169 @@
+"""
+規格文件串流解析器
+逐段接收 AI 回應的 token，即時辨識「==== 章節 ====」標題與
+```dbml / ```mermaid / ```gherkin 等程式碼區塊，並在章節完成時送出事件
+"""
+
+
+def _is_section_header(stripped):
+    return stripped.startswith('====') and stripped.endswith('====')
+
+
+class SpecStreamParser:
+    """
+    增量式章節解析器
+
+    每次 feed() 回傳這段輸入所完成的事件（dict，'event' 為事件類型）：
+        section_start {section}：遇到章節標題
+        code_block_start {section, language}：程式碼區塊開始
+        code_block {section, language, content}：程式碼區塊完成
+        section_end {section, content, code_blocks}：章節完成
+        token {section, text}：原始文字（僅 tokens=True 時送出）
+
+    標題與程式碼圍欄只在收到完整一行後判斷；
+    章節標題會結束未閉合的程式碼區塊，避免模型漏寫 ``` 時吞掉後續章節。
+
+    tokens=True 時文字會在標題處切開：標題行與其後的文字歸入新章節，
+    可能成為標題的行（以「=」開頭）會暫緩到整行收齊才送出。
+
+    使用方式：
+        parser = SpecStreamParser()
+        for chunk in stream_ollama_api(prompt, user_input):
+            for event in parser.feed(chunk):
+                handle(event)
+        for event in parser.close():
+            handle(event)
+        sections = parser.sections
+    """
+
+    def __init__(self, tokens=False):
+        self.tokens = tokens
+        self.section = None
+        self.sections = {}
+        self._buffer = ''
+        self._lines = []
+        self._code_blocks = []
+        self._fence_language = None
+        self._fence_lines = None
+        # 目前這行已經以 token 送出的長度
+        self._emitted = 0
+
+    @property
+    def in_code_block(self):
+        return self._fence_lines is not None
+
+    def feed(self, chunk):
+        """輸入一段文字，回傳因此完成的事件"""
+        events = []
+        while chunk:
+            head, newline, chunk = chunk.partition('\n')
+            if not newline:
+                self._buffer += head
+                events.extend(self._partial_token())
+                break
+            line, self._buffer = self._buffer + head, ''
+            events.extend(self._complete_line(line, newline))
+        return events
+
+    def close(self):
+        """輸入結束，處理剩餘的文字並結束目前章節"""
+        events = []
+        if self._buffer:
+            line, self._buffer = self._buffer, ''
+            events.extend(self._complete_line(line, ''))
+        if self.in_code_block:
+            # 未閉合的程式碼區塊仍以現有內容送出
+            events.append(self._finish_code_block())
+        events.extend(self._finish_section())
+        return events
+
+    def _token(self, text):
+        if not self.tokens or not text:
+            return []
+        return [{'event': 'token', 'section': self.section, 'text': text}]
+
+    def _partial_token(self):
+        # 尚未收齊的一行：可能是標題時先保留，否則立即送出
+        if '===='.startswith(self._buffer.lstrip()[:4]):
+            return []
+        text = self._buffer[self._emitted:]
+        self._emitted = len(self._buffer)
+        return self._token(text)
+
+    def _complete_line(self, line, ending):
+        text = (line + ending)[self._emitted:]
+        self._emitted = 0
+        if _is_section_header(line.strip()):
+            # 標題行歸入新章節
+            events = self._process_line(line)
+            return events + self._token(text)
+        return self._token(text) + self._process_line(line)
+
+    def _process_line(self, line):
+        stripped = line.strip()
+
+        if _is_section_header(stripped):
+            events = []
+            if self.in_code_block:
+                events.append(self._finish_code_block())
+            events.extend(self._finish_section())
+            self.section = stripped.replace('=', '').strip()
+            self._lines = []
+            self._code_blocks = []
+            events.append({'event': 'section_start', 'section': self.section})
+            return events
+
+        if self.in_code_block:
+            if stripped == '```':
+                self._lines.append(line)
+                return [self._finish_code_block()]
+            self._fence_lines.append(line)
+            self._lines.append(line)
+            return []
+
+        self._lines.append(line)
+        if stripped.startswith('```'):
+            self._fence_language = stripped[3:].strip() or None
+            self._fence_lines = []
+            return [{
+                'event': 'code_block_start',
+                'section': self.section,
+                'language': self._fence_language,
+            }]
+        return []
+
+    def _finish_code_block(self):
+        block = {
+            'language': self._fence_language,
+            'content': '\n'.join(self._fence_lines),
+        }
+        self._fence_language = None
+        self._fence_lines = None
+        if self.section:
+            self._code_blocks.append(block)
+        return dict(block, event='code_block', section=self.section)
+
+    def _finish_section(self):
+        if not self.section:
+            return []
+        content = '\n'.join(self._lines).strip()
+        self.sections[self.section] = content
+        return [{
+            'event': 'section_end',
+            'section': self.section,
+            'content': content,
+            'code_blocks': list(self._code_blocks),
+        }]
+
+
+def parse_spec_sections(text):
+    """
+    一次解析完整的 AI 回應
+
+    回傳：
+        dict: {章節名稱: 章節內容}
+    """
+    parser = SpecStreamParser()
+    parser.feed(text)
+    parser.close()
+    return parser.sections
@@ -47,8 +47,12 @@ class APITests(TestCase):
         self.assertIn('error', response.json())
 
     def test_retry_ai_success(self):
+        from polls.models import GenerationJob
+        job = GenerationJob.objects.create(
+            kind='formulation', status=GenerationJob.STATUS_FAILED
+        )
         url = reverse('retry_ai_api')
-        data = {'task_id': 1}
+        data = {'task_id': job.id}
         response = self.client.post(url, data, content_type='application/json')
         self.assertEqual(response.status_code, 200)
         result = response.json()
@@ -8,6 +8,21 @@ from django.urls import reverse
 from unittest.mock import patch, MagicMock
 
 
+def prompt_router(responses):
+    """
+    依提示詞中的關鍵字回傳對應的模擬回應
+    （區段改為並行生成後，呼叫順序不再固定）
+    """
+    def side_effect(prompt, user_input, **kwargs):
+        for keyword, response in responses.items():
+            if keyword in prompt:
+                if isinstance(response, Exception):
+                    raise response
+                return response
+        raise AssertionError(f'未預期的提示詞：{prompt[:40]}')
+    return side_effect
+
+
 class FormulationAPITest(TestCase):
     """測試 Formulation API"""
     
@@ -21,13 +36,13 @@ class FormulationAPITest(TestCase):
 訂單必須記錄客人資訊、訂購時間、總額。
 """
     
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_formulation_success(self, mock_ollama):
         """測試成功的 Formulation 請求"""
         # Mock Ollama API 返回
-        mock_ollama.side_effect = [
+        mock_ollama.side_effect = prompt_router({
             # DBML 返回
-            """Table MenuItem {
+            '輸出為 DBML 格式': """Table MenuItem {
   id int [pk]
   name string [note: "菜品名稱"]
   price float [note: "價格，必須 >= 0"]
@@ -45,7 +60,7 @@ Table Order {
   Note: "訂單實體"
 }""",
             # Gherkin 返回
-            """Feature: 瀏覽菜單
+            '輸出為 Gherkin 格式': """Feature: 瀏覽菜單
 
   Rule: 客人可以查看所有菜品
     Example: 成功瀏覽菜單
@@ -60,7 +75,7 @@ Feature: 將菜品加入訂單
       Given 菜品「宮保雞丁」存在於菜單中
       When 客人將「宮保雞丁」加入訂單
       Then 訂單中包含「宮保雞丁」"""
-        ]
+        })
         
         # 發送請求
         response = self.client.post(
@@ -78,6 +93,46 @@ Feature: 將菜品加入訂單
         self.assertIn('Feature: 瀏覽菜單', data['gherkin'])
         self.assertIn('Feature: 將菜品加入訂單', data['gherkin'])
         
+    @patch('polls.api_utils.acall_ollama_api')
+    def test_formulation_partial_failure(self, mock_ollama):
+        """測試單一產物失敗時仍回傳另一個產物"""
+        mock_ollama.side_effect = prompt_router({
+            '輸出為 DBML 格式': "Table Test {\n  id int\n}",
+            '輸出為 Gherkin 格式': Exception("gherkin service error"),
+        })
+        
+        response = self.client.post(
+            self.url,
+            data=json.dumps({'spec_text': self.test_spec}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue(data['success'])
+        self.assertTrue(data['partial'])
+        self.assertIn('Table Test', data['dbml'])
+        self.assertEqual(data['gherkin'], '')
+        self.assertIn('gherkin service error', data['errors']['gherkin'])
+        self.assertNotIn('dbml', data['errors'])
+    
+    @patch('polls.api_utils.acall_ollama_api')
+    def test_formulation_all_failed(self, mock_ollama):
+        """測試兩個產物都失敗時回傳 500"""
+        mock_ollama.side_effect = Exception("AI service error")
+        
+        response = self.client.post(
+            self.url,
+            data=json.dumps({'spec_text': self.test_spec}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 500)
+        data = json.loads(response.content)
+        self.assertFalse(data['success'])
+        self.assertIn('dbml', data['errors'])
+        self.assertIn('gherkin', data['errors'])
+        
     def test_formulation_missing_spec_text(self):
         """測試缺少 spec_text 參數"""
         response = self.client.post(
@@ -108,20 +163,20 @@ Feature: 將菜品加入訂單
         
         self.assertEqual(response.status_code, 405)
         
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_formulation_removes_code_blocks(self, mock_ollama):
         """測試自動移除 markdown code block 標記"""
         # Mock 返回包含 code block 標記的內容
-        mock_ollama.side_effect = [
-            """```dbml
+        mock_ollama.side_effect = prompt_router({
+            '輸出為 DBML 格式': """```dbml
 Table Test {
   id int
 }
 ```""",
-            """```gherkin
+            '輸出為 Gherkin 格式': """```gherkin
 Feature: Test
 ```"""
-        ]
+        })
         
         response = self.client.post(
             self.url,
@@ -153,7 +208,7 @@ class DiscoveryAPITest(TestCase):
   Rule: 客人可以查看所有菜品
     #TODO"""
     
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_discovery_success(self, mock_ollama):
         """測試成功的 Discovery 請求"""
         # Mock Ollama API 返回釐清項目
@@ -221,7 +276,7 @@ class DiscoveryAPITest(TestCase):
         
         self.assertEqual(response.status_code, 400)
         
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_discovery_empty_result(self, mock_ollama):
         """測試無釐清項目的情況"""
         # Mock 返回空陣列
@@ -241,7 +296,7 @@ class DiscoveryAPITest(TestCase):
         self.assertEqual(len(data['items']), 0)
         self.assertEqual(data['statistics']['total'], 0)
         
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_discovery_invalid_json_response(self, mock_ollama):
         """測試 AI 返回無效 JSON 的處理"""
         # Mock 返回無效 JSON
@@ -279,20 +334,20 @@ class IntegrationTest(TestCase):
 每個待辦事項有標題、描述、狀態(待辦/完成)。
 """
     
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_formulation_to_discovery_workflow(self, mock_ollama):
         """測試 Formulation → Discovery 完整流程"""
         # 第一階段: Formulation
-        mock_ollama.side_effect = [
+        mock_ollama.side_effect = prompt_router({
             # DBML
-            """Table TodoItem {
+            '輸出為 DBML 格式': """Table TodoItem {
   id int [pk]
   title string [note: "標題"]
   description string [note: "描述"]
   status string [note: "狀態：待辦或完成"]
 }""",
             # Gherkin
-            """Feature: 管理待辦事項
+            '輸出為 Gherkin 格式': """Feature: 管理待辦事項
 
   Rule: 用戶可以新增待辦事項
     Example: 成功新增
@@ -300,7 +355,7 @@ class IntegrationTest(TestCase):
       When 用戶新增待辦事項「買菜」
       Then 系統建立新的待辦事項""",
             # Discovery 結果
-            json.dumps([
+            '規格品質檢查專家': json.dumps([
                 {
                     "id": 1,
                     "priority": "High",
@@ -313,7 +368,7 @@ class IntegrationTest(TestCase):
                     ]
                 }
             ])
-        ]
+        })
         
         # Step 1: Formulation
         formulation_response = self.client.post(
@@ -368,22 +423,22 @@ class CompleteResultAPITest(TestCase):
       When 用戶使用 "test@example.com" 註冊
       Then 註冊成功"""
     
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_generate_complete_result_success(self, mock_ollama):
         """測試成功生成完整結果"""
         # Mock AI 返回不同部分的內容
-        mock_ollama.side_effect = [
+        mock_ollama.side_effect = prompt_router({
             # 背景說明
-            "本系統是一個用戶管理平台，提供用戶註冊和登入功能。",
+            '技術文件撰寫專家': "本系統是一個用戶管理平台，提供用戶註冊和登入功能。",
             # 專案目標
-            "1. 實現用戶註冊功能\n2. 確保電子郵件唯一性\n3. 提供基本的用戶管理",
+            '產品經理': "1. 實現用戶註冊功能\n2. 確保電子郵件唯一性\n3. 提供基本的用戶管理",
             # 流程圖 (Mermaid)
-            """graph LR
+            '流程圖設計專家': """graph LR
     A[用戶輸入資料] --> B{檢查郵件}
     B -->|唯一| C[註冊成功]
     B -->|重複| D[顯示錯誤]""",
             # API 規格
-            """### POST /api/users/register
+            'API 設計專家': """### POST /api/users/register
 **描述**: 註冊新用戶
 **請求參數**:
 - name (string): 用戶名稱
@@ -391,7 +446,7 @@ class CompleteResultAPITest(TestCase):
 **回應**:
 - 200: 註冊成功
 - 400: 郵件已存在"""
-        ]
+        })
         
         response = self.client.post(
             self.url,
@@ -421,7 +476,7 @@ class CompleteResultAPITest(TestCase):
         # 驗證流程圖包含 Mermaid 語法
         self.assertIn('graph', data['flowchart'])
     
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_generate_complete_result_missing_parameters(self, mock_ollama):
         """測試缺少必要參數"""
         # 缺少 gherkin
@@ -436,7 +491,7 @@ class CompleteResultAPITest(TestCase):
         self.assertFalse(data['success'])
         self.assertIn('error', data)
     
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_generate_complete_result_ai_error(self, mock_ollama):
         """測試 AI 呼叫失敗"""
         mock_ollama.side_effect = Exception("AI service error")
@@ -455,6 +510,63 @@ class CompleteResultAPITest(TestCase):
         self.assertFalse(data['success'])
         self.assertIn('error', data)
     
+    @patch('polls.api_utils.acall_ollama_api')
+    def test_generate_complete_result_partial_failure(self, mock_ollama):
+        """測試單一區段失敗時回傳其他區段"""
+        mock_ollama.side_effect = prompt_router({
+            '技術文件撰寫專家': "背景",
+            '產品經理': "1. 目標",
+            '流程圖設計專家': Exception("flowchart timeout"),
+            'API 設計專家': "POST /api/users",
+        })
+        
+        response = self.client.post(
+            self.url,
+            data=json.dumps({
+                'dbml': self.test_dbml,
+                'gherkin': self.test_gherkin
+            }),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue(data['success'])
+        self.assertTrue(data['partial'])
+        self.assertIn('flowchart', data['errors'])
+        self.assertEqual(data['flowchart'], '')
+        self.assertEqual(data['background'], '背景')
+        self.assertEqual(data['api_spec'], 'POST /api/users')
+    
+    @patch('polls.api_utils.acall_ollama_api')
+    def test_generate_complete_result_section_timeout(self, mock_ollama):
+        """測試區段逾時以部分結果回傳"""
+        import asyncio
+        
+        async def slow_flowchart(prompt, user_input, **kwargs):
+            if '流程圖設計專家' in prompt:
+                await asyncio.sleep(5)
+                return "graph TD"
+            return "內容"
+        
+        mock_ollama.side_effect = slow_flowchart
+        
+        with self.settings(LLM_SECTION_TIMEOUT=0.2):
+            response = self.client.post(
+                self.url,
+                data=json.dumps({
+                    'dbml': self.test_dbml,
+                    'gherkin': self.test_gherkin
+                }),
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue(data['partial'])
+        self.assertIn('flowchart', data['errors'])
+        self.assertEqual(data['goals'], '內容')
+    
     def test_generate_complete_result_method_not_allowed(self):
         """測試不支援的 HTTP 方法"""
         response = self.client.get(self.url)
@@ -472,12 +584,12 @@ class CompleteResultIntegrationTest(TestCase):
 每篇文章有標題、內容、作者、發布時間。
 """
     
-    @patch('polls.api_utils.call_ollama_api')
+    @patch('polls.api_utils.acall_ollama_api')
     def test_full_workflow(self, mock_ollama):
         """測試從 Formulation 到完整結果的完整流程"""
-        mock_ollama.side_effect = [
+        mock_ollama.side_effect = prompt_router({
             # Formulation: DBML
-            """Table Article {
+            '輸出為 DBML 格式': """Table Article {
   id int [pk]
   title string [note: "標題"]
   content string [note: "內容"]
@@ -485,23 +597,23 @@ class CompleteResultIntegrationTest(TestCase):
   publish_time string [note: "發布時間"]
 }""",
             # Formulation: Gherkin
-            """Feature: 發表文章
+            '輸出為 Gherkin 格式': """Feature: 發表文章
   Rule: 標題不可為空
     Example: 成功發表
       Given 用戶已登入
       When 用戶填寫標題和內容
       Then 文章發表成功""",
             # Discovery
-            json.dumps([{"id": 1, "priority": "High", "location": "Article", "question": "測試", "options": []}]),
+            '規格品質檢查專家': json.dumps([{"id": 1, "priority": "High", "location": "Article", "question": "測試", "options": []}]),
             # Complete Result: 背景
-            "部落格系統用於內容發布和互動。",
+            '技術文件撰寫專家': "部落格系統用於內容發布和互動。",
             # Complete Result: 目標
-            "1. 發表文章\n2. 管理留言",
+            '產品經理': "1. 發表文章\n2. 管理留言",
             # Complete Result: 流程圖
-            "graph TD\nA[開始] --> B[結束]",
+            '流程圖設計專家': "graph TD\nA[開始] --> B[結束]",
             # Complete Result: API
-            "POST /api/articles"
-        ]
+            'API 設計專家': "POST /api/articles"
+        })
         
         # Step 1: Formulation
         formulation_response = self.client.post(
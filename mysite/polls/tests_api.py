@@ -45,7 +45,11 @@ class APISpecificationTest(TestCase):
         self.assertIsNotNone(result["error"])
 
     def test_retry_ai_success(self):
-        data = {"task_id": 1}
+        from polls.models import GenerationJob
+        job = GenerationJob.objects.create(
+            kind="discovery", status=GenerationJob.STATUS_FAILED
+        )
+        data = {"task_id": job.id}
         response = self.client.post(
             "/polls/retry-ai/",
             data=json.dumps(data),
@@ -67,13 +71,13 @@ class APISpecificationTest(TestCase):
         result = response.json()
         self.assertIsNotNone(result["error"])
 
-    def test_retry_ai_service_error(self):
+    def test_retry_ai_invalid_task_id(self):
         data = {"task_id": -1}
         response = self.client.post(
             "/polls/retry-ai/",
             data=json.dumps(data),
             content_type="application/json"
         )
-        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.status_code, 400)
         result = response.json()
         self.assertIsNotNone(result["error"])
@@ -0,0 +1,241 @@
+"""
+批次 CRUD API 測試
+"""
+import json
+
+from django.test import TestCase, Client, override_settings
+
+from polls.models import (
+    CategoryMemory, ChatSession, Order, SentenceDatabase, SentenceLSHBucket,
+    User, VectorIndexOutbox,
+)
+from polls.query_budget import QueryBudgetTestMixin
+
+
+class BulkAPITestCase(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def send(self, method, url, payload):
+        return getattr(self.client, method)(
+            url, data=json.dumps(payload), content_type='application/json'
+        )
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+)
+class UserBulkTest(BulkAPITestCase):
+    def test_create_hashes_passwords(self):
+        response = self.send('post', '/polls/user/bulk/', {'items': [
+            {'username': f'u{i}', 'email': f'u{i}@example.com', 'password': 'pw'}
+            for i in range(5)
+        ]})
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual(data['created'], 5)
+        self.assertEqual(len(data['ids']), 5)
+        self.assertIn('rows_per_second', data)
+        for user in User.objects.all():
+            self.assertNotEqual(user.password, 'pw')
+
+    def test_invalid_row_rolls_back_everything(self):
+        User.objects.bulk_create([User(username='taken', email='t@example.com')])
+        response = self.send('post', '/polls/user/bulk/', {'items': [
+            {'username': 'ok', 'email': 'ok@example.com', 'password': 'pw'},
+            {'username': 'taken', 'email': 'new@example.com', 'password': 'pw'},
+            {'username': 'nopw', 'email': 'nopw@example.com'},
+            {'username': 'ok', 'email': 'ok2@example.com', 'password': 'pw'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        errors = {e['index']: e['error'] for e in response.json()['errors']}
+        self.assertEqual(set(errors), {1, 2, 3})
+        self.assertIn('已存在', errors[1])
+        self.assertIn('password', errors[2])
+        self.assertIn('重複', errors[3])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_partial_writes_valid_rows(self):
+        response = self.send('post', '/polls/user/bulk/', {
+            'partial': True,
+            'items': [
+                {'username': 'a', 'email': 'a@example.com', 'password': 'pw'},
+                {'username': 'b', 'email': 'not-an-email', 'password': 'pw'},
+                {'username': 'c', 'email': 'c@example.com', 'password': 'pw',
+                 'role': 'admin'},
+            ],
+        })
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([e['index'] for e in data['errors']], [1, 2])
+        self.assertEqual(
+            list(User.objects.values_list('username', flat=True)), ['a']
+        )
+
+
+class OrderBulkTest(BulkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(3)
+        ])
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+
+    def items(self, count):
+        return [
+            {'user_id': self.user_ids[i % 3], 'product_name': f'p{i}',
+             'amount': i + 1}
+            for i in range(count)
+        ]
+
+    def test_create_query_count_does_not_grow(self):
+        # SQLite 每個 INSERT 的參數有上限，150 筆仍在同一個 INSERT 內
+        with self.assertMaxQueries(8) as small:
+            self.send('post', '/polls/order/bulk/', {'items': self.items(5)})
+        with self.assertMaxQueries(small.count):
+            response = self.send(
+                'post', '/polls/order/bulk/', {'items': self.items(150)}
+            )
+        self.assertEqual(response.json()['created'], 150)
+        self.assertEqual(Order.objects.count(), 155)
+
+    def test_missing_user(self):
+        response = self.send('post', '/polls/order/bulk/', {'items': [
+            {'user_id': 999999, 'product_name': 'x', 'amount': 1},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('User not found', response.json()['errors'][0]['error'])
+
+    def test_update_and_delete(self):
+        self.send('post', '/polls/order/bulk/', {'items': self.items(4)})
+        ids = sorted(Order.objects.values_list('id', flat=True))
+        response = self.send('put', '/polls/order/bulk/', {'items': [
+            {'id': ids[0], 'status': 'completed'},
+            {'id': ids[1], 'amount': 42},
+        ]})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(Order.objects.get(id=ids[0]).status, 'completed')
+        self.assertEqual(Order.objects.get(id=ids[1]).amount, 42)
+        self.assertEqual(Order.objects.get(id=ids[1]).status, 'pending')
+
+        response = self.send('put', '/polls/order/bulk/', {'items': [
+            {'id': ids[0], 'amount': 0},
+            {'id': 999999, 'amount': 1},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([e['id'] for e in errors], [ids[0], 999999])
+
+        response = self.send(
+            'delete', '/polls/order/bulk/', {'ids': ids[:2] + [999999]}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['deleted'], 2)
+        self.assertEqual(data['not_found'], [999999])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_request_validation(self):
+        self.assertEqual(self.client.get('/polls/order/bulk/').status_code, 405)
+        self.assertEqual(
+            self.send('post', '/polls/order/bulk/', {'items': []}).status_code,
+            400
+        )
+        with override_settings(BULK_MAX_ITEMS=2):
+            response = self.send(
+                'post', '/polls/order/bulk/', {'items': self.items(3)}
+            )
+        self.assertEqual(response.status_code, 400)
+
+
+class SentenceBulkTest(BulkAPITestCase):
+    def test_create_writes_signatures_buckets_and_outbox(self):
+        response = self.send('post', '/polls/sentence-db/bulk/', {'items': [
+            {'user': 'u', 'sentence': '使用者可以登入系統並查看訂單',
+             'category': 'a', 'embedding': [0.1, 0.2]},
+            {'user': 'u', 'sentence': '使用者可以登入系統並查看訂單紀錄'},
+        ]})
+        self.assertEqual(response.status_code, 201, response.content)
+        ids = response.json()['ids']
+        for item in SentenceDatabase.objects.filter(id__in=ids):
+            self.assertIsNotNone(item.minhash)
+        self.assertTrue(
+            SentenceLSHBucket.objects.filter(sentence_id=ids[1]).exists()
+        )
+        self.assertEqual(
+            sorted(VectorIndexOutbox.objects.filter(
+                index_name='kb', action='upsert'
+            ).values_list('object_id', flat=True)),
+            sorted(ids)
+        )
+
+        from polls.minhash import find_near_duplicates
+
+        matches = find_near_duplicates(
+            '使用者可以登入系統並查看訂單', exclude_id=ids[0]
+        )
+        self.assertEqual([m['id'] for m in matches], [ids[1]])
+
+    def test_update_sentence_rewrites_buckets(self):
+        item = SentenceDatabase.objects.create(user='u', sentence='第一個句子')
+        old_buckets = set(item.lsh_buckets.values_list('bucket', flat=True))
+        VectorIndexOutbox.objects.all().delete()
+        response = self.send('put', '/polls/sentence-db/bulk/', {'items': [
+            {'id': item.id, 'sentence': '完全不同的另一段內容'},
+        ]})
+        self.assertEqual(response.status_code, 200, response.content)
+        item.refresh_from_db()
+        new_buckets = set(item.lsh_buckets.values_list('bucket', flat=True))
+        self.assertTrue(new_buckets)
+        self.assertFalse(old_buckets & new_buckets)
+        self.assertEqual(VectorIndexOutbox.objects.count(), 1)
+
+    def test_delete_records_outbox_once(self):
+        SentenceDatabase.objects.create(user='u', sentence='句子一')
+        SentenceDatabase.objects.create(user='u', sentence='句子二')
+        ids = list(SentenceDatabase.objects.values_list('id', flat=True))
+        VectorIndexOutbox.objects.all().delete()
+        response = self.send('delete', '/polls/sentence-db/bulk/', {'ids': ids})
+        self.assertEqual(response.json()['deleted'], 2)
+        self.assertFalse(SentenceLSHBucket.objects.exists())
+        self.assertEqual(
+            sorted(VectorIndexOutbox.objects.filter(
+                action='delete'
+            ).values_list('object_id', flat=True)),
+            sorted(ids)
+        )
+
+
+class OtherResourcesBulkTest(BulkAPITestCase):
+    def test_category_memory_unique_together(self):
+        CategoryMemory.objects.create(configuration_item='a', category='x')
+        response = self.send('post', '/polls/category-memory/bulk/', {
+            'partial': True,
+            'items': [
+                {'configuration_item': ' a ', 'category': 'x'},
+                {'configuration_item': 'a', 'category': 'y'},
+                {'configuration_item': '', 'category': 'z'},
+            ],
+        })
+        data = response.json()
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([e['index'] for e in data['errors']], [0, 2])
+
+    def test_chat_session_update_by_session_id(self):
+        ChatSession.objects.create(session_id='s1', title='old', messages=[])
+        response = self.send('put', '/polls/chat-session/bulk/', {'items': [
+            {'session_id': 's1', 'title': 'new',
+             'messages': [{'role': 'user', 'content': 'hi'}]},
+        ]})
+        self.assertEqual(response.status_code, 200, response.content)
+        session = ChatSession.objects.get(session_id='s1')
+        self.assertEqual(session.title, 'new')
+        self.assertEqual(len(session.messages), 1)
+
+        response = self.send('put', '/polls/chat-session/bulk/', {'items': [
+            {'session_id': 's1', 'messages': [{'role': 'bot', 'content': ''}]},
+        ]})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,224 @@
+"""
+批次語意向量編碼測試
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+
+from polls import embeddings
+from polls.api_utils import calculate_sentence_similarity
+from polls.caching import MemoryLRUCache, SQLiteCache, TieredCache
+from polls.embeddings import (
+    EmbeddingBatcher, EmbeddingCache, encode_sentences,
+    backfill_sentence_embeddings
+)
+from polls.models import SentenceDatabase
+from polls.vectors import vector_to_list
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, sentences, batch_size=32):
+        self.calls.append(list(sentences))
+        return [[float(len(s)), 1.0] for s in sentences]
+
+
+@override_settings(EMBEDDING_BATCH_SIZE=2, EMBEDDING_CACHE_ENABLED=False)
+class EncodeSentencesTest(TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+        patcher = patch(
+            'polls.api_utils.get_sentence_transformer_model',
+            return_value=self.model
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_dedupes_and_batches(self):
+        vectors = encode_sentences(['a', 'bb', 'a', 'ccc', 'bb'])
+        self.assertEqual(
+            [vector_to_list(v) for v in vectors],
+            [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+        )
+        self.assertEqual(self.model.calls, [['a', 'bb'], ['ccc']])
+
+    def test_empty_input(self):
+        self.assertEqual(encode_sentences([]), [])
+        self.assertEqual(self.model.calls, [])
+
+    def test_backfill_writes_in_bulk(self):
+        for text in ['a', 'bb', 'ccc']:
+            SentenceDatabase.objects.create(sentence=text)
+        SentenceDatabase.objects.create(sentence='done', embedding=[9.0])
+        SentenceDatabase.objects.create(sentence='', embedding=[])
+
+        progress = []
+        updated = backfill_sentence_embeddings(progress=progress.append)
+
+        self.assertEqual(updated, 4)
+        self.assertEqual(progress, [2, 4])
+        self.assertEqual(vector_to_list(
+            SentenceDatabase.objects.get(sentence='ccc').embedding
+        ), [3.0, 1.0])
+        self.assertEqual(vector_to_list(
+            SentenceDatabase.objects.get(sentence='done').embedding
+        ), [9.0])
+
+    def test_backfill_command(self):
+        SentenceDatabase.objects.create(sentence='abcd')
+        out = StringIO()
+        call_command('backfill_embeddings', '--all', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(
+            vector_to_list(SentenceDatabase.objects.get().embedding), [4.0, 1.0]
+        )
+
+
+class EmbeddingBatcherTest(TestCase):
+    def test_concurrent_requests_coalesced(self):
+        calls = []
+        gate = threading.Barrier(4)
+
+        def encode_fn(sentences):
+            calls.append(list(sentences))
+            return [[float(len(s))] for s in sentences]
+
+        batcher = EmbeddingBatcher(encode_fn, batch_size=100, max_wait=0.2)
+        results = {}
+
+        def worker(text):
+            gate.wait()
+            results[text] = batcher.encode([text, text * 2])
+
+        threads = [
+            threading.Thread(target=worker, args=(t,))
+            for t in ['a', 'b', 'c', 'd']
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results['c'], [[1.0], [2.0]])
+        self.assertLess(len(calls), 4)
+        self.assertEqual(sum(len(c) for c in calls), 8)
+
+    def test_error_propagates_to_callers(self):
+        def encode_fn(sentences):
+            raise RuntimeError('model down')
+
+        batcher = EmbeddingBatcher(encode_fn, max_wait=0)
+        with self.assertRaises(RuntimeError):
+            batcher.encode(['a'], timeout=5)
+
+
+@override_settings(EMBEDDING_CACHE_ENABLED=False)
+class SentenceDBEncodeAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = '/polls/sentence-db/encode/'
+
+    def post(self, payload):
+        return self.client.post(
+            self.url, data=json.dumps(payload), content_type='application/json'
+        )
+
+    @patch('polls.embeddings.get_embedding_batcher')
+    def test_encode_sentences(self, mock_batcher):
+        mock_batcher.return_value.encode.return_value = [[1.0], [1.0]]
+        response = self.post({'sentences': ['a', 'a']})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['unique'], 1)
+
+    @patch(
+        'polls.api_utils.get_sentence_transformer_model',
+        return_value=FakeModel()
+    )
+    def test_reencode_ids(self, _):
+        item = SentenceDatabase.objects.create(sentence='xyz', embedding=[0.0])
+        response = self.post({'ids': [item.id]})
+        self.assertEqual(response.json()['updated'], 1)
+        item.refresh_from_db()
+        self.assertEqual(vector_to_list(item.embedding), [3.0, 1.0])
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.post({'sentences': 'abc'}).status_code, 400)
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+@override_settings(EMBEDDING_CACHE_ENABLED=True, SENTENCE_TRANSFORMER_MODEL='m1')
+class EmbeddingCacheTest(TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+        self.cache = EmbeddingCache(MemoryLRUCache())
+        for patcher in (
+            patch('polls.api_utils.get_sentence_transformer_model',
+                  return_value=self.model),
+            patch.object(embeddings, '_embedding_cache', self.cache),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cached_sentences_skip_model(self):
+        encode_sentences(['使用者可以登入系統', 'ab'])
+        vectors = encode_sentences(['使用者可以登入系統', 'abc'])
+        self.assertEqual(self.model.calls, [['使用者可以登入系統', 'ab'], ['abc']])
+        self.assertEqual(vector_to_list(vectors[0]), [9.0, 1.0])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+
+    def test_normalized_text_shares_entry(self):
+        vectors = encode_sentences([
+            '使用者可以登入系統', ' 使用者可以登入系統\n', '使用者可以登入系統\u3000'
+        ])
+        self.assertEqual(len(self.model.calls[0]), 1)
+        self.assertEqual(len(vectors), 3)
+
+    def test_model_change_invalidates(self):
+        encode_sentences(['a'])
+        encode_sentences(['a'], model_name='m2')
+        self.assertEqual(len(self.model.calls), 2)
+        with override_settings(SENTENCE_TRANSFORMER_MODEL='m2'):
+            encode_sentences(['a'])
+        self.assertEqual(len(self.model.calls), 3)
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+    def test_sqlite_tier_survives_restart(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, 'embeddings.sqlite3')
+
+        def new_cache():
+            backend = SQLiteCache(path, table='embeddings')
+            self.addCleanup(backend.close)
+            return EmbeddingCache(TieredCache(MemoryLRUCache(), backend))
+
+        with patch.object(embeddings, '_embedding_cache', new_cache()):
+            encode_sentences(['persist me'])
+        with patch.object(embeddings, '_embedding_cache', new_cache()):
+            vectors = encode_sentences(['persist me'])
+        self.assertEqual(len(self.model.calls), 1)
+        self.assertEqual(vector_to_list(vectors[0]), [10.0, 1.0])
+
+    def test_similarity_uses_cache(self):
+        self.assertAlmostEqual(calculate_sentence_similarity('ab', 'ab'), 1.0)
+        calculate_sentence_similarity('ab', 'cd')
+        self.assertEqual(self.model.calls, [['ab'], ['cd']])
+
+    @override_settings(EMBEDDING_CACHE_ENABLED=False)
+    def test_disabled(self):
+        encode_sentences(['a'])
+        encode_sentences(['a'])
+        self.assertEqual(len(self.model.calls), 2)
@@ -0,0 +1,155 @@
+"""
+背景生成工作（資料庫佇列與 worker）測試
+"""
+import json
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, TransactionTestCase, Client
+from django.utils import timezone
+
+from polls.jobs import (
+    JobWorkerPool, claim_job, requeue_stale_jobs, run_pending_jobs, submit_job,
+)
+from polls.models import GenerationJob
+
+
+def fake_ollama(prompt, user_input, **kwargs):
+    if '輸出為 DBML 格式' in prompt:
+        return 'Table User {\n  id int [pk]\n}'
+    return 'Feature: 登入'
+
+
+class GenerationJobAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def post(self, url, payload):
+        return self.client.post(
+            url, data=json.dumps(payload), content_type='application/json'
+        )
+
+    @patch('polls.api_utils.acall_ollama_api', side_effect=fake_ollama)
+    @patch('polls.api_utils.call_ollama_api', side_effect=fake_ollama)
+    def test_submit_returns_immediately_and_worker_completes(
+        self, mock_ollama, mock_async_ollama
+    ):
+        response = self.post('/polls/jobs/', {
+            'kind': 'formulation', 'payload': {'spec_text': '使用者可以登入'},
+        })
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        self.assertEqual(response.json()['status'], 'queued')
+        mock_ollama.assert_not_called()
+
+        self.assertEqual(run_pending_jobs(), 1)
+        data = self.client.get(f'/polls/jobs/{job_id}/').json()
+        self.assertEqual(data['status'], 'succeeded')
+        self.assertEqual(data['attempts'], 1)
+        # 結果與 API 直接回應的內容相同
+        sync = self.post('/polls/formulation/', {'spec_text': '使用者可以登入'})
+        self.assertEqual(data['result'], sync.json())
+
+    def test_background_flag_on_pipeline_api(self):
+        response = self.post('/polls/discovery/', {
+            'dbml': 'Table A {}', 'gherkin': 'Feature: A', 'background': True,
+        })
+        self.assertEqual(response.status_code, 202)
+        job = GenerationJob.objects.get(id=response.json()['job_id'])
+        self.assertEqual(job.kind, 'discovery')
+        self.assertEqual(job.payload['dbml'], 'Table A {}')
+
+    def test_invalid_requests(self):
+        self.assertEqual(
+            self.post('/polls/jobs/', {'kind': 'unknown'}).status_code, 400
+        )
+        self.assertEqual(
+            self.post('/polls/jobs/', {
+                'kind': 'formulation', 'payload': 'text'
+            }).status_code,
+            400
+        )
+        self.assertEqual(self.client.get('/polls/jobs/999/').status_code, 404)
+
+    def test_failed_job_retry(self):
+        job = submit_job('complete_result', {'dbml': '', 'gherkin': ''})
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertIn('dbml', job.error)
+
+        # 修正輸入後重試
+        GenerationJob.objects.filter(id=job.id).update(
+            payload={'dbml': 'Table A {}', 'gherkin': 'Feature: A'}
+        )
+        response = self.post('/polls/retry-ai/', {'task_id': job.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['job']['status'], 'queued')
+
+        # 只有失敗的工作可以重試
+        response = self.post('/polls/retry-ai/', {'task_id': job.id})
+        self.assertEqual(response.status_code, 400)
+
+        with patch('polls.api_utils.call_ollama_api', return_value='內容'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.result['background'], '內容')
+
+    def test_list_filters_by_status(self):
+        submit_job('formulation', {'spec_text': 'a'})
+        GenerationJob.objects.create(
+            kind='discovery', status=GenerationJob.STATUS_FAILED
+        )
+        data = self.client.get('/polls/jobs/?status=failed').json()
+        self.assertEqual([job['kind'] for job in data['jobs']], ['discovery'])
+
+
+class JobQueueTest(TestCase):
+    def test_claim_is_exclusive_and_fifo(self):
+        first = submit_job('formulation', {'spec_text': 'a'})
+        second = submit_job('formulation', {'spec_text': 'b'})
+        self.assertEqual(claim_job('w1').id, first.id)
+        claimed = claim_job('w2')
+        self.assertEqual(claimed.id, second.id)
+        self.assertEqual(claimed.worker, 'w2')
+        self.assertEqual(claimed.status, GenerationJob.STATUS_RUNNING)
+        self.assertIsNone(claim_job('w3'))
+
+    def test_requeue_stale_jobs(self):
+        job = submit_job('formulation', {'spec_text': 'a'})
+        claim_job('w1')
+        self.assertEqual(requeue_stale_jobs(), 0)
+        GenerationJob.objects.filter(id=job.id).update(
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(claim_job('w2').id, job.id)
+
+
+class JobWorkerPoolTest(TransactionTestCase):
+    @patch('polls.api_utils.call_ollama_api', side_effect=fake_ollama)
+    def test_pool_executes_queued_jobs(self, mock_ollama):
+        jobs = [
+            submit_job('formulation', {'spec_text': f'需求 {i}'})
+            for i in range(3)
+        ]
+        pool = JobWorkerPool(workers=2, poll_interval=0.05)
+        pool.start()
+        try:
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                if not GenerationJob.objects.exclude(
+                    status=GenerationJob.STATUS_SUCCEEDED
+                ).exists():
+                    break
+                time.sleep(0.05)
+        finally:
+            pool.stop(timeout=5)
+        self.assertFalse(pool.running)
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+            self.assertEqual(job.attempts, 1)
@@ -0,0 +1,202 @@
+"""
+LLM 回應快取測試
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import AsyncMock, patch
+
+from django.test import TestCase, Client, override_settings
+
+from polls import caching
+from polls.caching import (
+    MemoryLRUCache, SQLiteCache, TieredCache, LLMResponseCache,
+    acached_llm_call, cached_llm_call,
+)
+
+
+class MemoryLRUCacheTest(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = MemoryLRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl_expiry(self):
+        cache = MemoryLRUCache(ttl=10)
+        with patch('polls.caching.time.time', return_value=1000.0):
+            cache.set('a', 'value')
+        with patch('polls.caching.time.time', return_value=1005.0):
+            self.assertEqual(cache.get('a'), 'value')
+        with patch('polls.caching.time.time', return_value=1011.0):
+            self.assertIsNone(cache.get('a'))
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_survives_reopen(self):
+        cache = SQLiteCache(self.path)
+        cache.set('key', '規格內容')
+        cache.close()
+        reopened = SQLiteCache(self.path)
+        self.assertEqual(reopened.get('key'), '規格內容')
+        reopened.close()
+
+    def test_tiered_promotes_to_memory(self):
+        memory = MemoryLRUCache()
+        disk = SQLiteCache(self.path)
+        disk.set('key', 'value')
+        tiered = TieredCache(memory, disk)
+        self.assertEqual(tiered.get('key'), 'value')
+        self.assertEqual(memory.get('key'), 'value')
+        disk.close()
+
+
+class CachedLLMCallTest(TestCase):
+    def setUp(self):
+        self.cache = LLMResponseCache(MemoryLRUCache())
+        patcher = patch.object(caching, '_llm_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'response {self.calls}'
+
+    def call(self, temperature=0, bypass_cache=False, user_input='hi'):
+        return cached_llm_call(
+            'ollama', 'model', 'system', user_input, temperature, None,
+            bypass_cache, self.compute
+        )
+
+    def test_deterministic_call_is_cached(self):
+        self.assertEqual(self.call(), 'response 1')
+        self.assertEqual(self.call(), 'response 1')
+        self.assertEqual(self.calls, 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_different_input_is_a_miss(self):
+        self.call(user_input='a')
+        self.call(user_input='b')
+        self.assertEqual(self.calls, 2)
+
+    @override_settings(LLM_CACHE_ENABLED=False)
+    def test_non_deterministic_call_not_cached_by_default(self):
+        self.call(temperature=None)
+        self.call(temperature=None)
+        self.assertEqual(self.calls, 2)
+
+    @override_settings(LLM_CACHE_ENABLED=True)
+    def test_cache_enabled_for_all_calls(self):
+        self.call(temperature=0.7)
+        self.call(temperature=0.7)
+        self.assertEqual(self.calls, 1)
+
+    def test_bypass_refreshes_cache(self):
+        self.call()
+        self.assertEqual(self.call(bypass_cache=True), 'response 2')
+        self.assertEqual(self.call(), 'response 2')
+        self.assertEqual(self.calls, 2)
+
+
+class ThreadRecordingCache(MemoryLRUCache):
+    """記錄 get / set 在哪個執行緒執行"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, ttl=None):
+        self.threads.append(threading.get_ident())
+        super().set(key, value, ttl)
+
+
+class AsyncCachedLLMCallTest(TestCase):
+    def use_backend(self, backend):
+        patcher = patch.object(
+            caching, '_llm_cache', LLMResponseCache(backend)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def call(self):
+        async def compute():
+            return '回應'
+
+        return await acached_llm_call(
+            'ollama', 'model', 'system', 'hi', 0, None, False, compute
+        )
+
+    async def test_persistent_backend_runs_off_the_event_loop(self):
+        backend = ThreadRecordingCache()
+        self.use_backend(TieredCache(backend))
+        self.assertEqual(await self.call(), '回應')
+        self.assertEqual(await self.call(), '回應')
+        # get、set、get 都不在事件迴圈的執行緒上執行
+        self.assertEqual(len(backend.threads), 3)
+        self.assertNotIn(threading.get_ident(), backend.threads)
+
+    async def test_memory_backend_stays_on_the_event_loop(self):
+        backend = ThreadRecordingCache()
+        self.use_backend(backend)
+        await self.call()
+        self.assertEqual(set(backend.threads), {threading.get_ident()})
+
+
+@override_settings(LLM_CACHE_ENABLED=True)
+class FormulationCacheTest(TestCase):
+    """測試 Formulation API 重送相同內容時使用快取"""
+
+    def setUp(self):
+        self.client = Client()
+        patcher = patch.object(
+            caching, '_llm_cache', LLMResponseCache(MemoryLRUCache())
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, **extra):
+        payload = {'spec_text': '使用者可以登入系統'}
+        payload.update(extra)
+        return self.client.post(
+            '/polls/formulation/',
+            data=json.dumps(payload),
+            content_type='application/json'
+        )
+
+    @override_settings(OLLAMA_API_KEY='test-key')
+    @patch('polls.api_utils._get_async_ollama_client')
+    def test_retry_hits_cache(self, mock_client):
+        async def chat(*args, **kwargs):
+            async def parts():
+                yield {'message': {'content': 'Table User {}'}}
+            return parts()
+
+        client = mock_client.return_value
+        client.chat = AsyncMock(side_effect=chat)
+
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(client.chat.call_count, 2)
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(client.chat.call_count, 2)
+        self.assertEqual(self.post(bypass_cache=True).status_code, 200)
+        self.assertEqual(client.chat.call_count, 4)
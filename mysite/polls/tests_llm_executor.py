@@ -0,0 +1,285 @@
+"""
+共用 LLM 執行器（全域並行上限、等待佇列背壓、供應商額度）
+與非同步 LLM 呼叫測試
+"""
+import asyncio
+import json
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import TestCase, Client, override_settings
+
+from polls.api_utils import (
+    BoundedLLMExecutor, LLMBusyError, acall_ollama_api, acall_openai_api,
+    arun_llm_tasks, run_llm_tasks,
+)
+
+
+class BoundedLLMExecutorTest(TestCase):
+    def setUp(self):
+        self.executor = BoundedLLMExecutor(
+            max_workers=1, max_queue=1,
+            provider_limits={'ollama': 1}, acquire_timeout=0.05,
+        )
+        self.addCleanup(self.executor.shutdown)
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def blocking(self):
+        self.started.set()
+        self.release.wait(5)
+        return 'ok'
+
+    def test_rejects_when_queue_is_full(self):
+        futures = self.executor.submit_all([self.blocking, self.blocking])
+        self.assertTrue(self.started.wait(5))
+        stats = self.executor.stats()
+        self.assertEqual((stats['active'], stats['queued']), (1, 1))
+
+        with self.assertRaises(LLMBusyError):
+            self.executor.submit(self.blocking)
+        self.assertEqual(self.executor.stats()['rejected'], 1)
+
+        self.release.set()
+        self.assertEqual([f.result(5) for f in futures], ['ok', 'ok'])
+        stats = self.executor.stats()
+        self.assertEqual((stats['active'], stats['queued']), (0, 0))
+        self.assertEqual(stats['completed'], 2)
+
+    def test_submit_all_is_all_or_nothing(self):
+        calls = []
+        with self.assertRaises(LLMBusyError):
+            self.executor.submit_all([lambda: calls.append(1)] * 3)
+        self.executor.shutdown()
+        self.assertEqual(calls, [])
+        self.assertEqual(self.executor.stats()['submitted'], 0)
+
+    def test_provider_slot_limit(self):
+        def hold():
+            with self.executor.provider_slot('ollama'):
+                self.started.set()
+                self.release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        self.assertTrue(self.started.wait(5))
+        try:
+            self.assertEqual(
+                self.executor.stats()['providers']['ollama']['active'], 1
+            )
+            with self.assertRaises(LLMBusyError):
+                with self.executor.provider_slot('ollama'):
+                    pass
+            # 未設定上限的供應商不受限制
+            with self.executor.provider_slot('openai'):
+                pass
+        finally:
+            self.release.set()
+            thread.join(5)
+        providers = self.executor.stats()['providers']
+        self.assertEqual(providers['ollama']['active'], 0)
+        self.assertEqual(providers['ollama']['rejected'], 1)
+
+    def test_run_llm_tasks_uses_shared_executor(self):
+        with patch('polls.api_utils._llm_executor', self.executor):
+            results, errors = run_llm_tasks({'a': lambda: 'A'})
+        self.assertEqual(results, {'a': 'A'})
+        self.assertEqual(self.executor.stats()['completed'], 1)
+
+
+class AsyncLLMTest(TestCase):
+    def setUp(self):
+        self.executor = BoundedLLMExecutor(
+            max_workers=1, max_queue=0, provider_limits={'ollama': 1},
+            acquire_timeout=0.05, max_async=3,
+        )
+        self.addCleanup(self.executor.shutdown)
+        patcher = patch('polls.api_utils._llm_executor', self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_arun_llm_tasks_runs_concurrently(self):
+        started = []
+        everyone = asyncio.Event()
+
+        async def task(name):
+            started.append(name)
+            if len(started) == 3:
+                everyone.set()
+            # 三個任務都開始後才會結束：證明是並行而非依序執行
+            await asyncio.wait_for(everyone.wait(), 1)
+            return name.upper()
+
+        async def slow():
+            await asyncio.sleep(5)
+
+        results, errors = await arun_llm_tasks(
+            {name: lambda name=name: task(name) for name in 'abc'},
+            timeout=2
+        )
+        self.assertEqual(results, {'a': 'A', 'b': 'B', 'c': 'C'})
+        self.assertEqual(errors, {})
+
+        results, errors = await arun_llm_tasks({'slow': slow}, timeout=0.05)
+        self.assertEqual(results, {})
+        self.assertIn('逾時', errors['slow'])
+        self.assertEqual(self.executor.stats()['async_active'], 0)
+
+    async def test_admission_limit(self):
+        async def noop():
+            return 'x'
+
+        with self.assertRaises(LLMBusyError):
+            await arun_llm_tasks({i: noop for i in range(4)})
+        self.assertEqual(self.executor.stats()['rejected'], 4)
+
+    async def test_async_provider_slot(self):
+        async with self.executor.async_provider_slot('ollama'):
+            self.assertEqual(
+                self.executor.stats()['providers']['ollama']['active'], 1
+            )
+            with self.assertRaises(LLMBusyError):
+                async with self.executor.async_provider_slot('ollama'):
+                    pass
+        async with self.executor.async_provider_slot('ollama'):
+            pass
+        self.assertEqual(
+            self.executor.stats()['providers']['ollama']['rejected'], 1
+        )
+
+    async def test_async_waiters_are_served_in_order(self):
+        executor = BoundedLLMExecutor(
+            max_workers=1, max_queue=0, provider_limits={'ollama': 1},
+            acquire_timeout=1,
+        )
+        self.addCleanup(executor.shutdown)
+        order = []
+
+        async def waiter(name):
+            async with executor.async_provider_slot('ollama'):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        # 同步呼叫佔住額度，釋放時直接交給最早等待的非同步呼叫
+        release = threading.Event()
+        holding = threading.Event()
+
+        def hold():
+            with executor.provider_slot('ollama'):
+                holding.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        self.assertTrue(holding.wait(5))
+        tasks = []
+        for name in 'abc':
+            tasks.append(asyncio.ensure_future(waiter(name)))
+            await asyncio.sleep(0)
+        self.assertEqual(
+            executor.stats()['providers']['ollama']['waiting'], 3
+        )
+        # b 放棄等待：額度跳過它交給 c
+        tasks[1].cancel()
+        release.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        thread.join(5)
+        self.assertEqual(order, ['a', 'c'])
+        providers = executor.stats()['providers']['ollama']
+        self.assertEqual((providers['active'], providers['waiting']), (0, 0))
+        # 額度已全部歸還
+        with executor.provider_slot('ollama'):
+            pass
+
+    @override_settings(OLLAMA_API_KEY='test-key')
+    async def test_acall_ollama_api_uses_async_client(self):
+        async def chat(model, messages, stream=False, options=None):
+            self.assertTrue(stream)
+            self.assertEqual(options, {'temperature': 0.2})
+
+            async def parts():
+                for token in ['你好', '，', '世界']:
+                    yield {'message': {'content': token}}
+            return parts()
+
+        client = MagicMock()
+        client.chat = chat
+        with patch(
+            'polls.api_utils._get_async_ollama_client', return_value=client
+        ):
+            result = await acall_ollama_api('系統', '問題', temperature=0.2)
+        self.assertEqual(result, '你好，世界')
+        self.assertEqual(
+            self.executor.stats()['providers']['ollama']['active'], 0
+        )
+
+
+    @override_settings(
+        OPENAI_API_KEY='test-key', OPENAI_MODEL='gpt-test', LLM_CACHE_ENABLED=False
+    )
+    async def test_acall_openai_api_uses_async_client(self):
+        executor = BoundedLLMExecutor(
+            max_workers=1, max_queue=0, provider_limits={'openai': 1},
+            acquire_timeout=0.05,
+        )
+        self.addCleanup(executor.shutdown)
+        active = []
+
+        async def create(**kwargs):
+            active.append(executor.stats()['providers']['openai']['active'])
+            message = MagicMock(content='你好')
+            return MagicMock(choices=[MagicMock(message=message)])
+
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(side_effect=create)
+        with patch('polls.api_utils._llm_executor', executor), patch(
+            'polls.api_utils._get_async_openai_client', return_value=client
+        ):
+            result = await acall_openai_api('系統', '問題', temperature=0.1)
+        self.assertEqual(result, '你好')
+        kwargs = client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['model'], 'gpt-test')
+        self.assertEqual(kwargs['messages'][1], {'role': 'user', 'content': '問題'})
+        # 呼叫期間佔用 openai 額度，結束後釋放
+        self.assertEqual(active, [1])
+        self.assertEqual(
+            executor.stats()['providers']['openai']['active'], 0
+        )
+
+
+class SaturatedExecutorAPITest(TestCase):
+    """執行器滿載時 AI API 立即回傳 503 與 Retry-After"""
+
+    def setUp(self):
+        self.client = Client()
+        executor = BoundedLLMExecutor(max_workers=1, max_queue=0, max_async=0)
+        self.addCleanup(executor.shutdown)
+        patch('polls.api_utils._llm_executor', executor).start()
+        self.llm = patch('polls.api_utils.acall_ollama_api').start()
+        self.addCleanup(patch.stopall)
+
+    def post(self, url, payload):
+        return self.client.post(
+            url, data=json.dumps(payload), content_type='application/json'
+        )
+
+    def assertBusy(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(response.json()['success'])
+
+    def test_fan_out_endpoints_return_503(self):
+        self.assertBusy(self.post('/polls/llm-ideas/', {'idea': '待辦清單'}))
+        self.assertBusy(self.post('/polls/formulation/', {'spec_text': '登入'}))
+        self.assertBusy(self.post('/polls/generate_complete_result/', {
+            'dbml': 'Table A {}', 'gherkin': 'Feature: A',
+        }))
+        self.assertBusy(self.post('/polls/generate_complete_result/stream/', {
+            'dbml': 'Table A {}', 'gherkin': 'Feature: A',
+        }))
+        self.llm.assert_not_called()
+
+    def test_metrics_report_executor(self):
+        data = self.client.get('/polls/metrics/').json()
+        self.assertEqual(data['llm_executor']['max_workers'], 1)
+        self.assertIn('queued', data['llm_executor'])
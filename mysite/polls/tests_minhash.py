@@ -0,0 +1,106 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from polls import minhash
+from polls.models import SentenceDatabase, SentenceLSHBucket
+
+
+BASE = '使用者可以透過電子郵件與密碼登入系統並查看個人訂單紀錄'
+
+
+class MinHashTest(TestCase):
+    def test_signature_estimates_jaccard(self):
+        a = 'the quick brown fox jumps over the lazy dog'
+        b = 'the quick brown fox jumped over the lazy dog'
+        exact = (
+            len(minhash.shingles(a) & minhash.shingles(b))
+            / len(minhash.shingles(a) | minhash.shingles(b))
+        )
+        estimate = minhash.estimate_similarity(
+            minhash.signature(a), minhash.signature(b)
+        )
+        self.assertAlmostEqual(estimate, exact, delta=0.15)
+        self.assertEqual(
+            minhash.estimate_similarity(
+                minhash.signature(a), minhash.signature(a.upper())
+            ), 1.0
+        )
+
+    def test_signature_is_stable_and_empty_is_none(self):
+        self.assertTrue(
+            (minhash.signature('hello') == minhash.signature('hello')).all()
+        )
+        self.assertIsNone(minhash.signature('   '))
+
+    def test_save_writes_signature_and_buckets(self):
+        item = SentenceDatabase.objects.create(sentence=BASE)
+        self.assertEqual(len(minhash.unpack_signature(item.minhash)), 128)
+        self.assertEqual(item.lsh_buckets.count(), 32)
+        item.sentence = '完全不同的句子'
+        item.save()
+        self.assertEqual(item.lsh_buckets.count(), 32)
+        item.delete()
+        self.assertFalse(SentenceLSHBucket.objects.exists())
+
+    def test_find_near_duplicates(self):
+        original = SentenceDatabase.objects.create(sentence=BASE)
+        SentenceDatabase.objects.create(sentence='管理員可以匯出每月的銷售報表')
+        matches = minhash.find_near_duplicates(BASE + '。')
+        self.assertEqual([m['id'] for m in matches], [original.id])
+        self.assertGreater(matches[0]['similarity'], 0.8)
+        self.assertEqual(
+            minhash.find_near_duplicates(BASE, exclude_id=original.id), []
+        )
+
+    def test_clusters_and_backfill(self):
+        a = SentenceDatabase.objects.create(sentence=BASE)
+        b = SentenceDatabase.objects.create(sentence=BASE + '！')
+        SentenceDatabase.objects.create(sentence='管理員可以匯出每月的銷售報表')
+        # bulk_create 不會呼叫 save()，由 backfill 補上簽章
+        c, = SentenceDatabase.objects.bulk_create([
+            SentenceDatabase(sentence='使用者可以透過電子郵件與密碼登入系統並查看個人訂單')
+        ])
+        self.assertEqual(minhash.backfill_signatures(), 1)
+        self.assertEqual(
+            minhash.find_duplicate_clusters(), [[a.id, b.id, c.id]]
+        )
+
+    def test_command(self):
+        a = SentenceDatabase.objects.create(sentence=BASE)
+        b = SentenceDatabase.objects.create(sentence=BASE + '。')
+        out = StringIO()
+        call_command('sentence_duplicates', '--rebuild', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue()), [[a.id, b.id]])
+
+
+class NearDuplicateAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def post(self, url, payload):
+        return self.client.post(
+            url, data=json.dumps(payload), content_type='application/json'
+        )
+
+    def test_create_returns_near_duplicates(self):
+        url = reverse('sentence_db_list')
+        first = self.post(url, {'sentence': BASE}).json()
+        self.assertEqual(first['near_duplicates'], [])
+        second = self.post(url, {'sentence': BASE + '。'}).json()
+        self.assertEqual(second['near_duplicates'][0]['id'], first['id'])
+
+    def test_lookup_endpoint(self):
+        item = SentenceDatabase.objects.create(sentence=BASE)
+        url = reverse('sentence_db_near_duplicates')
+        data = self.post(url, {'sentence': BASE}).json()
+        self.assertEqual(data['near_duplicates'][0]['id'], item.id)
+        self.assertEqual(data['near_duplicates'][0]['similarity'], 1.0)
+        self.assertEqual(self.post(url, {}).status_code, 400)
+        self.assertEqual(
+            self.post(url, {'sentence': 'x', 'threshold': 2}).status_code, 400
+        )
+        self.assertEqual(self.client.get(url).status_code, 405)
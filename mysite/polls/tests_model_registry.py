@@ -0,0 +1,125 @@
+"""
+Sentence Transformer 模型登錄表測試
+"""
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+
+from polls.api_utils import SentenceTransformerRegistry
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+        self.encoded = []
+
+    def encode(self, sentences):
+        self.encoded.append(list(sentences))
+        return [[float(len(s)), 1.0] for s in sentences]
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+
+@override_settings(SENTENCE_TRANSFORMER_MODEL='fake-model')
+class SentenceTransformerRegistryTest(TestCase):
+    def setUp(self):
+        self.loaded = []
+
+        def loader(name):
+            self.loaded.append(name)
+            return FakeModel(name)
+
+        self.registry = SentenceTransformerRegistry(loader=loader)
+
+    def test_model_loaded_once(self):
+        first = self.registry.get()
+        second = self.registry.get()
+        self.assertIs(first, second)
+        self.assertEqual(self.loaded, ['fake-model'])
+
+    def test_concurrent_get_loads_once(self):
+        threads = [
+            threading.Thread(target=self.registry.get) for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.loaded, ['fake-model'])
+
+    def test_each_model_name_loaded_separately(self):
+        self.registry.get('a')
+        self.registry.get('b')
+        self.registry.get('a')
+        self.assertEqual(self.loaded, ['a', 'b'])
+
+    def test_warmup_records_metrics(self):
+        metrics = self.registry.warmup()
+        self.assertIn('fake-model', metrics)
+        stats = self.registry.metrics()['fake-model']
+        self.assertIn('load_seconds', stats)
+        self.assertIn('warmup_seconds', stats)
+        self.assertEqual(stats['dimension'], 2)
+        self.assertEqual(self.registry.get().encoded, [['warmup']])
+
+    def test_unload(self):
+        self.registry.get()
+        self.registry.unload()
+        self.assertFalse(self.registry.is_loaded())
+        self.registry.get()
+        self.assertEqual(self.loaded, ['fake-model', 'fake-model'])
+
+
+@override_settings(SENTENCE_TRANSFORMER_MODEL='fake-model')
+class WarmupCommandTest(TestCase):
+    def test_command_reports_load_time(self):
+        registry = SentenceTransformerRegistry(loader=FakeModel)
+        out = StringIO()
+        with patch(
+            'polls.management.commands.warmup_models.'
+            'sentence_transformer_registry', registry
+        ):
+            call_command('warmup_models', stdout=out)
+        self.assertIn('fake-model', out.getvalue())
+        self.assertTrue(registry.is_loaded())
+
+
+class ServerProcessTest(TestCase):
+    def check(self, argv, env=None):
+        from polls.apps import _is_server_process
+
+        with patch('sys.argv', argv), patch.dict('os.environ', env or {}):
+            return _is_server_process()
+
+    def test_only_servers_warm_up(self):
+        self.assertTrue(self.check(['manage.py', 'runserver', '--noreload']))
+        self.assertTrue(self.check(
+            ['/usr/lib/python3/site-packages/django/__main__.py', 'runserver'],
+            {'RUN_MAIN': 'true'}
+        ))
+        self.assertTrue(self.check(['/venv/bin/gunicorn', 'mysite.wsgi']))
+        self.assertTrue(self.check(['/venv/lib/uvicorn/__main__.py', 'mysite.asgi:application']))
+        # runserver 的自動重新載入監看行程
+        self.assertFalse(self.check(['manage.py', 'runserver'], {'RUN_MAIN': ''}))
+        self.assertFalse(self.check(['manage.py', 'migrate']))
+        self.assertFalse(self.check(['/usr/lib/python3/site-packages/django/__main__.py', 'test']))
+        self.assertFalse(self.check(['/venv/bin/pytest']))
+        self.assertFalse(self.check(['/venv/bin/celery', 'worker']))
+
+
+class MetricsAPITest(TestCase):
+    def test_metrics_endpoint(self):
+        response = Client().get('/polls/metrics/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn('sentence_transformer', data)
+        self.assertIn('ollama_pool', data)
+        self.assertIn('llm_cache', data)
+
+    def test_metrics_method_not_allowed(self):
+        response = Client().post('/polls/metrics/')
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,135 @@
+"""
+Ollama 客戶端連線池測試
+"""
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from polls import api_utils
+from polls.api_utils import OllamaClientPool
+
+
+class FakeHTTPClient:
+    def __init__(self):
+        self.is_closed = False
+
+    def close(self):
+        self.is_closed = True
+
+
+class FakeOllamaClient:
+    def __init__(self, host, api_key):
+        self.host = host
+        self.api_key = api_key
+        self._client = FakeHTTPClient()
+
+    def chat(self, model, messages, stream=False, options=None):
+        for token in ['你好', '，', '世界']:
+            yield {'message': {'content': token}}
+
+
+class OllamaClientPoolTest(TestCase):
+    """測試連線池的重用、上限與回收"""
+
+    def setUp(self):
+        self.created = []
+
+        def factory(host, api_key):
+            client = FakeOllamaClient(host, api_key)
+            self.created.append(client)
+            return client
+
+        self.factory = factory
+
+    def test_reuses_client_for_same_key(self):
+        pool = OllamaClientPool(factory=self.factory)
+        with pool.client('h1', 'k1') as c1:
+            pass
+        with pool.client('h1', 'k1') as c2:
+            pass
+        self.assertIs(c1, c2)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_separate_clients_per_host_and_key(self):
+        pool = OllamaClientPool(factory=self.factory)
+        with pool.client('h1', 'k1') as c1:
+            pass
+        with pool.client('h1', 'k2') as c2:
+            pass
+        with pool.client('h2', 'k1') as c3:
+            pass
+        self.assertEqual(len({id(c1), id(c2), id(c3)}), 3)
+
+    def test_max_per_host_times_out(self):
+        pool = OllamaClientPool(
+            max_per_host=1, acquire_timeout=0.05, factory=self.factory
+        )
+        client = pool.acquire('h1', 'k1')
+        with self.assertRaises(TimeoutError):
+            pool.acquire('h1', 'k1')
+        pool.release('h1', 'k1', client)
+        self.assertIs(pool.acquire('h1', 'k1'), client)
+
+    def test_waiter_gets_released_client(self):
+        pool = OllamaClientPool(max_per_host=1, factory=self.factory)
+        client = pool.acquire('h1', 'k1')
+        result = {}
+
+        def worker():
+            result['client'] = pool.acquire('h1', 'k1')
+
+        t = threading.Thread(target=worker)
+        t.start()
+        pool.release('h1', 'k1', client)
+        t.join(timeout=2)
+        self.assertIs(result['client'], client)
+
+    def test_error_discards_client(self):
+        pool = OllamaClientPool(factory=self.factory)
+        with self.assertRaises(RuntimeError):
+            with pool.client('h1', 'k1'):
+                raise RuntimeError('boom')
+        self.assertTrue(self.created[0]._client.is_closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    def test_closed_client_is_not_reused(self):
+        pool = OllamaClientPool(factory=self.factory)
+        with pool.client('h1', 'k1') as c1:
+            pass
+        c1._client.close()
+        with pool.client('h1', 'k1') as c2:
+            pass
+        self.assertIsNot(c1, c2)
+
+    def test_idle_eviction(self):
+        pool = OllamaClientPool(idle_timeout=10, factory=self.factory)
+        with patch('polls.api_utils.time.monotonic', return_value=100.0):
+            with pool.client('h1', 'k1'):
+                pass
+        with patch('polls.api_utils.time.monotonic', return_value=200.0):
+            self.assertEqual(pool.evict_idle(), 1)
+        self.assertTrue(self.created[0]._client.is_closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+
+@override_settings(OLLAMA_API_KEY='test-key', OLLAMA_HOST='http://ollama')
+class CallOllamaAPIPoolTest(TestCase):
+    """測試 call_ollama_api 透過連線池呼叫"""
+
+    def test_call_ollama_api_uses_shared_pool(self):
+        created = []
+
+        def factory(host, api_key):
+            created.append((host, api_key))
+            return FakeOllamaClient(host, api_key)
+
+        pool = OllamaClientPool(factory=factory)
+        with patch.object(api_utils, '_ollama_client_pool', pool):
+            first = api_utils.call_ollama_api('system', 'hi')
+            second = api_utils.call_ollama_api('system', 'hi')
+        self.assertEqual(first, '你好，世界')
+        self.assertEqual(second, '你好，世界')
+        self.assertEqual(created, [('http://ollama', 'test-key')])
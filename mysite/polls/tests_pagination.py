@@ -0,0 +1,102 @@
+"""
+列表 API 游標分頁與欄位投影測試
+"""
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from polls.models import ChatSession, SentenceDatabase, User
+
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        # bulk_create 略過 save() 的密碼雜湊，加快測試
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(5)
+        ])
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def collect(self, url, key):
+        names, cursor = [], None
+        while True:
+            page_url = url + (f'&cursor={cursor}' if cursor else '')
+            data = self.get(page_url)
+            names += [row['username'] for row in data[key]]
+            cursor = data['next_cursor']
+            if cursor is None:
+                return names
+
+    def test_walks_all_pages_in_order(self):
+        self.assertEqual(
+            self.collect('/polls/user/?limit=2', 'users'),
+            [f'user{i}' for i in range(5)]
+        )
+        self.assertEqual(
+            self.collect('/polls/user/?limit=2&order=desc', 'users'),
+            [f'user{i}' for i in reversed(range(5))]
+        )
+
+    def test_cursor_stable_under_inserts(self):
+        first = self.get('/polls/user/?limit=2')
+        User.objects.filter(username='user0').delete()
+        User.objects.bulk_create([
+            User(username='late', email='late@example.com')
+        ])
+        rest = self.get(f"/polls/user/?limit=10&cursor={first['next_cursor']}")
+        self.assertEqual(
+            [row['username'] for row in rest['users']],
+            ['user2', 'user3', 'user4', 'late']
+        )
+
+    def test_default_and_max_limit(self):
+        with override_settings(API_PAGE_SIZE=3, API_MAX_PAGE_SIZE=4):
+            self.assertEqual(len(self.get('/polls/user/')['users']), 3)
+            data = self.get('/polls/user/?limit=100')
+            self.assertEqual((len(data['users']), data['limit']), (4, 4))
+
+    def test_field_projection(self):
+        data = self.get('/polls/user/?fields=username')
+        self.assertEqual(data['users'][0], {'username': 'user0'})
+        self.assertEqual(data['fields'], ['username'])
+
+    def test_invalid_parameters(self):
+        for query in ('limit=0', 'limit=x', 'fields=password', 'order=up',
+                      'cursor=%%%'):
+            response = self.client.get(f'/polls/user/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+        cursor = self.get('/polls/user/?limit=1')['next_cursor']
+        response = self.client.get(f'/polls/user/?order=desc&cursor={cursor}')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProjectionQueryTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def last_select(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return queries.captured_queries[-1]['sql']
+
+    def test_sentence_embedding_not_loaded_unless_requested(self):
+        SentenceDatabase.objects.create(sentence='a', embedding=[1.0, 2.0])
+        self.assertNotIn('"embedding"', self.last_select('/polls/sentence-db/'))
+        sql = self.last_select('/polls/sentence-db/?include_embedding=true')
+        self.assertIn('"embedding"', sql)
+
+    def test_chat_messages_not_loaded_unless_requested(self):
+        ChatSession.objects.create(
+            session_id='s1', title='t', messages=[{'role': 'user'}] * 100
+        )
+        sql = self.last_select('/polls/chat-session/?fields=session_id,title')
+        self.assertNotIn('"messages"', sql)
+        data = self.client.get('/polls/chat-session/?limit=1').json()
+        self.assertEqual(len(data['sessions'][0]['messages']), 100)
+        self.assertIsNone(data['next_cursor'])
@@ -0,0 +1,170 @@
+"""
+規格流程階段 checkpoint 測試
+"""
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, Client
+
+from polls.jobs import run_pending_jobs
+from polls.models import GenerationJob, PipelineRun
+
+DISCOVERY_ITEMS = [{'id': 'A1', 'priority': 'High', 'question': '?'}]
+
+
+class PipelineRunTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        patcher = patch(
+            'polls.api_utils.call_ollama_api', side_effect=self.route
+        )
+        self.llm = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fail_stage = None
+        response = self.post('/polls/pipeline-runs/', {
+            'spec_text': '使用者可以登入系統'
+        })
+        self.assertEqual(response.status_code, 201)
+        self.run_id = response.json()['run_id']
+        self.assertEqual(response.json()['next_stage'], 'formulation')
+
+    def route(self, prompt, user_input, **kwargs):
+        from polls.prompts import build_discovery_prompt, build_formulation_prompts
+
+        formulation = build_formulation_prompts('使用者可以登入系統')
+        if prompt == formulation['dbml']:
+            return 'Table User {\n  id int [pk]\n}'
+        if prompt == formulation['gherkin']:
+            return 'Feature: 登入'
+        if prompt.startswith(build_discovery_prompt('', '')[:40]):
+            if self.fail_stage == 'discovery':
+                raise ConnectionError('LLM 無法連線')
+            return json.dumps(DISCOVERY_ITEMS)
+        return '區段內容'
+
+    def post(self, url, payload=None):
+        return self.client.post(
+            url, data=json.dumps(payload or {}),
+            content_type='application/json'
+        )
+
+    def stage(self, name, payload=None):
+        return self.post(
+            f'/polls/pipeline-runs/{self.run_id}/stages/{name}/', payload
+        )
+
+    def test_stage_outputs_are_checkpointed_and_reused(self):
+        response = self.stage('formulation')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data['reused'])
+        self.assertIn('Table User', data['dbml'])
+        self.assertEqual(data['next_stage'], 'discovery')
+        self.assertEqual(self.llm.call_count, 2)
+
+        # 輸入未變：重送不呼叫 LLM
+        response = self.stage('formulation')
+        self.assertTrue(response.json()['reused'])
+        self.assertEqual(response.json()['dbml'], data['dbml'])
+        self.assertEqual(self.llm.call_count, 2)
+
+        # 下游階段使用伺服器保存的 DBML / Gherkin，不必由瀏覽器重送
+        response = self.stage('discovery')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'], DISCOVERY_ITEMS)
+        self.assertEqual(self.llm.call_count, 3)
+
+        # bypass_cache 強制重新執行
+        self.stage('formulation', {'bypass_cache': True})
+        self.assertEqual(self.llm.call_count, 5)
+
+    def test_resume_skips_completed_stages(self):
+        self.fail_stage = 'discovery'
+        response = self.post(f'/polls/pipeline-runs/{self.run_id}/resume/')
+        self.assertEqual(response.status_code, 500)
+        data = response.json()
+        self.assertEqual(data['executed']['formulation']['status'], 200)
+        self.assertEqual(data['executed']['discovery']['status'], 500)
+        self.assertNotIn('complete_result', data['executed'])
+        self.assertEqual(data['next_stage'], 'discovery')
+        self.assertEqual(data['stages']['discovery']['state'], 'failed')
+        calls = self.llm.call_count
+
+        # 重新整理頁面後查詢狀態
+        data = self.client.get(f'/polls/pipeline-runs/{self.run_id}/').json()
+        self.assertEqual(data['stages']['formulation']['state'], 'completed')
+        self.assertEqual(data['next_stage'], 'discovery')
+
+        self.fail_stage = None
+        response = self.post(f'/polls/pipeline-runs/{self.run_id}/resume/')
+        self.assertEqual(response.status_code, 200)
+        executed = response.json()['executed']
+        self.assertTrue(executed['formulation']['reused'])
+        self.assertFalse(executed['discovery']['reused'])
+        self.assertFalse(executed['complete_result']['reused'])
+        self.assertIsNone(response.json()['next_stage'])
+        # 1 次 discovery + 4 個完整結果區段，Formulation 未重做
+        self.assertEqual(self.llm.call_count, calls + 5)
+
+    def test_edited_inputs_invalidate_downstream_stages(self):
+        self.post(f'/polls/pipeline-runs/{self.run_id}/resume/')
+        run = PipelineRun.objects.get(id=self.run_id)
+        self.assertEqual(run.stages['complete_result']['status'], 'completed')
+        calls = self.llm.call_count
+
+        response = self.stage('discovery', {
+            'dbml': 'Table User {\n  id int [pk]\n  email string\n}'
+        })
+        self.assertFalse(response.json()['reused'])
+        self.assertEqual(response.json()['next_stage'], 'complete_result')
+        data = self.client.get(f'/polls/pipeline-runs/{self.run_id}/').json()
+        self.assertEqual(data['stages']['formulation']['state'], 'completed')
+        self.assertEqual(data['stages']['complete_result']['state'], 'stale')
+        self.assertEqual(self.llm.call_count, calls + 1)
+
+    def test_complete_result_regenerates_only_affected_sections(self):
+        self.post(f'/polls/pipeline-runs/{self.run_id}/resume/')
+        calls = self.llm.call_count
+
+        # 新增欄位：只重新生成 API 規格
+        response = self.stage('complete_result', {
+            'dbml': 'Table User {\n  id int [pk]\n  email string\n}'
+        })
+        data = response.json()
+        self.assertFalse(data['reused'])
+        self.assertEqual(data['regenerated'], ['api_spec'])
+        self.assertEqual(data['changes']['dbml']['changed'], ['Table User'])
+        self.assertEqual(self.llm.call_count, calls + 1)
+
+        # 只改註解與縮排：不呼叫 LLM
+        response = self.stage('complete_result', {
+            'dbml': '// 使用者\nTable User {\n    id int [pk]\n    email string\n}'
+        })
+        self.assertEqual(response.json()['regenerated'], [])
+        self.assertEqual(self.llm.call_count, calls + 1)
+        run = PipelineRun.objects.get(id=self.run_id)
+        self.assertEqual(run.stages['complete_result']['status'], 'completed')
+
+    def test_background_resume(self):
+        response = self.post(
+            f'/polls/pipeline-runs/{self.run_id}/resume/', {'background': True}
+        )
+        self.assertEqual(response.status_code, 202)
+        job = GenerationJob.objects.get(id=response.json()['job_id'])
+        self.assertEqual(job.kind, 'pipeline')
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+        self.assertIsNone(job.result['next_stage'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.stage('unknown').status_code, 404)
+        self.assertEqual(
+            self.post('/polls/pipeline-runs/999/stages/formulation/').status_code,
+            404
+        )
+        self.assertEqual(self.stage('discovery', {'dbml': 1}).status_code, 400)
+        self.assertEqual(
+            self.post('/polls/pipeline-runs/', {'spec_text': ' '}).status_code,
+            400
+        )
@@ -0,0 +1,104 @@
+"""
+SQL 查詢數預算測試：Order 讀取路徑不得逐筆查詢 User
+"""
+from django.test import TestCase, Client, override_settings
+
+from polls.models import Order, User
+from polls.query_budget import QueryBudgetExceeded, QueryBudgetTestMixin
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_STRICT=True)
+class OrderQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        # bulk_create 略過 save() 的密碼雜湊，加快測試
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(10)
+        ])
+        users = list(User.objects.order_by('id'))
+        Order.objects.bulk_create([
+            Order(user=users[i % 10], product_name=f'item{i}', amount=i + 1)
+            for i in range(30)
+        ])
+        self.users = {user.id: user for user in users}
+
+    def test_order_list_single_query(self):
+        with self.assertMaxQueries(1, 'GET /polls/order/'):
+            response = self.client.get('/polls/order/')
+        self.assertEqual(response.status_code, 200)
+        orders = response.json()['orders']
+        self.assertEqual(len(orders), 30)
+        self.assertNotIn('user', orders[0])
+        self.assertIn(orders[0]['user_id'], self.users)
+        self.assertEqual(response['X-Query-Count'], '1')
+
+    def test_order_list_expand_user_joins(self):
+        with self.assertMaxQueries(1, 'GET /polls/order/?expand=user'):
+            response = self.client.get('/polls/order/?expand=user')
+        self.assertEqual(response.status_code, 200)
+        for order in response.json()['orders']:
+            user = self.users[order['user_id']]
+            self.assertEqual(order['user'], {
+                'id': user.id, 'username': user.username, 'email': user.email,
+            })
+
+    def test_order_list_fields_user(self):
+        response = self.client.get('/polls/order/?fields=id,user')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['orders'][0]), {'id', 'user'})
+
+    def test_expand_unknown_relation(self):
+        response = self.client.get('/polls/order/?expand=product_name')
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_detail_expand_user(self):
+        order = Order.objects.order_by('id').first()
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/polls/order/{order.id}/?expand=user')
+        data = response.json()
+        self.assertEqual(data['user_id'], order.user_id)
+        self.assertEqual(data['user']['username'], order.user.username)
+
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/polls/order/{order.id}/')
+        self.assertNotIn('user', response.json())
+
+
+class QueryBudgetMiddlewareTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(3)
+        ])
+
+    @override_settings(
+        QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_STRICT=True,
+        QUERY_BUDGETS={'user-list': 0}
+    )
+    def test_strict_raises_over_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/polls/user/')
+
+    @override_settings(
+        QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_STRICT=False,
+        QUERY_BUDGETS={'user-list': 0}
+    )
+    def test_non_strict_logs_warning(self):
+        with self.assertLogs('polls.query_budget', level='WARNING') as logs:
+            response = self.client.get('/polls/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Query-Count'], '1')
+        self.assertIn('預算為 0', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get('/polls/user/')
+        self.assertNotIn('X-Query-Count', response)
+
+    def test_assert_max_queries_fails_over_budget(self):
+        with self.assertRaises(AssertionError):
+            with self.assertMaxQueries(1):
+                list(User.objects.all())
+                list(User.objects.all())
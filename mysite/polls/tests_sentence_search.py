@@ -0,0 +1,106 @@
+import json
+from unittest.mock import patch
+
+from django.test import Client
+from django.urls import reverse
+
+from polls import sentence_search, vector_index as vi
+from polls.models import SentenceDatabase
+from polls.tests_vector_index import FakeModel, VectorIndexTestCase
+
+
+class SentenceSearchTest(VectorIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.url = reverse('sentence_db_search')
+        # alice 的資料都比 bob 的更接近查詢向量 [1, 0, 0]
+        for i in range(20):
+            SentenceDatabase.objects.create(
+                user='alice', category='login', sentence=f'alice {i}',
+                embedding=[1, 0.01 * i, 0]
+            )
+        self.bob = SentenceDatabase.objects.create(
+            user='bob', category='login', sentence='bob login',
+            embedding=[0.5, 1, 0]
+        )
+        SentenceDatabase.objects.create(
+            user='bob', category='payment', sentence='bob pay',
+            embedding=[0, 0, 1]
+        )
+        vi.rebuild_vector_index('kb')
+
+    def post(self, payload):
+        return self.client.post(
+            self.url, data=json.dumps(payload), content_type='application/json'
+        )
+
+    def test_global_search_with_timings(self):
+        data = self.post({'vector': [1, 0, 0], 'k': 3}).json()
+        self.assertEqual(
+            [r['sentence'] for r in data['results']],
+            ['alice 0', 'alice 1', 'alice 2']
+        )
+        self.assertIsNone(data['candidates'])
+        self.assertEqual(
+            set(data['timings_ms']), {'embed', 'search', 'hydrate', 'total'}
+        )
+
+    def test_partition_filter_is_applied_before_top_k(self):
+        data = self.post({'vector': [1, 0, 0], 'k': 1, 'user': 'bob'}).json()
+        self.assertEqual(data['candidates'], 2)
+        self.assertEqual(data['results'][0]['id'], self.bob.id)
+
+        data = self.post({
+            'vector': [1, 0, 0], 'k': 5, 'user': 'bob', 'category': 'payment'
+        }).json()
+        self.assertEqual(
+            [r['sentence'] for r in data['results']], ['bob pay']
+        )
+        data = self.post({'vector': [1, 0, 0], 'user': 'nobody'}).json()
+        self.assertEqual(data['results'], [])
+
+    def test_min_score_and_deleted_rows(self):
+        self.bob.delete()
+        data = self.post({
+            'vector': [1, 0, 0], 'user': 'bob', 'min_score': -1
+        }).json()
+        self.assertEqual([r['sentence'] for r in data['results']], ['bob pay'])
+        data = self.post({
+            'vector': [1, 0, 0], 'user': 'bob', 'min_score': 0.5
+        }).json()
+        self.assertEqual(data['results'], [])
+
+    def test_partitions_follow_index_generation(self):
+        self.post({'vector': [1, 0, 0], 'user': 'bob'})
+        SentenceDatabase.objects.create(
+            user='carol', sentence='carol', embedding=[1, 0, 0]
+        )
+        vi.sync_vector_index('kb')
+        data = self.post({'vector': [1, 0, 0], 'user': 'carol'}).json()
+        self.assertEqual([r['sentence'] for r in data['results']], ['carol'])
+
+    @patch('polls.api_utils.get_sentence_transformer_model',
+           return_value=FakeModel())
+    def test_query_is_embedded(self, _):
+        response = self.post({'query': 'x', 'k': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_validation(self):
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(self.post({'vector': [1, 0]}).status_code, 400)
+        self.assertEqual(
+            self.post({'vector': [1, 0, 0], 'k': 0}).status_code, 400
+        )
+        self.assertEqual(
+            self.post({'vector': [1, 0, 0], 'user': 1}).status_code, 400
+        )
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_index_not_built(self):
+        with patch.object(sentence_search, 'get_vector_index',
+                          return_value=None):
+            self.assertEqual(
+                self.post({'vector': [1, 0, 0]}).status_code, 404
+            )
@@ -0,0 +1,137 @@
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from polls import similarity
+
+
+class FakeModel:
+    VECTORS = {
+        'login': [1.0, 0.0], 'sign in': [0.9, 0.1], 'pay': [0.0, 1.0],
+    }
+
+    def encode(self, sentences, batch_size=32):
+        return [self.VECTORS[s] for s in sentences]
+
+
+def jaccard(a, b):
+    a, b = set(a.lower().split()), set(b.lower().split())
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+@override_settings(EMBEDDING_CACHE_ENABLED=False)
+class SimilarityModuleTest(TestCase):
+    def test_lexical_matches_pairwise_jaccard(self):
+        queries = ['hello world', 'hello beautiful world', '', 'a b c']
+        candidates = ['hello wonderful world', 'goodbye universe', 'c b', '']
+        rows = []
+        for _, scores in similarity.lexical_similarity_chunks(
+            queries, candidates
+        ):
+            rows.extend(scores.tolist())
+        for i, query in enumerate(queries):
+            for j, candidate in enumerate(candidates):
+                self.assertAlmostEqual(
+                    rows[i][j], jaccard(query, candidate), places=6
+                )
+
+    def test_chunked_rows(self):
+        queries = [f'word{i} shared' for i in range(7)]
+        with patch.object(similarity, 'CHUNK_ELEMENTS', 6):
+            starts = [
+                start for start, _ in
+                similarity.lexical_similarity_chunks(queries, queries[:3])
+            ]
+        self.assertEqual(starts, [0, 2, 4, 6])
+
+    def test_top_k_threshold_and_self_exclusion(self):
+        method, rows = similarity.batch_similarity(
+            ['a b', 'a b c', 'x y'], k=2, threshold=0.5, method='lexical'
+        )
+        self.assertEqual(method, 'lexical')
+        self.assertEqual([column for column, _ in rows[0]], [1])
+        self.assertAlmostEqual(rows[0][0][1], 2 / 3, places=6)
+        self.assertEqual(rows[2], [])
+
+    @patch('polls.api_utils.get_sentence_transformer_model',
+           return_value=FakeModel())
+    def test_embedding_cosine(self, _):
+        method, rows = similarity.batch_similarity(
+            ['login'], ['pay', 'sign in'], k=1
+        )
+        self.assertEqual(method, 'embedding')
+        self.assertEqual(rows[0][0][0], 1)
+        self.assertGreater(rows[0][0][1], 0.99)
+
+    @patch('polls.api_utils.get_sentence_transformer_model',
+           side_effect=ImportError('sentence-transformers 未安裝'))
+    def test_auto_falls_back_to_lexical(self, _):
+        method, _ = similarity.batch_similarity(['a'], ['a'])
+        self.assertEqual(method, 'lexical')
+        with self.assertRaises(ImportError):
+            similarity.batch_similarity(['a'], ['a'], method='embedding')
+
+
+class SimilarityBatchAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('sentence_similarity_batch')
+
+    def post(self, payload):
+        return self.client.post(
+            self.url, data=json.dumps(payload), content_type='application/json'
+        )
+
+    def test_one_query_against_candidates(self):
+        response = self.post({
+            'query': 'hello world',
+            'candidates': ['goodbye universe', 'hello world', 'hello earth'],
+            'top_k': 2, 'method': 'lexical',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['shape'], [1, 3])
+        matches = data['results'][0]['matches']
+        self.assertEqual([m['index'] for m in matches], [1, 2])
+        self.assertEqual(matches[0]['similarity'], 1.0)
+        self.assertEqual(matches[1]['text'], 'hello earth')
+
+    def test_matrix_with_threshold(self):
+        response = self.post({
+            'queries': ['a b', 'c d'],
+            'candidates': ['a b', 'a x', 'c d e'],
+            'threshold': 0.5, 'method': 'lexical',
+        })
+        results = response.json()['results']
+        self.assertEqual([m['index'] for m in results[0]['matches']], [0])
+        self.assertEqual([m['index'] for m in results[1]['matches']], [2])
+
+    def test_dedupe_without_candidates(self):
+        response = self.post({
+            'queries': ['same text', 'same text', 'other'],
+            'top_k': 1, 'threshold': 0.9, 'method': 'lexical',
+        })
+        results = response.json()['results']
+        self.assertEqual(results[0]['matches'][0]['index'], 1)
+        self.assertEqual(results[2]['matches'], [])
+
+    def test_validation(self):
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(
+            self.post({'queries': ['a'], 'candidates': []}).status_code, 400
+        )
+        self.assertEqual(
+            self.post({'query': 'a', 'top_k': 0}).status_code, 400
+        )
+        self.assertEqual(
+            self.post({'query': 'a', 'method': 'tfidf'}).status_code, 400
+        )
+        with override_settings(SIMILARITY_MAX_PAIRS=3):
+            self.assertEqual(
+                self.post({'queries': ['a', 'b']}).status_code, 400
+            )
+
+    def test_method_not_allowed(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
@@ -0,0 +1,227 @@
+"""
+DBML / Gherkin 差異比對與完整結果區段增量重新生成測試
+"""
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, Client
+
+from polls.spec_diff import diff_spec, parse_dbml, parse_gherkin
+
+DBML = """// 使用者
+Table User {
+  id int [pk]
+  name varchar [note: "名稱 { 可含括號 }"]
+}
+
+Table Order {
+  id int [pk]
+  user_id int
+}
+
+Ref: Order.user_id > User.id
+"""
+
+GHERKIN = """@auth
+Feature: 登入
+  Scenario: 成功登入
+    Given 使用者已註冊
+    When 輸入正確密碼
+    Then 登入成功
+
+Feature: 下單
+  Rule: 庫存必須足夠
+    Example: 庫存不足
+      Given 商品庫存為 0
+      Then 顯示錯誤
+"""
+
+SECTION_EXPERTS = {
+    '技術文件撰寫專家': 'background',
+    '產品經理': 'goals',
+    '流程圖設計專家': 'flowchart',
+    'API 設計專家': 'api_spec',
+}
+
+
+class SpecDiffTest(TestCase):
+    def test_parse_blocks(self):
+        self.assertEqual(
+            list(parse_dbml(DBML)),
+            ['Table User', 'Table Order', 'Ref: Order.user_id > User.id']
+        )
+        features = parse_gherkin(GHERKIN)
+        self.assertEqual(list(features), ['Feature: 登入', 'Feature: 下單'])
+        self.assertTrue(features['Feature: 登入'].startswith('@auth\n'))
+
+    def test_formatting_and_comments_are_ignored(self):
+        edited = DBML.replace('// 使用者', '// 會員').replace('  id', '    id')
+        changes = diff_spec(DBML, GHERKIN, edited, GHERKIN + '\n# 備註\n')
+        self.assertEqual(changes['sections'], [])
+        self.assertEqual(changes['dbml']['changed'], [])
+
+    def test_comment_markers_inside_strings_are_content(self):
+        dbml = (
+            'Table Site {\n'
+            '  url varchar [note: "https://example.com // 首頁"] // 網址\n'
+            '  tag varchar [default: \'/* 無 */\']\n'
+            '}\n'
+        )
+        body = parse_dbml(dbml)['Table Site']
+        self.assertIn('"https://example.com // 首頁"', body)
+        self.assertIn("'/* 無 */'", body)
+        self.assertNotIn('網址', body)
+
+        changes = diff_spec(
+            dbml, GHERKIN, dbml.replace('// 首頁', '// 登入頁'), GHERKIN
+        )
+        self.assertEqual(changes['dbml']['changed'], ['Table Site'])
+        self.assertEqual(changes['sections'], ['api_spec'])
+
+        # 字串外的區塊註解仍忽略
+        changes = diff_spec(
+            dbml, GHERKIN, '/* 網站 {\n} */\n' + dbml, GHERKIN
+        )
+        self.assertEqual(changes['sections'], [])
+
+    def test_sections_follow_their_dependencies(self):
+        # 修改 Gherkin 步驟：只影響流程圖
+        changes = diff_spec(
+            DBML, GHERKIN, DBML, GHERKIN.replace('輸入正確密碼', '輸入密碼')
+        )
+        self.assertEqual(changes['sections'], ['flowchart'])
+        self.assertEqual(changes['gherkin']['changed'], ['Feature: 登入'])
+
+        # 新增資料表：背景、目標與 API 規格都需要更新
+        changes = diff_spec(
+            DBML, GHERKIN, DBML + '\nTable Item {\n  id int\n}\n', GHERKIN
+        )
+        self.assertEqual(
+            changes['sections'], ['background', 'goals', 'api_spec']
+        )
+        self.assertEqual(changes['dbml']['added'], ['Table Item'])
+
+        # 新增場景：除了區塊內容外標題也改變，四個區段都需要更新
+        changes = diff_spec(
+            DBML, GHERKIN, DBML,
+            GHERKIN + '\n  Scenario: 登出\n    Then 回到首頁\n'
+        )
+        self.assertEqual(len(changes['sections']), 4)
+
+    def test_changing_one_table_regenerates_one_section(self):
+        # 只有 API 規格的提示詞帶入欄位定義
+        changes = diff_spec(
+            DBML, GHERKIN, DBML.replace('user_id int', 'user_id bigint'), GHERKIN
+        )
+        self.assertEqual(changes['sections'], ['api_spec'])
+        self.assertEqual(changes['dbml'], {
+            'added': [], 'removed': [], 'changed': ['Table Order'],
+        })
+
+
+class IncrementalCompleteResultTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        patcher = patch(
+            'polls.api_utils.acall_ollama_api', side_effect=self.route
+        )
+        self.llm = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.version = 1
+
+    def route(self, prompt, user_input, **kwargs):
+        for expert, section in SECTION_EXPERTS.items():
+            if expert in prompt:
+                return f'{section} v{self.version}'
+        raise AssertionError('未知的提示詞')
+
+    def generate(self, dbml, gherkin, previous=None):
+        payload = {'dbml': dbml, 'gherkin': gherkin}
+        if previous is not None:
+            payload['previous'] = previous
+        return self.client.post(
+            '/polls/generate_complete_result/', data=json.dumps(payload),
+            content_type='application/json'
+        )
+
+    def test_unchanged_content_is_reused(self):
+        first = self.generate(DBML, GHERKIN).json()
+        self.assertEqual(self.llm.call_count, 4)
+        self.assertNotIn('regenerated', first)
+
+        # 只改註解與縮排：四個區段都沿用
+        self.version = 2
+        edited = DBML.replace('// 使用者', '// 會員').replace('  id', '    id')
+        previous = {'dbml': DBML, 'gherkin': GHERKIN, 'result': first}
+        data = self.generate(edited, GHERKIN, previous).json()
+        self.assertEqual(self.llm.call_count, 4)
+        self.assertEqual(data['regenerated'], [])
+        self.assertEqual(data['flowchart'], 'flowchart v1')
+
+        # 修改步驟：只重新生成流程圖，其餘區段沿用
+        edited = GHERKIN.replace('顯示錯誤', '顯示庫存不足')
+        data = self.generate(DBML, edited, previous).json()
+        self.assertEqual(self.llm.call_count, 5)
+        self.assertEqual(data['regenerated'], ['flowchart'])
+        self.assertEqual(data['flowchart'], 'flowchart v2')
+        self.assertEqual(data['api_spec'], 'api_spec v1')
+        self.assertEqual(data['changes']['gherkin']['changed'], ['Feature: 下單'])
+
+        # 修改單一資料表的欄位：只重新生成 API 規格
+        edited = DBML.replace('user_id int', 'user_id bigint')
+        data = self.generate(edited, GHERKIN, previous).json()
+        self.assertEqual(self.llm.call_count, 6)
+        self.assertEqual(data['regenerated'], ['api_spec'])
+        self.assertEqual(data['api_spec'], 'api_spec v2')
+        self.assertEqual(data['background'], 'background v1')
+
+    def test_prompts_only_embed_their_dependencies(self):
+        self.generate(DBML, GHERKIN)
+        prompts = {}
+        for call in self.llm.call_args_list:
+            prompt = call.kwargs['prompt']
+            for expert, section in SECTION_EXPERTS.items():
+                if expert in prompt:
+                    prompts[section] = prompt
+
+        self.assertIn(GHERKIN.strip(), prompts['flowchart'])
+        self.assertNotIn('Table User', prompts['flowchart'])
+
+        self.assertIn(DBML.strip(), prompts['api_spec'])
+        self.assertIn('- Feature: 下單', prompts['api_spec'])
+        self.assertNotIn('輸入正確密碼', prompts['api_spec'])
+
+        for section in ('background', 'goals'):
+            self.assertIn('- Table Order', prompts[section])
+            self.assertIn('- Feature: 登入', prompts[section])
+            self.assertNotIn('user_id', prompts[section])
+            self.assertNotIn('輸入正確密碼', prompts[section])
+
+    def test_failed_sections_are_retried(self):
+        previous = {
+            'dbml': DBML, 'gherkin': GHERKIN,
+            'result': {
+                'background': '背景', 'goals': '', 'flowchart': 'graph TD',
+                'api_spec': '', 'errors': {'api_spec': '逾時'},
+            },
+        }
+        data = self.generate(DBML, GHERKIN, previous).json()
+        self.assertEqual(data['regenerated'], ['goals', 'api_spec'])
+        self.assertEqual(self.llm.call_count, 2)
+        self.assertEqual(data['background'], '背景')
+
+    def test_invalid_previous(self):
+        valid = {'dbml': DBML, 'gherkin': GHERKIN, 'result': {}}
+        for previous in (
+            'x',
+            {**valid, 'result': 'x'},
+            {**valid, 'result': ['background']},
+            {'dbml': DBML, 'gherkin': GHERKIN},
+            {**valid, 'dbml': 1},
+            {**valid, 'gherkin': ['Feature: 登入']},
+            {**valid, 'result': {'errors': 'api_spec'}},
+        ):
+            response = self.generate(DBML, GHERKIN, previous)
+            self.assertEqual(response.status_code, 400, previous)
+            self.assertIn('previous', response.json()['error'])
+        self.llm.assert_not_called()
@@ -0,0 +1,147 @@
+"""
+規格文件串流解析器測試
+"""
+from django.test import SimpleTestCase
+
+from polls.stream_parser import SpecStreamParser, parse_spec_sections
+
+
+SPEC = """以下內容不屬於任何章節
+==== 背景說明 ====
+本專案提供線上點餐。
+
+==== 資料模型 ====
+```dbml
+Table users {
+  id integer [primary key]
+}
+```
+
+==== 流程圖 ====
+```mermaid
+graph TD
+    A[Start] --> B[End]
+```
+"""
+
+
+def legacy_parse(ai_response):
+    """spec_generator 原本的整份解析方式，用來比對結果"""
+    sections = {}
+    current_section = None
+    current_content = []
+    for line in ai_response.split('\n'):
+        if line.strip().startswith('====') and line.strip().endswith('===='):
+            if current_section:
+                sections[current_section] = '\n'.join(current_content).strip()
+            current_section = line.strip().replace('=', '').strip()
+            current_content = []
+        else:
+            current_content.append(line)
+    if current_section:
+        sections[current_section] = '\n'.join(current_content).strip()
+    return sections
+
+
+class SpecStreamParserTest(SimpleTestCase):
+    def feed_in_chunks(self, text, size):
+        parser = SpecStreamParser()
+        events = []
+        for i in range(0, len(text), size):
+            events.extend(parser.feed(text[i:i + size]))
+        events.extend(parser.close())
+        return parser, events
+
+    def test_matches_full_document_parse(self):
+        for size in (1, 3, 7, len(SPEC)):
+            parser, _ = self.feed_in_chunks(SPEC, size)
+            self.assertEqual(parser.sections, legacy_parse(SPEC))
+        self.assertEqual(parse_spec_sections(SPEC), legacy_parse(SPEC))
+
+    def test_section_completes_before_stream_ends(self):
+        parser = SpecStreamParser()
+        events = parser.feed("==== 背景說明 ====\n內容\n==== 目")
+        self.assertEqual(
+            [e['event'] for e in events], ['section_start']
+        )
+        events = parser.feed("標 ====\n")
+        self.assertEqual(events[0]['event'], 'section_end')
+        self.assertEqual(events[0]['section'], '背景說明')
+        self.assertEqual(events[0]['content'], '內容')
+        self.assertEqual(events[1], {'event': 'section_start', 'section': '目標'})
+
+    def test_code_blocks_detected(self):
+        _, events = self.feed_in_chunks(SPEC, 5)
+        blocks = [e for e in events if e['event'] == 'code_block']
+        self.assertEqual([b['language'] for b in blocks], ['dbml', 'mermaid'])
+        self.assertEqual(blocks[0]['section'], '資料模型')
+        self.assertIn('Table users', blocks[0]['content'])
+        self.assertNotIn('```', blocks[0]['content'])
+
+        model_end = next(
+            e for e in events
+            if e['event'] == 'section_end' and e['section'] == '資料模型'
+        )
+        self.assertEqual(model_end['code_blocks'][0]['language'], 'dbml')
+
+    def test_header_closes_unterminated_code_block(self):
+        text = (
+            "==== 流程圖 ====\n```mermaid\ngraph TD\n"
+            "==== API 規格 ====\nPOST /api/orders\n"
+        )
+        for size in (1, 4, len(text)):
+            parser, events = self.feed_in_chunks(text, size)
+            self.assertEqual(list(parser.sections), ['流程圖', 'API 規格'])
+            self.assertEqual(parser.sections['API 規格'], 'POST /api/orders')
+            self.assertEqual(
+                [e['event'] for e in events],
+                ['section_start', 'code_block_start', 'code_block',
+                 'section_end', 'section_start', 'section_end']
+            )
+            self.assertEqual(events[2]['content'], 'graph TD')
+            self.assertFalse(parser.in_code_block)
+
+    def test_unterminated_code_block_flushed_on_close(self):
+        parser = SpecStreamParser()
+        parser.feed("==== 流程圖 ====\n```mermaid\ngraph TD")
+        events = parser.close()
+        self.assertEqual(events[0]['event'], 'code_block')
+        self.assertEqual(events[0]['content'], 'graph TD')
+        self.assertEqual(events[1]['event'], 'section_end')
+
+    def test_tokens_split_at_section_headers(self):
+        for size in (1, 4, 9, len(SPEC)):
+            parser = SpecStreamParser(tokens=True)
+            events = []
+            for i in range(0, len(SPEC), size):
+                events.extend(parser.feed(SPEC[i:i + size]))
+            events.extend(parser.close())
+            tokens = [e for e in events if e['event'] == 'token']
+            self.assertEqual(''.join(t['text'] for t in tokens), SPEC)
+
+            text = {}
+            for token in tokens:
+                text[token['section']] = (
+                    text.get(token['section'], '') + token['text']
+                )
+            self.assertEqual(text[None], '以下內容不屬於任何章節\n')
+            self.assertEqual(text['背景說明'], '==== 背景說明 ====\n本專案提供線上點餐。\n\n')
+            self.assertTrue(text['流程圖'].startswith('==== 流程圖 ====\n'))
+
+    def test_token_carrying_header_is_split(self):
+        parser = SpecStreamParser(tokens=True)
+        parser.feed("==== 背景說明 ====\n內容")
+        events = parser.feed("。\n==== 目標 ====\n1. 快速")
+        self.assertEqual(
+            [(e['event'], e['section']) for e in events],
+            [('token', '背景說明'), ('section_end', '背景說明'),
+             ('section_start', '目標'), ('token', '目標'), ('token', '目標')]
+        )
+        self.assertEqual(events[0]['text'], '。\n')
+        self.assertEqual(events[3]['text'], '==== 目標 ====\n')
+        self.assertEqual(events[4]['text'], '1. 快速')
+
+    def test_tokens_disabled_by_default(self):
+        parser = SpecStreamParser()
+        events = parser.feed(SPEC) + parser.close()
+        self.assertNotIn('token', [e['event'] for e in events])
@@ -0,0 +1,255 @@
+"""
+串流 (SSE) API 測試
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, Client
+
+
+async def parse_sse(response):
+    """將非同步 StreamingHttpResponse 內容解析為 (event, data) 清單"""
+    chunks = [chunk async for chunk in response.streaming_content]
+    body = b''.join(chunks).decode('utf-8')
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def fake_stream(responses):
+    """依提示詞關鍵字回傳逐字元產出的模擬非同步串流"""
+    async def stream(prompt, user_input, **kwargs):
+        for keyword, response in responses.items():
+            if keyword in prompt or keyword in user_input:
+                if isinstance(response, Exception):
+                    raise response
+                for i in range(0, len(response), 4):
+                    yield response[i:i + 4]
+                return
+        raise AssertionError('未預期的提示詞')
+    return stream
+
+
+class SpecGeneratorStreamTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = '/polls/spec-generator/stream/'
+        self.payload = {
+            'project_goal': '線上點餐',
+            'core_features': '瀏覽菜單',
+            'technical_constraints': 'Django',
+            'target_audience': '餐廳顧客',
+        }
+
+    async def post(self, payload):
+        return await self.async_client.post(
+            self.url, data=json.dumps(payload),
+            content_type='application/json'
+        )
+
+    @patch('polls.api_utils.astream_ollama_api')
+    async def test_streams_tokens_and_sections(self, mock_stream):
+        mock_stream.side_effect = fake_stream({
+            '線上點餐': (
+                "==== 背景說明 ====\n本專案提供線上點餐。\n\n"
+                "==== 目標 ====\n1. 快速點餐\n"
+            )
+        })
+        response = await self.post(self.payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+
+        events = await parse_sse(response)
+        kinds = [kind for kind, _ in events]
+        self.assertIn('token', kinds)
+        starts = [d['section'] for k, d in events if k == 'section_start']
+        self.assertEqual(starts, ['背景說明', '目標'])
+        ends = {d['section']: d['content'] for k, d in events if k == 'section_end'}
+        self.assertEqual(ends['背景說明'], '本專案提供線上點餐。')
+        self.assertEqual(ends['目標'], '1. 快速點餐')
+        self.assertEqual(kinds[-1], 'done')
+        self.assertEqual(events[-1][1]['sections']['目標'], '1. 快速點餐')
+
+        # 含標題的 token 在標題處切開，標題之後的文字歸入新章節
+        text = {}
+        for kind, data in events:
+            if kind == 'token':
+                text[data['section']] = text.get(data['section'], '') + data['text']
+        self.assertEqual(
+            text['背景說明'], '==== 背景說明 ====\n本專案提供線上點餐。\n\n'
+        )
+        self.assertEqual(text['目標'], '==== 目標 ====\n1. 快速點餐\n')
+        self.assertEqual(''.join(text.values()), events[-1][1]['result'])
+
+    @patch('polls.api_utils.astream_ollama_api')
+    async def test_stream_error_event(self, mock_stream):
+        mock_stream.side_effect = fake_stream({'線上點餐': Exception('down')})
+        events = await parse_sse(await self.post(self.payload))
+        self.assertEqual(events[-1][0], 'error')
+        self.assertIn('down', events[-1][1]['error'])
+
+    async def test_missing_fields(self):
+        response = await self.post({'project_goal': '線上點餐'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FormulationStreamTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = '/polls/formulation/stream/'
+
+    @patch('polls.api_utils.astream_ollama_api')
+    async def test_streams_both_artifacts(self, mock_stream):
+        mock_stream.side_effect = fake_stream({
+            '輸出為 DBML 格式': "```dbml\nTable User {\n  id int\n}\n```",
+            '輸出為 Gherkin 格式': "Feature: 登入",
+        })
+        response = await self.async_client.post(
+            self.url, data=json.dumps({'spec_text': '使用者可以登入'}),
+            content_type='application/json'
+        )
+        events = await parse_sse(response)
+        sections = {d['section'] for k, d in events if k == 'token'}
+        self.assertEqual(sections, {'dbml', 'gherkin'})
+        done = events[-1][1]
+        self.assertTrue(done['success'])
+        self.assertEqual(done['dbml'], "Table User {\n  id int\n}")
+        self.assertEqual(done['gherkin'], 'Feature: 登入')
+
+    @patch('polls.api_utils.astream_ollama_api')
+    async def test_one_artifact_fails(self, mock_stream):
+        mock_stream.side_effect = fake_stream({
+            '輸出為 DBML 格式': "Table User {}",
+            '輸出為 Gherkin 格式': Exception('gherkin down'),
+        })
+        response = await self.async_client.post(
+            self.url, data=json.dumps({'spec_text': '使用者可以登入'}),
+            content_type='application/json'
+        )
+        events = await parse_sse(response)
+        errors = [d for k, d in events if k == 'section_error']
+        self.assertEqual(errors[0]['section'], 'gherkin')
+        done = events[-1][1]
+        self.assertTrue(done['partial'])
+        self.assertEqual(done['dbml'], 'Table User {}')
+
+    def test_missing_spec_text(self):
+        response = self.client.post(
+            self.url, data=json.dumps({}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CompleteResultStreamTest(TestCase):
+    @patch('polls.api_utils.astream_ollama_api')
+    async def test_streams_four_sections(self, mock_stream):
+        mock_stream.side_effect = fake_stream({
+            '技術文件撰寫專家': '背景',
+            '產品經理': '1. 目標',
+            '流程圖設計專家': '```mermaid\ngraph TD\n```',
+            'API 設計專家': 'POST /api/users',
+        })
+        response = await self.async_client.post(
+            '/polls/generate_complete_result/stream/',
+            data=json.dumps({'dbml': 'Table User {}', 'gherkin': 'Feature: X'}),
+            content_type='application/json'
+        )
+        events = await parse_sse(response)
+        ended = {d['section'] for k, d in events if k == 'section_end'}
+        self.assertEqual(
+            ended, {'background', 'goals', 'flowchart', 'api_spec'}
+        )
+        done = events[-1][1]
+        self.assertTrue(done['success'])
+        self.assertEqual(done['flowchart'], 'graph TD')
+
+
+class StreamPayloadTest(TestCase):
+    @patch('polls.api_utils.astream_ollama_api')
+    def test_non_object_json_is_rejected(self, mock_stream):
+        client = Client()
+        for url in (
+            '/polls/spec-generator/stream/',
+            '/polls/formulation/stream/',
+            '/polls/generate_complete_result/stream/',
+        ):
+            for body in ('[]', '"x"', '1', 'null'):
+                response = client.post(
+                    url, data=body, content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 400, (url, body))
+        mock_stream.assert_not_called()
+
+
+class AsyncStreamingTest(TestCase):
+    """串流 view 為非同步：事件逐一送出，不會在 ASGI 下被整批緩衝"""
+
+    async def test_events_are_sent_incrementally(self):
+        release = asyncio.Event()
+
+        async def stream(prompt, user_input, **kwargs):
+            yield 'Feature'
+            # 模型仍在生成：之前的 token 必須已經送達用戶端
+            await release.wait()
+            yield ': 登入'
+
+        with patch('polls.api_utils.astream_ollama_api', side_effect=stream):
+            response = await self.async_client.post(
+                '/polls/formulation/stream/',
+                data=json.dumps({'spec_text': '使用者可以登入'}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+
+            chunks = response.streaming_content.__aiter__()
+            received = []
+            while sum(b'event: token' in chunk for chunk in received) < 2:
+                received.append(
+                    await asyncio.wait_for(chunks.__anext__(), 1)
+                )
+            self.assertFalse(any(b'event: done' in chunk for chunk in received))
+
+            release.set()
+            rest = [chunk async for chunk in chunks]
+        self.assertIn(b'event: done', rest[-1])
+        self.assertIn('Feature: 登入', rest[-1].decode())
+
+    async def test_disconnect_cancels_streams(self):
+        from polls.api_utils import get_llm_executor
+
+        cancelled = asyncio.Event()
+
+        async def stream(prompt, user_input, **kwargs):
+            try:
+                yield '背景'
+                await asyncio.sleep(10)
+            finally:
+                cancelled.set()
+
+        with patch('polls.api_utils.astream_ollama_api', side_effect=stream):
+            response = await self.async_client.post(
+                '/polls/generate_complete_result/stream/',
+                data=json.dumps({'dbml': 'Table A {}', 'gherkin': 'Feature: A'}),
+                content_type='application/json'
+            )
+            received = asyncio.Event()
+
+            async def send():
+                async for _ in response.streaming_content:
+                    received.set()
+
+            sending = asyncio.ensure_future(send())
+            await asyncio.wait_for(received.wait(), 1)
+            # 用戶端斷線：ASGI handler 取消送出回應的工作
+            sending.cancel()
+            await asyncio.wait_for(cancelled.wait(), 1)
+        # 所有任務結束後釋放非同步呼叫額度
+        for _ in range(100):
+            if not get_llm_executor().stats()['async_active']:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(get_llm_executor().stats()['async_active'], 0)
@@ -0,0 +1,437 @@
+"""
+向量索引測試（NumPy 暴力搜尋後端；有安裝 faiss 時另測 faiss 後端）與增量同步測試
+"""
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+
+from polls import vector_index as vi
+from polls.models import SentenceDatabase, Ticket, VectorIndexOutbox
+
+
+class VectorIndexTestCase(TestCase):
+    def setUp(self):
+        self.base_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_path, True)
+        override = override_settings(
+            FAISS_INDEX_PATH=self.base_path, FAISS_DIMENSION=3,
+            EMBEDDING_CACHE_ENABLED=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class BruteForceIndexTest(VectorIndexTestCase):
+    def make_index(self, backend='numpy'):
+        index = vi.VectorIndex('kb', backend=backend)
+        index.add([
+            (10, [1.0, 0.0, 0.0], 'x'),
+            (20, [0.0, 1.0, 0.0], 'y'),
+            (30, [0.9, 0.1, 0.0], 'near x'),
+            (40, [1.0, 0.0], 'wrong dimension'),
+        ])
+        return index
+
+    def test_search_returns_nearest_by_primary_key(self):
+        index = self.make_index()
+        self.assertEqual(index.count, 3)
+        results = index.search([1.0, 0.0, 0.0], k=2)
+        self.assertEqual([r['id'] for r in results], [10, 30])
+        self.assertAlmostEqual(results[0]['score'], 1.0, places=5)
+        self.assertEqual(results[1]['text'], 'near x')
+
+    def test_k_larger_than_index(self):
+        results = self.make_index().search([0.0, 1.0, 0.0], k=10)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['id'], 20)
+
+    def test_add_replaces_and_remove(self):
+        index = self.make_index()
+        index.add([(10, [0.0, 0.0, 1.0], 'moved')])
+        self.assertEqual(index.count, 3)
+        self.assertEqual(index.search([0.0, 0.0, 1.0], k=1)[0]['id'], 10)
+        self.assertEqual(index.remove([10, 99]), 1)
+        self.assertEqual(index.count, 2)
+
+    def test_save_and_load(self):
+        self.make_index().save(build_seconds=0.1, skipped=1)
+        loaded = vi.VectorIndex.load('kb')
+        self.assertEqual(loaded.count, 3)
+        self.assertEqual(loaded.search([0.0, 1.0, 0.0], k=1)[0]['text'], 'y')
+        status = vi.index_status('kb')
+        self.assertEqual(status['record_count'], 3)
+        self.assertEqual(status['skipped'], 1)
+        self.assertEqual(status['dimension'], 3)
+
+    def test_faiss_backend_matches_numpy(self):
+        if vi.faiss is None:
+            self.skipTest('faiss 未安裝')
+        numpy_results = self.make_index('numpy').search([1.0, 0.2, 0.0], k=3)
+        faiss_results = self.make_index('faiss').search([1.0, 0.2, 0.0], k=3)
+        self.assertEqual(
+            [r['id'] for r in numpy_results], [r['id'] for r in faiss_results]
+        )
+
+
+class FakeModel:
+    def encode(self, sentences, batch_size=32):
+        return [[float(len(s)), 1.0, 0.0] for s in sentences]
+
+
+class VectorIndexAPITest(VectorIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        SentenceDatabase.objects.create(sentence='apple', embedding=[1, 0, 0])
+        SentenceDatabase.objects.create(sentence='banana', embedding=[0, 1, 0])
+        SentenceDatabase.objects.create(sentence='no vector')
+
+    def post(self, url, payload=None):
+        return self.client.post(
+            url, data=json.dumps(payload or {}),
+            content_type='application/json'
+        )
+
+    def test_rebuild_reports_real_counts(self):
+        response = self.post('/polls/faiss-index/rebuild/')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['record_count'], 2)
+        self.assertEqual(data['dimension'], 3)
+        self.assertIn('build_seconds', data)
+
+        status = self.client.get('/polls/faiss-index/status/').json()
+        self.assertEqual(status['record_count'], 2)
+        self.assertIsNotNone(status['build_seconds'])
+
+    def test_search_by_vector(self):
+        self.post('/polls/faiss-index/rebuild/')
+        response = self.post(
+            '/polls/faiss-index/search/', {'vector': [0, 1, 0], 'k': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.json()['results'][0]
+        self.assertEqual(result['text'], 'banana')
+        self.assertEqual(
+            result['id'], SentenceDatabase.objects.get(sentence='banana').id
+        )
+
+    def test_search_before_build(self):
+        response = self.post(
+            '/polls/faiss-index/search/', {'vector': [0, 1, 0]}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_validation(self):
+        self.post('/polls/faiss-index/rebuild/')
+        url = '/polls/faiss-index/search/'
+        self.assertEqual(self.post(url, {}).status_code, 400)
+        self.assertEqual(
+            self.post(url, {'vector': [1, 0, 0], 'k': 0}).status_code, 400
+        )
+        self.assertEqual(
+            self.post(url, {'vector': [1, 0], 'k': 1}).status_code, 400
+        )
+
+    @patch(
+        'polls.api_utils.get_sentence_transformer_model',
+        return_value=FakeModel()
+    )
+    def test_sync_encodes_tickets(self, _):
+        Ticket.objects.create(title='login', desc='')
+        Ticket.objects.create(title='checkout', desc='pay')
+        response = self.post('/polls/faiss-index/sync/')
+        self.assertEqual(response.json()['tickets_synced'], 2)
+
+        response = self.post(
+            '/polls/faiss-index/search/',
+            {'query': 'login', 'index': 'ticket', 'k': 1}
+        )
+        self.assertEqual(response.json()['results'][0]['text'], 'login')
+
+
+class IncrementalSyncTest(VectorIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.a = SentenceDatabase.objects.create(
+            sentence='a', embedding=[1, 0, 0]
+        )
+        self.b = SentenceDatabase.objects.create(
+            sentence='b', embedding=[0, 1, 0]
+        )
+
+    def test_signals_write_outbox(self):
+        actions = list(VectorIndexOutbox.objects.filter(
+            index_name='kb'
+        ).values_list('object_id', 'action'))
+        self.assertEqual(
+            actions, [(self.a.id, 'upsert'), (self.b.id, 'upsert')]
+        )
+        self.b.delete()
+        self.assertEqual(
+            VectorIndexOutbox.objects.last().action, 'delete'
+        )
+
+    def test_first_sync_rebuilds_and_clears_outbox(self):
+        result = vi.sync_vector_index('kb')
+        self.assertEqual(result['mode'], 'rebuild')
+        self.assertEqual(result['record_count'], 2)
+        self.assertFalse(
+            VectorIndexOutbox.objects.filter(index_name='kb').exists()
+        )
+
+    def test_sync_applies_only_delta(self):
+        vi.sync_vector_index('kb')
+        c = SentenceDatabase.objects.create(sentence='c', embedding=[0, 0, 1])
+        self.a.sentence = 'a2'
+        self.a.save()
+        self.b.delete()
+
+        with patch('polls.vector_index.sentence_items',
+                   wraps=vi.sentence_items) as mock_items:
+            result = vi.sync_vector_index('kb')
+        queried = set(
+            mock_items.call_args[0][0].values_list('id', flat=True)
+        )
+        self.assertEqual(queried, {self.a.id, c.id})
+
+        self.assertEqual(result['mode'], 'incremental')
+        self.assertEqual(result['upserted'], 2)
+        self.assertEqual(result['removed'], 1)
+        self.assertEqual(result['record_count'], 2)
+
+        index = vi.VectorIndex.load('kb')
+        self.assertEqual(index.metadata['watermark'], result['watermark'])
+        hits = index.search([1, 0, 0], k=2)
+        self.assertEqual(hits[0]['text'], 'a2')
+        self.assertNotIn(self.b.id, [hit['id'] for hit in hits])
+
+    def test_cleared_embedding_removed_from_index(self):
+        vi.sync_vector_index('kb')
+        self.a.embedding = None
+        self.a.save()
+        result = vi.sync_vector_index('kb')
+        self.assertEqual(result['record_count'], 1)
+
+    def test_no_changes_is_noop(self):
+        vi.sync_vector_index('kb')
+        result = vi.sync_vector_index('kb')
+        self.assertEqual(result['upserted'], 0)
+        self.assertEqual(result['removed'], 0)
+
+    def test_late_committed_change_is_not_lost(self):
+        vi.sync_vector_index('kb')
+        c = SentenceDatabase.objects.create(sentence='c', embedding=[0, 0, 1])
+        d = SentenceDatabase.objects.create(sentence='d', embedding=[0, 1, 1])
+        # c 的交易較早取得 ID 但在同步之後才 commit
+        late = VectorIndexOutbox.objects.get(index_name='kb', object_id=c.id)
+        late_id = late.id
+        late.delete()
+        result = vi.sync_vector_index('kb')
+        self.assertGreater(result['watermark'], late_id)
+        self.assertEqual(result['upserted'], 1)
+
+        VectorIndexOutbox.objects.create(
+            id=late_id, index_name='kb', object_id=c.id, action='upsert'
+        )
+        result = vi.sync_vector_index('kb')
+        self.assertEqual(result['upserted'], 1)
+        self.assertEqual(result['record_count'], 4)
+        ids = [hit['id'] for hit in vi.VectorIndex.load('kb').search([0, 0, 1], k=4)]
+        self.assertIn(c.id, ids)
+        self.assertIn(d.id, ids)
+        self.assertFalse(VectorIndexOutbox.objects.exists())
+
+    @skipUnless(vi.fcntl, '檔案鎖測試需要 fcntl')
+    def test_sync_holds_cross_process_file_lock(self):
+        seen = []
+
+        def items(name, ids=None):
+            # 同步進行中，其他行程（另一個檔案描述元）無法取得鎖
+            with open(os.path.join(self.base_path, 'kb.lock'), 'a+b') as f:
+                with self.assertRaises(BlockingIOError):
+                    vi.fcntl.flock(f, vi.fcntl.LOCK_EX | vi.fcntl.LOCK_NB)
+            seen.append(name)
+            return []
+
+        with patch('polls.vector_index.source_items', side_effect=items):
+            vi.sync_vector_index('kb')
+        self.assertEqual(seen, ['kb'])
+        with open(os.path.join(self.base_path, 'kb.lock'), 'a+b') as f:
+            vi.fcntl.flock(f, vi.fcntl.LOCK_EX | vi.fcntl.LOCK_NB)
+
+    def test_sync_command(self):
+        out = StringIO()
+        call_command('sync_vector_index', 'kb', stdout=out)
+        self.assertIn('kb: rebuild', out.getvalue())
+
+
+class MemoryMappedIndexTest(VectorIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        SentenceDatabase.objects.create(sentence='a', embedding=[1, 0, 0])
+        vi.rebuild_vector_index('kb')
+
+    def test_loaded_read_only_memory_map(self):
+        index = vi.get_vector_index('kb')
+        self.assertTrue(index.read_only)
+        self.assertIsInstance(index.index.vectors, vi.np.memmap)
+        self.assertFalse(index.index.vectors.flags.writeable)
+        with self.assertRaises(RuntimeError):
+            index.add([(99, [0, 1, 0], 'x')])
+
+    def test_new_generation_picked_up(self):
+        old = vi.get_vector_index('kb')
+        self.assertIs(vi.get_vector_index('kb'), old)
+
+        SentenceDatabase.objects.create(sentence='b', embedding=[0, 1, 0])
+        vi.sync_vector_index('kb')
+
+        new = vi.get_vector_index('kb')
+        self.assertIsNot(new, old)
+        self.assertEqual(
+            new.metadata['generation'], old.metadata['generation'] + 1
+        )
+        self.assertEqual(new.count, 2)
+        # 舊一代的 memory map 仍可使用
+        self.assertEqual(old.search([1, 0, 0], k=5)[0]['text'], 'a')
+
+    def test_mismatched_files_keep_previous_generation(self):
+        old = vi.get_vector_index('kb')
+        writable = vi.VectorIndex.load('kb', writable=True)
+        writable.add([(99, [0, 1, 0], 'x')])
+        writable.save()
+        # 模擬寫入中：索引檔已換新，但中繼資料仍記錄舊簽章
+        metadata_path = vi.index_files('kb')['metadata']
+        with open(metadata_path, encoding='utf-8') as f:
+            metadata = json.load(f)
+        metadata['files']['index'][0] += 1
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+
+        with patch.object(vi, 'LOAD_RETRY_DELAY', 0):
+            self.assertIs(vi.get_vector_index('kb'), old)
+            with self.assertRaises(vi.StaleIndexFiles):
+                vi.VectorIndex.load('kb')
+
+
+class IndexKindsTest(VectorIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(
+            FAISS_DIMENSION=8, FAISS_NPROBE=2, FAISS_TRAIN_SAMPLE=500
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        rng = vi.np.random.default_rng(1)
+        # 8 個明顯分開的群，每群 50 筆
+        centers = rng.normal(size=(8, 8)) * 5
+        vectors = centers.repeat(50, axis=0) + rng.normal(size=(400, 8)) * 0.1
+        self.items = [
+            (pk + 1, vector.tolist(), f'v{pk + 1}')
+            for pk, vector in enumerate(vectors)
+        ]
+
+    def make_index(self, kind, **config):
+        index = vi.VectorIndex('kb', backend='numpy', config={
+            **vi.index_config(kind), **config
+        })
+        index.add(self.items)
+        return index
+
+    def test_ivf_flat_trains_and_probes(self):
+        index = self.make_index('ivf_flat', nlist=8)
+        self.assertTrue(index.index.is_trained)
+        self.assertEqual(index.index.nlist, 8)
+        query = self.items[0][1]
+        self.assertEqual(index.search(query, k=1)[0]['id'], 1)
+        exact = {hit['id'] for hit in self.make_index('flat').search(query, k=60)}
+        every = {hit['id'] for hit in index.search(query, k=60, nprobe=8)}
+        self.assertEqual(every, exact)
+        # nprobe=1 只比對一個群
+        probed = index.index._candidates(vi._normalize(query)[0], 1)
+        self.assertLess(len(probed), 400)
+
+    def test_auto_nlist(self):
+        index = self.make_index('ivf_flat')
+        self.assertEqual(index.config['nlist'], vi.auto_nlist(400))
+
+    def test_sq8_recall_and_storage(self):
+        index = self.make_index('sq8')
+        self.assertEqual(index.index.vectors.dtype, vi.np.uint8)
+        for pk, vector, _ in self.items[::50]:
+            got = [hit['id'] for hit in index.search(vector, k=5)]
+            self.assertEqual(got[0], pk)
+            # 其餘結果都在同一群
+            self.assertTrue(all((hit - 1) // 50 == (pk - 1) // 50 for hit in got))
+
+    def test_save_and_load_keeps_kind(self):
+        for kind in ('ivf_flat', 'sq8'):
+            with self.subTest(kind=kind):
+                self.make_index(kind).save()
+                self.assertTrue(
+                    vi.os.path.exists(vi.quantizer_file('kb'))
+                )
+                loaded = vi.VectorIndex.load('kb')
+                self.assertEqual(loaded.kind, kind)
+                self.assertIsInstance(loaded.index.vectors, vi.np.memmap)
+                self.assertEqual(
+                    loaded.search(self.items[60][1], k=1)[0]['id'], 61
+                )
+                self.assertEqual(vi.index_status('kb')['index_kind'], kind)
+
+    def test_faiss_only_kinds_without_faiss(self):
+        for kind in ('ivf_pq', 'hnsw'):
+            with self.assertRaises(ImportError):
+                vi.VectorIndex('kb', backend='numpy', config=vi.index_config(kind))
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            vi.index_config('lsh')
+
+    def test_search_endpoint_accepts_nprobe(self):
+        with override_settings(FAISS_INDEX_TYPE='ivf_flat', FAISS_NLIST=8):
+            vi.build_vector_index('kb', self.items)
+        response = Client().post(
+            '/polls/faiss-index/search/',
+            data=json.dumps({'vector': self.items[0][1], 'k': 1, 'nprobe': 1}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['index_kind'], 'ivf_flat')
+        self.assertEqual(response.json()['results'][0]['id'], 1)
+        response = Client().post(
+            '/polls/faiss-index/search/',
+            data=json.dumps({'vector': self.items[0][1], 'nprobe': 0}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_report(self):
+        with patch.object(vi, 'source_items', return_value=self.items):
+            report = vi.evaluate_index_kinds(
+                'kb', ['flat', 'ivf_flat', 'hnsw'], k=5, num_queries=20,
+                nprobe_values=(1, 8)
+            )
+        rows = {(row['kind'], row.get('value')): row for row in report}
+        self.assertEqual(rows[('flat', None)]['recall'], 1.0)
+        self.assertEqual(rows[('ivf_flat', 8)]['recall'], 1.0)
+        self.assertIn('latency_ms_p95', rows[('ivf_flat', 1)])
+        if vi.faiss is None:
+            self.assertIn('error', rows[('hnsw', None)])
+
+    def test_report_command(self):
+        SentenceDatabase.objects.create(sentence='a', embedding=[1] * 8)
+        out = StringIO()
+        call_command(
+            'vector_index_report', '--kinds', 'flat,sq8', '--json', stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual([row['kind'] for row in report], ['flat', 'sq8'])
@@ -0,0 +1,90 @@
+"""
+二進位向量儲存測試
+"""
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, Client, SimpleTestCase
+
+from polls.models import SentenceDatabase
+from polls.vectors import (
+    HEADER, np, pack_vector, unpack_vector, read_header, vector_to_list
+)
+
+
+class VectorFormatTest(SimpleTestCase):
+    def test_float32_round_trip(self):
+        data = pack_vector([0.5, -1.0, 2.25], dtype='float32')
+        self.assertEqual(len(data), HEADER.size + 3 * 4)
+        self.assertEqual(read_header(data), ('float32', 3))
+        self.assertEqual(vector_to_list(unpack_vector(data)), [0.5, -1.0, 2.25])
+
+    def test_float16_halves_payload(self):
+        data = pack_vector([0.5, -1.0, 2.25], dtype='float16')
+        self.assertEqual(len(data), HEADER.size + 3 * 2)
+        self.assertEqual(vector_to_list(data), [0.5, -1.0, 2.25])
+
+    def test_empty_vector_is_none(self):
+        self.assertIsNone(pack_vector([]))
+        self.assertIsNone(pack_vector(None))
+        self.assertEqual(vector_to_list(None), [])
+
+    def test_unpack_is_zero_copy_view(self):
+        if np is None:
+            self.skipTest('NumPy 未安裝')
+        data = pack_vector([1.0, 2.0])
+        vector = unpack_vector(data)
+        self.assertFalse(vector.flags.owndata)
+        self.assertFalse(vector.flags.writeable)
+
+    def test_corrupt_data_rejected(self):
+        data = pack_vector([1.0, 2.0])
+        with self.assertRaises(ValueError):
+            read_header(data[:-1])
+        with self.assertRaises(ValueError):
+            read_header(b'\x09' + data[1:])
+
+    def test_non_numeric_rejected(self):
+        for value in ('abc', ['a', 'b'], [[1.0], [2.0]]):
+            with self.assertRaises((TypeError, ValueError)):
+                pack_vector(value)
+
+
+class SentenceDatabaseVectorTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.item = SentenceDatabase.objects.create(
+            user='u', sentence='s', embedding=[0.25, 0.5]
+        )
+
+    def test_stored_as_binary(self):
+        self.item.refresh_from_db()
+        self.assertEqual(vector_to_list(self.item.embedding), [0.25, 0.5])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT embedding FROM polls_sentencedatabase WHERE id = %s',
+                [self.item.id]
+            )
+            raw = bytes(cursor.fetchone()[0])
+        self.assertEqual(len(raw), HEADER.size + 2 * 4)
+
+    def test_clean_rejects_strings(self):
+        self.item.embedding = ['x']
+        with self.assertRaises(ValidationError):
+            self.item.clean()
+
+    def test_list_omits_embedding_by_default(self):
+        data = self.client.get('/polls/sentence-db/').json()['sentences'][0]
+        self.assertNotIn('embedding', data)
+        data = self.client.get(
+            '/polls/sentence-db/?fields=id,embedding_dim'
+        ).json()['sentences'][0]
+        self.assertEqual(data, {'id': self.item.id, 'embedding_dim': 2})
+
+        data = self.client.get(
+            '/polls/sentence-db/?include_embedding=true'
+        ).json()['sentences'][0]
+        self.assertEqual(data['embedding'], [0.25, 0.5])
+
+    def test_detail_includes_embedding(self):
+        data = self.client.get(f'/polls/sentence-db/{self.item.id}/').json()
+        self.assertEqual(data['embedding'], [0.25, 0.5])
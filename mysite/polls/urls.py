@@ -3,47 +3,77 @@ from . import views
 
 urlpatterns = [
     path('', views.spec_generator, name='spec_generator'),
+    path('spec-generator/stream/', views.spec_generator_stream, name='spec_generator_stream'),
     path('weight-config-page/', views.weight_config_page, name='weight_config_page'),
     path('field-priority-page/', views.field_priority_page, name='field_priority_page'),
     path('generate-specification/', views.generate_specification_api, name='generate_specification_api'),
     path('retry-ai/', views.retry_ai_api, name='retry_ai_api'),
+    path('jobs/', views.generation_job_list, name='generation-job-list'),
+    path('jobs/<int:job_id>/', views.generation_job_detail, name='generation-job-detail'),
     path('user/', views.user_list, name='user-list'),
+    path('user/bulk/', views.bulk_api, {'resource': 'user'}, name='user-bulk'),
     path('user/<int:user_id>/', views.user_detail, name='user-detail'),
     path('order/', views.order_list, name='order-list'),
+    path('order/bulk/', views.bulk_api, {'resource': 'order'}, name='order-bulk'),
     path('order/<int:order_id>/', views.order_detail, name='order-detail'),
     path('weight-config/', views.weight_config_list, name='weight_config_list'),
+    path('weight-config/bulk/', views.bulk_api, {'resource': 'weight-config'}, name='weight_config_bulk'),
     path('weight-config/<int:config_id>/', views.weight_config_detail, name='weight_config_detail'),
     path(
         'field-priority/',
         views.field_priority_list,
         name='field_priority_list'
     ),
+    path(
+        'field-priority/bulk/',
+        views.bulk_api,
+        {'resource': 'field-priority'},
+        name='field_priority_bulk'
+    ),
     path(
         'field-priority/<int:config_id>/',
         views.field_priority_detail,
         name='field_priority_detail'
     ),
     path('sentence-db/', views.sentence_db_list, name='sentence_db_list'),
+    path('sentence-db/bulk/', views.bulk_api, {'resource': 'sentence-db'}, name='sentence_db_bulk'),
     path('sentence-db/<int:sentence_id>/', views.sentence_db_detail, name='sentence_db_detail'),
+    path('sentence-db/search/', views.sentence_db_search, name='sentence_db_search'),
+    path('sentence-db/encode/', views.sentence_db_encode, name='sentence_db_encode'),
+    path('sentence-db/near-duplicates/', views.sentence_db_near_duplicates, name='sentence_db_near_duplicates'),
     path('sentence-similarity/', views.sentence_similarity_api, name='sentence_similarity_api'),
+    path('sentence-similarity/batch/', views.sentence_similarity_batch, name='sentence_similarity_batch'),
     path('gpt-prompt/', views.gpt_prompt_list, name='gpt_prompt_list'),
+    path('gpt-prompt/bulk/', views.bulk_api, {'resource': 'gpt-prompt'}, name='gpt_prompt_bulk'),
     path('gpt-prompt/<int:prompt_id>/', views.gpt_prompt_detail, name='gpt_prompt_detail'),
     path('gpt-generate/', views.gpt_generate_api, name='gpt_generate_api'),
     path('llm-ideas/', views.llm_ideas_api, name='llm_ideas_api'),
     path('generate-field/', views.generate_field_api, name='generate_field_api'),
     # 進階規格產出 API
     path('formulation/', views.formulation_api, name='formulation_api'),
+    path('formulation/stream/', views.formulation_stream_api, name='formulation_stream_api'),
     path('discovery/', views.discovery_api, name='discovery_api'),
     path('generate_complete_result/', views.generate_complete_result_api, name='generate_complete_result_api'),
+    path('generate_complete_result/stream/', views.generate_complete_result_stream_api, name='generate_complete_result_stream_api'),
+    path('pipeline-runs/', views.pipeline_run_list, name='pipeline-run-list'),
+    path('pipeline-runs/<int:run_id>/', views.pipeline_run_detail, name='pipeline-run-detail'),
+    path('pipeline-runs/<int:run_id>/resume/', views.pipeline_run_resume, name='pipeline-run-resume'),
+    path('pipeline-runs/<int:run_id>/stages/<str:stage>/', views.pipeline_run_stage, name='pipeline-run-stage'),
     path('sync-path/', views.sync_path_list, name='sync-path-list'),
+    path('sync-path/bulk/', views.bulk_api, {'resource': 'sync-path'}, name='sync-path-bulk'),
     path('sync-path/<int:path_id>/', views.sync_path_detail, name='sync-path-detail'),
     path('chat-session/', views.chat_session_list, name='chat-session-list'),
+    path('chat-session/bulk/', views.bulk_api, {'resource': 'chat-session'}, name='chat-session-bulk'),
     path('chat-session/<str:session_id>/', views.chat_session_detail, name='chat-session-detail'),
     path('category-memory/', views.category_memory_list, name='category-memory-list'),
+    path('category-memory/bulk/', views.bulk_api, {'resource': 'category-memory'}, name='category-memory-bulk'),
     path('category-memory/<int:memory_id>/', views.category_memory_detail, name='category-memory-detail'),
     path('uploaded-file/', views.uploaded_file_list, name='uploaded-file-list'),
+    path('uploaded-file/bulk/', views.bulk_api, {'resource': 'uploaded-file'}, name='uploaded-file-bulk'),
     path('uploaded-file/<int:file_id>/', views.uploaded_file_detail, name='uploaded-file-detail'),
     path('faiss-index/status/', views.faiss_index_status, name='faiss-index-status'),
     path('faiss-index/rebuild/', views.faiss_index_rebuild, name='faiss-index-rebuild'),
     path('faiss-index/sync/', views.faiss_index_sync, name='faiss-index-sync'),
+    path('faiss-index/search/', views.faiss_index_search, name='faiss-index-search'),
+    path('metrics/', views.metrics_api, name='metrics'),
 ]
@@ -0,0 +1,1260 @@
+"""
+向量索引
+以 IndexIDMap(IndexFlatL2) 建立 SentenceDatabase / Ticket 的語意向量索引，
+以資料主鍵作為向量 ID，並將索引、中繼資料與原文持久化到 settings.FAISS_INDEX_PATH
+
+索引類型由 settings.FAISS_INDEX_TYPE 選擇：
+    flat：精確搜尋（IndexFlatL2 + IndexIDMap，預設）
+    ivf_flat：IVF 分群後只搜尋 nprobe 個群（IndexIVFFlat）
+    ivf_pq：IVF + 乘積量化壓縮向量（IndexIVFPQ，需要 faiss）
+    hnsw：HNSW 圖搜尋（IndexHNSWFlat，需要 faiss，不支援移除）
+    sq8：每維 8-bit 純量量化（IndexScalarQuantizer QT_8bit）
+
+未安裝 faiss 時改用 NumPy 實作（flat、ivf_flat、sq8），介面與檔案配置相同
+
+服務請求的行程以唯讀 memory map 載入索引（faiss IO_FLAG_MMAP 或 np.memmap），
+多個 worker 共用作業系統的 page cache 而不各自複製一份；重建或同步時
+以 os.replace 換上新檔案，中繼資料最後寫入並記錄各檔案簽章，
+讀取端確認簽章一致後才切換到新一代索引
+"""
+import json
+import math
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy 為選用套件
+    np = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+INDEX_TYPE = 'IndexFlatL2 + IndexIDMap'
+INDEX_KINDS = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw', 'sq8')
+IVF_KINDS = ('ivf_flat', 'ivf_pq')
+# 需要額外量化參數檔（IVF 群中心、SQ8 範圍）的 NumPy 索引
+QUANTIZER_KINDS = ('ivf_flat', 'sq8')
+# faiss 可直接 memory map 的索引（其餘以一般方式讀入）
+MMAP_KINDS = ('flat', 'sq8')
+
+# 索引名稱 -> 資料來源說明
+SOURCES = {
+    'kb': 'SentenceDatabase',
+    'ticket': 'Ticket',
+}
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('向量索引需要 numpy：pip install numpy')
+
+
+def _normalize(vectors):
+    """轉為 float32 二維陣列並做 L2 正規化（L2 距離即對應 cosine 相似度）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms)
+
+
+def index_config(kind=None):
+    """
+    依 settings 組合索引設定
+
+    回傳：
+        dict: {'kind', 'nlist'（0 表示依資料量自動決定）, 'pq_m', 'hnsw_m'}
+    """
+    kind = kind or settings.FAISS_INDEX_TYPE
+    if kind not in INDEX_KINDS:
+        raise ValueError(
+            f"未知的索引類型: {kind}（可用：{', '.join(INDEX_KINDS)}）"
+        )
+    return {
+        'kind': kind,
+        'nlist': settings.FAISS_NLIST,
+        'pq_m': settings.FAISS_PQ_M,
+        'hnsw_m': settings.FAISS_HNSW_M,
+    }
+
+
+def auto_nlist(n):
+    """IVF 群數：約 4√n，且每群至少有數筆訓練資料"""
+    if n <= 0:
+        return 1
+    return max(1, min(int(4 * math.sqrt(n)), n // 8 or 1))
+
+
+def describe_index(config):
+    """索引類型的顯示名稱（status API 的 index_type）"""
+    kind = config.get('kind', 'flat')
+    if kind == 'ivf_flat':
+        return f"IndexIVFFlat (nlist={config.get('nlist')})"
+    if kind == 'ivf_pq':
+        return (
+            f"IndexIVFPQ (nlist={config.get('nlist')}, m={config.get('pq_m')})"
+        )
+    if kind == 'hnsw':
+        return f"IndexHNSWFlat (M={config.get('hnsw_m')}) + IndexIDMap"
+    if kind == 'sq8':
+        return 'IndexScalarQuantizer (QT_8bit) + IndexIDMap'
+    return INDEX_TYPE
+
+
+def _nearest_centroids(vectors, centroids, chunk_size=4096):
+    """每個向量最近的群中心（分段計算以限制暫存記憶體）"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        scores = centroid_norms - 2 * chunk @ centroids.T
+        assignments[start:start + chunk_size] = scores.argmin(axis=1)
+    return assignments
+
+
+def _kmeans(sample, nlist, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class BruteForceIndex:
+    """
+    NumPy 版 IndexIDMap(IndexFlatL2)
+
+    提供與 faiss 相同的 add_with_ids / remove_ids / search / ntotal 介面，
+    search 回傳 (平方 L2 距離, ID)，不足 k 筆時以 -1 補齊。
+
+    檔案格式為 .npy 結構化陣列，每筆紀錄為 (id int64, vector float32[d])，
+    可直接 memory map 而不需載入整份檔案。
+    """
+
+    is_trained = True
+
+    def __init__(self, dimension):
+        _require_numpy()
+        self.d = dimension
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dimension), dtype=np.float32)
+        self._changed()
+
+    def _changed(self):
+        """資料異動後清除衍生的快取"""
+        self._squared_norms = None
+        self._id_order = None
+
+    @staticmethod
+    def record_dtype(dimension):
+        return np.dtype([('id', '<i8'), ('vector', '<f4', (dimension,))])
+
+    @property
+    def ntotal(self):
+        return len(self.ids)
+
+    def train(self, vectors):
+        pass
+
+    def add_with_ids(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.d)
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self._changed()
+
+    def remove_ids(self, ids):
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        removed = int(len(self.ids) - keep.sum())
+        if removed:
+            self._keep(keep)
+        return removed
+
+    def _keep(self, mask):
+        self.ids = self.ids[mask]
+        self.vectors = self.vectors[mask]
+        self._changed()
+
+    def _squared_distances(self, query, rows=None):
+        """query 與所有（或指定 rows）向量的平方 L2 距離"""
+        if rows is not None:
+            vectors = self.vectors[rows]
+            norms = np.einsum('ij,ij->i', vectors, vectors)
+        else:
+            if self._squared_norms is None:
+                self._squared_norms = np.einsum(
+                    'ij,ij->i', self.vectors, self.vectors
+                )
+            vectors, norms = self.vectors, self._squared_norms
+        # ||q - x||^2 = ||q||^2 + ||x||^2 - 2 q·x
+        return (query @ query) + norms - 2 * (vectors @ query)
+
+    def _candidates(self, query, nprobe):
+        """要比對的列（None 表示全部）"""
+        return None
+
+    def rows_for_ids(self, ids):
+        """主鍵對應的列號（不在索引中的主鍵略過）"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.ntotal or not len(ids):
+            return np.empty(0, dtype=np.int64)
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind='stable')
+        sorted_ids = self.ids[self._id_order]
+        positions = np.minimum(
+            np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1
+        )
+        found = sorted_ids[positions] == ids
+        return np.sort(self._id_order[positions[found]])
+
+    def search(self, queries, k, nprobe=None, subset=None):
+        """subset 為只比對的列號（分區查詢），None 表示整個索引"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.d)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        if not self.ntotal:
+            return distances, labels
+
+        for row, query in enumerate(queries):
+            rows = subset
+            if rows is None:
+                rows = self._candidates(query, nprobe)
+            scores = self._squared_distances(query, rows)
+            n = min(k, len(scores))
+            if not n:
+                continue
+            top = np.argpartition(scores, n - 1)[:n]
+            top = top[np.argsort(scores[top])]
+            ids = self.ids[top] if rows is None else self.ids[rows[top]]
+            distances[row, :n] = np.maximum(scores[top], 0)
+            labels[row, :n] = ids
+        return distances, labels
+
+    def to_records(self):
+        records = np.empty(self.ntotal, dtype=self.record_dtype(self.d))
+        records['id'] = self.ids
+        records['vector'] = self.vectors
+        return records
+
+    def from_records(self, records, copy):
+        take = np.ascontiguousarray if copy else (lambda a: a)
+        self.ids = take(records['id'])
+        self.vectors = take(records['vector'])
+        self._changed()
+
+    def quantizer_data(self):
+        """需要另外保存的訓練結果（float32 二維陣列），沒有則為 None"""
+        return None
+
+    def set_quantizer_data(self, data):
+        pass
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.save(f, self.to_records())
+
+    @classmethod
+    def load(cls, f, dimension, mmap=True, **kwargs):
+        """
+        從已開啟的檔案讀取
+
+        mmap=True 時回傳指向檔案的唯讀 memory map，否則讀入行程記憶體
+        """
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype != cls.record_dtype(dimension):
+            raise ValueError('索引檔案格式與維度不符，請重建索引')
+
+        index = cls(dimension, **kwargs)
+        if not shape[0]:
+            return index
+        if mmap:
+            records = np.memmap(
+                f, dtype=dtype, mode='r', shape=shape, offset=f.tell()
+            )
+        else:
+            records = np.fromfile(f, dtype=dtype, count=shape[0])
+        index.from_records(records, copy=not mmap)
+        return index
+
+
+class IVFFlatIndex(BruteForceIndex):
+    """
+    NumPy 版 IndexIVFFlat
+
+    以 k-means 將向量分為 nlist 群，搜尋時只比對離查詢最近的 nprobe 群。
+    紀錄多一個 list 欄位（所屬群），群中心另存為量化參數檔。
+    """
+
+    def __init__(self, dimension, nlist=1):
+        super().__init__(dimension)
+        self.nlist = nlist
+        self.centroids = None
+        self.lists = np.empty(0, dtype=np.int32)
+
+    def _changed(self):
+        super()._changed()
+        self._inverted = None
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @staticmethod
+    def record_dtype(dimension):
+        return np.dtype([
+            ('id', '<i8'), ('list', '<i4'), ('vector', '<f4', (dimension,)),
+        ])
+
+    def train(self, vectors):
+        self.centroids = _kmeans(
+            np.asarray(vectors, dtype=np.float32), self.nlist
+        )
+        self.nlist = len(self.centroids)
+
+    def add_with_ids(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.d)
+        self.lists = np.concatenate([
+            self.lists, _nearest_centroids(vectors, self.centroids)
+        ])
+        super().add_with_ids(vectors, ids)
+
+    def _keep(self, mask):
+        self.lists = self.lists[mask]
+        super()._keep(mask)
+
+    def _candidates(self, query, nprobe):
+        nprobe = min(nprobe or settings.FAISS_NPROBE, self.nlist)
+        scores = (self.centroids ** 2).sum(axis=1) - 2 * self.centroids @ query
+        probe = np.argpartition(scores, nprobe - 1)[:nprobe]
+        order, offsets = self._inverted_lists()
+        return np.concatenate([
+            order[offsets[i]:offsets[i + 1]] for i in probe
+        ])
+
+    def _inverted_lists(self):
+        """依群排序的列號與各群起點（加入或移除資料後重新計算）"""
+        if self._inverted is None:
+            order = np.argsort(self.lists, kind='stable')
+            offsets = np.searchsorted(
+                self.lists[order], np.arange(self.nlist + 1)
+            )
+            self._inverted = (order, offsets)
+        return self._inverted
+
+    def to_records(self):
+        records = super().to_records()
+        records['list'] = self.lists
+        return records
+
+    def from_records(self, records, copy):
+        self.lists = (
+            np.ascontiguousarray(records['list']) if copy else records['list']
+        )
+        super().from_records(records, copy)
+
+    def quantizer_data(self):
+        return self.centroids
+
+    def set_quantizer_data(self, data):
+        self.centroids = np.asarray(data, dtype=np.float32)
+        self.nlist = len(self.centroids)
+
+
+class ScalarQuantizerIndex(BruteForceIndex):
+    """
+    NumPy 版 IndexScalarQuantizer(QT_8bit)
+
+    每一維依訓練資料的最小值與範圍量化為 uint8，儲存空間為 float32 的 1/4；
+    搜尋時分段還原後計算距離。
+    """
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self, dimension):
+        super().__init__(dimension)
+        self.vmin = None
+        self.vdiff = None
+        self.vectors = np.empty((0, dimension), dtype=np.uint8)
+
+    @property
+    def is_trained(self):
+        return self.vmin is not None
+
+    @staticmethod
+    def record_dtype(dimension):
+        return np.dtype([('id', '<i8'), ('vector', 'u1', (dimension,))])
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.vmin = vectors.min(axis=0)
+        self.vdiff = np.maximum(vectors.max(axis=0) - self.vmin, 1e-12)
+
+    def encode(self, vectors):
+        scaled = (np.asarray(vectors, dtype=np.float32) - self.vmin) / self.vdiff
+        return np.clip(np.rint(scaled * 255), 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        return codes.astype(np.float32) / 255 * self.vdiff + self.vmin
+
+    def add_with_ids(self, vectors, ids):
+        codes = self.encode(np.asarray(vectors).reshape(-1, self.d))
+        self.vectors = np.concatenate([self.vectors, codes])
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self._changed()
+
+    def _squared_distances(self, query, rows=None):
+        total = self.ntotal if rows is None else len(rows)
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, self.CHUNK_SIZE):
+            if rows is None:
+                codes = self.vectors[start:start + self.CHUNK_SIZE]
+            else:
+                codes = self.vectors[rows[start:start + self.CHUNK_SIZE]]
+            decoded = self.decode(codes)
+            diff = decoded - query
+            scores[start:start + len(decoded)] = np.einsum(
+                'ij,ij->i', diff, diff
+            )
+        return scores
+
+    def quantizer_data(self):
+        if self.vmin is None:
+            return None
+        return np.stack([self.vmin, self.vdiff])
+
+    def set_quantizer_data(self, data):
+        self.vmin = np.asarray(data[0], dtype=np.float32)
+        self.vdiff = np.asarray(data[1], dtype=np.float32)
+
+
+NUMPY_INDEXES = {
+    'flat': BruteForceIndex,
+    'ivf_flat': IVFFlatIndex,
+    'sq8': ScalarQuantizerIndex,
+}
+
+
+def _new_index(dimension, backend, config):
+    kind = config['kind']
+    nlist = config.get('nlist') or 1
+    if backend == 'faiss':
+        if kind == 'flat':
+            return faiss.IndexIDMap(faiss.IndexFlatL2(dimension))
+        if kind == 'ivf_flat':
+            return faiss.index_factory(dimension, f'IVF{nlist},Flat')
+        if kind == 'ivf_pq':
+            if dimension % config['pq_m']:
+                raise ValueError(
+                    f"FAISS_PQ_M={config['pq_m']} 必須整除維度 {dimension}"
+                )
+            return faiss.index_factory(
+                dimension,
+                f"IVF{nlist},PQ{config['pq_m']}x{config.get('pq_nbits', 8)}"
+            )
+        if kind == 'hnsw':
+            return faiss.index_factory(dimension, f"IDMap,HNSW{config['hnsw_m']}")
+        return faiss.index_factory(dimension, 'IDMap,SQ8')
+
+    if kind not in NUMPY_INDEXES:
+        raise ImportError(f'{kind} 索引需要 faiss：pip install faiss-cpu')
+    if kind == 'ivf_flat':
+        return IVFFlatIndex(dimension, nlist)
+    return NUMPY_INDEXES[kind](dimension)
+
+
+def _default_backend():
+    return 'faiss' if faiss is not None else 'numpy'
+
+
+def _atomic_write(path, write):
+    """先寫入暫存檔再以 os.replace 取代，讀取端不會看到寫到一半的檔案"""
+    tmp_path = f'{path}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _signature(stat_result):
+    """檔案簽章：os.replace 會換上新的 inode，用來辨識是否為同一代檔案"""
+    return [stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns]
+
+
+class StaleIndexFiles(RuntimeError):
+    """索引檔案與中繼資料不是同一代（寫入中）"""
+
+
+def _check_signature(metadata, key, stat_result):
+    expected = metadata.get('files', {}).get(key)
+    if expected is not None and expected != _signature(stat_result):
+        raise StaleIndexFiles(f'{key} 檔案與中繼資料不一致')
+
+
+class VectorIndex:
+    """
+    單一資料來源的向量索引
+
+    檔案配置（{name} 為索引名稱，如 kb、ticket）：
+        {name}_index.faiss：索引本體（faiss 格式或 NumPy .npy 結構化陣列）
+        {name}_metadata.json：維度、筆數、後端、索引類型、建置時間等
+        {name}_texts.pkl：{主鍵: 原文}
+        {name}_quantizer.npy：NumPy 版 ivf_flat / sq8 的訓練結果
+    """
+
+    def __init__(self, name, dimension=None, base_path=None, backend=None,
+                 config=None):
+        _require_numpy()
+        self.name = name
+        self.dimension = dimension or settings.FAISS_DIMENSION
+        self.base_path = base_path or settings.FAISS_INDEX_PATH
+        self.backend = backend or _default_backend()
+        self.config = dict(config or index_config())
+        if self.backend != 'faiss' and self.config['kind'] not in NUMPY_INDEXES:
+            raise ImportError(
+                f"{self.config['kind']} 索引需要 faiss：pip install faiss-cpu"
+            )
+        # 需要訓練的索引在第一次加入資料時才依資料量建立
+        self.index = None
+        if self.config['kind'] not in IVF_KINDS:
+            self.index = _new_index(self.dimension, self.backend, self.config)
+        self.texts = {}
+        self.metadata = {}
+        self.read_only = False
+        self._lock = threading.RLock()
+
+    @property
+    def kind(self):
+        return self.config['kind']
+
+    @property
+    def supports_remove(self):
+        return not (self.backend == 'faiss' and self.kind == 'hnsw')
+
+    @property
+    def files(self):
+        files = index_files(self.name, self.base_path)
+        if self.backend != 'faiss' and self.kind in QUANTIZER_KINDS:
+            files['quantizer'] = quantizer_file(self.name, self.base_path)
+        return files
+
+    @property
+    def count(self):
+        return int(self.index.ntotal) if self.index is not None else 0
+
+    def _prepare(self, items):
+        ids, vectors, texts, skipped = [], [], {}, 0
+        for pk, vector, text in items:
+            if vector is None or len(vector) != self.dimension:
+                skipped += 1
+                continue
+            ids.append(pk)
+            vectors.append(vector)
+            texts[pk] = text
+        return ids, vectors, texts, skipped
+
+    def _train(self, vectors):
+        """依資料建立並訓練索引（只在第一次加入資料時執行）"""
+        if self.index is None:
+            self.config['nlist'] = min(
+                self.config.get('nlist') or auto_nlist(len(vectors)),
+                len(vectors),
+            )
+            if self.kind == 'ivf_pq':
+                # PQ 每個子空間需要至少 2^nbits 筆訓練資料
+                self.config['pq_nbits'] = max(
+                    1, min(8, int(math.log2(max(len(vectors), 2))))
+                )
+            self.index = _new_index(self.dimension, self.backend, self.config)
+        if self.index.is_trained:
+            return
+        sample_size = min(len(vectors), settings.FAISS_TRAIN_SAMPLE)
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        self.index.train(np.ascontiguousarray(sample))
+        self.metadata['trained_on'] = sample_size
+
+    def add(self, items):
+        """
+        加入或取代向量
+
+        參數：
+            items: 可迭代的 (主鍵, 向量, 原文)；維度不符的資料會略過
+
+        回傳：
+            dict: {'added': 筆數, 'skipped': 略過筆數}
+        """
+        self._check_writable()
+        ids, vectors, texts, skipped = self._prepare(items)
+        with self._lock:
+            if ids:
+                vectors = _normalize(vectors)
+                self._train(vectors)
+                id_array = np.asarray(ids, dtype=np.int64)
+                if self.count and self.supports_remove:
+                    self.index.remove_ids(id_array)
+                self.index.add_with_ids(vectors, id_array)
+                self.texts.update(texts)
+        return {'added': len(ids), 'skipped': skipped}
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(
+                '唯讀索引無法修改，請以 VectorIndex.load(name, writable=True) 載入'
+            )
+
+    def remove(self, ids):
+        """依主鍵移除向量，回傳移除筆數"""
+        if not ids or not self.count:
+            return 0
+        self._check_writable()
+        if not self.supports_remove:
+            raise NotImplementedError(f'{self.kind} 索引不支援移除，請重建索引')
+        with self._lock:
+            removed = self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+            for pk in ids:
+                self.texts.pop(pk, None)
+        return int(removed)
+
+    def _search_kwargs(self, nprobe, ef_search, ids):
+        if self.backend != 'faiss':
+            kwargs = {'nprobe': nprobe}
+            if ids is not None:
+                kwargs['subset'] = self.index.rows_for_ids(ids)
+            return kwargs
+        options = {}
+        if ids is not None:
+            # 以 IDSelector 在搜尋時就限定範圍，而非先取全域 top-k 再過濾
+            options['sel'] = faiss.IDSelectorBatch(
+                np.asarray(ids, dtype=np.int64)
+            )
+        if self.kind in IVF_KINDS:
+            params = faiss.SearchParametersIVF(
+                nprobe=nprobe or settings.FAISS_NPROBE, **options
+            )
+        elif self.kind == 'hnsw':
+            params = faiss.SearchParametersHNSW(
+                efSearch=ef_search or settings.FAISS_EF_SEARCH, **options
+            )
+        elif options:
+            params = faiss.SearchParameters(**options)
+        else:
+            return {}
+        return {'params': params}
+
+    def search(self, vector, k=5, nprobe=None, ef_search=None, ids=None):
+        """
+        搜尋最相近的 k 筆
+
+        參數：
+            nprobe: IVF 索引搜尋的群數（預設 settings.FAISS_NPROBE）
+            ef_search: HNSW 搜尋的候選數（預設 settings.FAISS_EF_SEARCH）
+            ids: 只在這些主鍵中搜尋（分區查詢），None 表示整個索引
+
+        回傳：
+            list: [{'id', 'score'（cosine 相似度）, 'distance', 'text'}]
+        """
+        query = _normalize(vector)
+        if query.shape[1] != self.dimension:
+            raise ValueError(
+                f'查詢向量維度 {query.shape[1]} 與索引維度 {self.dimension} 不符'
+            )
+        if not self.count or (ids is not None and not len(ids)):
+            return []
+        # 唯讀索引不會被修改，多執行緒可同時查詢
+        with nullcontext() if self.read_only else self._lock:
+            distances, labels = self.index.search(
+                query, k, **self._search_kwargs(nprobe, ef_search, ids)
+            )
+            results = []
+            for distance, pk in zip(distances[0], labels[0]):
+                if pk < 0:
+                    continue
+                results.append({
+                    'id': int(pk),
+                    'score': round(float(1 - distance / 2), 6),
+                    'distance': round(float(distance), 6),
+                    'text': self.texts.get(int(pk), ''),
+                })
+        return results
+
+    def save(self, **extra_metadata):
+        """將索引、原文與中繼資料寫入磁碟；中繼資料最後寫入"""
+        os.makedirs(self.base_path, exist_ok=True)
+        if self.index is None:
+            self.config['nlist'] = self.config.get('nlist') or auto_nlist(0)
+            self.index = _new_index(self.dimension, self.backend, self.config)
+        files = self.files
+        with self._lock:
+            if self.backend == 'faiss':
+                _atomic_write(
+                    files['index'], lambda p: faiss.write_index(self.index, p)
+                )
+            else:
+                _atomic_write(files['index'], self.index.save)
+                if 'quantizer' in files:
+                    data = self.index.quantizer_data()
+                    if data is None:
+                        data = np.empty((0, self.dimension), dtype=np.float32)
+
+                    def write_quantizer(path):
+                        with open(path, 'wb') as f:
+                            np.save(f, data)
+
+                    _atomic_write(files['quantizer'], write_quantizer)
+
+            def write_texts(path):
+                with open(path, 'wb') as f:
+                    pickle.dump(self.texts, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            _atomic_write(files['texts'], write_texts)
+
+            self.metadata.update(extra_metadata)
+            self.metadata.update({
+                'generation': self.metadata.get('generation', 0) + 1,
+                'files': {
+                    key: _signature(os.stat(path))
+                    for key, path in files.items() if key != 'metadata'
+                },
+                'name': self.name,
+                'source': SOURCES.get(self.name, self.name),
+                'backend': self.backend,
+                'index_kind': self.kind,
+                'index_config': self.config,
+                'index_type': describe_index(self.config),
+                'dimension': self.dimension,
+                'record_count': self.count,
+                'saved_at': datetime.now(dt_timezone.utc).isoformat(),
+            })
+
+            def write_metadata(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+
+            _atomic_write(files['metadata'], write_metadata)
+        return self.metadata
+
+    @classmethod
+    def load(cls, name, base_path=None, writable=False):
+        """
+        從磁碟載入索引；檔案不存在時回傳 None
+
+        預設以唯讀 memory map 載入（多個 worker 共用同一份實體記憶體）；
+        writable=True 時讀入行程記憶體，供同步工作修改後再存檔。
+        檔案與中繼資料不是同一代時拋出 StaleIndexFiles。
+        """
+        base_path = base_path or settings.FAISS_INDEX_PATH
+        files = index_files(name, base_path)
+        if not all(os.path.exists(path) for path in files.values()):
+            return None
+        metadata = read_metadata(name, base_path)
+        backend = metadata.get('backend', 'numpy')
+        if backend == 'faiss' and faiss is None:
+            raise ImportError('此索引以 faiss 建立，請安裝 faiss-cpu 或重建索引')
+
+        config = metadata.get('index_config') or index_config('flat')
+        vector_index = cls(
+            name, metadata.get('dimension'), base_path, backend, config
+        )
+        files = vector_index.files
+        if backend == 'faiss':
+            flags = 0
+            if not writable and config['kind'] in MMAP_KINDS:
+                flags = (
+                    getattr(faiss, 'IO_FLAG_MMAP', 0)
+                    | getattr(faiss, 'IO_FLAG_READ_ONLY', 0)
+                )
+            _check_signature(metadata, 'index', os.stat(files['index']))
+            vector_index.index = faiss.read_index(files['index'], flags)
+            _check_signature(metadata, 'index', os.stat(files['index']))
+        else:
+            kwargs = {}
+            if config['kind'] == 'ivf_flat':
+                kwargs['nlist'] = config.get('nlist') or 1
+            with open(files['index'], 'rb') as f:
+                _check_signature(metadata, 'index', os.fstat(f.fileno()))
+                vector_index.index = NUMPY_INDEXES[config['kind']].load(
+                    f, vector_index.dimension, mmap=not writable, **kwargs
+                )
+            if 'quantizer' in files:
+                with open(files['quantizer'], 'rb') as f:
+                    _check_signature(metadata, 'quantizer', os.fstat(f.fileno()))
+                    data = np.load(f)
+                if len(data):
+                    vector_index.index.set_quantizer_data(data)
+        with open(files['texts'], 'rb') as f:
+            _check_signature(metadata, 'texts', os.fstat(f.fileno()))
+            vector_index.texts = pickle.load(f)
+        vector_index.metadata = metadata
+        vector_index.read_only = not writable
+        return vector_index
+
+
+def index_files(name, base_path=None):
+    base_path = base_path or settings.FAISS_INDEX_PATH
+    return {
+        'index': os.path.join(base_path, f'{name}_index.faiss'),
+        'metadata': os.path.join(base_path, f'{name}_metadata.json'),
+        'texts': os.path.join(base_path, f'{name}_texts.pkl'),
+    }
+
+
+def quantizer_file(name, base_path=None):
+    base_path = base_path or settings.FAISS_INDEX_PATH
+    return os.path.join(base_path, f'{name}_quantizer.npy')
+
+
+def read_metadata(name, base_path=None):
+    path = index_files(name, base_path)['metadata']
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def index_status(name, base_path=None):
+    """查詢索引檔案狀態（不載入索引本體）"""
+    files = index_files(name, base_path)
+    metadata = read_metadata(name, base_path)
+    return {
+        'index_exists': os.path.exists(files['index']),
+        'metadata_exists': os.path.exists(files['metadata']),
+        'texts_exists': os.path.exists(files['texts']),
+        'dimension': metadata.get('dimension', settings.FAISS_DIMENSION),
+        'index_type': metadata.get('index_type', INDEX_TYPE),
+        'index_kind': metadata.get('index_kind', 'flat'),
+        'backend': metadata.get('backend', _default_backend()),
+        'record_count': metadata.get('record_count', 0),
+        'skipped': metadata.get('skipped', 0),
+        'build_seconds': metadata.get('build_seconds'),
+        'saved_at': metadata.get('saved_at'),
+        'generation': metadata.get('generation', 0),
+    }
+
+
+# 行程內已載入的唯讀索引（以 (路徑, 名稱) 為鍵，值為 (索引, 中繼資料簽章)）
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# 讀到寫入中的檔案時的重試次數與間隔秒數
+LOAD_RETRIES = 5
+LOAD_RETRY_DELAY = 0.05
+
+
+def _cache_key(name, base_path):
+    return (os.path.abspath(base_path or settings.FAISS_INDEX_PATH), name)
+
+
+def _metadata_signature(name, base_path=None):
+    try:
+        return _signature(os.stat(index_files(name, base_path)['metadata']))
+    except OSError:
+        return None
+
+
+def get_vector_index(name):
+    """
+    取得唯讀（memory map）索引
+
+    中繼資料簽章改變（其他行程重建或同步）時載入新一代索引；
+    舊一代的 memory map 在沒有引用後釋放。檔案不存在則回傳 None
+    """
+    key = _cache_key(name, None)
+    signature = _metadata_signature(name)
+    if signature is None:
+        _indexes.pop(key, None)
+        return None
+
+    cached = _indexes.get(key)
+    if cached is not None and cached[1] == signature:
+        return cached[0]
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[1] == signature:
+            return cached[0]
+        for attempt in range(LOAD_RETRIES):
+            try:
+                vector_index = VectorIndex.load(name)
+                break
+            except StaleIndexFiles:
+                # 寫入端尚未寫完中繼資料，稍候再試；仍失敗時沿用上一代
+                if attempt == LOAD_RETRIES - 1:
+                    if cached is not None:
+                        return cached[0]
+                    raise
+                time.sleep(LOAD_RETRY_DELAY)
+                signature = _metadata_signature(name)
+        if vector_index is not None:
+            _indexes[key] = (vector_index, signature)
+    return vector_index
+
+
+def sentence_items(queryset=None):
+    """SentenceDatabase 中已有向量的資料：(主鍵, 向量, 句子)"""
+    from .models import SentenceDatabase
+
+    if queryset is None:
+        queryset = SentenceDatabase.objects.all()
+    rows = (
+        queryset.filter(embedding__isnull=False)
+        .only('id', 'sentence', 'embedding')
+        .order_by('id')
+        .iterator(chunk_size=2000)
+    )
+    for item in rows:
+        yield item.id, item.embedding, item.sentence
+
+
+def ticket_text(ticket):
+    return f"{ticket.title}\n{ticket.desc}".strip()
+
+
+def ticket_items(queryset=None, batch_size=None):
+    """Ticket 沒有儲存向量，依標題與描述批次編碼：(主鍵, 向量, 文字)"""
+    from .embeddings import encode_sentences
+    from .models import Ticket
+
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    if queryset is None:
+        queryset = Ticket.objects.all()
+    tickets = queryset.only('id', 'title', 'desc').order_by('id')
+
+    batch = []
+    for ticket in tickets.iterator(chunk_size=2000):
+        batch.append((ticket.id, ticket_text(ticket)))
+        if len(batch) >= batch_size:
+            yield from _encode_batch(batch, encode_sentences)
+            batch = []
+    if batch:
+        yield from _encode_batch(batch, encode_sentences)
+
+
+def _encode_batch(batch, encode_sentences):
+    vectors = encode_sentences([text for _, text in batch])
+    for (pk, text), vector in zip(batch, vectors):
+        yield pk, vector, text
+
+
+def record_index_changes(index_name, object_ids, action):
+    """寫入向量索引變更紀錄（bulk_update 等不觸發訊號的批次操作需自行呼叫）"""
+    from .models import VectorIndexOutbox
+
+    VectorIndexOutbox.objects.bulk_create([
+        VectorIndexOutbox(index_name=index_name, object_id=pk, action=action)
+        for pk in object_ids
+    ])
+
+
+def pending_changes(name):
+    """尚未套用的變更紀錄 (id, object_id, action)，依 id 排序"""
+    from .models import VectorIndexOutbox
+
+    return list(
+        VectorIndexOutbox.objects.filter(index_name=name)
+        .order_by('id')
+        .values_list('id', 'object_id', 'action')
+    )
+
+
+def _prune_outbox(ids):
+    """只刪除已套用的變更紀錄；較晚 commit 的紀錄即使 ID 較小也會保留到下次同步"""
+    from .models import VectorIndexOutbox
+
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        VectorIndexOutbox.objects.filter(id__in=ids[start:start + 500]).delete()
+
+
+def source_items(name, ids=None):
+    """依索引名稱取得資料來源的 (主鍵, 向量, 文字)；ids 為 None 表示全部"""
+    from .models import SentenceDatabase, Ticket
+
+    if name == 'kb':
+        queryset = SentenceDatabase.objects.all()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        return sentence_items(queryset)
+    if name == 'ticket':
+        queryset = Ticket.objects.all()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        return ticket_items(queryset)
+    raise ValueError(f'未知的索引: {name}')
+
+
+def build_vector_index(name, items, watermark=0, applied_ids=()):
+    """
+    以 items 重新建立索引並持久化
+
+    參數：
+        watermark: 已套用的最新變更紀錄 ID（記錄於中繼資料）
+        applied_ids: 已包含在本次建置中的變更紀錄，建置完成後刪除
+
+    回傳：
+        VectorIndex: 建好的索引（可寫入的記憶體版本；查詢請用 get_vector_index）
+    """
+    start = time.perf_counter()
+    vector_index = VectorIndex(name)
+    result = vector_index.add(items)
+    build_seconds = round(time.perf_counter() - start, 4)
+    vector_index.save(
+        build_seconds=build_seconds,
+        skipped=result['skipped'],
+        built_at=datetime.now(dt_timezone.utc).isoformat(),
+        watermark=watermark,
+    )
+    _prune_outbox(applied_ids)
+    return vector_index
+
+
+_sync_locks = {name: threading.Lock() for name in SOURCES}
+
+
+@contextmanager
+def index_lock(name, base_path=None):
+    """
+    索引寫入鎖：同一行程內以 threading.Lock、跨行程以 {name}.lock 檔案鎖
+    多個 worker 或排程同時重建 / 同步同一個索引時依序執行
+    """
+    base_path = base_path or settings.FAISS_INDEX_PATH
+    os.makedirs(base_path, exist_ok=True)
+    path = os.path.join(base_path, f'{name}.lock')
+    with _sync_locks.setdefault(name, threading.Lock()):
+        with open(path, 'a+b') as f:
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK 重試約 10 秒後放棄，持續等待到取得為止
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _rebuild(name):
+    # 先記下現有的變更紀錄再讀取資料，建置後只刪除這些紀錄；
+    # 建置期間新增或較晚 commit 的變更留待下次同步重新套用
+    changes = pending_changes(name)
+    return build_vector_index(
+        name, source_items(name),
+        watermark=changes[-1][0] if changes else 0,
+        applied_ids=[change[0] for change in changes],
+    )
+
+
+def rebuild_vector_index(name):
+    with index_lock(name):
+        return _rebuild(name)
+
+
+def rebuild_sentence_index():
+    return rebuild_vector_index('kb')
+
+
+def rebuild_ticket_index():
+    return rebuild_vector_index('ticket')
+
+
+def sync_vector_index(name):
+    """
+    增量同步索引
+
+    讀取所有尚未套用的 VectorIndexOutbox 紀錄，同一筆資料只套用最後一次變更：
+    upsert 重新讀取（Ticket 重新編碼）後以 add_with_ids 取代，
+    delete 以 remove_ids 移除。索引不存在時改為完整重建。
+
+    套用後只刪除本次讀到的紀錄，而不是刪除某個 ID 以下的全部紀錄：
+    自動遞增 ID 依交易開始的順序分配，較晚 commit 的變更可能帶著較小的 ID，
+    仍會在下次同步時套用。watermark 僅記錄已套用的最大 ID。
+
+    回傳：
+        dict: {'mode', 'upserted', 'removed', 'skipped', 'watermark', 'record_count'}
+    """
+    from .models import VectorIndexOutbox
+
+    with index_lock(name):
+        metadata = read_metadata(name)
+        if not metadata or _metadata_signature(name) is None:
+            vector_index = _rebuild(name)
+            return {
+                'mode': 'rebuild',
+                'upserted': vector_index.count,
+                'removed': 0,
+                'skipped': vector_index.metadata['skipped'],
+                'watermark': vector_index.metadata['watermark'],
+                'record_count': vector_index.count,
+            }
+
+        watermark = metadata.get('watermark', 0)
+        changes = pending_changes(name)
+        result = {
+            'mode': 'incremental',
+            'upserted': 0,
+            'removed': 0,
+            'skipped': 0,
+            'watermark': watermark,
+            'record_count': metadata.get('record_count', 0),
+        }
+        if not changes:
+            return result
+
+        latest = {}
+        for _, object_id, action in changes:
+            latest[object_id] = action
+        upsert_ids = [
+            pk for pk, action in latest.items()
+            if action == VectorIndexOutbox.ACTION_UPSERT
+        ]
+        delete_ids = [
+            pk for pk, action in latest.items()
+            if action == VectorIndexOutbox.ACTION_DELETE
+        ]
+
+        items = list(source_items(name, upsert_ids)) if upsert_ids else []
+        vector_index = VectorIndex.load(name, writable=True)
+        if not vector_index.supports_remove:
+            # HNSW 無法移除向量，有變更時只能重建
+            vector_index = _rebuild(name)
+            result.update({
+                'mode': 'rebuild',
+                'upserted': vector_index.count,
+                'skipped': vector_index.metadata['skipped'],
+                'watermark': vector_index.metadata['watermark'],
+                'record_count': vector_index.count,
+            })
+            return result
+        # 先移除所有更新過的資料，向量被清空或維度不符的資料才不會殘留舊向量
+        vector_index.remove(upsert_ids)
+        removed = vector_index.remove(delete_ids)
+        added = vector_index.add(items)
+
+        watermark = max(watermark, changes[-1][0])
+        vector_index.save(watermark=watermark)
+        _prune_outbox(change[0] for change in changes)
+
+        result.update({
+            'upserted': added['added'],
+            'removed': removed,
+            'skipped': added['skipped'],
+            'watermark': watermark,
+            'record_count': vector_index.count,
+        })
+        return result
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def evaluate_index_kinds(name, kinds=None, k=10, num_queries=100,
+                         nprobe_values=(1, 4, 16, 64),
+                         ef_values=(16, 64, 256)):
+    """
+    比較各索引類型的召回率與查詢延遲（不寫入磁碟）
+
+    以資料本身抽樣作為查詢，flat 精確搜尋的結果為標準答案；
+    IVF 類型逐一測試 nprobe_values，HNSW 逐一測試 ef_values。
+
+    回傳：
+        list: [{'kind', 'index_type', 'param', 'value', 'recall',
+                'latency_ms_mean', 'latency_ms_p95', 'build_seconds'}]；
+        無法建立的類型（如未安裝 faiss）只有 {'kind', 'error'}
+    """
+    items = list(source_items(name))
+    kinds = kinds or INDEX_KINDS
+    exact = VectorIndex(name, config=index_config('flat'))
+    exact.add(items)
+    if not exact.count:
+        return []
+
+    rng = np.random.default_rng(0)
+    by_id = {pk: vector for pk, vector, _ in items}
+    query_ids = rng.choice(
+        sorted(exact.texts), min(num_queries, exact.count), replace=False
+    )
+    queries = [by_id[int(pk)] for pk in query_ids]
+    truth = [
+        {hit['id'] for hit in exact.search(query, k=k)} for query in queries
+    ]
+
+    report = []
+    for kind in kinds:
+        try:
+            start = time.perf_counter()
+            candidate = VectorIndex(name, config=index_config(kind))
+            candidate.add(items)
+            build_seconds = round(time.perf_counter() - start, 4)
+        except (ImportError, ValueError, RuntimeError) as e:
+            report.append({'kind': kind, 'error': str(e)})
+            continue
+
+        if kind in IVF_KINDS:
+            param, values = 'nprobe', nprobe_values
+        elif kind == 'hnsw':
+            param, values = 'ef_search', ef_values
+        else:
+            param, values = None, (None,)
+
+        for value in values:
+            options = {param: value} if param else {}
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                results = candidate.search(query, k=k, **options)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(expected & {hit['id'] for hit in results})
+            report.append({
+                'kind': kind,
+                'index_type': describe_index(candidate.config),
+                'param': param,
+                'value': value,
+                'recall': round(hits / sum(len(t) for t in truth), 4),
+                'latency_ms_mean': round(sum(latencies) / len(latencies), 4),
+                'latency_ms_p95': round(_percentile(latencies, 0.95), 4),
+                'build_seconds': build_seconds,
+            })
+    return report
@@ -0,0 +1,171 @@
+"""
+二進位向量儲存格式
+以「標頭 + 連續浮點數」的位元組儲存語意向量，取代 JSON 陣列
+
+格式（little-endian）：
+    標頭 8 bytes：版本 (uint8)、dtype 代碼 (uint8)、保留 2 bytes、維度 (uint32)
+    內容：dimension 個 float32 或 float16
+
+讀取時若有 NumPy 則回傳直接指向原始位元組的唯讀 ndarray（不複製），
+否則回傳 array.array('f')
+"""
+import base64
+import struct
+from array import array
+
+from django.conf import settings
+from django.db import models
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy 為選用套件
+    np = None
+
+
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<BBxxI')
+DTYPES = {
+    'float32': (1, '<f4', 'f', 4),
+    'float16': (2, '<f2', 'e', 2),
+}
+_DTYPE_BY_CODE = {code: name for name, (code, *_rest) in DTYPES.items()}
+
+
+def _resolve_dtype(dtype):
+    dtype = dtype or settings.EMBEDDING_STORAGE_DTYPE
+    if dtype not in DTYPES:
+        raise ValueError(f'不支援的向量 dtype: {dtype}')
+    return dtype
+
+
+def read_header(data):
+    """
+    讀取向量標頭
+
+    回傳：
+        tuple: (dtype 名稱, 維度)
+    """
+    if len(data) < HEADER.size:
+        raise ValueError('向量資料長度不足')
+    version, code, dimension = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION or code not in _DTYPE_BY_CODE:
+        raise ValueError('無法辨識的向量格式')
+    dtype = _DTYPE_BY_CODE[code]
+    if len(data) != HEADER.size + dimension * DTYPES[dtype][3]:
+        raise ValueError('向量資料長度與標頭不符')
+    return dtype, dimension
+
+
+def as_vector(value):
+    """
+    將輸入轉為一維浮點向量
+
+    接受 list / tuple / ndarray / array.array / 已編碼的位元組；
+    空值或空陣列回傳 None。非數值內容會拋出 TypeError 或 ValueError。
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return unpack_vector(value)
+    if isinstance(value, str) or not hasattr(value, '__len__'):
+        raise TypeError('向量必須為數值陣列')
+    if len(value) == 0:
+        return None
+    if np is not None:
+        vector = np.asarray(value)
+        if vector.ndim != 1 or vector.dtype.kind not in 'biuf':
+            raise TypeError('向量必須為一維數值陣列')
+        return vector
+    return array('d', value)
+
+
+def pack_vector(value, dtype=None):
+    """將向量編碼為帶標頭的位元組；空向量回傳 None"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        read_header(value)
+        return bytes(value)
+    vector = as_vector(value)
+    if vector is None:
+        return None
+    dtype = _resolve_dtype(dtype)
+    code, np_dtype, struct_code, _ = DTYPES[dtype]
+    header = HEADER.pack(FORMAT_VERSION, code, len(vector))
+    if np is not None:
+        return header + np.asarray(vector, dtype=np_dtype).tobytes()
+    return header + struct.pack(f'<{len(vector)}{struct_code}', *vector)
+
+
+def unpack_vector(data):
+    """
+    解碼向量位元組
+
+    有 NumPy 時回傳指向 data 的唯讀 ndarray（零複製），
+    否則回傳 array.array('f')
+    """
+    dtype, dimension = read_header(data)
+    _, np_dtype, struct_code, _ = DTYPES[dtype]
+    if np is not None:
+        return np.frombuffer(
+            data, dtype=np_dtype, count=dimension, offset=HEADER.size
+        )
+    return array('f', struct.unpack_from(
+        f'<{dimension}{struct_code}', data, HEADER.size
+    ))
+
+
+def vector_to_list(value):
+    """API 輸出用：將向量轉為 JSON 可序列化的 float 列表"""
+    if value is None:
+        return []
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = unpack_vector(value)
+    if hasattr(value, 'tolist'):
+        return [float(x) for x in value.tolist()]
+    return [float(x) for x in value]
+
+
+def vector_dimension(value):
+    """回傳向量維度（無向量時為 0）"""
+    return 0 if value is None else len(value)
+
+
+class VectorField(models.BinaryField):
+    """
+    以二進位格式儲存的浮點向量欄位
+
+    寫入時接受 list / ndarray / array.array，依 dtype（預設
+    settings.EMBEDDING_STORAGE_DTYPE）編碼；讀取時回傳 unpack_vector() 的結果。
+    空向量儲存為 NULL。
+    """
+
+    description = '二進位浮點向量'
+
+    def __init__(self, *args, dtype=None, **kwargs):
+        self.dtype = dtype
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dtype is not None:
+            kwargs['dtype'] = self.dtype
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return unpack_vector(value)
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            value = base64.b64decode(value.encode('ascii'))
+        return as_vector(value)
+
+    def get_prep_value(self, value):
+        return pack_vector(value, self.dtype)
+
+    def value_to_string(self, obj):
+        data = self.get_prep_value(self.value_from_object(obj))
+        return base64.b64encode(data).decode('ascii') if data else None
@@ -1,27 +1,39 @@
 import json
-from django.http import JsonResponse
+import time
+from operator import attrgetter
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 from .models import TB_1, WeightConfiguration, FieldPriorityConfiguration
 from .models import SentenceDatabase, GPTPromptConfiguration, SyncPathConfiguration
 from .models import ChatSession, CategoryMemory, UploadedFile, User, Order
+from .api_utils import LLMBusyError
+from .vectors import vector_dimension, vector_to_list
+from .pagination import ListField, PaginationError, columns, paginate
+from .stream_parser import SpecStreamParser, parse_spec_sections
+from .prompts import (
+    SPEC_SYSTEM_PROMPT, build_spec_user_input, build_formulation_prompts,
+    build_complete_result_prompts, strip_code_block,
+)
+
+
+# 列表 API 可由 ?fields= 選擇的欄位（未選的欄位不會從資料庫讀取）
+USER_LIST_FIELDS = columns('id', 'username', 'email', 'created_at')
 
 
 # User CRUD API
 @csrf_exempt
 def user_list(request):
     if request.method == 'GET':
-        users = User.objects.all()
-        data = [
-            {
-                'id': u.id,
-                'username': u.username,
-                'email': u.email,
-                'created_at': u.created_at,
-            } for u in users
-        ]
-        return JsonResponse({'users': data})
+        try:
+            data, page = paginate(request, User.objects.all(), USER_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'users': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -77,22 +89,39 @@ def user_detail(request, user_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+def _order_user(order):
+    user = order.user
+    return {'id': user.id, 'username': user.username, 'email': user.email}
+
+
+ORDER_LIST_FIELDS = {
+    'id': ListField('id'),
+    # 直接讀取外鍵欄位，不會為每筆訂單查詢 User
+    'user_id': ListField('user', getter=attrgetter('user_id')),
+    **columns('product_name', 'amount', 'status', 'created_at'),
+    # ?expand=user：與訂單同一個查詢 JOIN 讀取
+    'user': ListField(
+        'user__id', 'user__username', 'user__email',
+        getter=_order_user, related=('user',)
+    ),
+}
+ORDER_DEFAULT_FIELDS = [
+    'id', 'user_id', 'product_name', 'amount', 'status', 'created_at'
+]
+
+
 # Order CRUD API
 @csrf_exempt
 def order_list(request):
     if request.method == 'GET':
-        orders = Order.objects.all()
-        data = [
-            {
-                'id': o.id,
-                'user_id': o.user.id,
-                'product_name': o.product_name,
-                'amount': o.amount,
-                'status': o.status,
-                'created_at': o.created_at,
-            } for o in orders
-        ]
-        return JsonResponse({'orders': data})
+        try:
+            data, page = paginate(
+                request, Order.objects.all(), ORDER_LIST_FIELDS,
+                default_fields=ORDER_DEFAULT_FIELDS
+            )
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'orders': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -125,20 +154,26 @@ def order_list(request):
 
 @csrf_exempt
 def order_detail(request, order_id):
+    expand_user = (
+        request.method == 'GET' and request.GET.get('expand') == 'user'
+    )
+    orders = Order.objects.select_related('user') if expand_user else Order.objects
     try:
-        order = Order.objects.get(id=order_id)
+        order = orders.get(id=order_id)
     except Order.DoesNotExist:
         return JsonResponse({'error': 'Not found'}, status=404)
 
     if request.method == 'GET':
         data = {
             'id': order.id,
-            'user_id': order.user.id,
+            'user_id': order.user_id,
             'product_name': order.product_name,
             'amount': order.amount,
             'status': order.status,
             'created_at': order.created_at,
         }
+        if expand_user:
+            data['user'] = _order_user(order)
         return JsonResponse(data)
     elif request.method == 'PUT':
         try:
@@ -167,19 +202,18 @@ def order_detail(request, order_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+SYNC_PATH_LIST_FIELDS = columns('id', 'path', 'updated_at')
+
+
 # 雲端同步路徑配置 CRUD API
 @csrf_exempt
 def sync_path_list(request):
     if request.method == 'GET':
-        items = SyncPathConfiguration.objects.all()
-        data = [
-            {
-                'id': i.id,
-                'path': i.path,
-                'updated_at': i.updated_at,
-            } for i in items
-        ]
-        return JsonResponse({'paths': data})
+        try:
+            data, page = paginate(request, SyncPathConfiguration.objects.all(), SYNC_PATH_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'paths': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -238,21 +272,20 @@ def sync_path_detail(request, path_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+CHAT_SESSION_LIST_FIELDS = columns(
+    'session_id', 'title', 'messages', 'created_at', 'updated_at'
+)
+
+
 # 聊天會話 CRUD API
 @csrf_exempt
 def chat_session_list(request):
     if request.method == 'GET':
-        items = ChatSession.objects.all()
-        data = [
-            {
-                'session_id': i.session_id,
-                'title': i.title,
-                'messages': i.messages,
-                'created_at': i.created_at,
-                'updated_at': i.updated_at,
-            } for i in items
-        ]
-        return JsonResponse({'sessions': data})
+        try:
+            data, page = paginate(request, ChatSession.objects.all(), CHAT_SESSION_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'sessions': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -319,21 +352,20 @@ def chat_session_detail(request, session_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+CATEGORY_MEMORY_LIST_FIELDS = columns(
+    'id', 'configuration_item', 'category', 'created_at', 'updated_at'
+)
+
+
 # AI分類記憶 CRUD API
 @csrf_exempt
 def category_memory_list(request):
     if request.method == 'GET':
-        items = CategoryMemory.objects.all()
-        data = [
-            {
-                'id': i.id,
-                'configuration_item': i.configuration_item,
-                'category': i.category,
-                'created_at': i.created_at,
-                'updated_at': i.updated_at,
-            } for i in items
-        ]
-        return JsonResponse({'memories': data})
+        try:
+            data, page = paginate(request, CategoryMemory.objects.all(), CATEGORY_MEMORY_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'memories': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -414,22 +446,21 @@ def category_memory_detail(request, memory_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+UPLOADED_FILE_LIST_FIELDS = columns(
+    'id', 'filename', 'stored_filename', 'upload_time', 'file_size',
+    'file_path'
+)
+
+
 # 上傳檔案記錄 CRUD API
 @csrf_exempt
 def uploaded_file_list(request):
     if request.method == 'GET':
-        items = UploadedFile.objects.all()
-        data = [
-            {
-                'id': i.id,
-                'filename': i.filename,
-                'stored_filename': i.stored_filename,
-                'upload_time': i.upload_time,
-                'file_size': i.file_size,
-                'file_path': i.file_path,
-            } for i in items
-        ]
-        return JsonResponse({'files': data})
+        try:
+            data, page = paginate(request, UploadedFile.objects.all(), UPLOADED_FILE_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'files': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -485,24 +516,52 @@ def uploaded_file_detail(request, file_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
-# FAISS 索引管理 API（模擬版）
+# CRUD 資源批次 API
+@csrf_exempt
+def bulk_api(request, resource):
+    """
+    CRUD 資源的批次 API（/polls/<資源>/bulk/）
+
+    請求格式：
+        POST   {"items": [{...}, ...], "partial": false}：批次新增
+        PUT    {"items": [{"id": 1, ...}, ...], "partial": false}：批次修改
+        DELETE {"ids": [1, 2, ...]}：批次刪除
+
+    所有資料先驗證再於單一交易內寫入；partial=false 時任何一筆失敗即不寫入，
+    errors 列出每筆失敗的索引與原因
+    """
+    if request.method not in ('POST', 'PUT', 'DELETE'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    from polls.bulk import BulkError, run_bulk
+
+    try:
+        body, status = run_bulk(resource, request.method, payload)
+    except BulkError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except IntegrityError as e:
+        return JsonResponse({'error': f'寫入失敗: {str(e)}'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse(body, status=status)
+
+
+# FAISS 向量索引管理 API
 @csrf_exempt
 def faiss_index_status(request):
-    """查詢 FAISS 索引狀態"""
+    """查詢向量索引狀態（知識庫 SentenceDatabase 與 Ticket）"""
     if request.method == 'GET':
-        import os
-        base_path = 'faiss_data/'
-        index_file = os.path.join(base_path, 'kb_index.faiss')
-        metadata_file = os.path.join(base_path, 'kb_metadata.json')
-        texts_file = os.path.join(base_path, 'kb_texts.pkl')
-        
-        status = {
-            'index_exists': os.path.exists(index_file),
-            'metadata_exists': os.path.exists(metadata_file),
-            'texts_exists': os.path.exists(texts_file),
-            'dimension': 384,
-            'index_type': 'IndexFlatL2 + IndexIDMap',
-            'record_count': 0  # 模擬值
+        from polls.vector_index import index_status
+
+        status = index_status('kb')
+        status['indexes'] = {
+            'kb': dict(status),
+            'ticket': index_status('ticket'),
         }
         return JsonResponse(status)
     else:
@@ -511,29 +570,26 @@ def faiss_index_status(request):
 
 @csrf_exempt
 def faiss_index_rebuild(request):
-    """重建 FAISS 索引（模擬）"""
+    """以 SentenceDatabase 的語意向量重建知識庫索引"""
     if request.method == 'POST':
-        import os
-        base_path = 'faiss_data/'
-        os.makedirs(base_path, exist_ok=True)
-        
-        # 模擬建立檔案
-        index_file = os.path.join(base_path, 'kb_index.faiss')
-        metadata_file = os.path.join(base_path, 'kb_metadata.json')
-        texts_file = os.path.join(base_path, 'kb_texts.pkl')
-        
-        # 寫入空檔案模擬重建
-        with open(index_file, 'w') as f:
-            f.write('FAISS_INDEX_MOCK')
-        with open(metadata_file, 'w') as f:
-            f.write('{}')
-        with open(texts_file, 'w') as f:
-            f.write('TEXTS_MOCK')
-        
+        from polls.vector_index import rebuild_sentence_index
+
+        try:
+            vector_index = rebuild_sentence_index()
+        except ImportError as e:
+            return JsonResponse({'error': str(e)}, status=500)
+        except Exception as e:
+            return JsonResponse({'error': f'索引重建失敗: {str(e)}'}, status=500)
+
+        metadata = vector_index.metadata
         return JsonResponse({
             'result': 'rebuilt',
-            'dimension': 384,
-            'files_created': 3
+            'dimension': vector_index.dimension,
+            'files_created': len(vector_index.files),
+            'record_count': vector_index.count,
+            'skipped': metadata['skipped'],
+            'build_seconds': metadata['build_seconds'],
+            'backend': vector_index.backend,
         }, status=201)
     else:
         return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -541,35 +597,136 @@ def faiss_index_rebuild(request):
 
 @csrf_exempt
 def faiss_index_sync(request):
-    """同步 FAISS 索引與 Ticket（模擬）"""
+    """
+    增量同步向量索引
+
+    只套用 VectorIndexOutbox 中上次同步之後的新增、修改、刪除；
+    索引尚未建立時改為完整建置
+    """
     if request.method == 'POST':
-        from .models import Ticket
-        ticket_count = Ticket.objects.count()
-        
+        from polls.vector_index import SOURCES, sync_vector_index
+
+        try:
+            results = {name: sync_vector_index(name) for name in SOURCES}
+        except ImportError as e:
+            return JsonResponse({'error': str(e)}, status=500)
+        except Exception as e:
+            return JsonResponse({'error': f'索引同步失敗: {str(e)}'}, status=500)
+
         return JsonResponse({
             'result': 'synced',
-            'tickets_synced': ticket_count,
-            'dimension': 384
+            'tickets_synced': results['ticket']['record_count'],
+            'dimension': settings.FAISS_DIMENSION,
+            'indexes': results,
         }, status=200)
     else:
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+@csrf_exempt
+def faiss_index_search(request):
+    """
+    向量索引 top-k 搜尋
+
+    請求格式：
+        {"query": "查詢句子"} 或 {"vector": [...]}
+        "k": 回傳筆數（預設 5）
+        "index": "kb"（SentenceDatabase，預設）或 "ticket"
+        "nprobe": IVF 索引搜尋的群數（選填，越大召回率越高、越慢）
+        "ef_search": HNSW 索引搜尋的候選數（選填）
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    from polls.vector_index import SOURCES, get_vector_index
+
+    name = payload.get('index', 'kb')
+    k = payload.get('k', 5)
+    query = payload.get('query')
+    vector = payload.get('vector')
+    nprobe = payload.get('nprobe')
+    ef_search = payload.get('ef_search')
+
+    if name not in SOURCES:
+        return JsonResponse({'error': f'未知的索引: {name}'}, status=400)
+    if not isinstance(k, int) or k <= 0:
+        return JsonResponse({'error': 'k 必須為正整數'}, status=400)
+    for key, value in (('nprobe', nprobe), ('ef_search', ef_search)):
+        if value is not None and (not isinstance(value, int) or value <= 0):
+            return JsonResponse({'error': f'{key} 必須為正整數'}, status=400)
+    if not query and not vector:
+        return JsonResponse({'error': '缺少必要參數：query 或 vector'}, status=400)
+
+    try:
+        vector_index = get_vector_index(name)
+        if vector_index is None:
+            return JsonResponse({'error': '索引尚未建立'}, status=404)
+
+        if vector is None:
+            from polls.embeddings import get_embedding_batcher
+            vector = get_embedding_batcher().encode([query])[0]
+
+        results = vector_index.search(
+            vector, k, nprobe=nprobe, ef_search=ef_search
+        )
+        return JsonResponse({
+            'index': name,
+            'index_kind': vector_index.kind,
+            'k': k,
+            'results': results,
+        })
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ImportError as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    except Exception as e:
+        return JsonResponse({'error': f'搜尋失敗: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+def metrics_api(request):
+    """查詢 AI 相關元件的執行狀態（模型載入、連線池、LLM 執行器、回應快取）"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    from polls.api_utils import (
+        sentence_transformer_registry, get_llm_executor, get_ollama_client_pool
+    )
+    from polls.caching import get_llm_cache
+    from polls.embeddings import get_embedding_batcher, get_embedding_cache
+
+    return JsonResponse({
+        'sentence_transformer': {
+            'configured_model': settings.SENTENCE_TRANSFORMER_MODEL,
+            'models': sentence_transformer_registry.metrics(),
+        },
+        'embedding_batcher': get_embedding_batcher().stats(),
+        'embedding_cache': get_embedding_cache().stats(),
+        'ollama_pool': get_ollama_client_pool().stats(),
+        'llm_executor': get_llm_executor().stats(),
+        'llm_cache': get_llm_cache().stats(),
+    })
+
+
+GPT_PROMPT_LIST_FIELDS = columns(
+    'id', 'task_type', 'prompt', 'model', 'updated_at'
+)
+
+
 # GPT提示詞配置 CRUD API
 @csrf_exempt
 def gpt_prompt_list(request):
     if request.method == 'GET':
-        items = GPTPromptConfiguration.objects.all()
-        data = [
-            {
-                'id': i.id,
-                'task_type': i.task_type,
-                'prompt': i.prompt,
-                'model': i.model,
-                'updated_at': i.updated_at,
-            } for i in items
-        ]
-        return JsonResponse({'prompts': data})
+        try:
+            data, page = paginate(request, GPTPromptConfiguration.objects.all(), GPT_PROMPT_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'prompts': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -627,21 +784,19 @@ def gpt_prompt_detail(request, prompt_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
   
+WEIGHT_CONFIG_LIST_FIELDS = columns(
+    'id', 'name', 'score_a', 'score_b', 'score_c', 'score_d'
+)
+
+
 @csrf_exempt
 def weight_config_list(request):
     if request.method == 'GET':
-        configs = WeightConfiguration.objects.all()
-        data = [
-            {
-                'id': c.id,
-                'name': c.name,
-                'score_a': c.score_a,
-                'score_b': c.score_b,
-                'score_c': c.score_c,
-                'score_d': c.score_d,
-            } for c in configs
-        ]
-        return JsonResponse({'configs': data})
+        try:
+            data, page = paginate(request, WeightConfiguration.objects.all(), WEIGHT_CONFIG_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'configs': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -663,22 +818,59 @@ def weight_config_list(request):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+def _include_embedding(request, default):
+    value = request.GET.get('include_embedding')
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def _sentence_db_to_dict(item, include_embedding):
+    """SentenceDatabase 的 API 輸出；向量只在需要時才轉為 float 列表"""
+    data = {
+        'id': item.id,
+        'user': item.user,
+        'sentence': item.sentence,
+        'category': item.category,
+        'embedding_dim': vector_dimension(item.embedding),
+        'created_at': item.created_at,
+        'updated_at': item.updated_at,
+    }
+    if include_embedding:
+        data['embedding'] = vector_to_list(item.embedding)
+    return data
+
+
+SENTENCE_DB_LIST_FIELDS = {
+    **columns('id', 'user', 'sentence', 'category'),
+    'embedding_dim': ListField(
+        'embedding', getter=lambda i: vector_dimension(i.embedding)
+    ),
+    'embedding': ListField(
+        'embedding', getter=lambda i: vector_to_list(i.embedding)
+    ),
+    **columns('created_at', 'updated_at'),
+}
+
+
 @csrf_exempt
 def sentence_db_list(request):
     if request.method == 'GET':
-        items = SentenceDatabase.objects.all()
-        data = [
-            {
-                'id': i.id,
-                'user': i.user,
-                'sentence': i.sentence,
-                'category': i.category,
-                'embedding': i.embedding,
-                'created_at': i.created_at,
-                'updated_at': i.updated_at,
-            } for i in items
+        # 向量欄位只在 ?include_embedding=true 或 fields= 指定時才讀取
+        default_fields = [
+            name for name in SENTENCE_DB_LIST_FIELDS
+            if name not in ('embedding_dim', 'embedding')
         ]
-        return JsonResponse({'sentences': data})
+        if _include_embedding(request, default=False):
+            default_fields += ['embedding_dim', 'embedding']
+        try:
+            data, page = paginate(
+                request, SentenceDatabase.objects.all(),
+                SENTENCE_DB_LIST_FIELDS, default_fields
+            )
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'sentences': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -686,11 +878,20 @@ def sentence_db_list(request):
                 user=payload.get('user', ''),
                 sentence=payload.get('sentence', ''),
                 category=payload.get('category', ''),
-                embedding=payload.get('embedding', []),
+                embedding=payload.get('embedding'),
             )
             item.clean()
             item.save()
-            return JsonResponse({'result': 'created', 'id': item.id})
+
+            from polls.minhash import find_near_duplicates
+
+            return JsonResponse({
+                'result': 'created',
+                'id': item.id,
+                'near_duplicates': find_near_duplicates(
+                    item.sentence, exclude_id=item.id
+                ),
+            })
         except ValidationError as e:
             return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
@@ -699,6 +900,117 @@ def sentence_db_list(request):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+@csrf_exempt
+def sentence_db_near_duplicates(request):
+    """
+    查詢近似重複的句子（MinHash / LSH，新增前可先檢查）
+
+    請求格式：
+        {"sentence": "句子", "threshold": 0.5（選填）, "limit": 20（選填）}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    sentence = payload.get('sentence')
+    threshold = payload.get('threshold')
+    limit = payload.get('limit', 20)
+    if not isinstance(sentence, str) or not sentence.strip():
+        return JsonResponse({'error': '缺少必要參數：sentence'}, status=400)
+    if threshold is not None and (
+        not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1
+    ):
+        return JsonResponse(
+            {'error': 'threshold 必須為 0 到 1 之間的數值'}, status=400
+        )
+    if not isinstance(limit, int) or limit <= 0:
+        return JsonResponse({'error': 'limit 必須為正整數'}, status=400)
+
+    from polls.minhash import find_near_duplicates
+
+    matches = find_near_duplicates(sentence, threshold, limit=limit)
+    return JsonResponse({
+        'sentence': sentence,
+        'threshold': (
+            settings.MINHASH_THRESHOLD if threshold is None else threshold
+        ),
+        'near_duplicates': matches,
+    })
+
+
+@csrf_exempt
+def sentence_db_search(request):
+    """
+    SentenceDatabase 語意搜尋（kb 向量索引）
+
+    請求格式：
+        {"query": "查詢句子"} 或 {"vector": [...]}
+        "k": 回傳筆數（預設 10）
+        "user" / "category": 只在該分區中搜尋（選填）
+        "min_score": 最低 cosine 相似度（選填）
+        "nprobe" / "ef_search": 近似索引的搜尋參數（選填）
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    query = payload.get('query')
+    vector = payload.get('vector')
+    k = payload.get('k', 10)
+    user = payload.get('user')
+    category = payload.get('category')
+    min_score = payload.get('min_score')
+    nprobe = payload.get('nprobe')
+    ef_search = payload.get('ef_search')
+
+    if not query and not vector:
+        return JsonResponse({'error': '缺少必要參數：query 或 vector'}, status=400)
+    if not isinstance(k, int) or k <= 0:
+        return JsonResponse({'error': 'k 必須為正整數'}, status=400)
+    for key, value in (('user', user), ('category', category)):
+        if value is not None and not isinstance(value, str):
+            return JsonResponse({'error': f'{key} 必須為字串'}, status=400)
+    if min_score is not None and not isinstance(min_score, (int, float)):
+        return JsonResponse({'error': 'min_score 必須為數值'}, status=400)
+    for key, value in (('nprobe', nprobe), ('ef_search', ef_search)):
+        if value is not None and (not isinstance(value, int) or value <= 0):
+            return JsonResponse({'error': f'{key} 必須為正整數'}, status=400)
+
+    from polls.sentence_search import search_sentences
+
+    try:
+        result = search_sentences(
+            query=query, vector=vector, k=k, user=user, category=category,
+            min_score=min_score, nprobe=nprobe, ef_search=ef_search
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ImportError as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    except Exception as e:
+        return JsonResponse({'error': f'搜尋失敗: {str(e)}'}, status=500)
+    if result is None:
+        return JsonResponse(
+            {'error': '索引尚未建立，請先呼叫 /polls/faiss-index/rebuild/'},
+            status=404
+        )
+
+    return JsonResponse({
+        'query': query,
+        'k': k,
+        'filters': {'user': user, 'category': category},
+        **result,
+    })
+
+
 @csrf_exempt
 def sentence_db_detail(request, sentence_id):
     try:
@@ -707,16 +1019,8 @@ def sentence_db_detail(request, sentence_id):
         return JsonResponse({'error': 'Not found'}, status=404)
 
     if request.method == 'GET':
-        data = {
-            'id': item.id,
-            'user': item.user,
-            'sentence': item.sentence,
-            'category': item.category,
-            'embedding': item.embedding,
-            'created_at': item.created_at,
-            'updated_at': item.updated_at,
-        }
-        return JsonResponse(data)
+        include_embedding = _include_embedding(request, default=True)
+        return JsonResponse(_sentence_db_to_dict(item, include_embedding))
     elif request.method == 'PUT':
         try:
             payload = json.loads(request.body.decode())
@@ -738,6 +1042,67 @@ def sentence_db_detail(request, sentence_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+@csrf_exempt
+def sentence_db_encode(request):
+    """
+    批次編碼 API
+
+    請求格式（二擇一）：
+        {"sentences": ["句子1", "句子2", ...]}：回傳每個句子的向量
+        {"ids": [1, 2, ...]}：重新計算指定 SentenceDatabase 資料的向量並批次寫回
+
+    同時抵達的請求會由 micro-batching 佇列合併後一起交給模型。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    from polls.embeddings import (
+        get_embedding_batcher, backfill_sentence_embeddings
+    )
+
+    sentences = payload.get('sentences')
+    ids = payload.get('ids')
+
+    try:
+        if sentences is not None:
+            if not isinstance(sentences, list) or not all(
+                isinstance(s, str) for s in sentences
+            ):
+                return JsonResponse(
+                    {'error': 'sentences must be a list of strings'}, status=400
+                )
+            embeddings = get_embedding_batcher().encode(sentences)
+            return JsonResponse({
+                'embeddings': [vector_to_list(v) for v in embeddings],
+                'count': len(embeddings),
+                'unique': len(set(sentences)),
+            })
+
+        if ids is not None:
+            if not isinstance(ids, list) or not all(
+                isinstance(i, int) for i in ids
+            ):
+                return JsonResponse(
+                    {'error': 'ids must be a list of integers'}, status=400
+                )
+            updated = backfill_sentence_embeddings(
+                queryset=SentenceDatabase.objects.filter(id__in=ids),
+                only_missing=False,
+            )
+            return JsonResponse({'result': 'updated', 'updated': updated})
+    except ImportError as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    except Exception as e:
+        return JsonResponse({'error': f'編碼失敗: {str(e)}'}, status=500)
+
+    return JsonResponse({'error': 'sentences or ids is required'}, status=400)
+
+
 @csrf_exempt
 def sentence_similarity_api(request):
     """
@@ -798,6 +1163,104 @@ def sentence_similarity_api(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+def sentence_similarity_batch(request):
+    """
+    批次語意相似度 API（一次請求取代 N×M 次 sentence_similarity_api）
+
+    請求格式：
+        {"query": "句子", "candidates": [...]}：1×N
+        {"queries": [...], "candidates": [...]}：N×M
+        {"queries": [...]}：查詢彼此比對（排除自身，適用於去重複）
+        "top_k": 每列回傳筆數（預設 5）
+        "threshold": 最低相似度（預設 0）
+        "method": "auto"（預設）、"embedding" 或 "lexical"
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    queries = payload.get('queries')
+    if queries is None and payload.get('query') is not None:
+        queries = [payload['query']]
+    candidates = payload.get('candidates')
+    top_k = payload.get('top_k', 5)
+    threshold = payload.get('threshold', 0.0)
+    method = payload.get('method', 'auto')
+
+    def is_sentence_list(value):
+        return (
+            isinstance(value, list) and value
+            and all(isinstance(item, str) for item in value)
+        )
+
+    if not is_sentence_list(queries):
+        return JsonResponse(
+            {'error': '缺少必要參數：query 或 queries（非空字串列表）'},
+            status=400
+        )
+    if candidates is not None and not is_sentence_list(candidates):
+        return JsonResponse(
+            {'error': 'candidates 必須為非空字串列表'}, status=400
+        )
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k <= 0:
+        return JsonResponse({'error': 'top_k 必須為正整數'}, status=400)
+    if not isinstance(threshold, (int, float)) or isinstance(threshold, bool):
+        return JsonResponse({'error': 'threshold 必須為數值'}, status=400)
+    if method not in ('auto', 'embedding', 'lexical'):
+        return JsonResponse(
+            {'error': 'method 必須為 auto、embedding 或 lexical'}, status=400
+        )
+
+    targets = candidates if candidates is not None else queries
+    pairs = len(queries) * len(targets)
+    if pairs > settings.SIMILARITY_MAX_PAIRS:
+        return JsonResponse({
+            'error': f'比對組數 {pairs} 超過上限 {settings.SIMILARITY_MAX_PAIRS}'
+        }, status=400)
+
+    from polls.similarity import batch_similarity
+
+    try:
+        start = time.perf_counter()
+        used_method, rows = batch_similarity(
+            queries, candidates, k=top_k, threshold=threshold, method=method
+        )
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ImportError as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    except Exception as e:
+        return JsonResponse({'error': f'相似度計算失敗: {str(e)}'}, status=500)
+
+    return JsonResponse({
+        'method': used_method,
+        'shape': [len(queries), len(targets)],
+        'top_k': top_k,
+        'threshold': threshold,
+        'elapsed_ms': elapsed_ms,
+        'results': [
+            {
+                'index': i,
+                'query': queries[i],
+                'matches': [
+                    {
+                        'index': j,
+                        'text': targets[j],
+                        'similarity': round(score, 4),
+                    }
+                    for j, score in matches
+                ],
+            }
+            for i, matches in enumerate(rows)
+        ],
+    })
+
   
 @csrf_exempt
 def weight_config_detail(request, config_id):
@@ -891,8 +1354,20 @@ def generate_specification_api(request):
         )
   
   
+GENERATION_JOB_LIST_FIELDS = columns(
+    'id', 'kind', 'status', 'attempts', 'error', 'created_at', 'started_at',
+    'finished_at'
+)
+
+
 @csrf_exempt
 def retry_ai_api(request):
+    """
+    重新執行失敗的背景生成工作
+
+    請求格式：
+        {"task_id": 工作 ID}
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
   
@@ -905,29 +1380,37 @@ def retry_ai_api(request):
                 {'status': 'error', 'error': '缺少必要參數：task_id'},
                 status=400
             )
+        if not isinstance(task_id, int) or isinstance(task_id, bool) \
+                or task_id <= 0:
+            return JsonResponse(
+                {'status': 'error', 'error': 'task_id 必須為正整數'},
+                status=400
+            )
         
-        # 模擬任務不存在（task_id >= 100）
-        if task_id >= 100:
+        from polls.jobs import job_to_dict, retry_job
+        from polls.models import GenerationJob
+
+        try:
+            job = GenerationJob.objects.get(id=task_id)
+        except GenerationJob.DoesNotExist:
             return JsonResponse(
                 {'status': 'error', 'error': f'Task {task_id} not found'},
                 status=404
             )
         
-        # 模擬服務錯誤（task_id < 0）
-        if task_id < 0:
-            return JsonResponse(
-                {'status': 'error', 'error': 'AI service internal error'},
-                status=500
-            )
+        if not retry_job(job):
+            return JsonResponse({
+                'status': 'error',
+                'error': f'Task {task_id} 目前為 {job.status}，只有失敗的工作可以重試',
+            }, status=400)
         
-        # 成功重試
-        result = {
+        return JsonResponse({
             'status': 'success',
             'error': None,
             'task_id': task_id,
-            'retry_result': 'completed'
-        }
-        return JsonResponse(result, status=200)
+            'retry_result': 'queued',
+            'job': job_to_dict(job, include_result=False),
+        }, status=200)
         
     except json.JSONDecodeError:
         return JsonResponse(
@@ -941,18 +1424,73 @@ def retry_ai_api(request):
         )
 
 
+@csrf_exempt
+def generation_job_list(request):
+    """
+    背景生成工作
+
+    GET：工作列表（分頁，可用 ?status= 篩選）
+    POST {"kind": "formulation" | "discovery" | "complete_result",
+          "payload": {...與同步 API 相同的請求內容}}：
+        寫入佇列並立即回傳 202 與 job_id，以 GET /polls/jobs/<id>/ 查詢結果
+    """
+    from polls.jobs import job_to_dict, submit_job
+    from polls.models import GenerationJob
+
+    if request.method == 'GET':
+        jobs = GenerationJob.objects.all()
+        status = request.GET.get('status')
+        if status:
+            jobs = jobs.filter(status=status)
+        try:
+            data, page = paginate(request, jobs, GENERATION_JOB_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'jobs': data, **page})
+    elif request.method == 'POST':
+        try:
+            payload = json.loads(request.body.decode())
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        job_payload = payload.get('payload', {})
+        if not isinstance(job_payload, dict):
+            return JsonResponse({'error': 'payload 必須是 JSON 物件'}, status=400)
+        try:
+            job = submit_job(payload.get('kind'), job_payload)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(job_to_dict(job, include_result=False), status=202)
+    else:
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+
+@csrf_exempt
+def generation_job_detail(request, job_id):
+    """查詢背景生成工作的狀態與結果（result 與同步 API 的回應內容相同）"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    from polls.jobs import job_to_dict
+    from polls.models import GenerationJob
+
+    try:
+        job = GenerationJob.objects.get(id=job_id)
+    except GenerationJob.DoesNotExist:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse(job_to_dict(job))
+
+
+FIELD_PRIORITY_LIST_FIELDS = columns('id', 'name', 'field_order')
+
+
 @csrf_exempt
 def field_priority_list(request):
     if request.method == 'GET':
-        configs = FieldPriorityConfiguration.objects.all()
-        data = [
-            {
-                'id': c.id,
-                'name': c.name,
-                'field_order': c.field_order,
-            } for c in configs
-        ]
-        return JsonResponse({'configs': data})
+        try:
+            data, page = paginate(request, FieldPriorityConfiguration.objects.all(), FIELD_PRIORITY_LIST_FIELDS)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'configs': data, **page})
     elif request.method == 'POST':
         try:
             payload = json.loads(request.body.decode())
@@ -1075,92 +1613,11 @@ def spec_generator(request):
     
     try:
         # 組合 Prompt
-        system_prompt = """你是一個專業的軟體規格文件生成助手。請根據用戶提供的資訊，生成一份完整的軟體規格文件。
-
-**重要規則：**
-1. 嚴格按照指定格式輸出，不要添加任何額外的說明、備註或問候語
-2. 每個章節必須以 "==== 章節名稱 ====" 開頭
-3. 直接輸出內容，不要用括號說明、不要用「以下是...」這類開場白
-4. Mermaid 流程圖必須用完整的 ```mermaid 代碼塊包裹
-5. 不要在內容中添加任何 emoji
-6. 資料模型、功能規格、API 規格請使用適當的換行，每個項目或區塊之間空一行
-
-**輸出格式：**
-
-==== 背景說明 ====
-[直接寫背景內容，分段描述，段落之間空一行]
-
-==== 目標 ====
-[直接列出目標項目，使用 "1. " "2. " 編號，每個目標換行]
-
-==== 資料模型 ====
-[直接寫 DBML 代碼，用 ```dbml 代碼塊包裹，表格之間空一行]
-
-範例：
-```dbml
-Table users {
-  id integer [primary key]
-  username varchar
-  email varchar
-}
-
-Table posts {
-  id integer [primary key]
-  user_id integer [ref: > users.id]
-  content text
-}
-```
-
-==== 功能規格 ====
-[直接寫 Gherkin 格式的功能描述，每個 Feature 之間空一行，每個 Scenario 之間也要空一行]
-
-範例：
-```gherkin
-Feature: 使用者登入
-
-Scenario: 成功登入
-  Given 使用者在登入頁面
-  When 輸入正確的帳號密碼
-  Then 應該導向首頁
-
-Scenario: 密碼錯誤
-  Given 使用者在登入頁面
-  When 輸入錯誤的密碼
-  Then 應該顯示錯誤訊息
-
-Feature: 發布文章
-
-Scenario: 成功發布
-  Given 使用者已登入
-  When 填寫文章內容並發布
-  Then 應該顯示成功訊息
-```
-
-==== 流程圖 ====
-```mermaid
-graph TD
-    [直接寫 Mermaid 流程圖代碼]
-```
-
-==== API 規格 ====
-[直接列出 API 端點和規格，每個 API 之間空一行]
-
-範例：
-POST /api/login
-- 請求：{"username": "string", "password": "string"}
-- 回應：{"token": "string", "user": {...}}
-
-GET /api/posts
-- 請求：無
-- 回應：[{"id": 1, "title": "string", ...}]
-"""
+        system_prompt = SPEC_SYSTEM_PROMPT
         
-        user_input = f"""
-專案目標: {project_goal}
-核心功能: {core_features}
-技術限制: {technical_constraints}
-目標使用者: {target_audience}
-"""
+        user_input = build_spec_user_input(
+            project_goal, core_features, technical_constraints, target_audience
+        )
   
         # 呼叫 Ollama Cloud API
         from polls.api_utils import call_ollama_api
@@ -1171,21 +1628,7 @@ GET /api/posts
         )
         
         # 解析 AI 回應到各個章節
-        sections = {}
-        current_section = None
-        current_content = []
-        
-        for line in ai_response.split('\n'):
-            if line.strip().startswith('====') and line.strip().endswith('===='):
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                current_section = line.strip().replace('=', '').strip()
-                current_content = []
-            else:
-                current_content.append(line)
-        
-        if current_section:
-            sections[current_section] = '\n'.join(current_content).strip()
+        sections = parse_spec_sections(ai_response)
         
         # 將解析的內容填入 context
         context['spec_background'] = sections.get('背景說明', f"背景說明：本專案旨在{project_goal}")
@@ -1302,7 +1745,7 @@ def gpt_generate_api(request):
 
 
 @csrf_exempt
-def llm_ideas_api(request):
+async def llm_ideas_api(request):
     """
     AI 想法衍生 API
     接收使用者的想法，使用 Ollama API 異步生成三個不同的衍生想法
@@ -1321,9 +1764,9 @@ def llm_ideas_api(request):
             )
         
         # 呼叫 Ollama API 生成想法
-        from polls.api_utils import call_ollama_api
-        import concurrent.futures
-        
+        from polls.api_utils import acall_ollama_api, arun_llm_tasks
+        from functools import partial
+
         # 三個不同角度的 prompt
         prompts = [
             # 第一個想法:技術/工具角度
@@ -1366,42 +1809,20 @@ def llm_ideas_api(request):
 5. **字數限制：300字以內**"""
         ]
         
-        def call_api_with_retry(prompt_text):
-            """呼叫 API 並處理錯誤"""
-            try:
-                return call_ollama_api(
-                    prompt=prompt_text,
-                    user_input=""
-                )
-            except Exception as e:
-                return f"[生成失敗] {str(e)}"
-        
         try:
-            # 使用 ThreadPoolExecutor 異步並行呼叫三次 API
-            ideas = []
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=3
-            ) as executor:
-                # 提交三個任務
-                future_to_prompt = {
-                    executor.submit(call_api_with_retry, prompt): i
+            # 三個角度以 asyncio 並行呼叫（受共用 LLM 執行器的並行上限限制）
+            results, errors = await arun_llm_tasks(
+                {
+                    i: partial(acall_ollama_api, prompt=prompt, user_input="")
                     for i, prompt in enumerate(prompts)
-                }
-                
-                # 收集結果（按順序）
-                results = [None, None, None]
-                for future in concurrent.futures.as_completed(
-                    future_to_prompt
-                ):
-                    index = future_to_prompt[future]
-                    try:
-                        results[index] = future.result().strip()
-                    except Exception as e:
-                        results[index] = (
-                            f"[想法 {index + 1} 生成失敗] {str(e)}"
-                        )
-                
-                ideas = results
+                },
+                timeout=settings.LLM_SECTION_TIMEOUT
+            )
+            ideas = [
+                results[i].strip() if i in results
+                else f"[生成失敗] {errors[i]}"
+                for i in range(len(prompts))
+            ]
             
             # 過濾空結果
             ideas = [
@@ -1427,6 +1848,8 @@ def llm_ideas_api(request):
                 'method': 'parallel_api_calls'
             })
             
+        except LLMBusyError as e:
+            return _busy_response(e)
         except Exception as e:
             # 如果並行呼叫失敗，返回模擬回應
             return JsonResponse({
@@ -1507,370 +1930,72 @@ def generate_field_api(request):
 # 進階規格產出 API (Formulation → Discovery → Clarify)
 # ============================================
 
-@csrf_exempt
-def formulation_api(request):
-    """
-    Formulation 階段: 從原始規格文本萃取資料模型 (DBML) 和功能模型 (Gherkin)
-    依照 formulation-rules.md 規則執行
-    """
-    if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
-    
+def _llm_response(body, status):
+    """回傳 LLM 流程結果；執行器滿載（503）時附上 Retry-After 標頭"""
+    response = JsonResponse(body, status=status)
+    if status == 503 and body.get('retry_after'):
+        response['Retry-After'] = str(body['retry_after'])
+    return response
+
+
+def _busy_response(error):
+    return _llm_response({
+        'success': False, 'error': str(error),
+        'retry_after': error.retry_after,
+    }, 503)
+
+
+async def _run_pipeline(request, stage):
+    # 非同步執行：LLM 呼叫以 asyncio 並行，等待回應時不佔用 worker 執行緒
     try:
         payload = json.loads(request.body.decode())
-        spec_text = payload.get('spec_text', '').strip()
-        
-        if not spec_text:
-            return JsonResponse({'error': '缺少規格文本'}, status=400)
-        
-        # 載入 formulation-rules.md 規則
-        formulation_rules = """
-# 核心原則：無腦補或任意假設原則
-嚴格遵守原始規格文本內容，如果需求中沒有明確寫出的欄位、規則、條件或行為，就不要加入。不要擅自假設、推測或補充任何需求中不存在的內容。
-
-# 資料模型萃取規則 (DBML 格式)
-
-## A. 識別「實體 (Entity)」
-- 只萃取規格中明確提到的實體
-- 實體名稱使用規格中的術語，不要自行創造
-- 不要添加規格中未提及的實體
-
-## B. 萃取實體的「屬性 (Attribute)」
-- 只萃取規格中明確提到或可直接推導的屬性
-- 每個屬性必須指定資料型別：int, long, float, bool, string
-- 每個屬性必須有 note 說明其定義與用途
-- 如果規格中有提到屬性的限制條件（如 > 0, >= 0, 必須唯一等），在 note 中明確標註
-- 不要添加規格中沒有提到的「預留欄位」或「可能需要的欄位」
-
-## C. 標註「跨屬性不變條件」
-- 在實體的 Note 中條列跨屬性不變條件
-- 例如：總額 = 單價 × 數量
-- 只記錄規格中明確提到的約束，不要臆測
-
-## D. 識別實體之間的「關係 (Relationship)」
-- 只標註規格中明確提到的關聯關係
-- 使用 DBML 的 ref 語法描述關聯
-- 明確標示關聯類型（一對一、一對多、多對多）
-
-## E. 記錄實體的整體說明
-- 在 Table 的 Note 中簡述此實體的用途
-
-# 功能模型萃取規則 (Gherkin 格式)
-
-## A. 萃取「功能 (Feature)」
-- 每個功能都是使用者與系統的請求交互點，若沒有明確交互時機則不被視為功能
-- 只萃取規格中明確提到的功能，不要推測「可能需要的功能」
-- 功能命名應清晰且反映使用者意圖
-
-## B. 萃取功能的「規則 (Rule)」
-- 每個前置條件 or 後置條件都必須為一條獨立的 Rule
-- Rule 必須原子化，分割到不可分割為止，每一個 Rule 只驗證一件事
-- 只萃取規格中明確提到的規則，不要添加「合理的驗證」
-- 規則描述必須可驗證，避免使用模糊的形容詞
-
-## C. 萃取規則的「例子 (Example)」
-- 使用 Gherkin 語法 (Given-When-Then) 描述此 Example
-- 如果無法從文本中找到任何例子，則在 Rule 下標記 #TODO
-- 不要編造例子或假設測試情境
-- 每個 Example 至少都有 "When step"，When 與該 Feature 的系統交互相關
-"""
-        
-        # 建立 Formulation 提示詞 - 資料模型
-        dbml_prompt = f"""你是一個專業的需求分析師。請依照以下規則從規格文本中萃取資料模型 (Data Model)，並輸出為 DBML 格式。
-
-{formulation_rules}
-
-## 原始規格文本
-{spec_text}
-
-## 輸出要求
-請嚴格依照上述規則萃取資料模型，輸出為標準 DBML 格式。
-
-**重要**: 
-- 只輸出 DBML 代碼本身，不要包含任何說明文字或前綴
-- 不要使用 markdown code block 標記 (```dbml)
-- 直接從 Table 開始輸出
-- 每個 Table 必須有 Note 說明用途
-- 每個 Column 必須有 note 說明定義
-- 使用 ref 語法描述實體關係
-
-範例格式:
-Table User {{
-  id int [pk]
-  username string [note: "使用者名稱，必須唯一"]
-  email string [note: "電子郵件"]
-  
-  Note: "系統使用者實體"
-}}
-
-Table Order {{
-  id int [pk]
-  user_id int [ref: > User.id, note: "訂單所屬使用者"]
-  total float [note: "訂單總額，必須 >= 0"]
-  
-  Note: "訂單實體。不變條件: total = sum(OrderItem.price * OrderItem.quantity)"
-}}
-"""
-        
-        # 建立 Formulation 提示詞 - 功能模型  
-        gherkin_prompt = f"""你是一個專業的需求分析師。請依照以下規則從規格文本中萃取功能模型 (Functional Model)，並輸出為 Gherkin 格式。
-
-{formulation_rules}
-
-## 原始規格文本
-{spec_text}
-
-## 輸出要求
-請嚴格依照上述規則萃取功能模型，輸出為標準 Gherkin Language 格式。
-
-**重要**: 
-- 只輸出 Gherkin 代碼本身，不要包含任何說明文字或前綴
-- 不要使用 markdown code block 標記 (```gherkin)
-- 使用英文 keyword (Feature, Rule, Example, Given, When, Then, And)
-- 主要內容使用繁體中文
-- 階層結構: Feature > Rule > Example
-- 每個 Example 必須有 When step
-- 如果規則沒有例子，標記 #TODO
-
-範例格式:
-Feature: 使用者註冊
-
-  Rule: 註冊時必須提供使用者名稱
-    Example: 成功註冊
-      Given 系統已啟動
-      When 使用者提供使用者名稱「張三」和密碼「pass123」進行註冊
-      Then 系統建立新使用者帳號
-      And 使用者名稱為「張三」
-
-  Rule: 使用者名稱必須唯一
-    Example: 拒絕重複的使用者名稱
-      Given 系統中已存在使用者名稱「張三」
-      When 使用者嘗試以使用者名稱「張三」註冊
-      Then 操作失敗
-      And 系統顯示錯誤訊息「使用者名稱已存在」
-"""
-        
-        # 呼叫 Ollama API 生成 DBML
-        from polls.api_utils import call_ollama_api
-        
-        try:
-            dbml_content = call_ollama_api(
-                prompt=dbml_prompt,
-                user_input=""
-            ).strip()
-            
-            # 移除可能的 markdown code block 標記
-            if dbml_content.startswith('```'):
-                lines = dbml_content.split('\n')
-                # 移除第一行和最後一行
-                if lines[-1].strip() == '```':
-                    dbml_content = '\n'.join(lines[1:-1])
-                else:
-                    dbml_content = '\n'.join(lines[1:])
-            
-            # 呼叫 Ollama API 生成 Gherkin
-            gherkin_content = call_ollama_api(
-                prompt=gherkin_prompt,
-                user_input=""
-            ).strip()
-            
-            # 移除可能的 markdown code block 標記
-            if gherkin_content.startswith('```'):
-                lines = gherkin_content.split('\n')
-                if lines[-1].strip() == '```':
-                    gherkin_content = '\n'.join(lines[1:-1])
-                else:
-                    gherkin_content = '\n'.join(lines[1:])
-            
-            return JsonResponse({
-                'success': True,
-                'dbml': dbml_content,
-                'gherkin': gherkin_content
-            })
-            
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'error': f'Formulation 執行失敗：{str(e)}'
-            }, status=500)
-        
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    if payload.get('background'):
+        # 只寫入工作佇列並立即回傳，LLM 呼叫由背景 worker 執行
+        from polls.jobs import job_to_dict, submit_job
+
+        job = await sync_to_async(submit_job)(stage, payload)
+        return JsonResponse(
+            job_to_dict(job, include_result=False), status=202
+        )
+
+    from polls.pipelines import ASYNC_PIPELINES
+
+    try:
+        body, status = await ASYNC_PIPELINES[stage](payload)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+    return _llm_response(body, status)
+
+
+@csrf_exempt
+async def formulation_api(request):
+    """
+    Formulation 階段: 從原始規格文本萃取資料模型 (DBML) 和功能模型 (Gherkin)
+    依照 formulation-rules.md 規則執行（實作見 polls.pipelines）
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    return await _run_pipeline(request, 'formulation')
 
 
 @csrf_exempt
-def discovery_api(request):
+async def discovery_api(request):
     """
     Discovery 階段: 掃描 DBML 和 Gherkin 規格,識別歧義與遺漏
     執行 A1-A6 (資料模型), B1-B5 (功能模型) 檢查清單
     """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
-    
-    try:
-        payload = json.loads(request.body.decode())
-        dbml_content = payload.get('dbml', '').strip()
-        gherkin_content = payload.get('gherkin', '').strip()
-        
-        if not dbml_content or not gherkin_content:
-            return JsonResponse({'error': '缺少 DBML 或 Gherkin 內容'}, status=400)
-        
-        # 建立 Discovery 提示詞
-        discovery_prompt = f"""你是一個專業的規格品質檢查專家。請依照以下檢查清單掃描規格,識別需要釐清的項目。
-
-## 檢查清單
-
-### A. 資料模型檢查 (DBML)
-
-A1. 實體完整性
-- 所有核心業務概念是否都已建模為實體？
-- 實體命名是否清晰且無歧義？
-
-A2. 屬性定義
-- 每個屬性是否都有明確的資料型別？
-- 每個屬性是否都有充足的定義說明？
-
-A3. 屬性值邊界條件
-- 數值屬性的範圍限制是否明確（>=、<=）？
-- 特殊值處理是否已定義（空值、零、負值）？
-
-A4. 跨屬性不變條件
-- 屬性間的計算關係是否明確？
-
-A5. 關係與唯一性
-- 實體間的關聯關係是否完整？
-- 主鍵與唯一性規則是否明確？
-
-A6. 生命週期與狀態
-- 具有狀態的實體是否定義了所有可能狀態？
-- 狀態轉換規則是否完整？
-
-### B. 功能模型檢查 (Gherkin)
-
-B1. 功能識別
-- 所有使用者與系統的交互點是否都已識別為功能？
-- 功能命名是否清晰？
-
-B2. 規則完整性
-- 每個功能是否至少有一條規則？
-- 規則是否已原子化？
-- 前置條件和後置條件是否完整？
-
-B3. 例子覆蓋度
-- 每條規則是否至少有一個 Example？
-- 缺少 Example 的規則是否已標記 #TODO？
-
-B4. 邊界條件覆蓋
-- 是否涵蓋臨界值案例（剛好達標、差一點、超過）？
-- 不同值域的資料分類是否都有對應 Example？
-
-B5. 錯誤與異常處理
-- 前置條件失敗時的行為是否明確？
-- 異常情況是否都有對應的規則與 Example？
-
-## 當前規格
-
-### DBML 資料模型
-```dbml
-{dbml_content}
-```
-
-### Gherkin 功能模型
-```gherkin
-{gherkin_content}
-```
-
-## 輸出要求
-
-請以 JSON 格式輸出釐清項目清單。每個釐清項目包含:
-- id: 編號
-- priority: 優先級 (High/Medium/Low)
-- location: 定位 (ERM: 實體.屬性 或 Feature: 功能名 → Rule: 規則)
-- question: 釐清問題
-- options: 選項陣列,每個選項包含 key (A/B/C/Short) 和 text
-
-**重要**: 
-- 只輸出 JSON 陣列,不要包含任何說明文字
-- 不要使用 markdown code block 標記
-- 直接從 [ 開始輸出
-- 如果沒有發現需要釐清的項目,返回空陣列 []
-- 優先識別 High 優先級的問題(影響核心功能或資料建模)
-
-範例格式:
-[
-  {{
-    "id": 1,
-    "priority": "High",
-    "location": "ERM: User 實體 → email 屬性",
-    "question": "email 是否必須唯一？",
-    "options": [
-      {{"key": "A", "text": "是，email 必須唯一"}},
-      {{"key": "B", "text": "否，允許重複 email"}}
-    ]
-  }}
-]
-"""
-        
-        # 呼叫 Ollama API
-        from polls.api_utils import call_ollama_api
-        
-        try:
-            result = call_ollama_api(
-                prompt=discovery_prompt,
-                user_input=""
-            ).strip()
-            
-            # 移除可能的 markdown code block 標記
-            if result.startswith('```'):
-                lines = result.split('\n')
-                if lines[-1].strip() == '```':
-                    result = '\n'.join(lines[1:-1])
-                else:
-                    result = '\n'.join(lines[1:])
-            
-            # 解析 JSON
-            try:
-                clarification_items = json.loads(result)
-                
-                # 計算統計
-                total = len(clarification_items)
-                high = len([item for item in clarification_items if item.get('priority') == 'High'])
-                medium = len([item for item in clarification_items if item.get('priority') == 'Medium'])
-                low = len([item for item in clarification_items if item.get('priority') == 'Low'])
-                
-                return JsonResponse({
-                    'success': True,
-                    'items': clarification_items,
-                    'statistics': {
-                        'total': total,
-                        'high': high,
-                        'medium': medium,
-                        'low': low
-                    }
-                })
-                
-            except json.JSONDecodeError as je:
-                return JsonResponse({
-                    'success': False,
-                    'error': f'AI 返回的內容無法解析為 JSON: {str(je)}\n原始內容: {result[:200]}'
-                }, status=500)
-            
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'error': f'Discovery 執行失敗：{str(e)}'
-            }, status=500)
-        
-    except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON'}, status=400)
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+    return await _run_pipeline(request, 'discovery')
 
 
 @csrf_exempt
-def generate_complete_result_api(request):
+async def generate_complete_result_api(request):
     """
     生成完整規格結果的 API
     輸入: DBML 和 Gherkin 內容
@@ -1878,150 +2003,384 @@ def generate_complete_result_api(request):
     """
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
-    
-    try:
-        payload = json.loads(request.body)
-        
-        # 取得輸入參數
-        dbml_content = payload.get('dbml', '').strip()
-        gherkin_content = payload.get('gherkin', '').strip()
-        
-        # 參數驗證
-        if not dbml_content or not gherkin_content:
-            return JsonResponse({
-                'success': False,
-                'error': '缺少必要參數：dbml 和 gherkin 都是必填項'
-            }, status=400)
-        
+    return await _run_pipeline(request, 'complete_result')
+
+
+PIPELINE_RUN_LIST_FIELDS = columns('id', 'spec_text', 'created_at', 'updated_at')
+
+
+def _pipeline_overrides(payload):
+    """請求中可覆寫的流程輸入；型別錯誤時拋出 ValueError"""
+    values = {}
+    for name in ('spec_text', 'dbml', 'gherkin'):
+        value = payload.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            raise ValueError(f'{name} 必須為字串')
+        values[name] = value.strip()
+    return values
+
+
+@csrf_exempt
+def pipeline_run_list(request):
+    """
+    規格流程執行紀錄
+
+    GET：列表（分頁）
+    POST {"spec_text": "..."}：建立流程，之後以
+        /polls/pipeline-runs/<id>/stages/<階段>/ 或 /resume/ 執行各階段
+    """
+    from polls.models import PipelineRun
+    from polls.pipeline_runs import run_to_dict
+
+    if request.method == 'GET':
         try:
-            # 導入 API 工具
-            from polls.api_utils import call_ollama_api
-            
-            # 1. 生成背景說明
-            background_prompt = f"""你是一個專業的技術文件撰寫專家。請根據以下規格生成簡潔的背景說明（2-3 句話）。
+            data, page = paginate(
+                request, PipelineRun.objects.all(), PIPELINE_RUN_LIST_FIELDS
+            )
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'runs': data, **page})
+    elif request.method == 'POST':
+        try:
+            payload = json.loads(request.body.decode())
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        spec_text = str(payload.get('spec_text', '') or '').strip()
+        if not spec_text:
+            return JsonResponse({'error': '缺少規格文本'}, status=400)
+        run = PipelineRun.objects.create(spec_text=spec_text)
+        return JsonResponse(run_to_dict(run), status=201)
+    else:
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
 
-當前規格:
-### DBML 資料模型
-```dbml
-{dbml_content}
-```
 
-### Gherkin 功能模型
-```gherkin
-{gherkin_content}
-```
+@csrf_exempt
+def pipeline_run_detail(request, run_id):
+    """查詢流程各階段狀態與保存的輸出；next_stage 為應續跑的階段"""
+    from polls.models import PipelineRun
+    from polls.pipeline_runs import run_to_dict
 
-請直接輸出背景說明內容，不要包含任何標題或 markdown 標記。"""
+    try:
+        run = PipelineRun.objects.get(id=run_id)
+    except PipelineRun.DoesNotExist:
+        return JsonResponse({'error': 'Not found'}, status=404)
 
-            background = call_ollama_api(prompt=background_prompt, user_input="")
-            background = background.strip()
-            
-            # 2. 生成專案目標
-            goals_prompt = f"""你是一個專業的產品經理。請根據以下規格列出 3-5 個核心專案目標。
+    if request.method == 'GET':
+        return JsonResponse(run_to_dict(run))
+    elif request.method == 'DELETE':
+        run.delete()
+        return JsonResponse({'result': 'deleted'})
+    else:
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
 
-當前規格:
-### DBML 資料模型
-```dbml
-{dbml_content}
-```
 
-### Gherkin 功能模型
-```gherkin
-{gherkin_content}
-```
+@csrf_exempt
+def pipeline_run_stage(request, run_id, stage):
+    """
+    執行流程的單一階段
 
-請以有編號的清單格式輸出（例如：1. ... 2. ...），不要包含任何標題。"""
+    請求格式（皆為選填）：
+        {"spec_text" | "dbml" | "gherkin": 修改後的輸入, "bypass_cache": false}
 
-            goals = call_ollama_api(prompt=goals_prompt, user_input="")
-            goals = goals.strip()
-            
-            # 3. 生成流程圖 (Mermaid)
-            flowchart_prompt = f"""你是一個流程圖設計專家。請根據以下規格生成 Mermaid 流程圖代碼。
-
-當前規格:
-### DBML 資料模型
-```dbml
-{dbml_content}
-```
-
-### Gherkin 功能模型
-```gherkin
-{gherkin_content}
-```
-
-**重要規則**：
-1. 只輸出 Mermaid 語法，不要包含 ```mermaid 標記
-2. 直接從 graph 或 flowchart 開始
-3. 節點標籤使用英文或簡短中文（不超過 10 個字）
-4. 箭頭標籤（條件分支）請使用英文，例如：
-   - 使用 -->|Yes| 而不是 -->|是|
-   - 使用 -->|No| 而不是 -->|否|
-   - 使用 -->|Success| 而不是 -->|成功|
-5. 避免使用特殊符號：/ \\ : " ' 等
-6. 節點 ID 使用簡單的字母數字組合（A, B, C 或 step1, step2）
-7. 使用基本圖形：方括號表示方形、圓括號表示圓角、大括號表示菱形
-
-**範例格式**：
-graph TD
-    A[Start] --> B{{Check Auth}}
-    B -->|Yes| C[Load Data]
-    B -->|No| D[Show Login]
-    C --> E[Display]
-
-請只輸出符合以上規則的 Mermaid 代碼。"""
-
-            flowchart = call_ollama_api(prompt=flowchart_prompt, user_input="")
-            flowchart = flowchart.strip()
-            
-            # 移除可能的 code block 標記
-            if flowchart.startswith('```'):
-                lines = flowchart.split('\n')
-                flowchart = '\n'.join(lines[1:-1] if lines[-1].strip() == '```' else lines[1:])
-                flowchart = flowchart.strip()
-            
-            # 4. 生成 API 規格
-            api_spec_prompt = f"""你是一個 API 設計專家。請根據以下規格生成 RESTful API 規格文件。
-
-當前規格:
-### DBML 資料模型
-```dbml
-{dbml_content}
-```
-
-### Gherkin 功能模型
-```gherkin
-{gherkin_content}
-```
-
-請以 Markdown 格式輸出，包含：
-- 端點路徑和方法
-- 描述
-- 請求參數
-- 回應格式
-- 狀態碼
-
-不要包含 # API 規格 這樣的大標題。"""
-
-            api_spec = call_ollama_api(prompt=api_spec_prompt, user_input="")
-            api_spec = api_spec.strip()
-            
-            # 返回完整結果
-            return JsonResponse({
-                'success': True,
-                'background': background,
-                'goals': goals,
-                'flowchart': flowchart,
-                'api_spec': api_spec
-            })
-            
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'error': f'生成完整結果失敗：{str(e)}'
-            }, status=500)
-        
+    輸入與上次完成時相同則直接回傳保存的輸出（reused=true），不呼叫 LLM；
+    回應內容與對應的同步 API 相同，另加 run_id、stage、reused、next_stage
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    from polls.models import PipelineRun
+    from polls.pipeline_runs import STAGES, next_stage, run_stage, update_inputs
+
+    if stage not in STAGES:
+        return JsonResponse(
+            {'error': f"未知的階段: {stage}（可用：{', '.join(STAGES)}）"},
+            status=404
+        )
+    try:
+        run = PipelineRun.objects.get(id=run_id)
+    except PipelineRun.DoesNotExist:
+        return JsonResponse({'error': 'Not found'}, status=404)
+
+    try:
+        payload = json.loads(request.body.decode() or '{}')
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    try:
+        overrides = _pipeline_overrides(payload)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    update_inputs(run, **overrides)
+    body, status, reused = run_stage(
+        run, stage, bool(payload.get('bypass_cache', False))
+    )
+    return _llm_response({
+        **body,
+        'run_id': run.id,
+        'stage': stage,
+        'reused': reused,
+        'next_stage': next_stage(run),
+    }, status)
+
+
+@csrf_exempt
+def pipeline_run_resume(request, run_id):
+    """
+    從第一個未完成的階段續跑到最後（已完成且輸入未變的階段直接略過）
+
+    請求格式（皆為選填）：
+        {"bypass_cache": false, "background": false}
+    background=true 時寫入背景工作佇列並回傳 202 與 job_id
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    from polls.models import PipelineRun
+    from polls.pipeline_runs import run_pipeline_job
+
+    if not PipelineRun.objects.filter(id=run_id).exists():
+        return JsonResponse({'error': 'Not found'}, status=404)
+    try:
+        payload = json.loads(request.body.decode() or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    job_payload = {
+        'run_id': run_id,
+        'bypass_cache': bool(payload.get('bypass_cache', False)),
+    }
+    if payload.get('background'):
+        from polls.jobs import job_to_dict, submit_job
+
+        job = submit_job('pipeline', job_payload)
+        return JsonResponse(job_to_dict(job, include_result=False), status=202)
+
+    body, status = run_pipeline_job(job_payload)
+    return JsonResponse(body, status=status)
+
+
+# ============================================
+# 串流 API (Server-Sent Events)
+# ============================================
+
+def _sse_event(event, data):
+    """格式化一個 Server-Sent Event"""
+    return (
+        f"event: {event}\n"
+        f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    )
+
 
+def _sse_response(events):
+    """
+    以 text/event-stream 回傳事件產生器，並關閉代理伺服器緩衝
+
+    events 為非同步產生器：ASGI 下逐一送出事件，不會被 Django
+    以 sync_to_async(list) 整批緩衝，也不佔用執行緒
+    """
+    response = StreamingHttpResponse(
+        events, content_type='text/event-stream; charset=utf-8'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _stream_sections(tasks, finalize):
+    """
+    將多個並行的非同步串流 LLM 任務轉為 SSE 事件的非同步產生器
+
+    任務立即登記非同步呼叫額度並開始執行；已達上限時拋出 LLMBusyError，
+    呼叫端應在開始串流前回傳 503
+
+    事件：
+        section_start {section}：該區段收到第一個 token
+        token {section, text}：收到一段文字
+        section_end {section, content}：該區段完成（content 已經 finalize 處理）
+        section_error {section, error}：該區段失敗或逾時
+        done {...}：全部結束，內容與對應的 JSON API 相同
+    """
+    from polls.api_utils import astream_llm_tasks
+
+    stream = astream_llm_tasks(tasks, timeout=settings.LLM_SECTION_TIMEOUT)
+
+    async def events():
+        started = set()
+        results = {}
+        errors = {}
+        async for name, kind, value in stream:
+            if kind == 'token':
+                if name not in started:
+                    started.add(name)
+                    yield _sse_event('section_start', {'section': name})
+                yield _sse_event('token', {'section': name, 'text': value})
+            elif kind == 'done':
+                results[name] = finalize(value)
+                yield _sse_event(
+                    'section_end', {'section': name, 'content': results[name]}
+                )
+            else:
+                errors[name] = value
+                yield _sse_event(
+                    'section_error', {'section': name, 'error': value}
+                )
+
+        summary = {'success': bool(results)}
+        summary.update({name: results.get(name, '') for name in tasks})
+        if errors:
+            summary['partial'] = bool(results)
+            summary['errors'] = errors
+        yield _sse_event('done', summary)
+
+    return events()
+
+
+@csrf_exempt
+async def spec_generator_stream(request):
+    """
+    spec_generator 的串流版本 (SSE)
+    逐 token 回傳 AI 生成的規格文件，並在遇到「==== 章節 ====」標題時送出章節事件
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    fields = {
+        name: str(payload.get(name, '')).strip()
+        for name in (
+            'project_goal', 'core_features',
+            'technical_constraints', 'target_audience'
+        )
+    }
+    if not all(fields.values()):
+        return JsonResponse({'error': '請填寫所有欄位'}, status=400)
+    
+    from polls.api_utils import astream_llm_tasks, astream_ollama_api
+    from functools import partial
+    
+    user_input = build_spec_user_input(**fields)
+    try:
+        # 整份文件只有一個串流；同樣經由共用非同步額度，滿載時回傳 503
+        stream = astream_llm_tasks({
+            'spec': partial(
+                astream_ollama_api,
+                prompt=SPEC_SYSTEM_PROMPT, user_input=user_input
+            )
+        })
+    except LLMBusyError as e:
+        return _busy_response(e)
+    
+    async def events():
+        # token 在章節標題處切開，標題之後的文字歸入新章節
+        parser = SpecStreamParser(tokens=True)
+        async for _, kind, value in stream:
+            if kind == 'token':
+                for event in parser.feed(value):
+                    yield _sse_event(event.pop('event'), event)
+            elif kind == 'done':
+                for event in parser.close():
+                    yield _sse_event(event.pop('event'), event)
+                yield _sse_event('done', {
+                    'success': True,
+                    'sections': parser.sections,
+                    'result': value
+                })
+            else:
+                yield _sse_event('error', {
+                    'success': False,
+                    'error': f'AI 服務暫時無法使用，請稍後重試 ({value})'
+                })
+    
+    return _sse_response(events())
+
+
+@csrf_exempt
+async def formulation_stream_api(request):
+    """
+    Formulation 的串流版本 (SSE)
+    DBML 與 Gherkin 並行生成，token 依抵達順序以 section=dbml/gherkin 送出
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    spec_text = str(payload.get('spec_text', '')).strip()
+    if not spec_text:
+        return JsonResponse({'error': '缺少規格文本'}, status=400)
+    
+    from polls.api_utils import astream_ollama_api
+    from functools import partial
+    
+    prompts = build_formulation_prompts(spec_text)
+    tasks = {
+        name: partial(astream_ollama_api, prompt=artifact_prompt, user_input="")
+        for name, artifact_prompt in prompts.items()
+    }
+    try:
+        events = _stream_sections(tasks, strip_code_block)
+    except LLMBusyError as e:
+        return _busy_response(e)
+    return _sse_response(events)
+
+
+@csrf_exempt
+async def generate_complete_result_stream_api(request):
+    """
+    完整結果生成的串流版本 (SSE)
+    背景說明、專案目標、流程圖、API 規格四個區段並行生成並即時回傳
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
+    
+    try:
+        payload = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    dbml_content = str(payload.get('dbml', '')).strip()
+    gherkin_content = str(payload.get('gherkin', '')).strip()
+    if not dbml_content or not gherkin_content:
+        return JsonResponse({
+            'success': False,
+            'error': '缺少必要參數：dbml 和 gherkin 都是必填項'
+        }, status=400)
+    
+    from polls.api_utils import astream_ollama_api
+    from functools import partial
+    
+    section_prompts = build_complete_result_prompts(
+        dbml_content, gherkin_content
+    )
+    tasks = {
+        name: partial(astream_ollama_api, prompt=section_prompt, user_input="")
+        for name, section_prompt in section_prompts.items()
+    }
+    try:
+        events = _stream_sections(
+            tasks, lambda content: strip_code_block(content).strip()
+        )
+    except LLMBusyError as e:
+        return _busy_response(e)
+    return _sse_response(events)